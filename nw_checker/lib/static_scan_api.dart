@@ -32,7 +32,7 @@ class StaticScanApi {
 
   /// 静的スキャンを実行し結果を取得する。
   /// 成功時は `findings` と `risk_score` を含むマップを返す。
-  /// `report` が true の場合は `report_path` も含まれる。
+  /// `report` が true の場合は `report_id` と、描画済みなら `report_path` も含まれる。
   /// 失敗時は例外を投げる。
   static Future<Map<String, dynamic>> fetchScan({
     http.Client? client,
@@ -53,8 +53,10 @@ class StaticScanApi {
             (decoded['findings'] as List?)?.cast<Map<String, dynamic>>() ?? [];
         final riskScore = decoded['risk_score'] ?? 0;
         final result = {'findings': findings, 'risk_score': riskScore};
-        if (decoded['report_path'] != null) {
-          result['report_path'] = decoded['report_path'];
+        for (final key in ['report_id', 'report_path']) {
+          if (decoded[key] != null) {
+            result[key] = decoded[key];
+          }
         }
         return result;
       }
@@ -73,8 +75,37 @@ class StaticScanApi {
   }
 
   /// PDFレポートを生成しそのパスを返す。
-  static Future<String> fetchReport({http.Client? client}) async {
-    final result = await fetchScan(client: client, report: true);
-    return result['report_path']?.toString() ?? '';
+  /// 描画中の場合は `/reports/{id}` を完了までポーリングする。
+  static Future<String> fetchReport({
+    http.Client? client,
+    Duration interval = const Duration(milliseconds: 500),
+    int attempts = 20,
+  }) async {
+    final created = client == null;
+    final c = client ?? http.Client();
+    try {
+      final result = await fetchScan(client: c, report: true);
+      var path = result['report_path']?.toString();
+      final id = result['report_id']?.toString();
+      for (var i = 0; path == null && id != null && i < attempts; i++) {
+        await Future.delayed(interval);
+        final resp = await c
+            .get(Uri.parse('$_baseUrl/reports/$id'), headers: _headers())
+            .timeout(const Duration(seconds: 5));
+        if (resp.statusCode != 200) {
+          throw Exception(_extractMessage(resp));
+        }
+        final status = jsonDecode(resp.body) as Map<String, dynamic>;
+        if (status['report_status'] == 'failed') {
+          throw Exception(status['message']?.toString() ?? 'report failed');
+        }
+        path = status['report_path']?.toString();
+      }
+      return path ?? '';
+    } finally {
+      if (created) {
+        c.close();
+      }
+    }
   }
 }
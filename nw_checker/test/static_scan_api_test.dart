@@ -94,6 +94,60 @@ void main() {
     expect(path, '/tmp/r.pdf');
   });
 
+  test('fetchReport polls until the report is ready', () async {
+    var polls = 0;
+    final client = MockClient((request) async {
+      if (request.url.path == '/static_scan') {
+        return http.Response(
+          '{"risk_score": 1, "findings": [], "report_id": "abc",'
+          ' "report_status": "pending"}',
+          200,
+        );
+      }
+      expect(request.url.path, '/reports/abc');
+      polls++;
+      return http.Response(
+        polls < 2
+            ? '{"report_status": "pending"}'
+            : '{"report_status": "ready", "report_path": "/tmp/abc.pdf"}',
+        200,
+      );
+    });
+
+    final path = await StaticScanApi.fetchReport(
+      client: client,
+      interval: Duration.zero,
+    );
+    expect(path, '/tmp/abc.pdf');
+    expect(polls, 2);
+  });
+
+  test('fetchReport surfaces failed renders', () async {
+    final client = MockClient((request) async {
+      if (request.url.path == '/static_scan') {
+        return http.Response(
+          '{"risk_score": 1, "findings": [], "report_id": "abc"}',
+          200,
+        );
+      }
+      return http.Response(
+        '{"report_status": "failed", "message": "render failed"}',
+        200,
+      );
+    });
+
+    expect(
+      StaticScanApi.fetchReport(client: client, interval: Duration.zero),
+      throwsA(
+        isA<Exception>().having(
+          (e) => e.toString(),
+          'message',
+          contains('render failed'),
+        ),
+      ),
+    );
+  });
+
   test('fetchScan throws on timeout', () async {
     final client = MockClient((request) async {
       return Future.delayed(
@@ -2,20 +2,25 @@
 
 from __future__ import annotations
 
-from typing import Iterable, List, Mapping, Sequence
+from typing import Iterable, List, Mapping, Sequence, Union
 
 from graphviz import Digraph
 
+from ..topology_graph import TopologyGraph
+
 
 def build_graph(
-    paths: Iterable[Sequence[str]], nodes: Mapping[str, Mapping[str, str]]
+    paths: Union[Iterable[Sequence[str]], TopologyGraph],
+    nodes: Mapping[str, Mapping[str, str]],
 ) -> Digraph:
     """Build a Graphviz digraph representing the topology.
 
     Parameters
     ----------
     paths:
-        各経路を示すノードIDのリスト。
+        各経路を示すノードIDのリスト、または構築済みの
+        :class:`~src.topology_graph.TopologyGraph`。共通する経路は
+        1 本のエッジにまとめられる。
     nodes:
         ノードIDをキーとし、``hostname`` と ``vendor`` を含む辞書。
 
@@ -28,19 +33,19 @@ def build_graph(
     # Flutter 側のタップ処理のためノード形状は楕円とする
     graph.attr("node", shape="ellipse")
 
-    added: set[str] = set()
-
-    for path in paths:
-        for idx, node_id in enumerate(path):
-            info = nodes.get(node_id, {})
-            if node_id not in added:
-                hostname = info.get("hostname", "")
-                vendor = info.get("vendor", "")
-                label_parts: List[str] = [p for p in (hostname, vendor) if p]
-                label = "\n".join(label_parts) if label_parts else node_id
-                graph.node(node_id, label=label)
-                added.add(node_id)
-            if idx > 0:
-                parent = path[idx - 1]
-                graph.edge(parent, node_id)
+    if isinstance(paths, TopologyGraph):
+        topology = paths
+    else:
+        topology = TopologyGraph()
+        topology.update({str(idx): path for idx, path in enumerate(paths) if path})
+
+    for node_id in topology.nodes:
+        info = nodes.get(node_id, {})
+        hostname = info.get("hostname", "")
+        vendor = info.get("vendor", "")
+        label_parts: List[str] = [p for p in (hostname, vendor) if p]
+        label = "\n".join(label_parts) if label_parts else node_id
+        graph.node(node_id, label=label)
+    for parent, node_id in topology.edges:
+        graph.edge(parent, node_id)
     return graph
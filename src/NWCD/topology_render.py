@@ -0,0 +1,228 @@
+"""Cached, off-request-path SVG rendering of topology graphs.
+
+Graphviz layout of a large topology takes seconds, so rendered SVGs are
+stored on disk under the SHA-256 of the canonical graph (sorted nodes with
+their labels and sorted edges).  An unchanged topology is served from the
+cache; a changed one is laid out in a process pool while the caller keeps
+serving the previous image.  Graphs above :data:`MAX_DETAILED_NODES` are
+collapsed first: the end hosts behind each router become one summary node.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from graphviz import Source
+
+from ..topology_graph import TopologyGraph
+from .generate_topology import build_graph
+
+CACHE_DIR = Path(__file__).resolve().parents[2] / "data" / "topology_cache"
+# これを超えるノード数ではルータごとに端末をまとめて描画する
+MAX_DETAILED_NODES = 1500
+DEFAULT_WORKERS = 2
+
+NodeInfo = Mapping[str, Mapping[str, str]]
+
+
+def render_svg(source: str) -> str:
+    """Lay out DOT *source* with Graphviz and return the SVG text."""
+
+    return Source(source).pipe(format="svg", encoding="utf-8")
+
+
+def collapse(
+    topology: TopologyGraph, nodes: NodeInfo
+) -> Tuple[TopologyGraph, Dict[str, Dict[str, str]]]:
+    """Replace the leaf hosts of every router with one summary node.
+
+    Returns the collapsed graph and node information with ``N hosts``
+    labels for the summary nodes.
+    """
+
+    parents: Dict[str, List[str]] = {}
+    has_children = set()
+    for parent, child in topology.edges:
+        parents.setdefault(child, []).append(parent)
+        has_children.add(parent)
+    # 葉で、かつ上流が 1 つだけのノードをまとめる
+    grouped: Dict[str, str] = {
+        node: f"{owners[0]}/hosts"
+        for node, owners in parents.items()
+        if node not in has_children and len(owners) == 1
+    }
+    counts: Dict[str, int] = {}
+    for group in grouped.values():
+        counts[group] = counts.get(group, 0) + 1
+
+    collapsed = TopologyGraph()
+    paths: Dict[str, List[str]] = {}
+    for host, path in topology.paths():
+        key = grouped.get(path[-1], path[-1])
+        paths.setdefault(key, path[:-1] + [key])
+    collapsed.update(paths)
+    info: Dict[str, Dict[str, str]] = {k: dict(v) for k, v in nodes.items()}
+    for group, count in counts.items():
+        info[group] = {"hostname": f"{count} hosts"}
+    return collapsed, info
+
+
+def canonical(topology: TopologyGraph, nodes: NodeInfo) -> Dict[str, Any]:
+    """Return an order-independent description of what gets drawn."""
+
+    return {
+        "nodes": sorted(
+            (
+                n,
+                nodes.get(n, {}).get("hostname", ""),
+                nodes.get(n, {}).get("vendor", ""),
+            )
+            for n in topology.nodes
+        ),
+        "edges": sorted(topology.edges),
+    }
+
+
+def graph_key(topology: TopologyGraph, nodes: NodeInfo) -> str:
+    payload = json.dumps(canonical(topology, nodes), separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TopologyRenderer:
+    """Render topology SVGs through a content-addressed disk cache.
+
+    Parameters
+    ----------
+    cache_dir:
+        Directory holding ``<sha256>.svg`` files.
+    executor:
+        Pool running the layout; a process pool is created on first use.
+    layout:
+        Function turning DOT source into SVG.  It runs in *executor*, so it
+        must be picklable for a process pool.
+    max_detailed_nodes:
+        Larger graphs are rendered collapsed via :func:`collapse`.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | str = CACHE_DIR,
+        *,
+        executor: Optional[Executor] = None,
+        layout: Callable[[str], str] = render_svg,
+        max_detailed_nodes: int = MAX_DETAILED_NODES,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.layout = layout
+        self.max_detailed_nodes = max_detailed_nodes
+        self._executor = executor
+        self._own_executor = executor is None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        # 最後に描画が完了した SVG (再描画中に返す)
+        self.latest: Optional[str] = None
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.svg"
+
+    def _prepare(
+        self, topology: TopologyGraph, nodes: NodeInfo
+    ) -> Tuple[str, TopologyGraph, NodeInfo]:
+        if len(topology.nodes) > self.max_detailed_nodes:
+            topology, nodes = collapse(topology, nodes)
+        return graph_key(topology, nodes), topology, nodes
+
+    def cached(self, topology: TopologyGraph, nodes: NodeInfo) -> Optional[str]:
+        """Return the cached SVG for the graph, or ``None``."""
+
+        key, _, _ = self._prepare(topology, nodes)
+        return self._read(key)
+
+    def _read(self, key: str) -> Optional[str]:
+        try:
+            return self._path(key).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def _store(self, key: str, svg: str) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self._path(key).with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(svg, encoding="utf-8")
+        os.replace(tmp, self._path(key))
+
+    def submit(self, topology: TopologyGraph, nodes: NodeInfo) -> Future:
+        """Return a future SVG, laid out in the pool unless cached.
+
+        Concurrent requests for the same graph share one layout job.
+        """
+
+        key, graph, info = self._prepare(topology, nodes)
+        svg = self._read(key)
+        if svg is not None:
+            self.latest = svg
+            done: Future = Future()
+            done.set_result(svg)
+            return done
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=DEFAULT_WORKERS)
+            source = build_graph(graph, info).source
+            job = self._executor.submit(self.layout, source)
+            # キャッシュへの保存が終わってから結果を返す
+            result: Future = Future()
+            self._pending[key] = result
+
+        def finished(fut: Future) -> None:
+            error: Optional[BaseException] = None
+            try:
+                svg = fut.result()
+                self._store(key, svg)
+            except BaseException as exc:  # noqa: BLE001 - 呼び出し側へ伝える
+                error = exc
+            with self._lock:
+                self._pending.pop(key, None)
+                if error is None:
+                    self.latest = svg
+            if error is None:
+                result.set_result(svg)
+            else:
+                result.set_exception(error)
+
+        job.add_done_callback(finished)
+        return result
+
+    def current(self, topology: TopologyGraph, nodes: NodeInfo) -> Optional[str]:
+        """Return an SVG without waiting for a layout.
+
+        On a cache hit the matching SVG is returned; otherwise the layout is
+        started in the background and the last rendered SVG (``None`` before
+        the first one) is served meanwhile.
+        """
+
+        future = self.submit(topology, nodes)
+        if future.done() and future.exception() is None:
+            return future.result()
+        return self.latest
+
+    def render(self, topology: TopologyGraph, nodes: NodeInfo) -> str:
+        """Return the SVG, blocking until the layout is done."""
+
+        return self.submit(topology, nodes).result()
+
+    async def render_async(self, topology: TopologyGraph, nodes: NodeInfo) -> str:
+        return await asyncio.wrap_future(self.submit(topology, nodes))
+
+    def close(self) -> None:
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
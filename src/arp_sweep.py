@@ -0,0 +1,234 @@
+"""Native ARP sweep for hosts on directly attached IPv4 subnets.
+
+One ``AF_PACKET`` socket sends a paced ARP request to every address of the
+subnet while replies are collected concurrently on the same socket, so a
+``/24`` completes in about a second without spawning any process.  Routed
+subnets cannot be swept with ARP; :func:`sweep` returns ``None`` for them (and
+when raw sockets are unavailable) so callers can fall back to nmap.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import ipaddress
+import socket
+import struct
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ETH_P_ARP = 0x0806
+PROC_ROUTE = "/proc/net/route"
+# 1 秒あたりの送信数と、送信完了後に応答を待つ秒数
+DEFAULT_RATE = 1000
+DEFAULT_TIMEOUT = 0.75
+
+_SIOCGIFADDR = 0x8915
+_RTF_UP = 0x0001
+_RTF_GATEWAY = 0x0002
+_BROADCAST = b"\xff" * 6
+_ARP_REQUEST = 1
+_ARP_REPLY = 2
+# 送信が予定よりこの秒数以上先行したときだけ sleep する
+_PACING_SLACK = 0.005
+
+
+def build_frame(
+    op: int, src_mac: bytes, src_ip: str, dst_mac: bytes, dst_ip: str
+) -> bytes:
+    """Return an Ethernet frame carrying an ARP packet."""
+
+    eth_dst = _BROADCAST if op == _ARP_REQUEST else dst_mac
+    arp = struct.pack(
+        "!HHBBH6s4s6s4s",
+        1,  # htype: Ethernet
+        0x0800,  # ptype: IPv4
+        6,
+        4,
+        op,
+        src_mac,
+        socket.inet_aton(src_ip),
+        dst_mac,
+        socket.inet_aton(dst_ip),
+    )
+    return eth_dst + src_mac + struct.pack("!H", ETH_P_ARP) + arp
+
+
+def build_request(src_mac: bytes, src_ip: str, target_ip: str) -> bytes:
+    return build_frame(_ARP_REQUEST, src_mac, src_ip, b"\x00" * 6, target_ip)
+
+
+def parse_reply(frame: bytes) -> Optional[tuple]:
+    """Return ``(ip, mac)`` of the sender if *frame* is an ARP reply."""
+
+    if len(frame) < 42 or frame[12:14] != b"\x08\x06":
+        return None
+    _, ptype, hlen, plen, op, sha, spa = struct.unpack("!HHBBH6s4s", frame[14:32])
+    if ptype != 0x0800 or hlen != 6 or plen != 4 or op != _ARP_REPLY:
+        return None
+    return socket.inet_ntoa(spa), ":".join(f"{b:02x}" for b in sha)
+
+
+def _on_link_interface(network: ipaddress.IPv4Network) -> Optional[str]:
+    """Return the interface whose directly connected route covers *network*."""
+
+    best: Optional[tuple] = None
+    try:
+        with open(PROC_ROUTE) as fh:
+            lines = fh.read().splitlines()[1:]
+    except OSError:
+        return None
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        try:
+            flags = int(fields[3], 16)
+            dest = socket.inet_ntoa(struct.pack("<I", int(fields[1], 16)))
+            mask = socket.inet_ntoa(struct.pack("<I", int(fields[7], 16)))
+        except ValueError:
+            continue
+        if not flags & _RTF_UP or flags & _RTF_GATEWAY:
+            continue
+        route = ipaddress.IPv4Network(f"{dest}/{mask}", strict=False)
+        if route.prefixlen == 0 or not network.subnet_of(route):
+            continue
+        if best is None or route.prefixlen > best[0]:
+            best = (route.prefixlen, fields[0])
+    return best[1] if best else None
+
+
+def _interface_ip(sock: socket.socket, interface: str) -> str:
+    ifreq = struct.pack("256s", interface.encode()[:15])
+    return socket.inet_ntoa(fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, ifreq)[20:24])
+
+
+async def sweep_socket(
+    sock: socket.socket,
+    probes: Dict[str, bytes],
+    *,
+    rate: float = DEFAULT_RATE,
+    timeout: float = DEFAULT_TIMEOUT,
+    on_reply: Optional[Callable[[str, str], None]] = None,
+    on_sent: Optional[Callable[[int], None]] = None,
+    pace: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Dict[str, str]:
+    """Send *probes* (``ip -> frame``) over *sock* and collect replies.
+
+    Sending is paced to *rate* frames per second while a reader task parses
+    replies as they arrive.  Collection stops *timeout* seconds after the
+    last request was sent, or as soon as every target has answered.
+    *on_reply* is called with ``(ip, mac)`` for each new reply and *on_sent*
+    with the number of requests sent so far; an exception raised by either
+    callback aborts the sweep.  *pace*, when given, is awaited before every
+    request, e.g. a shared rate limiter that must not block the reader.
+
+    Returns
+    -------
+    dict
+        ``ip -> mac`` for every target that replied.
+    """
+
+    loop = asyncio.get_running_loop()
+    sock.setblocking(False)
+    found: Dict[str, str] = {}
+    complete = asyncio.Event()
+
+    async def reader() -> None:
+        while True:
+            try:
+                frame = await loop.sock_recv(sock, 2048)
+            except OSError:
+                return
+            reply = parse_reply(frame)
+            if reply and reply[0] in probes and reply[0] not in found:
+                found[reply[0]] = reply[1]
+                if on_reply is not None:
+                    on_reply(reply[0], reply[1])
+                if len(found) == len(probes):
+                    complete.set()
+
+    task = asyncio.create_task(reader())
+    try:
+        interval = 1.0 / rate if rate > 0 else 0.0
+        start = loop.time()
+        for i, frame in enumerate(probes.values()):
+            ahead = start + i * interval - loop.time()
+            if ahead > _PACING_SLACK:
+                await asyncio.sleep(ahead)
+            if pace is not None:
+                await pace()
+            await loop.sock_sendall(sock, frame)
+            if on_sent is not None:
+                on_sent(i + 1)
+        waiter = asyncio.ensure_future(complete.wait())
+        # 応答側コールバックの例外も拾えるよう reader と一緒に待つ
+        await asyncio.wait(
+            {waiter, task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        waiter.cancel()
+        if task.done():
+            task.result()
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    return found
+
+
+async def sweep_async(
+    subnet: str,
+    *,
+    interface: Optional[str] = None,
+    rate: float = DEFAULT_RATE,
+    timeout: float = DEFAULT_TIMEOUT,
+    on_reply: Optional[Callable[[str, str], None]] = None,
+    on_sent: Optional[Callable[[int], None]] = None,
+    pace: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Optional[List[Dict[str, str]]]:
+    """ARP-sweep *subnet* and return ``[{"ip", "mac"}, ...]``.
+
+    ``None`` is returned when the subnet is not directly attached, or when a
+    raw socket cannot be opened (non-Linux, missing ``CAP_NET_RAW``).
+    """
+
+    network = ipaddress.ip_network(subnet, strict=False)
+    if not isinstance(network, ipaddress.IPv4Network):
+        return None
+    iface = interface or _on_link_interface(network)
+    if iface is None:
+        return None
+    try:
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+    except (AttributeError, OSError):
+        return None
+    with sock:
+        try:
+            sock.bind((iface, ETH_P_ARP))
+            src_mac = sock.getsockname()[4]
+            src_ip = _interface_ip(sock, iface)
+        except OSError:
+            return None
+        hosts = network.hosts() if network.num_addresses > 1 else [network[0]]
+        probes = {
+            str(ip): build_request(src_mac, src_ip, str(ip))
+            for ip in hosts
+            if str(ip) != src_ip
+        }
+        found = await sweep_socket(
+            sock,
+            probes,
+            rate=rate,
+            timeout=timeout,
+            on_reply=on_reply,
+            on_sent=on_sent,
+            pace=pace,
+        )
+    return [{"ip": ip, "mac": found[ip]} for ip in probes if ip in found]
+
+
+def sweep(subnet: str, **kwargs) -> Optional[List[Dict[str, str]]]:
+    """Synchronous wrapper around :func:`sweep_async`."""
+
+    return asyncio.run(sweep_async(subnet, **kwargs))
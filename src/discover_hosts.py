@@ -1,161 +1,454 @@
 """LAN host discovery utilities."""
 
+import asyncio
+import ipaddress
+import queue
 import re
-import socket
+import sqlite3
 import subprocess
-from pathlib import Path
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import requests
 
+from . import arp_sweep, host_verify, hostnames, ndp_discovery, oui
 
-def _verify_host(ip: str, port: int = 80, timeout: float = 0.1) -> bool:
-    """Verify that a host responds on the given port.
+if TYPE_CHECKING:
+    from .discovery_scheduler import RateLimiter
 
-    A simple TCP connection attempt is used to check reachability.  This
-    function is intentionally lightweight so that it can be easily mocked in
-    tests without performing real network operations.
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+_api_cache: Optional[oui.ApiCache] = None
+
+
+def _get_api_cache() -> Optional[oui.ApiCache]:
+    """Return the persistent API cache, or ``None`` if it cannot be opened."""
+    global _api_cache
+    if _api_cache is None:
+        try:
+            _api_cache = oui.ApiCache(oui.API_CACHE_PATH)
+        except (OSError, sqlite3.Error):
+            return None
+    return _api_cache
+
+
+def _query_vendor_api(mac: str, bits: int = 48) -> Optional[str]:
+    """Resolve *mac* via macvendors.com, consulting the persistent cache.
+
+    The answer is cached for every MAC sharing the first *bits* bits.
     """
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    cache = _get_api_cache()
+    if cache is not None:
+        hit, vendor = cache.get(mac, bits)
+        if hit:
+            return vendor
     try:
-        sock.settimeout(timeout)
-        sock.connect((ip, port))
-        return True
-    except OSError:
-        return False
-    finally:
-        sock.close()
+        resp = requests.get(oui.API_URL.format(mac=mac), timeout=5)
+    except Exception:
+        return None
+    if resp.status_code == 200:
+        vendor = resp.text.strip() or None
+    elif resp.status_code == 404:
+        vendor = None  # 未登録も記録して問い合わせを繰り返さない
+    else:
+        return None  # レート制限などは一時的なのでキャッシュしない
+    if cache is not None:
+        try:
+            cache.put(mac, vendor, bits)
+        except sqlite3.Error:
+            pass
+    return vendor
+
+
+def lookup_vendors(macs: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Return ``mac -> vendor`` for every MAC in *macs*.
+
+    The compiled ``oui.txt`` index is consulted first.  Remaining MACs are
+    resolved through the external API once per registry block
+    (:meth:`oui.OuiIndex.block_bits`), so a subnet full of devices from the
+    same vendor costs a single request while MA-M / MA-S blocks sharing an
+    OUI keep their own vendors.  MACs whose OUI is not in the registry are
+    queried one by one.
+    """
+    macs = list(dict.fromkeys(macs))
+    index = oui.load_index()
+    vendors = index.lookup_many(macs)
+    by_prefix: Dict[str, Optional[str]] = {}
+    for mac in macs:
+        if vendors[mac]:
+            continue
+        bits = index.block_bits(mac)
+        prefix = oui.ApiCache.key(mac, bits)
+        if prefix not in by_prefix:
+            by_prefix[prefix] = _query_vendor_api(mac, bits)
+        vendors[mac] = by_prefix[prefix]
+    return vendors
 
 
 def _lookup_vendor(mac: str) -> Optional[str]:
     """Return vendor name for *mac* using ``oui.txt`` or external API."""
-    prefix = mac.upper().replace("-", "").replace(":", "")[:6]
-    oui_path = Path(__file__).resolve().parent.parent / "data" / "oui.txt"
-    if oui_path.exists():
-        try:
-            with oui_path.open() as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith("#"):
-                        continue
-                    parts = line.split(None, 1)
-                    key = parts[0].replace("-", "").replace(":", "").upper()
-                    if key == prefix:
-                        return parts[1].strip() if len(parts) > 1 else None
-        except OSError:
-            pass
-    try:  # Fallback to API lookup
-        resp = requests.get(f"https://api.macvendors.com/{mac}", timeout=5)
-        if resp.status_code == 200:
-            return resp.text.strip()
-    except Exception:
-        pass
-    return None
+    return lookup_vendors([mac])[mac]
+
+
+# ストリーミング時に確認・名前解決・ベンダー照会をまとめて行う単位
+STREAM_BATCH_SIZE = 64
+STREAM_FLUSH_INTERVAL = 0.5
+
+_HOST_RE = re.compile(r"^Host:\s+(\S+)(?:\s+\(([^)]*)\))?")
+_STATUS_RE = re.compile(r"Status:\s+(\w+)")
+_MAC_RE = re.compile(r"MAC Address:\s+([0-9A-Fa-f:]{17})(?:\s+\(([^)]+)\))?")
+# nmap -R で DNS は引き済みなので、nmap 由来のホストはそれ以外で名前を引く
+_NMAP_NAME_SOURCES = ("netbios", "mdns", "llmnr")
+# NetBIOS/mDNS/LLMNR の逆引きは IPv4 専用なので IPv6 は PTR のみ
+_NDP_NAME_SOURCES = ("dns",)
+# これより広い IPv6 範囲は nmap でも列挙しない
+_NMAP_MAX_IPV6_ADDRESSES = 1 << 16
+
+Candidate = Dict[str, Any]
+_Put = Callable[[Tuple[str, Any]], None]
+
+
+class _Cancelled(Exception):
+    """Raised inside producer callbacks once the consumer stopped iterating."""
+
 
+def _sent_callback(put: _Put, stop: threading.Event) -> Callable[[int], None]:
+    """Return an ``on_sent`` hook reporting progress and honouring *stop*.
 
-def _run_nmap_scan(subnet: str) -> List[Dict[str, Optional[str]]]:
-    """Run an nmap scan and return discovered hosts.
+    The hook runs inside the sweep's event loop, so it must not block;
+    rate limiting is applied through the sweep's ``pace`` argument instead.
+    """
+
+    def on_sent(count: int) -> None:
+        if stop.is_set():
+            raise _Cancelled
+        put(("probed", count))
+
+    return on_sent
+
+
+def _pacing(
+    limiter: Optional["RateLimiter"], max_rate: Optional[float] = None
+) -> Dict[str, Any]:
+    """Return the sweep keyword arguments applying *limiter* and *max_rate*."""
 
-    Each host is represented as a dict with ``ip`` and optional ``hostname`` and
-    ``vendor`` fields.  The ``-R`` option forces reverse DNS resolution so that
-    nmap tries to determine hostnames for all targets.  ``nbtscan`` and
-    ``avahi-resolve`` are consulted when nmap does not provide a hostname.
+    kwargs: Dict[str, Any] = {}
+    if limiter is not None:
+        # 共有リミッタは待つ間もイベントループを止めない
+        kwargs["pace"] = limiter.acquire_async
+    if max_rate:
+        kwargs["rate"] = max_rate
+    return kwargs
+
+
+def _produce_arp(
+    subnet: str,
+    put: _Put,
+    stop: threading.Event,
+    limiter: Optional["RateLimiter"] = None,
+    max_rate: Optional[float] = None,
+) -> bool:
+    """Feed ARP sweep results to *put*; ``False`` if the sweep is not possible.
+
+    The sweep paces itself to *max_rate* (this worker's share of the global
+    rate) and draws every request from the shared *limiter*.
     """
+
+    def on_reply(ip: str, mac: str) -> None:
+        put(("host", {"ip": ip, "hostname": None, "mac": mac, "source": "arp"}))
+
     try:
-        output = subprocess.check_output(
-            ["nmap", "-sn", "-oG", "-", "-R", subnet], text=True
+        pairs = arp_sweep.sweep(
+            subnet,
+            on_reply=on_reply,
+            on_sent=_sent_callback(put, stop),
+            **_pacing(limiter, max_rate),
         )
-    except (OSError, subprocess.CalledProcessError):
-        return []
+    except _Cancelled:
+        return True
+    except (OSError, ValueError):
+        return False
+    return pairs is not None
 
-    host_map: Dict[str, Dict[str, Optional[str]]] = {}
-    host_re = re.compile(r"^Host:\s+(\S+)\s+\(([^)]*)\)")
-    mac_re = re.compile(r"MAC Address:\s+([0-9A-Fa-f:]{17})(?:\s+\(([^)]+)\))?")
 
-    for line in output.splitlines():
-        line = line.strip()
-        if not line.startswith("Host:"):
-            continue
-        m_host = host_re.search(line)
-        if not m_host:
-            continue
-        ip = m_host.group(1)
-        hostname = m_host.group(2) or None
-        entry = host_map.setdefault(
-            ip, {"ip": ip, "hostname": hostname, "mac": None, "vendor": None}
+def _produce_ndp(
+    subnet: str,
+    put: _Put,
+    stop: threading.Event,
+    limiter: Optional["RateLimiter"] = None,
+) -> bool:
+    """Feed IPv6 neighbours found by :mod:`ndp_discovery` to *put*."""
+
+    try:
+        found = ndp_discovery.discover(
+            subnet, on_sent=_sent_callback(put, stop), **_pacing(limiter)
+        )
+    except _Cancelled:
+        return True
+    except (OSError, ValueError):
+        return False
+    if found is None:
+        return False
+    for host in found:
+        put(
+            (
+                "host",
+                {
+                    "ip": host["ip"],
+                    "hostname": None,
+                    "mac": host["mac"],
+                    "source": "ndp",
+                },
+            )
         )
-        if hostname and not entry.get("hostname"):
-            entry["hostname"] = hostname
-        m_mac = mac_re.search(line)
-        if m_mac:
-            entry["mac"] = m_mac.group(1)
-            if m_mac.group(2):
-                entry["vendor"] = m_mac.group(2)
-
-    for host in host_map.values():
-        ip = host.get("ip")
-        if not host.get("hostname") and ip:
-            hostname = _get_hostname_nbtscan(ip)
-            if not hostname:
-                hostname = _get_hostname_avahi(ip)
-            if hostname:
-                host["hostname"] = hostname
-        mac = host.get("mac")
-        if mac and not host.get("vendor"):
-            vendor = _lookup_vendor(mac)
-            if vendor:
-                host["vendor"] = vendor
-
-    results: List[Dict[str, Optional[str]]] = []
-    for info in host_map.values():
-        entry = {
-            "ip": info["ip"],
-            "hostname": info.get("hostname"),
-            "vendor": info.get("vendor"),
+    return True
+
+
+def _produce_nmap(
+    subnet: str,
+    put: _Put,
+    stop: threading.Event,
+    max_rate: Optional[float] = None,
+) -> None:
+    """Feed hosts from nmap's greppable output to *put* line by line.
+
+    ``-v`` makes nmap report down hosts as well, which gives the number of
+    addresses probed so far.  *max_rate* is passed on as ``--max-rate``.
+    """
+    cmd = ["nmap", "-sn", "-v", "-oG", "-", "-R"]
+    if ":" in subnet:
+        cmd.append("-6")
+    if max_rate:
+        cmd += ["--max-rate", str(max(1, int(max_rate)))]
+    try:
+        proc = subprocess.Popen(
+            cmd + [subnet],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+    except OSError:
+        return
+    probed = 0
+    try:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            if stop.is_set():
+                break
+            m_host = _HOST_RE.search(line.strip())
+            if not m_host:
+                continue
+            status = _STATUS_RE.search(line)
+            if status:
+                probed += 1
+                put(("probed", probed))
+                if status.group(1) != "Up":
+                    continue
+            m_mac = _MAC_RE.search(line)
+            put(
+                (
+                    "host",
+                    {
+                        "ip": m_host.group(1),
+                        "hostname": m_host.group(2) or None,
+                        "mac": m_mac.group(1) if m_mac else None,
+                        "vendor": m_mac.group(2) if m_mac else None,
+                        "source": "nmap",
+                    },
+                )
+            )
+    finally:
+        # 途中で打ち切られた場合だけ nmap を止める
+        if stop.is_set() and proc.poll() is None:
+            proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _finish(batch: List[Candidate]) -> List[Dict[str, Optional[str]]]:
+    """Verify, name and attribute a batch of candidate hosts.
+
+    ARP replies and IPv6 neighbour advertisements prove presence on their
+    own; nmap candidates are confirmed concurrently via
+    :func:`host_verify.verify_hosts` first.
+    """
+    from_nmap = [h["ip"] for h in batch if h["source"] == "nmap"]
+    alive = host_verify.verify_hosts(from_nmap) if from_nmap else set()
+    hosts = [h for h in batch if h["source"] != "nmap" or h["ip"] in alive]
+
+    for source, sources in (
+        ("arp", hostnames.PRIORITY),
+        ("nmap", _NMAP_NAME_SOURCES),
+        ("ndp", _NDP_NAME_SOURCES),
+    ):
+        unnamed = [
+            h["ip"] for h in hosts if h["source"] == source and not h.get("hostname")
+        ]
+        if unnamed:
+            names = hostnames.resolve_hostnames(unnamed, sources=sources)
+            for host in hosts:
+                if host["ip"] in names:
+                    host["hostname"] = names[host["ip"]]
+
+    # ベンダーはまとめて引き、同じ OUI の API 問い合わせを 1 回にする
+    pending = [h for h in hosts if h.get("mac") and not h.get("vendor")]
+    if pending:
+        vendors = lookup_vendors(str(h["mac"]) for h in pending)
+        for host in pending:
+            host["vendor"] = vendors.get(str(host["mac"]))
+
+    # MAC は静的スキャンのキャッシュで機器の入れ替わりを検出するために返す
+    return [
+        {
+            "ip": h["ip"],
+            "hostname": h.get("hostname"),
+            "mac": h.get("mac") or None,
+            "vendor": h.get("vendor"),
         }
-        results.append(entry)
-    return results
+        for h in hosts
+    ]
+
+
+def iter_discovery(
+    subnet: str,
+    *,
+    limiter: Optional["RateLimiter"] = None,
+    max_rate: Optional[float] = None,
+) -> Generator[Dict[str, Any], None, None]:
+    """Discover devices in *subnet*, yielding events as hosts are confirmed.
+
+    Directly attached subnets are swept with the native ARP engine in
+    :mod:`arp_sweep`, IPv6 prefixes with :mod:`ndp_discovery`.  For routed
+    subnets, or when raw sockets are unavailable, nmap's greppable output is
+    read line by line instead.  Candidates are verified, named and
+    attributed in small batches, so hosts appear while the sweep is still
+    running.
 
+    *limiter* (a :class:`discovery_scheduler.RateLimiter`) paces native
+    probes without blocking their event loop, and *max_rate* caps the
+    packet rate of this sweep (the ARP engine's pacing or nmap's
+    ``--max-rate``).
 
-def _get_hostname_nbtscan(ip: str) -> Optional[str]:
-    """Try to resolve hostname using nbtscan."""
+    Yields
+    ------
+    dict
+        ``{"type": "host", "host": {...}, "probed", "total"}`` for every
+        confirmed host, ``{"type": "progress", "probed", "total"}`` at most
+        every :data:`STREAM_FLUSH_INTERVAL` seconds while probing continues
+        and a final ``{"type": "done", "hosts", "probed", "total"}``.
+        ``total`` is the number of addresses in *subnet*, or ``None`` for
+        IPv6 prefixes too large to enumerate.
+    """
     try:
-        output = subprocess.check_output(["nbtscan", "-q", ip], text=True)
-    except (OSError, subprocess.CalledProcessError):
-        return None
+        network: Optional[IPNetwork] = ipaddress.ip_network(subnet, strict=False)
+    except ValueError:
+        network = None
+    total: Optional[int] = None
+    if network is not None and (
+        network.version == 4 or network.num_addresses <= _NMAP_MAX_IPV6_ADDRESSES
+    ):
+        total = network.num_addresses
+    events: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    stop = threading.Event()
 
-    for line in output.splitlines():
-        parts = line.strip().split()
-        if len(parts) >= 2 and parts[0] == ip:
-            return parts[1]
-    return None
+    def produce() -> None:
+        try:
+            if network is not None and network.version == 6:
+                if not _produce_ndp(subnet, events.put, stop, limiter) and total:
+                    _produce_nmap(subnet, events.put, stop, max_rate)
+            elif not _produce_arp(subnet, events.put, stop, limiter, max_rate):
+                _produce_nmap(subnet, events.put, stop, max_rate)
+        finally:
+            events.put(("end", None))
 
+    threading.Thread(target=produce, name="discover-hosts", daemon=True).start()
 
-def _get_hostname_avahi(ip: str) -> Optional[str]:
-    """Try to resolve hostname using avahi-resolve."""
+    pending: Dict[str, Candidate] = {}
+    emitted: Set[str] = set()
+    probed = 0
+    reported = 0
+    found = 0
+    finished = False
     try:
-        output = subprocess.check_output(["avahi-resolve", "-a", ip], text=True)
-    except (OSError, subprocess.CalledProcessError):
-        return None
+        while not finished:
+            deadline = time.monotonic() + STREAM_FLUSH_INTERVAL
+            while len(pending) < STREAM_BATCH_SIZE:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    break
+                try:
+                    kind, value = events.get(timeout=wait)
+                except queue.Empty:
+                    break
+                if kind == "end":
+                    finished = True
+                    break
+                if kind == "probed":
+                    probed = value
+                    continue
+                if value["ip"] in emitted:
+                    continue
+                entry = pending.setdefault(value["ip"], value)
+                for key, item in value.items():
+                    if item and not entry.get(key):
+                        entry[key] = item
 
-    for line in output.splitlines():
-        parts = line.strip().split()
-        if len(parts) >= 2 and parts[0] == ip:
-            return parts[1]
-    return None
+            if pending:
+                batch = list(pending.values())
+                pending.clear()
+                emitted.update(h["ip"] for h in batch)
+                for host in _finish(batch):
+                    found += 1
+                    reported = probed
+                    yield {
+                        "type": "host",
+                        "host": host,
+                        "probed": probed,
+                        "total": total,
+                    }
+            if probed != reported and not finished:
+                reported = probed
+                yield {"type": "progress", "probed": probed, "total": total}
+        yield {"type": "done", "hosts": found, "probed": probed, "total": total}
+    finally:
+        stop.set()
+
+
+async def aiter_discovery(subnet: str) -> AsyncIterator[Dict[str, Any]]:
+    """Async variant of :func:`iter_discovery` for use inside event loops."""
+    events = iter_discovery(subnet)
+    try:
+        while True:
+            event = await asyncio.to_thread(next, events, None)
+            if event is None:
+                return
+            yield event
+    finally:
+        events.close()
 
 
 def discover_hosts(subnet: str) -> List[Dict[str, Optional[str]]]:
     """Discover devices in the given subnet.
 
-    The current implementation delegates the heavy lifting to ``nmap`` to obtain
-    a list of candidate hosts.  Each candidate is probed via
-    :func:`_verify_host` to confirm reachability.  Hostname resolution and
-    vendor lookup are handled within :func:`_run_nmap_scan`.
+    Collects the ``host`` events of :func:`iter_discovery` into a list of
+    ``{"ip", "hostname", "mac", "vendor"}`` dictionaries.
     """
-    hosts: List[Dict[str, Optional[str]]] = []
-    for h in _run_nmap_scan(subnet):
-        ip = h.get("ip")
-        if ip and _verify_host(ip):
-            hosts.append(h)
-    return hosts
+    return [
+        event["host"] for event in iter_discovery(subnet) if event["type"] == "host"
+    ]
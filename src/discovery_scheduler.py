@@ -0,0 +1,265 @@
+"""Chunked, rate-limited and resumable discovery for large ranges.
+
+A ``/16`` is split into ``/24`` chunks (configurable) that are discovered by
+parallel workers via :func:`discover_hosts.iter_discovery`.  All native
+probes of all workers draw from one :class:`RateLimiter` and each worker
+paces itself (or nmap, through ``--max-rate``) to an equal share of the
+rate.  After every finished chunk the results are written to a JSON
+checkpoint, so an interrupted scan resumes with the chunks that are still
+missing.  IPv6 prefixes are not split: they are handed to neighbour
+discovery as a whole.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List, Optional, Set, Tuple
+
+from . import discover_hosts
+
+DEFAULT_CHUNK_PREFIX = 24
+DEFAULT_WORKERS = 4
+# 全ワーカー合計の送信レート (packets/s)
+DEFAULT_RATE = 2000.0
+
+Host = Dict[str, Optional[str]]
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by all discovery workers.
+
+    Native sweeps run inside their own event loop and use
+    :meth:`acquire_async`, which never blocks the loop; :meth:`acquire` is
+    for plain threads.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate / 10)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take *tokens* if available and return ``0``, else the seconds to wait."""
+
+        with self._lock:
+            now = self._clock()
+            elapsed = max(0.0, now - self._last)
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._last = now
+            # 浮動小数点の丸めで待ち続けないよう僅かな誤差は許容する
+            if self._tokens + 1e-9 >= tokens:
+                self._tokens = max(0.0, self._tokens - tokens)
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block the calling thread until *tokens* packets may be sent."""
+
+        while (wait := self.try_acquire(tokens)) > 0:
+            self._sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0) -> None:
+        """Wait without blocking the event loop until *tokens* may be sent."""
+
+        while (wait := self.try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+
+def split_ranges(subnet: str, chunk_prefix: int = DEFAULT_CHUNK_PREFIX) -> List[str]:
+    """Split an IPv4 *subnet* into ``/chunk_prefix`` pieces.
+
+    Subnets that are already small enough, and IPv6 prefixes, are returned
+    unchanged as a single chunk.
+    """
+
+    network = ipaddress.ip_network(subnet, strict=False)
+    if network.version == 6 or network.prefixlen >= chunk_prefix:
+        return [str(network)]
+    return [str(net) for net in network.subnets(new_prefix=chunk_prefix)]
+
+
+class Checkpoint:
+    """JSON file recording finished chunks and the hosts they produced."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+
+    def load(self, subnet: str, chunk_prefix: int) -> Dict[str, List[Host]]:
+        """Return ``chunk -> hosts`` for a matching checkpoint, else ``{}``."""
+
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        # 別のスキャンのチェックポイントは使わない
+        if data.get("subnet") != subnet or data.get("chunk_prefix") != chunk_prefix:
+            return {}
+        chunks = data.get("chunks")
+        return chunks if isinstance(chunks, dict) else {}
+
+    def save(
+        self, subnet: str, chunk_prefix: int, chunks: Dict[str, List[Host]]
+    ) -> None:
+        payload = {"subnet": subnet, "chunk_prefix": chunk_prefix, "chunks": chunks}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def iter_scheduled(
+    subnet: str,
+    *,
+    chunk_prefix: int = DEFAULT_CHUNK_PREFIX,
+    workers: int = DEFAULT_WORKERS,
+    rate: float = DEFAULT_RATE,
+    checkpoint: Optional[Path | str] = None,
+) -> Generator[Dict[str, Any], None, None]:
+    """Discover *subnet* chunk by chunk, yielding events as they happen.
+
+    Parameters
+    ----------
+    chunk_prefix:
+        Prefix length of the IPv4 chunks handed to the workers.
+    workers:
+        Number of chunks discovered in parallel.
+    rate:
+        Global packet rate shared by all workers.
+    checkpoint:
+        Path of a JSON checkpoint.  Chunks recorded there are not scanned
+        again; their hosts are replayed with ``"resumed": True``.  The file
+        is removed once the whole range has been discovered.
+
+    Yields
+    ------
+    dict
+        ``host`` events (with ``chunk``), aggregated ``progress`` events,
+        a ``chunk`` event per finished chunk, ``error`` events for failed
+        chunks and a final ``done`` event.
+    """
+
+    chunks = split_ranges(subnet, chunk_prefix)
+    store = Checkpoint(checkpoint) if checkpoint else None
+    finished: Dict[str, List[Host]] = store.load(subnet, chunk_prefix) if store else {}
+    finished = {c: hosts for c, hosts in finished.items() if c in chunks}
+    network = ipaddress.ip_network(subnet, strict=False)
+    total = network.num_addresses if network.version == 4 else None
+    probed: Dict[str, int] = {
+        c: ipaddress.ip_network(c).num_addresses for c in finished if total
+    }
+    found = 0
+
+    for chunk, hosts in finished.items():
+        for host in hosts:
+            found += 1
+            yield {"type": "host", "host": host, "chunk": chunk, "resumed": True}
+
+    limiter = RateLimiter(rate)
+    workers = max(1, workers)
+    events: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue()
+    stop = threading.Event()
+
+    def run_chunk(chunk: str) -> None:
+        stream = discover_hosts.iter_discovery(
+            chunk, limiter=limiter, max_rate=rate / workers
+        )
+        try:
+            for event in stream:
+                if stop.is_set():
+                    return
+                events.put((chunk, event))
+        except Exception as exc:  # noqa: BLE001 - 他のチャンクは続行する
+            events.put((chunk, {"type": "error", "error": str(exc)}))
+        finally:
+            stream.close()
+
+    pending = [c for c in chunks if c not in finished]
+    hosts_by_chunk: Dict[str, List[Host]] = {c: [] for c in pending}
+    failed: Set[str] = set()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="discovery")
+    try:
+        for chunk in pending:
+            pool.submit(run_chunk, chunk)
+        remaining = len(pending)
+        while remaining:
+            chunk, event = events.get()
+            kind = event["type"]
+            if kind == "host":
+                found += 1
+                hosts_by_chunk[chunk].append(event["host"])
+                yield {"type": "host", "host": event["host"], "chunk": chunk}
+            elif kind == "progress":
+                probed[chunk] = event["probed"]
+                yield {
+                    "type": "progress",
+                    "probed": sum(probed.values()),
+                    "total": total,
+                    "chunks_done": len(finished),
+                    "chunks_total": len(chunks),
+                }
+            elif kind == "done":
+                remaining -= 1
+                probed[chunk] = event["probed"]
+                finished[chunk] = hosts_by_chunk.pop(chunk)
+                if store is not None:
+                    store.save(subnet, chunk_prefix, finished)
+                yield {
+                    "type": "chunk",
+                    "chunk": chunk,
+                    "hosts": len(finished[chunk]),
+                    "chunks_done": len(finished),
+                    "chunks_total": len(chunks),
+                }
+            elif kind == "error":
+                remaining -= 1
+                failed.add(chunk)
+                yield {"type": "error", "chunk": chunk, "error": event["error"]}
+        if store is not None and not failed:
+            store.clear()
+        yield {
+            "type": "done",
+            "hosts": found,
+            "probed": sum(probed.values()),
+            "total": total,
+            "chunks_done": len(finished),
+            "chunks_total": len(chunks),
+        }
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def discover_range(subnet: str, **kwargs: Any) -> List[Host]:
+    """Return every host of *subnet* found by :func:`iter_scheduled`."""
+
+    return [
+        event["host"]
+        for event in iter_scheduled(subnet, **kwargs)
+        if event["type"] == "host"
+    ]
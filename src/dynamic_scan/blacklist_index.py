@@ -0,0 +1,305 @@
+"""Compiled binary index of the DNS blacklist.
+
+The text blacklist (:data:`BLACKLIST_PATH`) stays the editable source of
+truth; next to it the updater writes ``<name>.idx`` holding the sorted
+64-bit BLAKE2b hashes of every domain.  The header records the size and
+mtime of the text file the index was compiled from, so a hand-edited text
+file invalidates it.  Lookups are a binary search over the memory-mapped
+hash array, so every process shares the same page-cache copy and opening
+the index costs the same whatever the blacklist size.
+
+Layout (little endian)::
+
+    b"NWBLIDX1" | count:u64 | text_size:u64 | text_mtime_ns:u64 | hash:u64 * count
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 更新ツールと解析処理が共有する唯一のブラックリスト
+BLACKLIST_PATH = Path(__file__).resolve().parents[2] / "data" / "dns_blacklist.txt"
+MAGIC = b"NWBLIDX1"
+CHECK_INTERVAL = 5.0  # seconds
+_HEADER = struct.Struct("<8sQQQ")
+
+
+def index_path(text_path: Path | str) -> Path:
+    """Return the index file belonging to *text_path*."""
+
+    return Path(text_path).with_suffix(".idx")
+
+
+def domain_hash(domain: str) -> int:
+    digest = hashlib.blake2b(domain.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def hash_domains(domains: Iterable[str]) -> array:
+    """Return :func:`domain_hash` of every domain as a ``u64`` array."""
+
+    blake2b = hashlib.blake2b
+    digests = b"".join(
+        [blake2b(d.encode("utf-8"), digest_size=8).digest() for d in domains]
+    )
+    values = array("Q")
+    values.frombytes(digests)
+    if sys.byteorder != "little":  # pragma: no cover - ビッグエンディアン環境
+        values.byteswap()
+    return values
+
+
+def read_domains(text_path: Path | str) -> set[str]:
+    """Parse a blacklist text file, skipping blank lines and ``#`` comments."""
+
+    with open(text_path, encoding="utf-8") as f:
+        return {d for d in map(str.strip, map(str.lower, f)) if d and d[0] != "#"}
+
+
+def _text_stamp(text_path: Path | str) -> tuple[int, int]:
+    st = os.stat(text_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def write_index(
+    hashes: Iterable[int],
+    path: Path | str,
+    text_path: Path | str,
+    *,
+    stamp: Optional[Tuple[int, int]] = None,
+) -> int:
+    """Sort *hashes* and write them atomically as the index of *text_path*.
+
+    *stamp* is the ``(size, mtime_ns)`` of the text the hashes were read
+    from; by default the current one.  Returns the number of hashes written.
+    """
+
+    values = array("Q", sorted(hashes))
+    if sys.byteorder != "little":  # pragma: no cover - ビッグエンディアン環境
+        values.byteswap()
+    size, mtime_ns = stamp or _text_stamp(text_path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(values), size, mtime_ns))
+            values.tofile(f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return len(values)
+
+
+class BlacklistIndex:
+    """Read-only view of an index file backed by ``mmap``."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError(f"truncated blacklist index: {self.path}")
+            magic, count, self.text_size, self.text_mtime_ns = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"not a blacklist index: {self.path}")
+            st = os.fstat(f.fileno())
+            if st.st_size != _HEADER.size + 8 * count:
+                raise ValueError(f"truncated blacklist index: {self.path}")
+            self.file_id = (st.st_ino, st.st_size, st.st_mtime_ns)
+            self._mmap: Optional[mmap.mmap] = None
+            self._views: list[memoryview] = []
+            self._hashes: Sequence[int]
+            if count:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                base = memoryview(self._mmap)
+                view = base[_HEADER.size :]
+                self._views = [base, view]
+                if sys.byteorder == "little":
+                    # コピーせずにマップした領域を直接 u64 配列として読む
+                    self._hashes = view.cast("Q")
+                    self._views.append(self._hashes)
+                else:  # pragma: no cover - ビッグエンディアン環境
+                    values = array("Q", view.tobytes())
+                    values.byteswap()
+                    self._hashes = values
+            else:
+                self._hashes = array("Q")
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, domain: object) -> bool:
+        if not isinstance(domain, str):
+            return False
+        return self.contains_hash(domain_hash(domain))
+
+    def contains_hash(self, value: int) -> bool:
+        pos = bisect_left(self._hashes, value)
+        return pos < len(self._hashes) and self._hashes[pos] == value
+
+    def hashes(self) -> Sequence[int]:
+        """Return the sorted hash array (a view into the mapping)."""
+
+        return self._hashes
+
+    def copy_hashes(self) -> array:
+        """Return a writable copy of the sorted hash array."""
+
+        values = array("Q")
+        if isinstance(self._hashes, memoryview):
+            with self._hashes.cast("B") as raw:
+                values.frombytes(raw)
+        else:
+            values.extend(self._hashes)
+        return values
+
+    def matches(self, text_path: Path | str) -> bool:
+        """Whether the index was compiled from the current *text_path*."""
+
+        try:
+            return _text_stamp(text_path) == (self.text_size, self.text_mtime_ns)
+        except OSError:
+            return False
+
+    def close(self) -> None:
+        self._hashes = array("Q")
+        # mmap を閉じる前にすべての memoryview を解放する
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+def open_index(text_path: Path | str) -> Optional[BlacklistIndex]:
+    """Open the index of *text_path*, or ``None`` if missing or stale."""
+
+    try:
+        index = BlacklistIndex(index_path(text_path))
+    except (OSError, ValueError):
+        return None
+    if not index.matches(text_path):
+        index.close()
+        return None
+    return index
+
+
+def compile_index(text_path: Path | str) -> int:
+    """Rebuild the index of *text_path* from its contents."""
+
+    # 読み込み中にテキストが差し替えられても古い内容に新しい印を付けない
+    stamp = _text_stamp(text_path)
+    hashes = hash_domains(read_domains(text_path))
+    return write_index(hashes, index_path(text_path), text_path, stamp=stamp)
+
+
+def _file_id(path: Path | str) -> Optional[Tuple[int, ...]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class SharedIndex:
+    """Process-wide blacklist view that re-maps the index when it changes.
+
+    Nothing is read until the first lookup.  Afterwards, at most every
+    *check_interval* seconds, the index and text files are ``stat``-ed; the
+    updater replaces the index atomically, so a new inode means a new
+    mapping.  A missing or stale index (text edited by hand) is compiled
+    once; if the directory is not writable the text is loaded into memory.
+
+    Parameters
+    ----------
+    text_path:
+        The blacklist text file.
+    check_interval:
+        Seconds between change checks; ``0`` checks on every lookup.
+    clock:
+        Monotonic clock, replaceable in tests.
+    """
+
+    def __init__(
+        self,
+        text_path: Path | str = BLACKLIST_PATH,
+        *,
+        check_interval: float = CHECK_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.text_path = Path(text_path)
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._checked: Optional[float] = None
+        self._files: Optional[Tuple[object, object]] = None
+        self._index: Union[BlacklistIndex, frozenset[str]] = frozenset()
+
+    def __contains__(self, domain: object) -> bool:
+        self.refresh()
+        return domain in self._index
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._index)
+
+    def refresh(self, *, force: bool = False) -> None:
+        """Re-map the index if it or the text file changed on disk."""
+
+        now = self._clock()
+        if (
+            not force
+            and self._checked is not None
+            and now - self._checked < self.check_interval
+        ):
+            return
+        with self._lock:
+            self._checked = now
+            files = (_file_id(index_path(self.text_path)), _file_id(self.text_path))
+            if files == self._files:
+                return
+            index = self._load()
+            # 参照中の古いマップは参照が無くなった時点で解放される
+            self._index = index
+            # 実際に開いた索引を記録し、読み込み中の差し替えも次回検出する
+            self._files = (
+                (
+                    index.file_id
+                    if isinstance(index, BlacklistIndex)
+                    else _file_id(index_path(self.text_path))
+                ),
+                files[1],
+            )
+
+    def _load(self) -> Union[BlacklistIndex, frozenset[str]]:
+        if not self.text_path.exists():
+            return frozenset()
+        index = open_index(self.text_path)
+        if index is not None:
+            return index
+        try:
+            compile_index(self.text_path)
+            index = open_index(self.text_path)
+            if index is not None:
+                return index
+        except OSError as exc:
+            logger.warning("cannot compile %s: %s", self.text_path, exc)
+        # 索引を書けない場合はテキストをこのプロセスのメモリに読み込む
+        try:
+            return frozenset(read_domains(self.text_path))
+        except OSError:
+            return frozenset()
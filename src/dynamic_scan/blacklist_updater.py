@@ -1,66 +1,307 @@
 import argparse
+import asyncio
+import heapq
+import json
 import logging
 import os
-from typing import Sequence
+import zlib
+from array import array
+from itertools import islice
+from pathlib import Path
+from typing import (
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
 
-import requests
+import httpx
+
+from . import blacklist_index
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PATH = str(blacklist_index.BLACKLIST_PATH)
+FETCH_TIMEOUT = 10  # seconds
+MAX_CONCURRENT_FEEDS = 8
+_WRITE_BATCH = 65536
+_GZIP_MAGIC = b"\x1f\x8b"
 
-def fetch_feed(url: str) -> set[str]:
-    """Fetch a blacklist feed and return a set of domains."""
-    try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-    except Exception as exc:  # pragma: no cover - ログ確認用
-        logger.error("failed to fetch %s: %s", url, exc)
-        return set()
 
+class FeedResult(NamedTuple):
+    """Outcome of fetching one feed.
+
+    ``status`` is ``updated``, ``not_modified`` or ``failed``; ``domains`` is
+    only set for ``updated``.
+    """
+
+    url: str
+    status: str
+    domains: Optional[set[str]] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def __repr__(self) -> str:
+        # asyncio はタスクの結果を repr するため、数百万件の集合を文字列化しない
+        count = None if self.domains is None else len(self.domains)
+        return f"FeedResult(url={self.url!r}, status={self.status!r}, domains={count})"
+
+
+def _domain(line: str) -> Optional[str]:
+    domain = line.strip().lower()
+    if not domain or domain.startswith("#"):
+        return None
+    return domain
+
+
+async def _gunzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Decompress a gzip body chunk by chunk."""
+
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+async def _body(resp: httpx.Response) -> AsyncIterator[bytes]:
+    """Yield the decoded body, unpacking ``.gz`` feeds served as files.
+
+    ``Content-Encoding: gzip`` is already undone by httpx; this handles
+    feeds that are gzip files themselves (detected by their magic bytes).
+    """
+
+    chunks = resp.aiter_bytes()
+    first = b""
+    async for first in chunks:
+        if first:
+            break
+
+    async def replay() -> AsyncIterator[bytes]:
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    if first.startswith(_GZIP_MAGIC):
+        async for data in _gunzip(replay()):
+            yield data
+    else:
+        async for data in replay():
+            yield data
+
+
+def _domains(lines: Iterable[str]) -> set[str]:
+    """Normalise a batch of lines like :func:`_domain` in one pass."""
+
+    return {d for d in map(str.strip, map(str.lower, lines)) if d and d[0] != "#"}
+
+
+async def _iter_line_batches(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[List[str]]:
+    """Yield the complete lines of every chunk as one list."""
+
+    rest = b""
+    async for chunk in chunks:
+        data = rest + chunk
+        end = data.rfind(b"\n") + 1
+        rest = data[end:]
+        if end:
+            yield data[:end].decode("utf-8", "replace").split("\n")
+    if rest:
+        yield [rest.decode("utf-8", "replace")]
+
+
+def _parse_json(data: bytes) -> set[str]:
+    parsed = json.loads(data)
+    if isinstance(parsed, dict):
+        domains = parsed.get("domains") or parsed.get("blacklist") or []
+    elif isinstance(parsed, list):
+        domains = parsed
+    else:
+        domains = []
+    return _domains(str(x) for x in domains if x)
+
+
+async def _read_domains(resp: httpx.Response, url: str) -> set[str]:
     content_type = resp.headers.get("Content-Type", "")
+    is_json = "json" in content_type or url.endswith((".json", ".json.gz"))
+    if is_json:
+        # JSON は行単位で読めないため本文をまとめてから解析する
+        return _parse_json(b"".join([chunk async for chunk in _body(resp)]))
+    domains: set[str] = set()
+    async for lines in _iter_line_batches(_body(resp)):
+        domains |= _domains(lines)
+    return domains
+
+
+async def _fetch(
+    client: httpx.AsyncClient,
+    url: str,
+    validators: Dict[str, str],
+) -> FeedResult:
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
     try:
-        if "json" in content_type or url.endswith(".json"):
-            data = resp.json()
-            if isinstance(data, dict):
-                domains = data.get("domains") or data.get("blacklist") or []
-            elif isinstance(data, list):
-                domains = data
-            else:
-                domains = []
-        else:
-            domains = resp.text.splitlines()
+        async with client.stream("GET", url, headers=headers) as resp:
+            if resp.status_code == 304:
+                return FeedResult(url, "not_modified")
+            resp.raise_for_status()
+            domains = await _read_domains(resp, url)
+            return FeedResult(
+                url,
+                "updated",
+                domains,
+                resp.headers.get("ETag"),
+                resp.headers.get("Last-Modified"),
+            )
     except Exception as exc:  # pragma: no cover - ログ確認用
-        logger.error("failed to parse feed %s: %s", url, exc)
-        return set()
+        logger.error("failed to fetch %s: %s", url, exc)
+        return FeedResult(url, "failed")
+
+
+async def fetch_feeds(
+    urls: Sequence[str],
+    validators: Optional[Dict[str, Dict[str, str]]] = None,
+    *,
+    timeout: float = FETCH_TIMEOUT,
+    concurrency: int = MAX_CONCURRENT_FEEDS,
+) -> List[FeedResult]:
+    """Fetch *urls* concurrently, streaming and parsing each body.
+
+    Parameters
+    ----------
+    urls:
+        Feed URLs (plain text, one domain per line, or JSON; optionally gzip).
+    validators:
+        ``url -> {"etag", "last_modified"}`` from the previous run; the
+        request is made conditional and a ``304`` yields ``not_modified``.
+    timeout:
+        Per-operation timeout in seconds.
+    concurrency:
+        Maximum number of feeds downloaded at the same time.
 
-    return {d.strip() for d in domains if d and not d.strip().startswith("#")}
+    Returns
+    -------
+    list of FeedResult
+        One result per URL, in the order given.
+    """
 
+    validators = validators or {}
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
 
-def merge_blacklist(
-    feed_domains: set[str], path: str = "data/dns_blacklist.txt"
-) -> None:
-    """Merge feed domains into blacklist file atomically."""
+        async def fetch_one(url: str) -> FeedResult:
+            async with semaphore:
+                return await _fetch(client, url, validators.get(url, {}))
+
+        return list(await asyncio.gather(*(fetch_one(url) for url in urls)))
+
+
+def fetch_feed(url: str) -> set[str]:
+    """Fetch a blacklist feed and return a set of domains."""
+    result = asyncio.run(fetch_feeds([url]))[0]
+    return result.domains or set()
+
+
+class _Unsorted(Exception):
+    """The existing blacklist file is not sorted (e.g. edited by hand)."""
+
+
+def _read_existing(path: str, *, check_order: bool = False) -> Iterator[str]:
+    if not os.path.exists(path):
+        return
+    previous = ""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            domain = _domain(line)
+            if domain is None:
+                continue
+            if check_order and domain < previous:
+                raise _Unsorted(path)
+            previous = domain
+            yield domain
+
+
+def _unique(domains: Iterable[str]) -> Iterator[str]:
+    previous = None
+    for domain in domains:
+        if domain != previous:
+            yield domain
+            previous = domain
+
+
+def _write_text(path: str, domains: Iterable[str], hashes: Optional[array]) -> int:
+    count = 0
+    domains = iter(domains)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# DNS blacklist\n")
+        while batch := list(islice(domains, _WRITE_BATCH)):
+            f.write("\n".join(batch) + "\n")
+            count += len(batch)
+            if hashes is not None:
+                hashes.extend(blacklist_index.hash_domains(batch))
+    return count
+
+
+def merge_blacklist(feed_domains: set[str], path: str = DEFAULT_PATH) -> int:
+    """Merge feed domains into blacklist file atomically.
+
+    The file is kept sorted, so new domains are merged into it in one
+    streaming pass.  Domains already present are filtered out through the
+    compiled index first; if nothing is new, neither the file nor the
+    index is rewritten.  Returns the number of domains added.
+    """
+    return _merge(_domains(d for d in feed_domains if d), path)
+
+
+def _merge(feed_domains: set[str], path: str) -> int:
     if not feed_domains:
         logger.info("no domains to merge")
-        return
+        return 0
+
+    index = blacklist_index.open_index(path)
+    hashes: Optional[array] = None
+    try:
+        if index is not None:
+            new = sorted(d for d in feed_domains if d not in index)
+            if not new:
+                logger.info("blacklist already up to date")
+                return 0
+            # 既存分のハッシュは索引から引き継ぎ、新規分だけ計算する
+            hashes = index.copy_hashes()
+            hashes.extend(blacklist_index.hash_domains(new))
+            existing = len(index)
+        else:
+            new = sorted(feed_domains)
+    finally:
+        if index is not None:
+            index.close()
 
     tmp_path = f"{path}.tmp"
     try:
-        existing: set[str] = set()
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                existing = {
-                    line.strip()
-                    for line in f
-                    if line.strip() and not line.startswith("#")
-                }
-
-        combined = existing | {d for d in feed_domains if d}
-
-        with open(tmp_path, "w", encoding="utf-8") as f:
-            f.write("# DNS blacklist\n")
-            for domain in sorted(combined):
-                f.write(domain + "\n")
+        collected = array("Q") if hashes is None else None
+        try:
+            merged = heapq.merge(_read_existing(path, check_order=True), new)
+            written = _write_text(tmp_path, _unique(merged), collected)
+        except _Unsorted:
+            # 手編集などで並んでいない既存ファイルは一度だけ全体を並べ直す
+            combined = set(_read_existing(path)) | set(new)
+            collected = array("Q")
+            written = _write_text(tmp_path, sorted(combined), collected)
+        if collected is not None:
+            existing = sum(1 for _ in _read_existing(path))
+            hashes = collected
 
         os.replace(tmp_path, path)
     except Exception as exc:  # pragma: no cover - エラー時は既存ファイル保持
@@ -69,22 +310,78 @@ def merge_blacklist(
             os.remove(tmp_path)
         raise
 
+    assert hashes is not None
+    blacklist_index.write_index(hashes, blacklist_index.index_path(path), path)
+    return written - existing
+
+
+def _state_path(path: str) -> Path:
+    return Path(path).with_suffix(".feeds.json")
+
+
+def _load_state(path: str) -> Dict[str, Dict[str, str]]:
+    # 本体が消えている場合は条件付き取得をせず全件取り直す
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(_state_path(path), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_state(path: str, state: Dict[str, Dict[str, str]]) -> None:
+    target = _state_path(path)
+    tmp = target.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, target)
+
+
+def _split_urls(feed_urls: str | Sequence[str]) -> List[str]:
+    if isinstance(feed_urls, str):
+        feed_urls = feed_urls.replace(",", " ").split()
+    return [url for url in feed_urls if url]
+
+
+def update(feed_urls: str | Sequence[str], path: str = DEFAULT_PATH) -> None:
+    """Fetch feeds concurrently and merge new domains into the blacklist.
+
+    *feed_urls* is one URL, a comma or whitespace separated string of URLs
+    or a sequence of them.  ETag / Last-Modified of every feed are kept in
+    ``<path stem>.feeds.json`` so unchanged feeds are not downloaded again.
+    """
+    urls = _split_urls(feed_urls)
+    state = _load_state(path)
+    results = asyncio.run(fetch_feeds(urls, state))
+
+    domains: set[str] = set()
+    for result in results:
+        if result.status == "updated" and result.domains:
+            domains |= result.domains
+        elif result.status == "not_modified":
+            logger.info("feed not modified: %s", result.url)
+    _merge(domains, path)
 
-def update(feed_url: str, path: str = "data/dns_blacklist.txt") -> None:
-    """Fetch feed and merge into blacklist file."""
-    domains = fetch_feed(feed_url)
-    merge_blacklist(domains, path)
+    # 取り込みに成功した後で検証子を保存する
+    updated = {
+        r.url: {
+            k: v for k, v in (("etag", r.etag), ("last_modified", r.last_modified)) if v
+        }
+        for r in results
+        if r.status == "updated"
+    }
+    if updated:
+        _save_state(path, {**state, **updated})
 
 
 def main(argv: Sequence[str] | None = None) -> None:
-    parser = argparse.ArgumentParser(description="Update DNS blacklist from feed")
-    parser.add_argument("feed_url", help="Blacklist feed URL")
-    parser.add_argument(
-        "--output", default="data/dns_blacklist.txt", help="Blacklist file path"
-    )
+    parser = argparse.ArgumentParser(description="Update DNS blacklist from feeds")
+    parser.add_argument("feed_urls", nargs="+", help="Blacklist feed URLs")
+    parser.add_argument("--output", default=DEFAULT_PATH, help="Blacklist file path")
     args = parser.parse_args(list(argv) if argv is not None else None)
 
-    update(args.feed_url, args.output)
+    update(args.feed_urls, args.output)
 
 
 if __name__ == "__main__":  # pragma: no cover - CLI entry
@@ -1,7 +1,7 @@
 import asyncio
 from scapy.all import AsyncSniffer
 
-from . import parser
+from . import neighbors, parser
 
 
 def capture_packets(
@@ -31,6 +31,10 @@ def capture_packets(
     # analysis so downstream consumers can operate on normalized structures.
     def _enqueue(packet) -> None:
         parsed = parser.parse_packet(packet)
+        # LLDP / CDP は届いた時点で近隣テーブルへ反映する
+        neighbor = getattr(parsed, "neighbor", None)
+        if neighbor:
+            neighbors.neighbor_table.update(neighbor)
         queue.put_nowait(parsed)
 
     async def _run() -> None:
@@ -1,26 +1,25 @@
 import socket
 import time
+from pathlib import Path
 from typing import Callable, Dict, Optional, Tuple
 
+from . import blacklist_index
+
 # DNS 逆引き結果のキャッシュ {ip: (hostname, expire_at)}
 _dns_cache: Dict[str, Tuple[str, float]] = {}
 
 
-def load_blacklist(path: str = "configs/domain_blacklist.txt") -> set[str]:
+def load_blacklist(path: Path | str = blacklist_index.BLACKLIST_PATH) -> set[str]:
     """ブラックリストファイルを読み込み"""
     try:
-        with open(path, encoding="utf-8") as f:
-            return {
-                line.strip().lower()
-                for line in f
-                if line.strip() and not line.startswith("#")
-            }
+        return blacklist_index.read_domains(path)
     except FileNotFoundError:
         return set()
 
 
 # 逆引きドメインのブラックリスト
-DOMAIN_BLACKLIST = load_blacklist()
+# 更新ツールが書き出す索引を mmap で共有し、差し替えられたら開き直す
+DOMAIN_BLACKLIST = blacklist_index.SharedIndex()
 
 
 def is_blacklisted(host: Optional[str]) -> bool:
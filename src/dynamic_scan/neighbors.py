@@ -0,0 +1,250 @@
+"""Passive LLDP / CDP decoding and the switch-port neighbour table.
+
+Switches announce themselves every few seconds with LLDP (IEEE 802.1AB) or
+CDP frames.  The capture pipeline already sees them, so decoding their TLVs
+gives the name, port and management address of the neighbouring devices
+without sending a single probe.  Entries expire after the TTL the device
+advertised, like in the switch's own neighbour table.
+"""
+
+from __future__ import annotations
+
+import socket
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+LLDP_ETHERTYPE = 0x88CC
+# LLDP (nearest bridge / non-TPMR / customer bridge) と CDP の宛先 MAC
+LLDP_MULTICAST = {"01:80:c2:00:00:0e", "01:80:c2:00:00:03", "01:80:c2:00:00:00"}
+CDP_MULTICAST = "01:00:0c:cc:cc:cc"
+DISCOVERY_MULTICAST = LLDP_MULTICAST | {CDP_MULTICAST}
+DEFAULT_TTL = 180
+
+_VLAN_ETHERTYPES = (0x8100, 0x88A8)
+_CDP_SNAP = b"\xaa\xaa\x03\x00\x00\x0c\x20\x00"
+
+# LLDP TLV 種別
+_LLDP_END = 0
+_LLDP_CHASSIS_ID = 1
+_LLDP_PORT_ID = 2
+_LLDP_TTL = 3
+_LLDP_PORT_DESCRIPTION = 4
+_LLDP_SYSTEM_NAME = 5
+_LLDP_SYSTEM_DESCRIPTION = 6
+_LLDP_MANAGEMENT_ADDRESS = 8
+# Chassis ID / Port ID のサブタイプ
+_ID_MAC = {1: 4, 2: 3}
+_ID_NETWORK_ADDRESS = {1: 5, 2: 4}
+
+# CDP TLV 種別
+_CDP_DEVICE_ID = 0x0001
+_CDP_ADDRESSES = 0x0002
+_CDP_PORT_ID = 0x0003
+_CDP_SOFTWARE = 0x0005
+_CDP_PLATFORM = 0x0006
+_CDP_MANAGEMENT_ADDRESSES = 0x0016
+
+Neighbor = Dict[str, Any]
+
+
+def _mac(raw: bytes) -> str:
+    return ":".join(f"{b:02x}" for b in raw)
+
+
+def _text(raw: bytes) -> str:
+    return raw.decode("utf-8", "replace").strip("\x00").strip()
+
+
+def _network_address(raw: bytes) -> Optional[str]:
+    """Decode an IANA address-family prefixed address (IPv4 / IPv6)."""
+
+    if len(raw) == 5 and raw[0] == 1:
+        return socket.inet_ntoa(raw[1:])
+    if len(raw) == 17 and raw[0] == 2:
+        return socket.inet_ntop(socket.AF_INET6, raw[1:])
+    return None
+
+
+def _lldp_id(tlv_type: int, value: bytes) -> str:
+    subtype, body = value[0], value[1:]
+    if subtype == _ID_MAC[tlv_type] and len(body) == 6:
+        return _mac(body)
+    if subtype == _ID_NETWORK_ADDRESS[tlv_type]:
+        address = _network_address(body)
+        if address:
+            return address
+    return _text(body)
+
+
+def decode_lldp(payload: bytes) -> Optional[Neighbor]:
+    """Decode the TLVs of an LLDPDU (the payload after the EtherType)."""
+
+    neighbor: Neighbor = {"protocol": "lldp", "management_addresses": []}
+    offset = 0
+    while offset + 2 <= len(payload):
+        (header,) = struct.unpack("!H", payload[offset : offset + 2])
+        tlv_type, length = header >> 9, header & 0x01FF
+        value = payload[offset + 2 : offset + 2 + length]
+        offset += 2 + length
+        if len(value) < length or tlv_type == _LLDP_END:
+            break
+        if tlv_type in (_LLDP_CHASSIS_ID, _LLDP_PORT_ID) and value:
+            key = "chassis_id" if tlv_type == _LLDP_CHASSIS_ID else "port_id"
+            neighbor[key] = _lldp_id(tlv_type, value)
+        elif tlv_type == _LLDP_TTL and length == 2:
+            neighbor["ttl"] = struct.unpack("!H", value)[0]
+        elif tlv_type == _LLDP_PORT_DESCRIPTION:
+            neighbor["port_description"] = _text(value)
+        elif tlv_type == _LLDP_SYSTEM_NAME:
+            neighbor["system_name"] = _text(value)
+        elif tlv_type == _LLDP_SYSTEM_DESCRIPTION:
+            neighbor["system_description"] = _text(value)
+        elif tlv_type == _LLDP_MANAGEMENT_ADDRESS and value:
+            address = _network_address(value[1 : 1 + value[0]])
+            if address:
+                neighbor["management_addresses"].append(address)
+    # Chassis ID / Port ID / TTL は必須 TLV
+    if "chassis_id" not in neighbor or "port_id" not in neighbor:
+        return None
+    return neighbor
+
+
+def _cdp_addresses(value: bytes) -> List[str]:
+    addresses: List[str] = []
+    if len(value) < 4:
+        return addresses
+    (count,) = struct.unpack("!I", value[:4])
+    offset = 4
+    for _ in range(count):
+        if offset + 2 > len(value):
+            break
+        proto_len = value[offset + 1]
+        protocol = value[offset + 2 : offset + 2 + proto_len]
+        offset += 2 + proto_len
+        if offset + 2 > len(value):
+            break
+        (addr_len,) = struct.unpack("!H", value[offset : offset + 2])
+        raw = value[offset + 2 : offset + 2 + addr_len]
+        offset += 2 + addr_len
+        # NLPID 0xCC = IPv4
+        if protocol == b"\xcc" and len(raw) == 4:
+            addresses.append(socket.inet_ntoa(raw))
+    return addresses
+
+
+def decode_cdp(payload: bytes) -> Optional[Neighbor]:
+    """Decode a CDP packet (the payload after the LLC/SNAP header)."""
+
+    if len(payload) < 4:
+        return None
+    neighbor: Neighbor = {
+        "protocol": "cdp",
+        "ttl": payload[1],
+        "management_addresses": [],
+    }
+    offset = 4
+    while offset + 4 <= len(payload):
+        tlv_type, length = struct.unpack("!HH", payload[offset : offset + 4])
+        if length < 4:
+            break
+        value = payload[offset + 4 : offset + length]
+        offset += length
+        if tlv_type == _CDP_DEVICE_ID:
+            neighbor["chassis_id"] = neighbor["system_name"] = _text(value)
+        elif tlv_type == _CDP_PORT_ID:
+            neighbor["port_id"] = _text(value)
+        elif tlv_type == _CDP_PLATFORM:
+            neighbor["platform"] = _text(value)
+        elif tlv_type == _CDP_SOFTWARE:
+            neighbor["system_description"] = _text(value)
+        elif tlv_type in (_CDP_ADDRESSES, _CDP_MANAGEMENT_ADDRESSES):
+            for address in _cdp_addresses(value):
+                if address not in neighbor["management_addresses"]:
+                    neighbor["management_addresses"].append(address)
+    if "chassis_id" not in neighbor:
+        return None
+    neighbor.setdefault("port_id", "")
+    return neighbor
+
+
+def decode_frame(frame: bytes) -> Optional[Neighbor]:
+    """Decode an Ethernet frame carrying LLDP or CDP, else return ``None``."""
+
+    if len(frame) < 14:
+        return None
+    src_mac = _mac(frame[6:12])
+    offset = 12
+    (ethertype,) = struct.unpack("!H", frame[offset : offset + 2])
+    while ethertype in _VLAN_ETHERTYPES and len(frame) >= offset + 6:
+        offset += 4
+        (ethertype,) = struct.unpack("!H", frame[offset : offset + 2])
+    payload = frame[offset + 2 :]
+    neighbor: Optional[Neighbor] = None
+    if ethertype == LLDP_ETHERTYPE:
+        neighbor = decode_lldp(payload)
+    elif ethertype <= 1500 and payload.startswith(_CDP_SNAP):
+        # 802.3 長さフィールド + LLC/SNAP (Cisco OUI, PID 0x2000)
+        neighbor = decode_cdp(payload[len(_CDP_SNAP) : ethertype])
+    if neighbor is not None:
+        neighbor["src_mac"] = src_mac
+    return neighbor
+
+
+class NeighborTable:
+    """Switch-port neighbour table fed by decoded LLDP / CDP frames."""
+
+    def __init__(self, *, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (chassis_id, port_id) -> (期限, 近隣情報)
+        self._entries: Dict[Tuple[str, str], Tuple[float, Neighbor]] = {}
+
+    def update(self, neighbor: Neighbor, now: Optional[float] = None) -> None:
+        seen = self._clock() if now is None else now
+        key = (neighbor["chassis_id"], neighbor.get("port_id", ""))
+        entry = dict(neighbor, last_seen=seen)
+        # TTL 0 は「この近隣を削除せよ」という通知
+        ttl = neighbor.get("ttl", DEFAULT_TTL)
+        with self._lock:
+            if ttl == 0:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (seen + ttl, entry)
+
+    def entries(self) -> List[Neighbor]:
+        """Return the live neighbours, dropping expired ones."""
+
+        now = self._clock()
+        with self._lock:
+            expired = [k for k, (until, _) in self._entries.items() if until <= now]
+            for key in expired:
+                del self._entries[key]
+            return [entry for _, entry in self._entries.values()]
+
+    def find(self, address: str) -> Optional[Neighbor]:
+        """Return the neighbour with management address (or MAC) *address*."""
+
+        wanted = address.lower()
+        for entry in self.entries():
+            if wanted in entry.get("management_addresses", ()) or wanted in (
+                entry.get("src_mac"),
+                entry.get("chassis_id"),
+            ):
+                return entry
+        return None
+
+    def name_for(self, address: str) -> Optional[str]:
+        entry = self.find(address)
+        if entry is None:
+            return None
+        return entry.get("system_name") or entry.get("chassis_id")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# キャプチャパイプラインとトポロジ構築で共有する近隣テーブル
+neighbor_table = NeighborTable()
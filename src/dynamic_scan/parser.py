@@ -5,21 +5,24 @@ from __future__ import annotations
 from types import SimpleNamespace
 
 from scapy.layers.inet import IP, TCP, UDP
-from scapy.layers.l2 import Ether
+from scapy.layers.l2 import Dot3, Ether
 from scapy.packet import Packet
 
+from . import neighbors
+
 
 def parse_packet(packet: Packet) -> SimpleNamespace:
     """Convert a Scapy packet into a simple namespace.
 
     The analyser only needs a handful of common fields. This helper extracts
     them and returns a lightweight object that mimics the attributes used in
-    :mod:`src.dynamic_scan.analyze`.
+    :mod:`src.dynamic_scan.analyze`.  LLDP / CDP frames are additionally
+    decoded into ``neighbor`` (see :mod:`src.dynamic_scan.neighbors`).
     """
     if packet is None:
         return SimpleNamespace()
 
-    src_mac = dst_mac = src_ip = dst_ip = protocol = None
+    src_mac = dst_mac = src_ip = dst_ip = protocol = neighbor = None
     # パケットサイズとタイムスタンプを取得
     size = len(packet)
     timestamp = getattr(packet, "time", None)
@@ -29,6 +32,12 @@ def parse_packet(packet: Packet) -> SimpleNamespace:
         src_mac = ether.src
         dst_mac = ether.dst
 
+    # LLDP / CDP は宛先のマルチキャスト MAC で見分けてから TLV を解析する
+    # (CDP は 802.3 フレームなので Scapy では Dot3 になる)
+    l2 = ether if ether is not None else packet.getlayer(Dot3)
+    if l2 is not None and str(l2.dst).lower() in neighbors.DISCOVERY_MULTICAST:
+        neighbor = neighbors.decode_frame(bytes(l2))
+
     ip_layer = packet.getlayer(IP)
     if ip_layer is not None:
         src_ip = ip_layer.src
@@ -50,4 +59,5 @@ def parse_packet(packet: Packet) -> SimpleNamespace:
         protocol=protocol,
         size=size,
         timestamp=timestamp,
+        neighbor=neighbor,
     )
@@ -1,15 +1,30 @@
 from __future__ import annotations
 
 import asyncio
+import importlib
 import json
 import os
 from contextlib import suppress
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Any, Iterable
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from . import storage
 
-from . import blacklist_updater, capture, analyze, storage
+if TYPE_CHECKING:  # pragma: no cover - 型チェック時のみ
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+# capture(scapy) / analyze・blacklist_updater(httpx) は重いため、
+# API 起動時ではなく最初のスキャン開始時に読み込む
+_LAZY_MODULES = {"blacklist_updater", "capture", "analyze"}
+
+
+def __getattr__(name: str) -> Any:
+    """``scheduler.capture`` などのサブモジュール参照を遅延 import する"""
+    if name in _LAZY_MODULES:
+        module = importlib.import_module(f"{__package__}.{name}")
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 CONFIG_PATH = Path(__file__).with_name("config.json")
@@ -58,6 +73,8 @@ class DynamicScanScheduler:
         approved_macs: Iterable[str] | None,
     ) -> None:
         """実際に 1 回のスキャンを実行する内部メソッド"""
+        from . import analyze, capture
+
         queue, self.capture_task = capture.capture_packets(
             interface=interface, duration=duration
         )
@@ -81,6 +98,10 @@ class DynamicScanScheduler:
         interval: int = 3600,
     ) -> None:
         """スケジューラを開始し、定期スキャンを設定する"""
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+        from . import blacklist_updater
+
         # ストレージを新たに生成（テスト時は monkeypatch で差し替え可能）
         self.storage = storage.Storage()
         if self.scheduler is None:
@@ -0,0 +1,223 @@
+"""Concurrent reachability checks for discovered hosts.
+
+Every host is probed on several TCP ports, plus ICMP echo when a raw socket
+is available, and counts as alive on the first positive answer.  A refused
+connection is positive too, since only a live host can send the RST.  Probe
+timeouts adapt to the round-trip times observed so far in the run, using
+the smoothed RTT estimator from RFC 6298.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import socket
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# 多くの機器がいずれかを開けているか RST を返すポート
+DEFAULT_PORTS: Tuple[int, ...] = (80, 443, 22, 445, 3389)
+DEFAULT_CONCURRENCY = 64
+# 適応タイムアウトの初期値と上下限（秒）
+INITIAL_TIMEOUT = 0.25
+MIN_TIMEOUT = 0.05
+MAX_TIMEOUT = 1.0
+
+_ICMP_ECHO_REQUEST = 8
+_ICMP_ECHO_REPLY = 0
+
+
+class RttEstimator:
+    """Smoothed RTT / variance tracker yielding an adaptive probe timeout."""
+
+    def __init__(
+        self,
+        initial: float = INITIAL_TIMEOUT,
+        minimum: float = MIN_TIMEOUT,
+        maximum: float = MAX_TIMEOUT,
+    ) -> None:
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+
+    def update(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def timeout(self) -> float:
+        if self.srtt is None:
+            return self.initial
+        return min(self.maximum, max(self.minimum, self.srtt + 4 * self.rttvar))
+
+
+async def _tcp_probe(ip: str, port: int, timeout: float) -> Optional[float]:
+    """Return the connect RTT if *ip* answered on *port* (SYN-ACK or RST)."""
+
+    start = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except ConnectionRefusedError:
+        return time.monotonic() - start
+    except (OSError, asyncio.TimeoutError):
+        return None
+    rtt = time.monotonic() - start
+    writer.close()
+    return rtt
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(ident: int, seq: int, payload: bytes = b"nw-checker") -> bytes:
+    header = struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = _checksum(header + payload)
+    return struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+
+def parse_echo_reply(packet: bytes) -> Optional[Tuple[int, int]]:
+    """Return ``(ident, seq)`` if the raw IPv4 *packet* is an echo reply."""
+
+    if len(packet) < 20:
+        return None
+    offset = (packet[0] & 0x0F) * 4
+    if len(packet) < offset + 8:
+        return None
+    icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", packet[offset : offset + 8])
+    if icmp_type != _ICMP_ECHO_REPLY:
+        return None
+    return ident, seq
+
+
+class IcmpPinger:
+    """Shared raw ICMP socket multiplexing echo requests for many hosts."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+        self._sock.setblocking(False)
+        self._ident = os.getpid() & 0xFFFF
+        self._seq = itertools.count(1)
+        self._waiters: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._on_readable)
+
+    @classmethod
+    def open(cls) -> Optional["IcmpPinger"]:
+        """Return a pinger, or ``None`` without raw socket privileges."""
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        except OSError:
+            return None
+        return cls(sock)
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                packet, (src, _) = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            reply = parse_echo_reply(packet)
+            if reply is None or reply[0] != self._ident:
+                continue
+            waiter = self._waiters.get((src, reply[1]))
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    async def ping(self, ip: str, timeout: float) -> Optional[float]:
+        seq = next(self._seq) & 0xFFFF
+        waiter = self._loop.create_future()
+        self._waiters[(ip, seq)] = waiter
+        start = time.monotonic()
+        try:
+            self._sock.sendto(build_echo_request(self._ident, seq), (ip, 0))
+            await asyncio.wait_for(waiter, timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            self._waiters.pop((ip, seq), None)
+        return time.monotonic() - start
+
+    def close(self) -> None:
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+
+
+async def verify_hosts_async(
+    ips: Iterable[str],
+    *,
+    ports: Sequence[int] = DEFAULT_PORTS,
+    icmp: Optional[bool] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    estimator: Optional[RttEstimator] = None,
+) -> Set[str]:
+    """Return the subset of *ips* that answered any probe.
+
+    Parameters
+    ----------
+    ports:
+        TCP ports probed concurrently for each host.
+    icmp:
+        ``True`` to require ICMP echo, ``False`` to disable it and ``None``
+        to use it when a raw socket can be opened.
+    concurrency:
+        Maximum number of hosts probed at the same time.
+    estimator:
+        RTT estimator shared across hosts; a fresh one is used by default.
+    """
+
+    est = estimator or RttEstimator()
+    pinger = IcmpPinger.open() if icmp is not False else None
+    if icmp and pinger is None:
+        raise PermissionError("ICMP probing requires a raw socket")
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def check(ip: str) -> bool:
+        async with sem:
+            timeout = est.timeout()
+            probes: List[asyncio.Future] = [
+                asyncio.ensure_future(_tcp_probe(ip, port, timeout)) for port in ports
+            ]
+            if pinger is not None:
+                probes.append(asyncio.ensure_future(pinger.ping(ip, timeout)))
+            try:
+                # 最初に応答したプローブで生存と判断し、残りは打ち切る
+                for fut in asyncio.as_completed(probes):
+                    rtt = await fut
+                    if rtt is not None:
+                        est.update(rtt)
+                        return True
+                return False
+            finally:
+                for probe in probes:
+                    probe.cancel()
+                await asyncio.gather(*probes, return_exceptions=True)
+
+    targets = list(dict.fromkeys(ips))
+    try:
+        alive = await asyncio.gather(*(check(ip) for ip in targets))
+    finally:
+        if pinger is not None:
+            pinger.close()
+    return {ip for ip, ok in zip(targets, alive) if ok}
+
+
+def verify_hosts(ips: Iterable[str], **kwargs) -> Set[str]:
+    """Synchronous wrapper around :func:`verify_hosts_async`."""
+
+    return asyncio.run(verify_hosts_async(ips, **kwargs))
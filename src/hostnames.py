@@ -0,0 +1,284 @@
+"""Batched hostname resolution for discovered hosts.
+
+Instead of spawning ``nbtscan`` and ``avahi-resolve`` once per host, all
+sources are queried for the whole host list at once and run concurrently:
+
+* ``dns``: reverse PTR lookups through the system resolver, in parallel
+* ``netbios``: a single ``nbtscan`` run reading the targets from stdin
+* ``mdns``: one round of multicast reverse queries to ``224.0.0.251``
+* ``llmnr``: reverse queries sent to every host's LLMNR port over one socket
+
+Answers are merged in :data:`PRIORITY` order, so each host keeps the name
+from the most trusted source that knew it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import struct
+import subprocess
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+PRIORITY: Tuple[str, ...] = ("dns", "netbios", "mdns", "llmnr")
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_PTR_CONCURRENCY = 32
+
+MDNS_ADDR = ("224.0.0.251", 5353)
+LLMNR_PORT = 5355
+# 1 パケットに詰める mDNS の質問数 (MTU に収まる数)
+MDNS_QUESTIONS_PER_PACKET = 32
+
+_TYPE_PTR = 12
+_CLASS_IN = 1
+
+
+def reverse_name(ip: str) -> str:
+    return ".".join(reversed(ip.split("."))) + ".in-addr.arpa"
+
+
+def _encode_name(name: str) -> bytes:
+    out = b""
+    for label in name.rstrip(".").split("."):
+        raw = label.encode()
+        out += bytes([len(raw)]) + raw
+    return out + b"\x00"
+
+
+def build_ptr_query(txid: int, names: Sequence[str]) -> bytes:
+    """Return a DNS-format query asking PTR for every name in *names*."""
+
+    header = struct.pack("!HHHHHH", txid & 0xFFFF, 0, len(names), 0, 0, 0)
+    questions = b"".join(
+        _encode_name(name) + struct.pack("!HH", _TYPE_PTR, _CLASS_IN) for name in names
+    )
+    return header + questions
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a (possibly compressed) domain name starting at *offset*."""
+
+    labels: List[str] = []
+    end: Optional[int] = None
+    for _ in range(128):  # 圧縮ポインタのループ対策
+        if offset >= len(data):
+            raise ValueError("truncated name")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data):
+                raise ValueError("truncated pointer")
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        if length == 0:
+            return ".".join(labels), end if end is not None else offset + 1
+        labels.append(data[offset + 1 : offset + 1 + length].decode("utf-8", "replace"))
+        offset += 1 + length
+    raise ValueError("name too long")
+
+
+def parse_ptr_answers(data: bytes) -> Dict[str, str]:
+    """Return ``reverse name -> hostname`` for every PTR answer in *data*."""
+
+    answers: Dict[str, str] = {}
+    try:
+        _, flags, qd, an, ns, ar = struct.unpack("!HHHHHH", data[:12])
+        if not flags & 0x8000:
+            return answers
+        offset = 12
+        for _ in range(qd):
+            _, offset = _read_name(data, offset)
+            offset += 4
+        # mDNS 応答は追加セクションにも PTR を載せることがある
+        for _ in range(an + ns + ar):
+            owner, offset = _read_name(data, offset)
+            rtype, _, _, rdlength = struct.unpack("!HHIH", data[offset : offset + 10])
+            offset += 10
+            if rtype == _TYPE_PTR:
+                target, _ = _read_name(data, offset)
+                answers.setdefault(owner.lower(), target.rstrip("."))
+            offset += rdlength
+    except (ValueError, struct.error):
+        pass
+    return answers
+
+
+class _PtrCollector(asyncio.DatagramProtocol):
+    """Collect PTR answers for the expected reverse names."""
+
+    def __init__(self, expected: Dict[str, str]):
+        self.expected = expected  # reverse name -> ip
+        self.names: Dict[str, str] = {}
+        self.done = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        for owner, target in parse_ptr_answers(data).items():
+            ip = self.expected.get(owner)
+            if ip and target and ip not in self.names:
+                self.names[ip] = target
+        if len(self.names) == len(self.expected) and not self.done.done():
+            self.done.set_result(None)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP port unreachable は応答しないホストとして扱う
+        pass
+
+
+async def _query_ptr(
+    ips: List[str],
+    packets: Iterable[Tuple[bytes, Tuple[str, int]]],
+    timeout: float,
+    *,
+    multicast: bool = False,
+) -> Dict[str, str]:
+    loop = asyncio.get_running_loop()
+    expected = {reverse_name(ip): ip for ip in ips}
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _PtrCollector(expected), local_addr=("0.0.0.0", 0)
+    )
+    try:
+        if multicast:
+            sock = transport.get_extra_info("socket")
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+        for packet, addr in packets:
+            transport.sendto(packet, addr)
+            await asyncio.sleep(0)
+        try:
+            await asyncio.wait_for(asyncio.shield(protocol.done), timeout)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        transport.close()
+    return protocol.names
+
+
+async def mdns_names(
+    ips: List[str], timeout: float = DEFAULT_TIMEOUT
+) -> Dict[str, str]:
+    """Resolve *ips* with one round of multicast mDNS reverse queries.
+
+    The query is sent from an ephemeral port, which makes it a "legacy
+    unicast" query (RFC 6762 section 6.7): responders answer directly to us.
+    """
+
+    names = [reverse_name(ip) for ip in ips]
+    txid = int.from_bytes(os.urandom(2), "big")
+    packets = [
+        (build_ptr_query(txid, names[i : i + MDNS_QUESTIONS_PER_PACKET]), MDNS_ADDR)
+        for i in range(0, len(names), MDNS_QUESTIONS_PER_PACKET)
+    ]
+    return await _query_ptr(ips, packets, timeout, multicast=True)
+
+
+async def llmnr_names(
+    ips: List[str], timeout: float = DEFAULT_TIMEOUT
+) -> Dict[str, str]:
+    """Resolve *ips* by sending LLMNR reverse queries to each host."""
+
+    txid = int.from_bytes(os.urandom(2), "big")
+    # LLMNR は 1 パケット 1 質問
+    packets = [
+        (build_ptr_query(txid + i, [reverse_name(ip)]), (ip, LLMNR_PORT))
+        for i, ip in enumerate(ips)
+    ]
+    return await _query_ptr(ips, packets, timeout)
+
+
+async def dns_names(
+    ips: List[str],
+    timeout: float = DEFAULT_TIMEOUT,
+    concurrency: int = DEFAULT_PTR_CONCURRENCY,
+) -> Dict[str, str]:
+    """Resolve *ips* with concurrent PTR lookups via the system resolver."""
+
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def lookup(ip: str) -> Optional[str]:
+        async with sem:
+            try:
+                name, _ = await asyncio.wait_for(
+                    loop.getnameinfo((ip, 0), socket.NI_NAMEREQD), timeout
+                )
+            except (OSError, UnicodeError, asyncio.TimeoutError):
+                return None
+            return name
+
+    results = await asyncio.gather(*(lookup(ip) for ip in ips))
+    return {ip: name for ip, name in zip(ips, results) if name}
+
+
+def nbtscan_names(ips: List[str], timeout: float = DEFAULT_TIMEOUT) -> Dict[str, str]:
+    """Resolve NetBIOS names for *ips* with a single ``nbtscan`` process."""
+
+    try:
+        proc = subprocess.run(
+            ["nbtscan", "-q", "-f", "-"],
+            check=False,
+            input="\n".join(ips) + "\n",
+            capture_output=True,
+            text=True,
+            # nbtscan は応答待ちに時間がかかるので余裕を持たせる
+            timeout=timeout + 5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    wanted = set(ips)
+    names: Dict[str, str] = {}
+    for line in proc.stdout.splitlines():
+        parts = line.strip().split()
+        if len(parts) >= 2 and parts[0] in wanted and parts[0] not in names:
+            names[parts[0]] = parts[1]
+    return names
+
+
+async def resolve_hostnames_async(
+    ips: Iterable[str],
+    *,
+    sources: Sequence[str] = PRIORITY,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> Dict[str, str]:
+    """Resolve hostnames for *ips* using all *sources* concurrently.
+
+    Parameters
+    ----------
+    sources:
+        Subset of :data:`PRIORITY`.  The order of :data:`PRIORITY`, not of
+        this argument, decides which answer wins.
+    timeout:
+        Time each source waits for answers.
+
+    Returns
+    -------
+    dict
+        ``ip -> hostname`` for every host at least one source could name.
+    """
+
+    targets = list(dict.fromkeys(ips))
+    if not targets:
+        return {}
+    runners = {
+        "dns": lambda: dns_names(targets, timeout),
+        "netbios": lambda: asyncio.to_thread(nbtscan_names, targets, timeout),
+        "mdns": lambda: mdns_names(targets, timeout),
+        "llmnr": lambda: llmnr_names(targets, timeout),
+    }
+    selected = [name for name in PRIORITY if name in sources]
+    results = await asyncio.gather(
+        *(runners[name]() for name in selected), return_exceptions=True
+    )
+    merged: Dict[str, str] = {}
+    for result in results:
+        if isinstance(result, BaseException):
+            continue
+        for ip, name in result.items():
+            merged.setdefault(ip, name)
+    return merged
+
+
+def resolve_hostnames(ips: Iterable[str], **kwargs) -> Dict[str, str]:
+    """Synchronous wrapper around :func:`resolve_hostnames_async`."""
+
+    return asyncio.run(resolve_hostnames_async(ips, **kwargs))
@@ -0,0 +1,268 @@
+"""IPv6 host discovery via multicast echo and neighbour solicitation.
+
+An IPv6 /64 cannot be enumerated, so hosts are found the way the link
+itself knows them:
+
+1. An ICMPv6 echo request to the all-nodes group ``ff02::1`` is answered by
+   every IPv6 node on the link, usually from its link-local address.
+2. For each responder the interface identifier is combined with the target
+   prefix, and a neighbour solicitation is sent to the candidate's
+   solicited-node group (``ff02::1:ffXX:XXXX``).  A neighbour advertisement
+   confirms the address and carries the host's MAC.
+
+Hosts using random (privacy) interface identifiers in the target prefix
+are still reported, under their link-local address.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+PROC_IF_INET6 = "/proc/net/if_inet6"
+ALL_NODES = "ff02::1"
+DEFAULT_TIMEOUT = 1.0
+
+_ECHO_REQUEST = 128
+_ECHO_REPLY = 129
+_NEIGHBOR_SOLICIT = 135
+_NEIGHBOR_ADVERT = 136
+_OPT_SOURCE_LLADDR = 1
+_OPT_TARGET_LLADDR = 2
+
+
+def _local_addresses() -> List[Tuple[ipaddress.IPv6Address, str, int]]:
+    """Return ``(address, interface, index)`` for every local IPv6 address."""
+
+    try:
+        with open(PROC_IF_INET6) as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return []
+    result = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 6:
+            continue
+        try:
+            addr = ipaddress.IPv6Address(bytes.fromhex(fields[0]))
+        except ValueError:
+            continue
+        result.append((addr, fields[5], int(fields[1], 16)))
+    return result
+
+
+def _interface_for(network: ipaddress.IPv6Network) -> Optional[Tuple[str, int]]:
+    """Return ``(name, index)`` of the interface holding an address in *network*."""
+
+    for addr, name, index in _local_addresses():
+        if addr in network and not addr.is_loopback:
+            return name, index
+    return None
+
+
+def solicited_node(addr: ipaddress.IPv6Address) -> str:
+    """Return the solicited-node multicast group for *addr*."""
+
+    return str(
+        ipaddress.IPv6Address(
+            b"\xff\x02" + b"\x00" * 9 + b"\x01\xff" + addr.packed[13:]
+        )
+    )
+
+
+def build_echo_request(ident: int, seq: int) -> bytes:
+    # チェックサムはカーネルが計算する (ICMPv6 raw ソケット)
+    return struct.pack("!BBHHH", _ECHO_REQUEST, 0, 0, ident, seq) + b"nw-checker"
+
+
+def build_neighbor_solicit(target: ipaddress.IPv6Address, src_mac: bytes) -> bytes:
+    header = struct.pack("!BBHI", _NEIGHBOR_SOLICIT, 0, 0, 0) + target.packed
+    option = struct.pack("!BB", _OPT_SOURCE_LLADDR, 1) + src_mac
+    return header + option
+
+
+def parse_message(packet: bytes) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Parse an ICMPv6 message as delivered by a raw socket.
+
+    Returns ``(type, fields)`` for echo replies (``ident``, ``seq``) and
+    neighbour advertisements (``target``, optional ``mac``).
+    """
+
+    if len(packet) < 8:
+        return None
+    icmp_type = packet[0]
+    if icmp_type == _ECHO_REPLY:
+        ident, seq = struct.unpack("!HH", packet[4:8])
+        return icmp_type, {"ident": ident, "seq": seq}
+    if icmp_type == _NEIGHBOR_ADVERT and len(packet) >= 24:
+        fields: Dict[str, Any] = {"target": ipaddress.IPv6Address(packet[8:24])}
+        offset = 24
+        while offset + 2 <= len(packet):
+            opt_type, opt_len = packet[offset], packet[offset + 1] * 8
+            if opt_len == 0:
+                break
+            if opt_type == _OPT_TARGET_LLADDR and opt_len >= 8:
+                mac = packet[offset + 2 : offset + 8]
+                fields["mac"] = ":".join(f"{b:02x}" for b in mac)
+            offset += opt_len
+        return icmp_type, fields
+    return None
+
+
+def _interface_mac(name: str) -> bytes:
+    try:
+        with open(f"/sys/class/net/{name}/address") as fh:
+            return bytes.fromhex(fh.read().strip().replace(":", ""))
+    except (OSError, ValueError):
+        return b"\x00" * 6
+
+
+class _Listener:
+    """Dispatch ICMPv6 messages from the raw socket to the active phase."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.handler: Optional[Callable[[int, Dict[str, Any], str], None]] = None
+
+    def on_readable(self) -> None:
+        while True:
+            try:
+                packet, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            parsed = parse_message(packet)
+            if parsed is not None and self.handler is not None:
+                # スコープ ID 付きのアドレス ("fe80::1%eth0") は取り除く
+                self.handler(parsed[0], parsed[1], addr[0].split("%", 1)[0])
+
+
+async def discover_async(
+    subnet: str,
+    *,
+    interface: Optional[str] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    on_sent: Optional[Callable[[int], None]] = None,
+    pace: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Optional[List[Dict[str, str]]]:
+    """Find IPv6 hosts of *subnet* on the directly attached link.
+
+    *on_sent* is called with the number of probes sent so far and *pace*,
+    when given, is awaited before every probe so a caller can apply a rate
+    limit without blocking the event loop.  ``None`` is returned when no local interface
+    holds the prefix or a raw ICMPv6 socket cannot be opened.
+
+    Returns
+    -------
+    list
+        ``{"ip", "mac"}`` dictionaries; ``mac`` is empty for hosts that were
+        only seen through the multicast echo.
+    """
+
+    network = ipaddress.ip_network(subnet, strict=False)
+    if not isinstance(network, ipaddress.IPv6Network):
+        return None
+    if interface is not None:
+        iface: Optional[Tuple[str, int]] = (interface, socket.if_nametoindex(interface))
+    else:
+        iface = _interface_for(network)
+    if iface is None:
+        return None
+    name, index = iface
+    try:
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6)
+    except OSError:
+        return None
+
+    loop = asyncio.get_running_loop()
+    listener = _Listener(sock)
+    sent = 0
+
+    async def send(packet: bytes, dest: str) -> None:
+        nonlocal sent
+        if pace is not None:
+            await pace()
+        try:
+            sock.sendto(packet, (dest, 0, 0, index))
+        except OSError:
+            return
+        sent += 1
+        if on_sent is not None:
+            on_sent(sent)
+
+    with sock:
+        sock.setblocking(False)
+        # NDP はホップリミット 255 でなければ受理されない
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, 255)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, 255)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_IF, index)
+        loop.add_reader(sock.fileno(), listener.on_readable)
+        try:
+            # 1. 全ノード宛の echo で応答者を集める
+            ident = os.getpid() & 0xFFFF
+            responders: List[str] = []
+
+            own = {str(addr) for addr, _, _ in _local_addresses()}
+
+            def on_echo(kind: int, fields: Dict[str, Any], src: str) -> None:
+                if kind == _ECHO_REPLY and fields["ident"] == ident:
+                    if src not in responders and src not in own:
+                        responders.append(src)
+
+            listener.handler = on_echo
+            await send(build_echo_request(ident, 1), ALL_NODES)
+            await asyncio.sleep(timeout)
+
+            # 2. 応答者の IID と対象プレフィックスから候補を作り NS で確認する
+            candidates: Dict[ipaddress.IPv6Address, str] = {}
+            for src in responders:
+                addr = ipaddress.IPv6Address(src)
+                if addr in network:
+                    candidates.setdefault(addr, src)
+                elif network.prefixlen <= 64:
+                    iid = int(addr) & ((1 << 64) - 1)
+                    candidates.setdefault(
+                        ipaddress.IPv6Address(int(network.network_address) | iid), src
+                    )
+            confirmed: Dict[str, str] = {}
+            macs: Dict[str, str] = {}
+
+            def on_advert(kind: int, fields: Dict[str, Any], src: str) -> None:
+                if kind == _NEIGHBOR_ADVERT and fields["target"] in candidates:
+                    confirmed[candidates[fields["target"]]] = str(fields["target"])
+                    macs[str(fields["target"])] = fields.get("mac", "")
+
+            listener.handler = on_advert
+            src_mac = _interface_mac(name)
+            for target in candidates:
+                await send(
+                    build_neighbor_solicit(target, src_mac), solicited_node(target)
+                )
+                await asyncio.sleep(0)
+            if candidates:
+                await asyncio.sleep(timeout)
+        finally:
+            loop.remove_reader(sock.fileno())
+
+    hosts: List[Dict[str, str]] = []
+    for src in responders:
+        if src in confirmed:
+            ip = confirmed[src]
+            hosts.append({"ip": ip, "mac": macs.get(ip, "")})
+        elif ipaddress.IPv6Address(src) in network:
+            hosts.append({"ip": src, "mac": ""})
+        else:
+            hosts.append({"ip": f"{src}%{name}", "mac": ""})
+    return hosts
+
+
+def discover(subnet: str, **kwargs) -> Optional[List[Dict[str, str]]]:
+    """Synchronous wrapper around :func:`discover_async`."""
+
+    return asyncio.run(discover_async(subnet, **kwargs))
@@ -3,8 +3,10 @@
 import argparse
 import json
 import sys
+from typing import Any, Dict, Iterator
 
-from .discover_hosts import discover_hosts
+from .discover_hosts import discover_hosts, iter_discovery
+from .discovery_scheduler import iter_scheduled
 
 
 def network_map(subnet: str):
@@ -22,7 +24,24 @@ def main(argv=None):
 
     parser = argparse.ArgumentParser(description="Scan a subnet for hosts")
     parser.add_argument("subnet", help="CIDR subnet to scan")
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="stream discovery events as JSON Lines while scanning",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        help="scan in chunks and resume an interrupted scan from PATH",
+    )
     args = parser.parse_args(argv)
+    if args.checkpoint:
+        events = iter_scheduled(args.subnet, checkpoint=args.checkpoint)
+        if args.jsonl:
+            return _stream_jsonl(events)
+        return _collect(events)
+    if args.jsonl:
+        return _stream_jsonl(iter_discovery(args.subnet))
     try:
         hosts = network_map(args.subnet)
     except Exception as exc:
@@ -34,5 +53,34 @@ def main(argv=None):
     return 0
 
 
+def _collect(events: Iterator[Dict[str, Any]]) -> int:
+    """Print the hosts of a scheduled scan as one JSON document."""
+
+    try:
+        hosts = [event["host"] for event in events if event["type"] == "host"]
+    except Exception as exc:
+        print(f"Host discovery failed: {exc}", file=sys.stderr)
+        return 1
+    json.dump(hosts, sys.stdout)
+    sys.stdout.write("\n")
+    print("Host discovery succeeded", file=sys.stdout)
+    return 0
+
+
+def _stream_jsonl(events: Iterator[Dict[str, Any]]) -> int:
+    """Write each discovery event to stdout as soon as it occurs."""
+
+    try:
+        for event in events:
+            sys.stdout.write(json.dumps(event) + "\n")
+            sys.stdout.flush()
+    except Exception as exc:
+        print(f"Host discovery failed: {exc}", file=sys.stderr)
+        return 1
+    # stdout は JSON Lines のみにしておく
+    print("Host discovery succeeded", file=sys.stderr)
+    return 0
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -0,0 +1,240 @@
+"""IEEE OUI vendor lookup with a compiled longest-prefix index.
+
+The registry text is parsed once into three sorted integer arrays (36-, 28-
+and 24-bit prefixes for MA-S, MA-M and MA-L assignments) so a lookup is a
+handful of binary searches instead of a full file scan.  Vendors that are
+not in the local registry can be resolved through the macvendors.com API;
+those answers are cached persistently in SQLite, keyed by the registry
+block the MAC falls in (the whole MAC when the block is unknown).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+OUI_PATH = DATA_DIR / "oui.txt"
+API_CACHE_PATH = DATA_DIR / "oui_api_cache.db"
+API_URL = "https://api.macvendors.com/{mac}"
+
+# 長い接頭辞から順に照合する (MA-S, MA-M, MA-L)
+PREFIX_BITS = (36, 28, 24)
+
+# API 結果の有効期限（秒）。見つからなかった結果は短めに再確認する
+API_TTL = 30 * 24 * 3600
+API_NEGATIVE_TTL = 24 * 3600
+
+_HEX = frozenset("0123456789ABCDEF")
+
+
+def mac_to_int(mac: str) -> Optional[int]:
+    """Convert ``aa:bb:cc:dd:ee:ff`` (or ``-``/``.``/bare) to a 48-bit int."""
+
+    digits = mac.upper().replace(":", "").replace("-", "").replace(".", "")
+    if len(digits) != 12 or not _HEX.issuperset(digits):
+        return None
+    return int(digits, 16)
+
+
+def _parse_line(line: str) -> Optional[Tuple[int, int, str]]:
+    """Parse one registry line into ``(prefix, bits, vendor)``.
+
+    Accepted forms include the simple ``001122 Vendor`` layout, IEEE text
+    dumps (``00-11-22   (hex)  Vendor``), Wireshark ``manuf`` entries with an
+    explicit length (``00:55:DA:A0:00:00/28  Vendor``) and IEEE CSV rows
+    (``MA-M,0055DA5,Vendor,...``).
+    """
+
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if "," in line and line.split(",", 1)[0] in {"MA-L", "MA-M", "MA-S"}:
+        parts = [p.strip().strip('"') for p in line.split(",", 3)]
+        key, vendor = (parts[1], parts[2]) if len(parts) > 2 else ("", "")
+    else:
+        fields = line.split(None, 1)
+        key = fields[0]
+        vendor = fields[1] if len(fields) > 1 else ""
+        for marker in ("(hex)", "(base 16)"):
+            if vendor.startswith(marker):
+                vendor = vendor[len(marker) :]
+    key, _, explicit = key.partition("/")
+    digits = key.upper().replace(":", "").replace("-", "").replace(".", "")
+    if "-" in digits or not digits or not _HEX.issuperset(digits):
+        return None
+    if explicit:
+        bits = int(explicit) if explicit.isdigit() else 0
+    else:
+        bits = len(digits) * 4
+    if bits not in PREFIX_BITS or len(digits) * 4 < bits:
+        return None
+    value = int(digits, 16) >> (len(digits) * 4 - bits)
+    vendor = vendor.split("\t")[-1].strip()
+    return value, bits, vendor
+
+
+class OuiIndex:
+    """Sorted-integer index over OUI assignments with longest-prefix lookup."""
+
+    def __init__(self, entries: Iterable[Tuple[int, int, str]] = ()):
+        vendors: Dict[str, int] = {}
+        tables: Dict[int, Dict[int, int]] = {bits: {} for bits in PREFIX_BITS}
+        for value, bits, vendor in entries:
+            if bits not in tables or not vendor:
+                continue
+            # 同じ接頭辞が重複した場合は先勝ち
+            tables[bits].setdefault(value, vendors.setdefault(vendor, len(vendors)))
+        self.vendors: List[str] = list(vendors)
+        self._tables: List[Tuple[int, array, array]] = []
+        for bits in PREFIX_BITS:
+            items = sorted(tables[bits].items())
+            if not items:
+                continue
+            keys = array("Q", (k for k, _ in items))
+            ids = array("I", (v for _, v in items))
+            self._tables.append((48 - bits, keys, ids))
+
+    def __len__(self) -> int:
+        return sum(len(keys) for _, keys, _ in self._tables)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "OuiIndex":
+        return cls(entry for entry in map(_parse_line, lines) if entry)
+
+    @classmethod
+    def from_file(cls, path: Path | str) -> "OuiIndex":
+        with open(path, encoding="utf-8", errors="replace") as fh:
+            return cls.from_lines(fh)
+
+    def lookup_int(self, value: int) -> Optional[str]:
+        for shift, keys, ids in self._tables:
+            key = value >> shift
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                return self.vendors[ids[i]]
+        return None
+
+    def block_bits(self, mac: str) -> int:
+        """Return the prefix length of the registry block containing *mac*.
+
+        An OUI carved into MA-M or MA-S blocks yields 28 or 36 even when the
+        block of *mac* itself is not listed; a plain MA-L assignment yields
+        24.  Unknown OUIs (and invalid MACs) yield 48, i.e. the MAC alone.
+        """
+
+        value = mac_to_int(mac)
+        if value is None:
+            return 48
+        oui = value >> 24
+        for shift, keys, _ in self._tables:
+            bits = 48 - shift
+            # この表に同じ OUI 配下の接頭辞が 1 つでもあればその長さで区切られている
+            lo = oui << (bits - 24)
+            i = bisect_left(keys, lo)
+            if i < len(keys) and keys[i] < lo + (1 << (bits - 24)):
+                return bits
+        return 48
+
+    def lookup(self, mac: str) -> Optional[str]:
+        """Return the vendor for *mac* using the longest matching prefix."""
+
+        value = mac_to_int(mac)
+        return self.lookup_int(value) if value is not None else None
+
+    def lookup_many(self, macs: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Bulk variant of :meth:`lookup` returning ``mac -> vendor``."""
+
+        lookup_int = self.lookup_int
+        result: Dict[str, Optional[str]] = {}
+        for mac in macs:
+            value = mac_to_int(mac)
+            result[mac] = lookup_int(value) if value is not None else None
+        return result
+
+
+_INDEX_LOCK = threading.Lock()
+_INDEX_CACHE: Dict[Path, Tuple[float, OuiIndex]] = {}
+
+
+def load_index(path: Optional[Path] = None) -> OuiIndex:
+    """Return the compiled index for *path*, rebuilding it when the file changes."""
+
+    path = Path(path or OUI_PATH)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return OuiIndex()
+    with _INDEX_LOCK:
+        cached = _INDEX_CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                index = OuiIndex.from_file(path)
+            except OSError:
+                index = OuiIndex()
+            cached = (mtime, index)
+            _INDEX_CACHE[path] = cached
+        return cached[1]
+
+
+class ApiCache:
+    """SQLite cache of macvendors.com answers keyed by MAC prefix.
+
+    ``bits`` is the prefix length an answer applies to, normally
+    :meth:`OuiIndex.block_bits`; the default of 48 keys by the whole MAC.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | str = API_CACHE_PATH,
+        *,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self._clock = clock
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS oui_api_cache (
+                    oui TEXT PRIMARY KEY,
+                    vendor TEXT,
+                    fetched_at REAL NOT NULL
+                )
+                """)
+            conn.commit()
+
+    @staticmethod
+    def key(mac: str, bits: int = 48) -> str:
+        digits = mac.upper().replace(":", "").replace("-", "").replace(".", "")
+        return digits[: bits // 4]
+
+    def get(self, mac: str, bits: int = 48) -> Tuple[bool, Optional[str]]:
+        """Return ``(hit, vendor)``; expired entries count as misses."""
+
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            row = conn.execute(
+                "SELECT vendor, fetched_at FROM oui_api_cache WHERE oui = ?",
+                (self.key(mac, bits),),
+            ).fetchone()
+        if row is None:
+            return False, None
+        vendor, fetched_at = row
+        ttl = API_TTL if vendor is not None else API_NEGATIVE_TTL
+        if self._clock() - fetched_at >= ttl:
+            return False, None
+        return True, vendor
+
+    def put(self, mac: str, vendor: Optional[str], bits: int = 48) -> None:
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO oui_api_cache (oui, vendor, fetched_at) "
+                "VALUES (?, ?, ?)",
+                (self.key(mac, bits), vendor, self._clock()),
+            )
+            conn.commit()
@@ -1,59 +1,158 @@
-"""PDF reporting for scan results."""
+"""PDF reporting for scan results.
 
+reportlab keeps every page of a canvas in memory until it is saved, so large
+multi-host reports are rendered in parts of :data:`HOSTS_PER_PART` hosts.
+Each part is written to disk as soon as it is complete and the parts are
+joined with pypdf at the end.
+"""
+
+import os
+import tempfile
 from datetime import datetime
-from typing import Dict, Any
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple
 
+from pypdf import PdfWriter
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 
 HIGH_RISK_THRESHOLD = 70
+TOP_MARGIN = 40
+BOTTOM_MARGIN = 40
+# 1 つの部分 PDF に描画するホスト数。描画中に保持するページ数をこの範囲に抑える
+HOSTS_PER_PART = 50
 
 
-def create_pdf(report_data: Dict[str, Any], output_path: str) -> None:
-    """Render scan results into a PDF.
+def _iter_findings(findings: Any) -> Iterator[Tuple[str, Mapping[str, Any]]]:
+    """Yield ``(label, finding)`` pairs from dict or list shaped findings.
 
-    Args:
-        report_data: 結果の辞書。"findings"キーを含む場合はその値を使用。
-        output_path: 出力PDFファイルのパス。
+    ``static_scan.run_all`` returns a list of findings carrying their own
+    ``category`` (and ``target`` for per-host scanners), older callers pass
+    a ``category -> finding`` mapping.
     """
-    findings = report_data.get("findings", report_data)
-    risk_score = report_data.get("risk_score")
+    if isinstance(findings, Mapping):
+        for category, data in findings.items():
+            yield str(category), data if isinstance(data, Mapping) else {}
+        return
+    for data in findings or ():
+        if not isinstance(data, Mapping):
+            continue
+        label = str(data.get("category", "unknown"))
+        if data.get("target"):
+            label = f"{label} ({data['target']})"
+        yield label, data
 
-    c = canvas.Canvas(output_path, pagesize=A4)
-    width, height = A4
-    y = height - 40
 
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(40, y, "Static Scan Report")
-    y -= 24
+class _Writer:
+    """Draw lines top to bottom, starting a new page when one is full.
 
-    c.setFont("Helvetica", 12)
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.drawString(40, y, f"Generated: {timestamp}")
-    y -= 24
+    reportlab keeps every finished page in memory until :meth:`save` writes
+    the file, so one writer should only draw one part of a large report.
+    """
 
-    if risk_score is not None:
-        c.drawString(40, y, f"Overall Risk Score: {risk_score}")
-        y -= 24
+    def __init__(self, output_path: str) -> None:
+        # ページ内容は圧縮して保持し、大きなレポートでもメモリを抑える
+        self.canvas = canvas.Canvas(output_path, pagesize=A4, pageCompression=1)
+        self.height = A4[1]
+        self.y = self.height - TOP_MARGIN
+
+    def line(self, text: str, *, x: int = 40, step: int = 16, font: str = "") -> None:
+        if self.y < BOTTOM_MARGIN:
+            self.canvas.showPage()
+            self.y = self.height - TOP_MARGIN
+        if font:
+            self.canvas.setFont(font, 16 if font.endswith("Bold") else 12)
+        self.canvas.drawString(x, self.y, text)
+        self.y -= step
+
+    def save(self) -> None:
+        self.canvas.save()
 
-    for category, data in findings.items():
+
+def _write_findings(writer: _Writer, findings: Iterable[Any]) -> None:
+    for category, data in _iter_findings(findings):
         score = data.get("score")
         high_risk = score is not None and score >= HIGH_RISK_THRESHOLD
         text = f"{category}: {score}" + (" HIGH RISK" if high_risk else "")
-        c.drawString(40, y, text)
-        y -= 18
+        writer.line(text, step=18)
 
         details = data.get("details", {})
         if isinstance(details, dict):
             for key, value in details.items():
-                if y < 40:
-                    c.showPage()
-                    y = height - 40
-                c.drawString(60, y, f"{key}: {value}")
-                y -= 16
+                writer.line(f"{key}: {value}", x=60)
+
+
+def _write_hosts(
+    writer: _Writer, hosts: Iterable[Tuple[Any, Mapping[str, Any]]]
+) -> None:
+    for ip, host in hosts:
+        writer.line("", step=8)
+        writer.line(f"Host {ip}: {host.get('risk_score')}", step=18)
+        _write_findings(writer, host.get("findings", ()))
+
+
+def _join(parts: List[str], output_path: str) -> None:
+    """Concatenate the part PDFs into *output_path*."""
+
+    merged = PdfWriter()
+    for part in parts:
+        merged.append(part)
+    with open(output_path, "wb") as fh:
+        merged.write(fh)
+    merged.close()
+
+
+def _write_head(writer: _Writer, findings: Any, risk_score: Any) -> None:
+    writer.line("Static Scan Report", step=24, font="Helvetica-Bold")
+
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    writer.line(f"Generated: {timestamp}", step=24, font="Helvetica")
+
+    if risk_score is not None:
+        writer.line(f"Overall Risk Score: {risk_score}", step=24)
+
+    _write_findings(writer, findings)
+
+
+def create_pdf(report_data: Dict[str, Any], output_path: str) -> None:
+    """Render scan results into a PDF.
+
+    Args:
+        report_data: 結果の辞書。"findings"キーを含む場合はその値を使用。
+            ``findings`` は辞書・リストのどちらでもよく、``hosts`` があれば
+            ホストごとの節を続けて出力する。
+        output_path: 出力PDFファイルのパス。
+    """
+    findings = report_data.get("findings", report_data)
+    risk_score = report_data.get("risk_score")
+    hosts = report_data.get("hosts") if "findings" in report_data else None
+    host_items = (
+        (ip, host)
+        for ip, host in (hosts.items() if isinstance(hosts, Mapping) else ())
+        if isinstance(host, Mapping)
+    )
+    chunk = list(islice(host_items, HOSTS_PER_PART))
+    rest = list(islice(host_items, HOSTS_PER_PART))
 
-        if y < 40:
-            c.showPage()
-            y = height - 40
+    if not rest:
+        writer = _Writer(output_path)
+        _write_head(writer, findings, risk_score)
+        _write_hosts(writer, chunk)
+        writer.save()
+        return
 
-    c.save()
+    # 大きなレポートは部分 PDF ごとに保存してページを手放し、最後に連結する
+    with tempfile.TemporaryDirectory(
+        dir=os.path.dirname(os.path.abspath(output_path))
+    ) as tmp:
+        parts: List[str] = []
+        while chunk:
+            path = os.path.join(tmp, f"part-{len(parts)}.pdf")
+            writer = _Writer(path)
+            if not parts:
+                _write_head(writer, findings, risk_score)
+            _write_hosts(writer, chunk)
+            writer.save()
+            parts.append(path)
+            chunk, rest = rest, list(islice(host_items, HOSTS_PER_PART))
+        _join(parts, output_path)
@@ -0,0 +1,199 @@
+"""Content-addressed PDF report store rendering in a worker pool.
+
+A report is identified by the SHA-256 of its canonical JSON payload, so
+identical scan results share one PDF.  Rendering happens in a process pool
+off the request path: :meth:`ReportStore.submit` returns the report id at
+once and the PDF appears under ``<id>.pdf`` when the worker is done.
+Concurrent submissions of the same payload share one render job.  Only the
+most recently used reports are kept on disk.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+REPORT_DIR = Path(__file__).resolve().parents[2] / "data" / "reports"
+DEFAULT_WORKERS = 2
+# 保持する PDF の数と、記録しておく失敗の数（古いものから捨てる）
+MAX_REPORTS = 256
+MAX_FAILED = 256
+
+_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def report_id(payload: Any) -> str:
+    """Return the id of the report for *payload*."""
+
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def render_pdf(payload: Dict[str, Any], output_path: str) -> None:
+    """Render *payload* to *output_path*; runs inside the worker process."""
+
+    # reportlab は実際に描画するプロセスでだけ読み込む
+    from .pdf import create_pdf
+
+    tmp = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        create_pdf(payload, tmp)
+        os.replace(tmp, output_path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+class ReportStore:
+    """Cache of rendered reports keyed by payload hash.
+
+    Parameters
+    ----------
+    directory:
+        Where ``<id>.pdf`` files are kept.
+    executor:
+        Pool running *render*; a process pool is created on first use.
+    render:
+        ``render(payload, path)`` writing the PDF.  Must be picklable when a
+        process pool is used.
+    max_reports:
+        Number of PDFs kept in *directory*; after each render the least
+        recently used ones beyond it are deleted.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str = REPORT_DIR,
+        *,
+        executor: Optional[Executor] = None,
+        render: Callable[[Dict[str, Any], str], None] = render_pdf,
+        max_reports: int = MAX_REPORTS,
+    ) -> None:
+        self.directory = Path(directory)
+        self.render = render
+        self.max_reports = max(1, max_reports)
+        self._executor = executor
+        self._own_executor = executor is None
+        self._pending: Dict[str, Future] = {}
+        self._failed: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, rid: str) -> Path:
+        if not _ID_RE.match(rid):
+            raise ValueError(f"invalid report id: {rid!r}")
+        return self.directory / f"{rid}.pdf"
+
+    def status(self, rid: str) -> Optional[str]:
+        """Return ``ready``, ``pending``, ``failed`` or ``None`` if unknown."""
+
+        if self.path(rid).exists():
+            return "ready"
+        with self._lock:
+            if rid in self._pending:
+                return "pending"
+            if rid in self._failed:
+                return "failed"
+        return None
+
+    def error(self, rid: str) -> Optional[str]:
+        with self._lock:
+            return self._failed.get(rid)
+
+    def submit(self, payload: Dict[str, Any]) -> Tuple[str, Future]:
+        """Start rendering *payload* unless it is cached or already queued.
+
+        Returns the report id and a future resolving to the PDF path.
+        """
+
+        rid = report_id(payload)
+        target = self.path(rid)
+        if target.exists():
+            try:
+                # 再利用したレポートは最近使ったものとして整理の対象から外す
+                os.utime(target)
+            except OSError:
+                pass
+            done: Future = Future()
+            done.set_result(target)
+            return rid, done
+        with self._lock:
+            pending = self._pending.get(rid)
+            if pending is not None:
+                return rid, pending
+            self._failed.pop(rid, None)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=DEFAULT_WORKERS)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            job = self._executor.submit(self.render, payload, str(target))
+            result: Future = Future()
+            self._pending[rid] = result
+
+        def finished(fut: Future) -> None:
+            error: Optional[BaseException] = None
+            try:
+                fut.result()
+            except BaseException as exc:  # noqa: BLE001 - 呼び出し側へ伝える
+                error = exc
+            with self._lock:
+                self._pending.pop(rid, None)
+                if error is not None:
+                    self._failed[rid] = str(error) or type(error).__name__
+                    while len(self._failed) > MAX_FAILED:
+                        self._failed.popitem(last=False)
+            if error is None:
+                self._prune(keep=target)
+                result.set_result(target)
+            else:
+                result.set_exception(error)
+
+        job.add_done_callback(finished)
+        return rid, result
+
+    def _prune(self, keep: Path) -> None:
+        """Delete the least recently used PDFs beyond :attr:`max_reports`."""
+
+        reports = []
+        for path in self.directory.glob("*.pdf"):
+            if path == keep or not _ID_RE.match(path.stem):
+                continue
+            try:
+                reports.append((path.stat().st_mtime_ns, path))
+            except OSError:
+                continue
+        excess = len(reports) + 1 - self.max_reports
+        for _, path in sorted(reports)[: max(0, excess)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def pending(self, rid: str) -> Optional[Future]:
+        with self._lock:
+            return self._pending.get(rid)
+
+    async def wait(self, rid: str, timeout: Optional[float] = None) -> Optional[Path]:
+        """Wait for a report; ``None`` if it is unknown or failed."""
+
+        target = self.path(rid)
+        future = self.pending(rid)
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except asyncio.TimeoutError:
+                raise
+            except Exception:  # noqa: BLE001 - 失敗は status で確認できる
+                return None
+        return target if target.exists() else None
+
+    def close(self) -> None:
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
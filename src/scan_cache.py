@@ -0,0 +1,185 @@
+"""Persistent result cache for incremental static scans.
+
+Each entry is keyed by ``(host, scanner)`` and remembers the fingerprint of
+the host at scan time (MAC address, open-port set, ...).  A cached result is
+reused while it is younger than the scanner's TTL and the fingerprint is
+unchanged, so periodic reassessments only re-run what actually changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# スキャナごとの有効期限（秒）。ネットワーク全体のスキャナは短めにする。
+DEFAULT_TTLS: Dict[str, float] = {
+    "ports": 3600,
+    "os_banner": 24 * 3600,
+    "smb_netbios": 6 * 3600,
+    "ssl_cert": 12 * 3600,
+    "arp_spoof": 900,
+    "dhcp": 900,
+    "dns": 900,
+    "upnp": 900,
+}
+DEFAULT_TTL = 3600.0
+
+# サーバーが使う既定のキャッシュファイル
+CACHE_PATH = Path(__file__).resolve().parents[1] / "data" / "static_scan_cache.db"
+
+# ネットワーク全体のスキャナ結果を格納するホストキー
+NETWORK_HOST = ""
+
+# (host, scanner) -> (fingerprint, scanned_at, result)
+Snapshot = Dict[Tuple[str, str], Tuple[str, float, Dict[str, Any]]]
+
+
+def _digest(data: Mapping[str, Any]) -> str:
+    raw = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ScanResultCache:
+    """SQLite backed cache of static scan results."""
+
+    def __init__(
+        self,
+        db_path: str | Path = CACHE_PATH,
+        *,
+        ttls: Optional[Mapping[str, float]] = None,
+        default_ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """キャッシュを初期化
+
+        Args:
+            db_path: SQLite のファイルパス
+            ttls: スキャナ名ごとの有効期限（秒）。``DEFAULT_TTLS`` を上書きする
+            default_ttl: 未登録スキャナの有効期限
+            clock: 現在時刻を返す関数（テスト用に差し替え可能）
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_cache (
+                    host TEXT NOT NULL,
+                    scanner TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    scanned_at REAL NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (host, scanner)
+                )
+                """)
+            conn.commit()
+
+    def ttl(self, scanner: str) -> float:
+        return self.ttls.get(scanner, self.default_ttl)
+
+    def snapshot(self) -> Snapshot:
+        """Load every cached entry in one query."""
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            rows = conn.execute(
+                "SELECT host, scanner, fingerprint, scanned_at, result FROM scan_cache"
+            ).fetchall()
+        return {(h, s): (fp, ts, json.loads(res)) for h, s, fp, ts, res in rows}
+
+    def fingerprint(
+        self,
+        scanner: str,
+        host: Optional[str],
+        target: Optional[Mapping[str, Any]] = None,
+        snapshot: Optional[Snapshot] = None,
+    ) -> str:
+        """Return the change-detection fingerprint for ``(host, scanner)``.
+
+        The MAC address (as reported by :func:`discover_hosts.discover_hosts`)
+        and open ports, when the caller already knows them, come from
+        ``target``.  For host scanners other than ``ports`` the open
+        port set last seen by the ``ports`` scanner is included as well, so a
+        newly opened service re-triggers banner/TLS/SMB checks.
+        """
+        if host is None:
+            return _digest({})
+        target = target or {}
+        data: Dict[str, Any] = {"mac": (target.get("mac") or "").lower()}
+        open_ports = target.get("open_ports")
+        if open_ports is None and scanner != "ports" and snapshot is not None:
+            cached = snapshot.get((host, "ports"))
+            if cached is not None:
+                open_ports = cached[2].get("details", {}).get("open_ports")
+        if open_ports is not None and scanner != "ports":
+            data["open_ports"] = sorted(open_ports)
+        return _digest(data)
+
+    def lookup(
+        self,
+        snapshot: Snapshot,
+        host: Optional[str],
+        scanner: str,
+        fingerprint: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached result if it is fresh and the fingerprint matches."""
+        entry = snapshot.get((host or NETWORK_HOST, scanner))
+        if entry is None:
+            return None
+        cached_fp, scanned_at, result = entry
+        if cached_fp != fingerprint:
+            return None
+        if self._clock() - scanned_at >= self.ttl(scanner):
+            return None
+        return result
+
+    def store_many(
+        self,
+        entries: Iterable[Tuple[Optional[str], str, str, Dict[str, Any]]],
+    ) -> None:
+        """Persist ``(host, scanner, fingerprint, result)`` tuples in one transaction.
+
+        Results carrying ``details["error"]`` are not cached so that failed
+        scans are retried on the next run.
+        """
+        now = self._clock()
+        rows: List[Tuple[str, str, str, float, str]] = []
+        for host, scanner, fp, result in entries:
+            details = result.get("details")
+            if isinstance(details, dict) and "error" in details:
+                continue
+            rows.append((host or NETWORK_HOST, scanner, fp, now, json.dumps(result)))
+        if not rows:
+            return
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO scan_cache "
+                "(host, scanner, fingerprint, scanned_at, result) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+
+    def invalidate(
+        self, host: Optional[str] = None, scanner: Optional[str] = None
+    ) -> None:
+        """Drop cached entries for ``host`` and/or ``scanner`` (all when omitted)."""
+        query = "DELETE FROM scan_cache WHERE 1=1"
+        params: List[Any] = []
+        if host is not None:
+            query += " AND host = ?"
+            params.append(host)
+        if scanner is not None:
+            query += " AND scanner = ?"
+            params.append(scanner)
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            conn.execute(query, params)
+            conn.commit()
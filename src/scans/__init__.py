@@ -1,86 +1,144 @@
 # src/scans/__init__.py
 
-# 他の公開モジュール（必要なものだけ残してOK）
-from typing import Any
-
-from . import ports, os_banner, upnp, arp_spoof, dhcp, dns, ssl_cert  # noqa: F401
-
-smb_netbios: Any
-
-# smb_netbios は impacket が無い環境でも落ちないようにガード
-try:
-    from . import smb_netbios as _smb_netbios  # type: ignore
-
-    smb_netbios = _smb_netbios  # noqa: F401
-except Exception:
-    import types
-    import subprocess as _subprocess
-
-    class _SmbNetbiosStub(types.SimpleNamespace):
-        def __init__(self):
-            # テストが monkeypatch する属性を用意
-            super().__init__(
-                NetBIOS=None,  # monkeypatch で関数/クラスが入る
-                SMBConnection=None,  # 同上
-                subprocess=_subprocess,  # check_output を差し替えられるように
-                _nmblookup_names=self._nmblookup_names,
+# スキャナモジュールは scapy / nmap / impacket など重い依存を持つため、
+# パッケージ import 時には読み込まず、属性アクセス時に遅延 import する。
+from __future__ import annotations
+
+import importlib
+import importlib.util
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+
+@dataclass(frozen=True)
+class ScannerInfo:
+    """Static metadata describing a scanner module.
+
+    The registry is consulted *before* importing a scanner so that modules
+    whose dependencies are missing can be skipped without paying their import
+    cost.
+    """
+
+    name: str
+    scope: str = "network"  # "host": 対象ホストごとに実行 / "network": 1 回のみ
+    requires: Tuple[str, ...] = ()  # 必須の Python モジュール名
+    privileged: bool = False  # raw socket 等で root 権限が必要か
+
+    def missing_requirements(self) -> Tuple[str, ...]:
+        """Return required modules that cannot be found (without importing)."""
+        return tuple(
+            dep for dep in self.requires if importlib.util.find_spec(dep) is None
+        )
+
+
+SCANNERS: Dict[str, ScannerInfo] = {
+    info.name: info
+    for info in (
+        ScannerInfo("ports", scope="host"),
+        ScannerInfo("os_banner", scope="host", requires=("nmap",), privileged=True),
+        # impacket が無くても nmblookup にフォールバックする
+        ScannerInfo("smb_netbios", scope="host"),
+        ScannerInfo("ssl_cert", scope="host", requires=("cryptography",)),
+        ScannerInfo("upnp"),
+        ScannerInfo("arp_spoof", requires=("scapy",), privileged=True),
+        # DHCP クライアントポート 68 への bind に root 権限が必要
+        ScannerInfo("dhcp", privileged=True),
+        ScannerInfo("dns"),
+    )
+}
+
+
+def scanner_info(name: str) -> ScannerInfo:
+    """Return registry metadata for *name* (defaults for unknown modules)."""
+    return SCANNERS.get(name) or ScannerInfo(name)
+
+
+def __getattr__(name: str) -> Any:
+    """Import scanner submodules on first access (PEP 562)."""
+    if name.startswith("__"):
+        raise AttributeError(name)
+    if name == "smb_netbios":
+        module = _load_smb_netbios()
+    else:
+        try:
+            module = importlib.import_module(f"{__name__}.{name}")
+        except ModuleNotFoundError as exc:
+            if exc.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = module
+    return module
+
+
+def _load_smb_netbios() -> Any:
+    # smb_netbios は impacket が無い環境でも落ちないようにガード
+    try:
+        return importlib.import_module(f"{__name__}.smb_netbios")
+    except Exception:
+        return _SmbNetbiosStub()  # fallback stub instance
+
+
+class _SmbNetbiosStub:
+    """smb_netbios を import できない環境向けの最低限の代替実装"""
+
+    def __init__(self):
+        import subprocess as _subprocess
+
+        # テストが monkeypatch する属性を用意
+        self.NetBIOS = None  # monkeypatch で関数/クラスが入る
+        self.SMBConnection = None  # 同上
+        self.subprocess = _subprocess  # check_output を差し替えられるように
+
+    def _nmblookup_names(self, target: str, timeout: int = 2):
+        """nmblookup の出力から名前一覧を抽出"""
+        try:
+            out = self.subprocess.check_output(
+                ["nmblookup", "-A", target], text=True, timeout=timeout
             )
+        except Exception:
+            return []
+        names: list[str] = []
+        for line in out.splitlines():
+            t = line.strip()
+            if "<" in t and ">" in t and not t.lower().startswith("looking up status"):
+                names.append(t.split("<", 1)[0].strip())
+        return names
+
+    def scan(self, target: str, timeout: int = 2):
+        """
+        最低限のスタブ実装:
+          1) NetBIOS() → queryIPForName で名前を取る
+             （失敗したら nmblookup にフォールバック）
+          2) SMBConnection は呼べても呼べなくても OK（結果の score には影響させない）
+          3) 常に score=0 を返し、details に netbios_names を入れる
+        """
+        names: list[str] = []
+        # 1) NetBIOS で取得を試す
+        try:
+            if self.NetBIOS is not None:
+                nb = self.NetBIOS()  # monkeypatch 済み想定
+                names = nb.queryIPForName(target, timeout=timeout) or []
+            else:
+                raise RuntimeError("NetBIOS not available")
+        except Exception:
+            # 失敗したら nmblookup へ
+            names = self._nmblookup_names(target, timeout)
+
+        # 2) SMBConnection は存在しても例外でも無視（テストは score=0 を期待）
+        try:
+            if self.SMBConnection is not None:
+                conn = self.SMBConnection(target, target)  # ダミー呼び出し
+                _ = getattr(conn, "getDialect", lambda: None)()
+                try:
+                    getattr(conn, "logoff", lambda: None)()
+                except Exception:
+                    pass
+        except Exception:
+            pass
 
-        def _nmblookup_names(self, target: str, timeout: int = 2):
-            """nmblookup の出力から名前一覧を抽出"""
-            try:
-                out = self.subprocess.check_output(
-                    ["nmblookup", "-A", target], text=True, timeout=timeout
-                )
-            except Exception:
-                return []
-            names: list[str] = []
-            for line in out.splitlines():
-                t = line.strip()
-                if (
-                    "<" in t
-                    and ">" in t
-                    and not t.lower().startswith("looking up status")
-                ):
-                    names.append(t.split("<", 1)[0].strip())
-            return names
-
-        def scan(self, target: str, timeout: int = 2):
-            """
-            最低限のスタブ実装:
-              1) NetBIOS() → queryIPForName で名前を取る（失敗したら nmblookup にフォールバック）
-              2) SMBConnection は呼べても呼べなくても OK（結果の score には影響させない）
-              3) 常に score=0 を返し、details に netbios_names を入れる
-            """
-            names: list[str] = []
-            # 1) NetBIOS で取得を試す
-            try:
-                if self.NetBIOS is not None:
-                    nb = self.NetBIOS()  # monkeypatch 済み想定
-                    names = nb.queryIPForName(target, timeout=timeout) or []
-                else:
-                    raise RuntimeError("NetBIOS not available")
-            except Exception:
-                # 失敗したら nmblookup へ
-                names = self._nmblookup_names(target, timeout)
-
-            # 2) SMBConnection は存在しても例外でも無視（テストは score=0 を期待）
-            try:
-                if self.SMBConnection is not None:
-                    conn = self.SMBConnection(target, target)  # ダミー呼び出し
-                    _ = getattr(conn, "getDialect", lambda: None)()
-                    try:
-                        getattr(conn, "logoff", lambda: None)()
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-
-            # 3) 期待形で返す
-            return {
-                "category": "smb_netbios",
-                "score": 0,
-                "details": {"netbios_names": names},
-            }
-
-    smb_netbios = _SmbNetbiosStub()  # type: ignore[assignment]  # fallback stub instance
+        # 3) 期待形で返す
+        return {
+            "category": "smb_netbios",
+            "score": 0,
+            "details": {"netbios_names": names},
+        }
@@ -0,0 +1,80 @@
+"""Passive response collector shared by broadcast/multicast probes.
+
+DHCP discover and SSDP M-SEARCH are answered by an unknown number of hosts.
+Instead of keeping only the first answer (``sr1``) or always waiting for a
+fixed timeout (``srp``), :func:`collect` sends the probe once and gathers
+replies until no new reply arrived for ``quiet`` seconds or the overall
+``deadline`` passes.
+"""
+
+from __future__ import annotations
+
+import select
+import socket
+import time
+from typing import Callable, List, Optional, Tuple
+
+Address = Tuple[str, int]
+Reply = Tuple[bytes, Address]
+
+
+def collect(
+    probe: bytes,
+    address: Address,
+    *,
+    bind: Address = ("", 0),
+    broadcast: bool = False,
+    quiet: float = 1.0,
+    deadline: float = 3.0,
+    accept: Optional[Callable[[bytes, Address], bool]] = None,
+    bufsize: int = 65535,
+) -> List[Reply]:
+    """Send *probe* to *address* over UDP and return every reply received.
+
+    Parameters
+    ----------
+    bind:
+        Local address for the UDP socket, e.g. ``("", 68)`` for DHCP.
+    broadcast:
+        Enable ``SO_BROADCAST`` for limited-broadcast destinations.
+    quiet:
+        Stop once no accepted reply arrived for this many seconds.  The timer
+        starts when the probe is sent and restarts on every accepted reply.
+    deadline:
+        Hard limit in seconds for the whole collection.
+    accept:
+        Optional filter; rejected datagrams are ignored and do not restart
+        the quiet timer.
+
+    Returns
+    -------
+    list
+        ``(payload, (ip, port))`` tuples in arrival order.
+    """
+
+    replies: List[Reply] = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if broadcast:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind(bind)
+        sock.sendto(probe, address)
+        start = time.monotonic()
+        hard_stop = start + deadline
+        quiet_until = start + quiet
+        while True:
+            wait_for = min(hard_stop, quiet_until) - time.monotonic()
+            if wait_for <= 0:
+                break
+            readable, _, _ = select.select([sock], [], [], wait_for)
+            if not readable:
+                continue
+            try:
+                data, addr = sock.recvfrom(bufsize)
+            except OSError:
+                continue
+            if accept is not None and not accept(data, addr):
+                continue
+            replies.append((data, (addr[0], addr[1])))
+            quiet_until = time.monotonic() + quiet
+    return replies
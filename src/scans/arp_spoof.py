@@ -6,18 +6,56 @@ from __future__ import annotations
 import re
 import subprocess
 import time
-from typing import Dict
+from typing import Dict, Iterable, Optional, Tuple
 
 from scapy.all import ARP, send  # type: ignore
 
-
 # デフォルトで注入するダミーのIPとMAC
 FAKE_IP = "1.2.3.4"
 FAKE_MAC = "de:ad:be:ef:00:01"
 
+# カーネルの近隣テーブル (IPv4)
+PROC_ARP = "/proc/net/arp"
+# 近隣テーブルを確認する間隔（秒）
+POLL_INTERVAL = 0.05
+
+_ATF_COM = 0x2  # 解決済みエントリ
+
+
+def _read_proc_arp(path: str = PROC_ARP) -> Dict[str, str]:
+    """Read the kernel ARP table without spawning a process.
+
+    Raises ``OSError`` when the file does not exist (non-Linux systems).
+    """
+
+    table: Dict[str, str] = {}
+    with open(path, encoding="ascii", errors="replace") as fh:
+        next(fh, None)  # ヘッダ行
+        for line in fh:
+            fields = line.split()
+            if len(fields) < 4:
+                continue
+            ip, _, flags, mac = fields[:4]
+            try:
+                complete = int(flags, 16) & _ATF_COM
+            except ValueError:
+                continue
+            if complete and mac != "00:00:00:00:00:00":
+                table[ip] = mac.lower()
+    return table
+
 
 def _get_arp_table() -> Dict[str, str]:
-    """Parse system ARP table into an ``ip -> mac`` mapping."""
+    """Return the system ARP table as an ``ip -> mac`` mapping.
+
+    ``/proc/net/arp`` is used when available; other systems fall back to
+    parsing ``arp -an``.
+    """
+
+    try:
+        return _read_proc_arp(PROC_ARP)
+    except OSError:
+        pass
 
     try:
         output = subprocess.check_output(["arp", "-an"], text=True)
@@ -36,8 +74,15 @@ def scan(
     wait: float = 1.0,
     fake_ip: str = FAKE_IP,
     fake_mac: str = FAKE_MAC,
+    pairs: Optional[Iterable[Tuple[str, str]]] = None,
 ) -> dict:
-    """Inject a spoofed ARP reply and watch for table changes.
+    """Inject spoofed ARP replies and watch for table changes.
+
+    The neighbour table is polled every :data:`POLL_INTERVAL` seconds until
+    every spoofed entry has shown up, or for ``wait`` seconds at the latest.
+    ``pairs`` tests several fake ``(ip, mac)`` pairs at once (instead of
+    ``fake_ip``/``fake_mac``) and adds a per-pair ``pairs`` list to the
+    details; an empty ``pairs`` sends nothing and reports no poisoning.
 
     Returns
     -------
@@ -48,29 +93,52 @@ def scan(
 
     category = "arp_spoof"
     details: Dict[str, object] = {}
+    targets = list(pairs) if pairs is not None else [(fake_ip, fake_mac)]
+    poisoned = [False] * len(targets)
 
     try:
-        before = _get_arp_table()
-
-        pkt = ARP(
-            op=2,  # is-at
-            psrc=fake_ip,
-            hwsrc=fake_mac,
-            pdst=fake_ip,
-            hwdst="ff:ff:ff:ff:ff:ff",
-        )
-        send(pkt, verbose=False)
-        time.sleep(wait)
-
-        after = _get_arp_table()
-
-        changed = before.get(fake_ip) != fake_mac and after.get(fake_ip) == fake_mac
+        if targets:
+            before = _get_arp_table()
+
+            packets = [
+                ARP(
+                    op=2,  # is-at
+                    psrc=ip,
+                    hwsrc=mac,
+                    pdst=ip,
+                    hwdst="ff:ff:ff:ff:ff:ff",
+                )
+                for ip, mac in targets
+            ]
+            send(packets if len(packets) > 1 else packets[0], verbose=False)
+
+            # すべての偽エントリが現れるか期限が来るまで短い間隔で確認する。
+            # 一度現れたペアは以後の確認で消えていても汚染ありとして扱う
+            deadline = time.monotonic() + wait
+            while True:
+                after = _get_arp_table()
+                for i, (ip, mac) in enumerate(targets):
+                    poisoned[i] = poisoned[i] or (
+                        before.get(ip) != mac.lower()
+                        and after.get(ip, "").lower() == mac.lower()
+                    )
+                remaining = deadline - time.monotonic()
+                if all(poisoned) or remaining <= 0:
+                    break
+                time.sleep(min(POLL_INTERVAL, remaining))
+
+        changed = any(poisoned)
         explanation = (
             "ARP table updated with spoofed entry"
             if changed
             else "No ARP poisoning detected"
         )
         details.update({"vulnerable": changed, "explanation": explanation})
+        if pairs is not None:
+            details["pairs"] = [
+                {"ip": ip, "mac": mac, "poisoned": hit}
+                for (ip, mac), hit in zip(targets, poisoned)
+            ]
         score = 5 if changed else 0
         return {"category": category, "score": score, "details": details}
 
@@ -1,20 +1,90 @@
-"""Static scan for rogue DHCP servers using scapy.
+"""Static scan for rogue DHCP servers.
 
 This scan broadcasts a DHCP *discover* packet and counts how many
 servers answer. The IP address of each responding server is recorded and
 a warning is emitted when multiple servers respond, which may indicate a
-configuration conflict in the network.
+configuration conflict in the network.  Offers are gathered with the shared
+passive collector, so the scan returns shortly after the last server answers
+instead of always waiting for the full timeout.
 """
 
 # 不正DHCPサーバーの有無を調べる
-from scapy.all import (  # type: ignore
-    Ether,
-    IP,
-    UDP,
-    BOOTP,
-    DHCP,
-    srp,
-)
+from __future__ import annotations
+
+import os
+import socket
+import struct
+import uuid
+from typing import Optional
+
+from ._collector import Address, collect
+
+DHCP_SERVER_PORT = 67
+DHCP_CLIENT_PORT = 68
+# 最後の応答からこの秒数だけ新しい応答が無ければ打ち切る
+QUIET_PERIOD = 1.0
+
+_MAGIC_COOKIE = b"\x63\x82\x53\x63"
+_OPT_MESSAGE_TYPE = 53
+_OPT_SERVER_ID = 54
+_OPT_END = 255
+_DHCPDISCOVER = 1
+_DHCPOFFER = 2
+
+
+def build_discover(xid: int, mac: bytes) -> bytes:
+    """Return a broadcast DHCPDISCOVER for transaction *xid*."""
+
+    header = struct.pack(
+        "!BBBBIHH4s4s4s4s16s64s128s",
+        1,  # op: BOOTREQUEST
+        1,  # htype: Ethernet
+        6,  # hlen
+        0,  # hops
+        xid,
+        0,  # secs
+        0x8000,  # flags: 応答をブロードキャストで返してもらう
+        b"\x00" * 4,
+        b"\x00" * 4,
+        b"\x00" * 4,
+        b"\x00" * 4,
+        mac.ljust(16, b"\x00"),
+        b"",
+        b"",
+    )
+    options = bytes(
+        [_OPT_MESSAGE_TYPE, 1, _DHCPDISCOVER, 55, 3, 1, 3, 6, _OPT_END]  # 55: 要求項目
+    )
+    return header + _MAGIC_COOKIE + options
+
+
+def parse_offer(data: bytes, xid: int, source: Address) -> Optional[str]:
+    """Return the offering server's address if *data* is an offer for *xid*."""
+
+    if len(data) < 240 or data[0] != 2 or data[236:240] != _MAGIC_COOKIE:
+        return None
+    if struct.unpack("!I", data[4:8])[0] != xid:
+        return None
+    message_type = None
+    server_id = None
+    i = 240
+    while i < len(data) and data[i] != _OPT_END:
+        code = data[i]
+        if code == 0:  # pad
+            i += 1
+            continue
+        if i + 1 >= len(data):
+            break
+        length = data[i + 1]
+        value = data[i + 2 : i + 2 + length]
+        if code == _OPT_MESSAGE_TYPE and value:
+            message_type = value[0]
+        elif code == _OPT_SERVER_ID and len(value) == 4:
+            server_id = socket.inet_ntoa(value)
+        i += 2 + length
+    if message_type != _DHCPOFFER:
+        return None
+    return server_id or source[0]
 
 
 def scan(timeout: int = 2) -> dict:
@@ -25,17 +95,21 @@ def scan(timeout: int = 2) -> dict:
         servers = set()
         warnings = []
 
-        discover = (
-            Ether(dst="ff:ff:ff:ff:ff:ff")
-            / IP(src="0.0.0.0", dst="255.255.255.255")
-            / UDP(sport=68, dport=67)
-            / BOOTP(chaddr=b"\x00" * 6)
-            / DHCP(options=[("message-type", "discover"), "end"])
+        xid = int.from_bytes(os.urandom(4), "big")
+        mac = uuid.getnode().to_bytes(6, "big")
+        replies = collect(
+            build_discover(xid, mac),
+            ("255.255.255.255", DHCP_SERVER_PORT),
+            bind=("", DHCP_CLIENT_PORT),
+            broadcast=True,
+            quiet=QUIET_PERIOD,
+            deadline=timeout,
+            accept=lambda data, addr: parse_offer(data, xid, addr) is not None,
         )
-        ans, _ = srp(discover, timeout=timeout, verbose=False)
-        for _, pkt in ans:
-            if DHCP in pkt:
-                servers.add(pkt[IP].src)
+        for data, addr in replies:
+            server = parse_offer(data, xid, addr)
+            if server:
+                servers.add(server)
 
         server_list = sorted(servers)
         if len(server_list) > 1:
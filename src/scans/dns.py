@@ -1,13 +1,17 @@
 """DNS設定の静的スキャン。
 
 現在のDNSサーバーにクエリを実行し、外部サーバーの利用や
-DNSSECが無効な場合に警告を返す。"""
+DNSSECが無効な場合に警告を返す。設定された全サーバーに対して
+非同期 UDP クライアントで並行に問い合わせ、AD フラグ・応答時間の
+パーセンタイル・タイムアウト率をサーバーごとに記録する。"""
 
 # DNSサーバーの設定を検証し外部利用やDNSSEC無効を警告
+import asyncio
+import os
+import struct
+import time
 from ipaddress import ip_address, ip_network
-from typing import Any, List
-
-from scapy.all import IP, UDP, DNS, DNSQR, sr1  # type: ignore
+from typing import Any, Dict, List, Optional, Tuple
 
 # プライベートアドレス空間
 _PRIVATE_NETS = [
@@ -33,6 +37,162 @@ def _get_nameservers(path: str = "/etc/resolv.conf") -> List[str]:
     return servers or ["8.8.8.8"]
 
 
+DNS_PORT = 53
+# サーバーごとの問い合わせ回数（パーセンタイル計算用）
+DEFAULT_QUERIES = 5
+PROBE_QNAME = "example.com"
+
+_FLAG_QR = 0x8000
+_FLAG_RD = 0x0100
+_FLAG_AD = 0x0020
+_TYPE_A = 1
+_TYPE_OPT = 41
+
+
+def build_query(
+    transaction_id: int, qname: str, qtype: int = _TYPE_A, dnssec: bool = True
+) -> bytes:
+    """Return a recursive DNS query, optionally asking for DNSSEC (AD + DO)."""
+
+    flags = _FLAG_RD | (_FLAG_AD if dnssec else 0)
+    header = struct.pack(
+        "!HHHHHH", transaction_id & 0xFFFF, flags, 1, 0, 0, 1 if dnssec else 0
+    )
+    question = b"".join(
+        bytes([len(label)]) + label.encode("idna")
+        for label in qname.rstrip(".").split(".")
+        if label
+    )
+    body = header + question + b"\x00" + struct.pack("!HH", qtype, 1)
+    if dnssec:
+        # EDNS0 OPT: UDP 4096 バイト、DO ビット
+        body += b"\x00" + struct.pack("!HHIH", _TYPE_OPT, 4096, 0x8000, 0)
+    return body
+
+
+def parse_header(data: bytes) -> Optional[Tuple[int, int]]:
+    """Return ``(transaction_id, flags)`` of a DNS response, or ``None``."""
+
+    if len(data) < 12:
+        return None
+    transaction_id, flags = struct.unpack("!HH", data[:4])
+    if not flags & _FLAG_QR:
+        return None
+    return transaction_id, flags
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class _ResolverProtocol(asyncio.DatagramProtocol):
+    """Route responses on a connected UDP socket to waiting queries."""
+
+    def __init__(self) -> None:
+        self.pending: Dict[int, asyncio.Future] = {}
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        parsed = parse_header(data)
+        if parsed is None:
+            return
+        future = self.pending.pop(parsed[0], None)
+        if future is not None and not future.done():
+            future.set_result((time.monotonic(), parsed[1]))
+
+    def error_received(self, exc: Exception) -> None:
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending.clear()
+
+
+async def probe_resolver(
+    server: str,
+    *,
+    queries: int = DEFAULT_QUERIES,
+    timeout: float = 2.0,
+    qname: str = PROBE_QNAME,
+    port: int = DNS_PORT,
+) -> Dict[str, Any]:
+    """Send ``queries`` DNSSEC-enabled queries to *server* concurrently.
+
+    Returns the AD flag seen in any answer, latency percentiles (ms) and the
+    share of queries that timed out.
+    """
+
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _ResolverProtocol, remote_addr=(server, port)
+    )
+    latencies: List[float] = []
+    timeouts = 0
+    errors = 0
+    ad = False
+    try:
+        base = int.from_bytes(os.urandom(2), "big")
+        sent: List[Tuple[float, asyncio.Future]] = []
+        for i in range(queries):
+            txid = (base + i) & 0xFFFF
+            future = loop.create_future()
+            protocol.pending[txid] = future
+            sent.append((time.monotonic(), future))
+            transport.sendto(build_query(txid, qname))
+        for started, future in sent:
+            remaining = started + timeout - time.monotonic()
+            try:
+                received, flags = await asyncio.wait_for(future, max(0.0, remaining))
+            except asyncio.TimeoutError:
+                timeouts += 1
+                continue
+            except OSError:
+                errors += 1
+                continue
+            latencies.append((received - started) * 1000)
+            ad = ad or bool(flags & _FLAG_AD)
+    finally:
+        transport.close()
+
+    def rounded(value: Optional[float]) -> Optional[float]:
+        return round(value, 1) if value is not None else None
+
+    return {
+        "queries": queries,
+        "answered": len(latencies),
+        "timeout_rate": round(timeouts / queries, 2) if queries else 0.0,
+        "error_rate": round(errors / queries, 2) if queries else 0.0,
+        "ad": ad,
+        "latency_ms": {
+            "p50": rounded(_percentile(latencies, 50)),
+            "p90": rounded(_percentile(latencies, 90)),
+            "p99": rounded(_percentile(latencies, 99)),
+        },
+    }
+
+
+async def probe_resolvers(
+    servers: List[str], *, queries: int = DEFAULT_QUERIES, timeout: float = 2.0
+) -> Dict[str, Dict[str, Any]]:
+    """Probe all *servers* concurrently; total time is bounded by ``timeout``."""
+
+    results = await asyncio.gather(
+        *(probe_resolver(s, queries=queries, timeout=timeout) for s in servers),
+        return_exceptions=True,
+    )
+    stats: Dict[str, Dict[str, Any]] = {}
+    for server, result in zip(servers, results):
+        if isinstance(result, BaseException):
+            stats[server] = {"queries": queries, "answered": 0, "error": str(result)}
+        else:
+            stats[server] = result
+    return stats
+
+
 def _is_private(ip: str) -> bool:
     try:
         addr = ip_address(ip)
@@ -41,7 +201,7 @@ def _is_private(ip: str) -> bool:
         return False
 
 
-def scan() -> dict:
+def scan(queries: int = DEFAULT_QUERIES, timeout: float = 2.0) -> dict:
     category = "dns"
     servers = _get_nameservers()
 
@@ -69,18 +229,25 @@ def scan() -> dict:
             details["warnings"].append("Invalid DNS server IP: " + ", ".join(invalid))
             details["invalid_servers"] = invalid
 
-        # DNSSECチェック（有効な最初のIPで）
+        # 有効な全サーバーへ並行に問い合わせ、DNSSEC と応答性能を調べる
         dnssec_enabled = None
         valid = [ip for ip in servers if ip not in invalid]
         if valid:
-            pkt = (
-                IP(dst=valid[0])
-                / UDP(dport=53)
-                / DNS(rd=1, qd=DNSQR(qname="example.com"), ad=1)
+            resolvers = asyncio.run(
+                probe_resolvers(valid, queries=queries, timeout=timeout)
             )
-            resp = sr1(pkt, timeout=2, verbose=False)
-            if resp and resp.haslayer(DNS):
-                dnssec_enabled = bool(getattr(resp[DNS], "ad", 0))
+            details["resolvers"] = resolvers
+            # 応答したサーバーがすべて検証している場合だけ DNSSEC 有効とみなす
+            answered = {ip: s for ip, s in resolvers.items() if s.get("answered")}
+            if answered:
+                dnssec_enabled = all(s.get("ad") for s in answered.values())
+                unvalidated = [ip for ip, s in answered.items() if not s.get("ad")]
+                if unvalidated:
+                    details["dnssec_disabled_servers"] = unvalidated
+            # 応答しないサーバーは記録のみ。score は従来どおり警告数
+            silent = [ip for ip in resolvers if ip not in answered]
+            if silent:
+                details["unresponsive_servers"] = silent
         details["dnssec_enabled"] = bool(dnssec_enabled)
         if dnssec_enabled is False:
             details["warnings"].append("DNSSEC is disabled")
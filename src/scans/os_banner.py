@@ -1,8 +1,46 @@
 """Static scan for OS and service banners using nmap."""
 
 # OSやサービスのバナー情報からバージョン漏洩を調べる
+import ipaddress
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional
+
 import nmap
 
+NMAP_ARGUMENTS = "-O -sV --top-ports 10"
+# バッチ実行時に 1 グループとして並列に調べるホスト数。
+# 大きいほど並列度が上がり、小さいほど結果が早く届く。
+DEFAULT_HOSTGROUP = 16
+
+
+def _result(target: str, tcp_info: Mapping, os_name: str) -> dict:
+    """Build the scan result from per-port service info and the OS guess.
+
+    score = len(banners) + (1 if os_name else 0).
+    """
+
+    banners: Dict[int, str] = {}
+    for port, data in tcp_info.items():
+        banner = " ".join(filter(None, [data.get("name"), data.get("version")])).strip()
+        if banner:
+            banners[int(port)] = banner
+    score = len(banners) + (1 if os_name else 0)
+    return {
+        "category": "os_banner",
+        "score": score,
+        "details": {"target": target, "os": os_name, "banners": banners},
+    }
+
+
+def _error(target: str, message: str) -> dict:
+    return {
+        "category": "os_banner",
+        "score": 0,
+        "details": {"target": target, "os": "", "banners": {}, "error": message},
+    }
+
 
 def scan(target: str = "127.0.0.1") -> dict:
     """Attempt to grab OS and service banners from *target*.
@@ -11,35 +49,143 @@ def scan(target: str = "127.0.0.1") -> dict:
     score = len(banners) + (1 if os_name else 0).
     """
 
-    category = "os_banner"
-    details: dict = {"target": target}
-
     try:
         scanner = nmap.PortScanner()
-        banners: dict[int, str] = {}
-        os_name = ""
-
-        result = scanner.scan(target, arguments="-O -sV --top-ports 10")
-        host_info = result.get("scan", {}).get(target, {})
-
-        # サービスバナー取得
-        tcp_info = host_info.get("tcp", {})
-        for port, data in tcp_info.items():
-            banner = " ".join(
-                filter(None, [data.get("name"), data.get("version")])
-            ).strip()
-            if banner:
-                banners[int(port)] = banner
+        result = scanner.scan(target, arguments=NMAP_ARGUMENTS)
+        hosts = result.get("scan", {})
+        # ホスト名で指定した場合、結果は解決後のアドレスをキーに返る
+        host_info = hosts.get(target) or (
+            next(iter(hosts.values())) if len(hosts) == 1 else {}
+        )
 
         # OS情報取得
         os_match = host_info.get("osmatch", [])
-        if os_match:
-            os_name = os_match[0].get("name", "")
-
-        score = len(banners) + (1 if os_name else 0)
-        details.update({"os": os_name, "banners": banners})
-        return {"category": category, "score": score, "details": details}
+        os_name = os_match[0].get("name", "") if os_match else ""
+        return _result(target, host_info.get("tcp", {}), os_name)
 
     except Exception as exc:
-        details.update({"os": "", "banners": {}, "error": str(exc)})
-        return {"category": category, "score": 0, "details": details}
+        return _error(target, str(exc))
+
+
+def _key(target: str) -> str:
+    """Normalise an address or host name for matching nmap's output."""
+
+    try:
+        return str(ipaddress.ip_address(target))
+    except ValueError:
+        return target.lower().rstrip(".")
+
+
+def _parse_host(elem: ET.Element) -> tuple:
+    """Extract ``(names, tcp_info, os_name)`` from an nmap ``<host>`` element.
+
+    ``names`` lists the scanned address followed by the host names nmap
+    reports, the one given on the command line (``type="user"``) first.
+    """
+
+    names: List[str] = []
+    for addr in elem.findall("address"):
+        if addr.get("addrtype") in ("ipv4", "ipv6"):
+            names.append(addr.get("addr", ""))
+            break
+    hostnames = elem.findall("hostnames/hostname")
+    hostnames.sort(key=lambda h: h.get("type") != "user")
+    names.extend(h.get("name", "") for h in hostnames)
+    tcp_info: Dict[str, Dict[str, str]] = {}
+    for port in elem.findall("ports/port"):
+        if port.get("protocol") != "tcp":
+            continue
+        service = port.find("service")
+        attrs = service.attrib if service is not None else {}
+        tcp_info[port.get("portid", "0")] = {
+            "name": attrs.get("name", ""),
+            "version": attrs.get("version", ""),
+        }
+    osmatch = elem.find("os/osmatch")
+    os_name = osmatch.get("name", "") if osmatch is not None else ""
+    return names, tcp_info, os_name
+
+
+def _match(names: List[str], remaining: Mapping[str, str]) -> Optional[str]:
+    """Return the key of the pending target one of *names* refers to."""
+
+    for name in names:
+        key = _key(name)
+        if key in remaining:
+            return key
+    return None
+
+
+def scan_many(
+    targets: Iterable[str],
+    *,
+    hostgroup: int = DEFAULT_HOSTGROUP,
+    arguments: str = NMAP_ARGUMENTS,
+) -> Iterator[dict]:
+    """Scan all *targets* with a single nmap process, yielding per-host results.
+
+    nmap's XML output (``-oX -``) is parsed incrementally so each host's
+    result is yielded as soon as nmap finishes its host group, instead of
+    after the whole batch.  Results have the same shape as :func:`scan`.
+    Results are matched back to *targets* through the scanned address or the
+    host name nmap echoes, so host name targets keep their original spelling.
+    Targets nmap never reports (e.g. down hosts) are yielded last with empty
+    findings; if nmap cannot be run every target gets an ``error`` entry.
+    """
+
+    hosts = list(dict.fromkeys(targets))
+    if not hosts:
+        return
+    cmd = [
+        "nmap",
+        *arguments.split(),
+        "-T4",
+        "--min-hostgroup",
+        str(max(1, min(hostgroup, len(hosts)))),
+        "-oX",
+        "-",
+        *hosts,
+    ]
+    # stderr はファイルに逃がし、stdout を読む間にパイプが詰まらないようにする
+    with tempfile.TemporaryFile(mode="w+") as errors:
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=errors,
+                text=True,
+            )
+        except OSError as exc:
+            for host in hosts:
+                yield _error(host, str(exc))
+            return
+
+        remaining = {_key(host): host for host in hosts}
+        parser = ET.XMLPullParser(events=("end",))  # type: ignore[var-annotated]
+        try:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                parser.feed(line)
+                for _, elem in parser.read_events():  # type: ignore[misc]
+                    if not isinstance(elem, ET.Element) or elem.tag != "host":
+                        continue
+                    names, tcp_info, os_name = _parse_host(elem)
+                    elem.clear()
+                    key = _match(names, remaining)
+                    if key is not None:
+                        yield _result(remaining.pop(key), tcp_info, os_name)
+            returncode = proc.wait()
+        finally:
+            # 途中で打ち切られた場合も nmap を残さない
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+        if returncode != 0:
+            errors.seek(0)
+            message = errors.read().strip() or f"nmap exited with code {returncode}"
+            for host in remaining.values():
+                yield _error(host, message)
+            return
+    for host in remaining.values():
+        yield _result(host, {}, "")
@@ -1,14 +1,19 @@
 """Probe SMB/NetBIOS services using impacket.
 
 This scan tries a NetBIOS name query and negotiates an SMB connection to
-determine whether SMBv1 is enabled on the target host.
+determine whether SMBv1 is enabled on the target host.  :func:`sweep`
+does the same for many hosts at once with raw NBSTAT datagrams over a
+single UDP socket and concurrent SMB1 negotiate probes over TCP.
 """
 
 # SMBv1の有効化やNetBIOS名の公開状況を確認する
 from __future__ import annotations
 
+import asyncio
+import ipaddress
+import struct
 import subprocess
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 # Import as module-level names so tests can monkeypatch smb_netbios.NetBIOS / SMBConnection
 try:
@@ -97,3 +102,234 @@ def scan(target: str) -> Dict[str, Any]:
     except Exception as e:
         details["error"] = str(e)
         return {"category": category, "score": 0, "details": details}
+
+
+# --- batched engine ---------------------------------------------------------
+
+NBSTAT_PORT = 137
+SMB_PORT = 445
+DEFAULT_SWEEP_CONCURRENCY = 64
+
+# ワイルドカード名 "*" を NetBIOS の first-level encoding にしたもの
+_NBSTAT_NAME = b"\x20" + b"CK" + b"A" * 30 + b"\x00"
+_NBSTAT_TYPE = 0x21
+
+# SMB1 の NEGOTIATE 要求。方言は "NT LM 0.12" のみを提示し、
+# サーバが SMB1 を受け付けるかどうかだけを判定する。
+_SMB1_NEGOTIATE = (
+    b"\xffSMB"
+    + b"\x72"  # SMB_COM_NEGOTIATE
+    + b"\x00" * 4  # status
+    + b"\x18"  # flags
+    + struct.pack("<H", 0xC853)  # flags2
+    + b"\x00" * 12  # pid high, signature, reserved
+    + b"\x00\x00"  # tid
+    + struct.pack("<H", 0xFEFF)  # pid
+    + b"\x00\x00"  # uid
+    + b"\x00\x00"  # mid
+    + b"\x00"  # word count
+    + struct.pack("<H", 12)  # byte count
+    + b"\x02NT LM 0.12\x00"
+)
+_SMB1_REQUEST = b"\x00" + len(_SMB1_NEGOTIATE).to_bytes(3, "big") + _SMB1_NEGOTIATE
+
+
+def _expand_targets(targets: Iterable[str] | str) -> List[str]:
+    """Expand CIDR strings into host addresses, keeping order and uniqueness."""
+
+    if isinstance(targets, str):
+        targets = [targets]
+    hosts: Dict[str, None] = {}
+    for target in targets:
+        if "/" in target:
+            network = ipaddress.ip_network(target, strict=False)
+            for ip in network.hosts():
+                hosts[str(ip)] = None
+        else:
+            hosts[target] = None
+    return list(hosts)
+
+
+def build_nbstat_query(transaction_id: int) -> bytes:
+    """Return a NetBIOS node-status request for the wildcard name."""
+
+    header = struct.pack("!HHHHHH", transaction_id & 0xFFFF, 0, 1, 0, 0, 0)
+    return header + _NBSTAT_NAME + struct.pack("!HH", _NBSTAT_TYPE, 1)
+
+
+def parse_nbstat_response(data: bytes) -> Optional[Tuple[int, List[str], str]]:
+    """Parse a node-status reply into ``(transaction_id, names, mac)``."""
+
+    if len(data) < 12:
+        return None
+    transaction_id, flags, _, answers = struct.unpack("!HHHH", data[:8])
+    if not flags & 0x8000 or answers < 1:
+        return None
+    offset = 12
+    # 回答の名前部 (ラベル列 or 圧縮ポインタ) を読み飛ばす
+    while offset < len(data):
+        length = data[offset]
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xC0 == 0xC0:
+            offset += 2
+            break
+        offset += 1 + length
+    if offset + 11 > len(data):
+        return None
+    rr_type = struct.unpack("!H", data[offset : offset + 2])[0]
+    if rr_type != _NBSTAT_TYPE:
+        return None
+    offset += 10  # type, class, ttl, rdlength
+    count = data[offset]
+    offset += 1
+    names: List[str] = []
+    for _ in range(count):
+        entry = data[offset : offset + 18]
+        if len(entry) < 18:
+            break
+        name = entry[:15].decode("ascii", "replace").strip().upper()
+        if name and name not in names:
+            names.append(name)
+        offset += 18
+    mac_bytes = data[offset : offset + 6]
+    mac = ":".join(f"{b:02x}" for b in mac_bytes) if len(mac_bytes) == 6 else ""
+    return transaction_id, names, mac
+
+
+class _NbstatProtocol(asyncio.DatagramProtocol):
+    """Match NBSTAT replies arriving on the shared socket to their targets."""
+
+    def __init__(self, expected: Dict[str, int]):
+        self.expected = expected
+        self.replies: Dict[str, Tuple[List[str], str]] = {}
+        self.done = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        ip = addr[0]
+        if ip not in self.expected or ip in self.replies:
+            return
+        parsed = parse_nbstat_response(data)
+        if parsed is None or parsed[0] != self.expected[ip]:
+            return
+        self.replies[ip] = (parsed[1], parsed[2])
+        if len(self.replies) == len(self.expected) and not self.done.done():
+            self.done.set_result(None)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP port unreachable 等は無視して他ホストの応答を待つ
+        pass
+
+
+async def _nbstat_sweep(
+    hosts: List[str], timeout: float, retries: int = 1
+) -> Dict[str, Tuple[List[str], str]]:
+    """Query every host over one UDP socket; unanswered hosts are retried."""
+
+    loop = asyncio.get_running_loop()
+    expected = {ip: index & 0xFFFF for index, ip in enumerate(hosts, 1)}
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _NbstatProtocol(expected), local_addr=("0.0.0.0", 0)
+    )
+    try:
+        for attempt in range(retries + 1):
+            for ip in hosts:
+                if ip not in protocol.replies:
+                    transport.sendto(
+                        build_nbstat_query(expected[ip]), (ip, NBSTAT_PORT)
+                    )
+                    # 送信バッファを溢れさせないよう時々イベントループに戻す
+                    await asyncio.sleep(0)
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(protocol.done), timeout / (retries + 1)
+                )
+                break
+            except asyncio.TimeoutError:
+                continue
+    finally:
+        transport.close()
+    return protocol.replies
+
+
+async def probe_smb1(host: str, timeout: float = 2.0) -> bool:
+    """Return ``True`` when *host* accepts an SMB1 ``NT LM 0.12`` negotiate."""
+
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, SMB_PORT), timeout
+    )
+    try:
+        writer.write(_SMB1_REQUEST)
+        await writer.drain()
+        try:
+            header = await asyncio.wait_for(reader.readexactly(4), timeout)
+            body = await asyncio.wait_for(
+                reader.readexactly(int.from_bytes(header[1:4], "big")), timeout
+            )
+        except asyncio.IncompleteReadError:
+            # SMB1 を無効化したサーバは接続を切る
+            return False
+        if len(body) < 35 or body[:4] != b"\xffSMB" or body[4] != 0x72:
+            return False
+        status = struct.unpack("<I", body[5:9])[0]
+        dialect = struct.unpack("<H", body[33:35])[0]
+        return status == 0 and dialect != 0xFFFF
+    finally:
+        writer.close()
+
+
+async def sweep(
+    targets: Iterable[str] | str,
+    *,
+    timeout: float = 2.0,
+    concurrency: int = DEFAULT_SWEEP_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    """Probe NetBIOS names and SMB1 support for many hosts in one event loop.
+
+    ``targets`` may be host addresses or CIDR networks.  NetBIOS node-status
+    queries for every host share a single UDP socket while SMB negotiate
+    probes run concurrently (at most ``concurrency`` connections).  Results
+    have the same shape as :func:`scan` and are returned in target order.
+    """
+
+    hosts = _expand_targets(targets)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def smb(host: str) -> Tuple[bool, Optional[str]]:
+        async with semaphore:
+            try:
+                return await probe_smb1(host, timeout), None
+            except Exception as exc:
+                return False, str(exc) or type(exc).__name__
+
+    nbstat_task = asyncio.ensure_future(_nbstat_sweep(hosts, timeout))
+    smb_results = await asyncio.gather(*(smb(host) for host in hosts))
+    names = await nbstat_task
+
+    results: List[Dict[str, Any]] = []
+    for host, (smb1, error) in zip(hosts, smb_results):
+        details: Dict[str, Any] = {
+            "target": host,
+            "netbios_names": [],
+            "smb1_enabled": smb1,
+        }
+        if host in names:
+            details["netbios_names"], details["mac"] = names[host]
+        if error:
+            details["error"] = error
+        results.append(
+            {"category": "smb_netbios", "score": 5 if smb1 else 0, "details": details}
+        )
+    return results
+
+
+def scan_many(
+    targets: Iterable[str] | str,
+    *,
+    timeout: float = 2.0,
+    concurrency: int = DEFAULT_SWEEP_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    """Synchronous wrapper around :func:`sweep` for non-async callers."""
+
+    return asyncio.run(sweep(targets, timeout=timeout, concurrency=concurrency))
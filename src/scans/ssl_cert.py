@@ -3,10 +3,16 @@
 # SSL証明書の期限切れや信頼性をチェックする
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+import hashlib
 import socket
 import ssl
-from typing import Any
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
 
 # 信頼された証明書発行者の簡易リスト
 TRUSTED_ISSUERS = {
@@ -16,6 +22,19 @@ TRUSTED_ISSUERS = {
     "Sectigo",
 }
 
+# スイープ時の同時ハンドシェイク数の上限
+DEFAULT_SWEEP_CONCURRENCY = 64
+
+# RDP は X.224 で TLS を要求してからハンドシェイクする
+RDP_PORTS = frozenset({3389})
+# TPKT + X.224 Connection Request + RDP_NEG_REQ (PROTOCOL_SSL | PROTOCOL_HYBRID)
+_RDP_NEG_REQ = bytes.fromhex("030000130ee000000000000100080003000000")
+
+# SHA-256 フィンガープリント -> DER から復号した証明書 (古いものから捨てる)
+# 残り日数などの時刻依存の値は保持せず、毎回計算し直す
+CERT_CACHE_SIZE = 1024
+_CERT_CACHE: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
 
 def _extract_issuer(cert: dict[str, Any] | None) -> str:
     """抽出した issuer 情報を文字列に整形して返す。"""
@@ -31,50 +50,216 @@ def _extract_issuer(cert: dict[str, Any] | None) -> str:
     return ", ".join(names)
 
 
+def _analyse(cert: dict[str, Any] | None) -> dict[str, Any]:
+    """証明書の期限と発行者を評価し、score と details 用の値を返す。"""
+
+    expired = False
+    days_remaining: int | None = None
+    issuer = _extract_issuer(cert)
+    not_after = cert.get("notAfter") if cert else None
+    if isinstance(not_after, str):
+        expiry = datetime.strptime(not_after, "%b %d %H:%M:%S %Y %Z").replace(
+            tzinfo=timezone.utc
+        )
+        delta = expiry - datetime.now(timezone.utc)
+        days_remaining = delta.days
+        expired = days_remaining < 0
+
+    score = 0
+    if expired:
+        score = 5
+    else:
+        if days_remaining is not None and days_remaining < 30:
+            score += 2
+        if issuer and all(t not in issuer for t in TRUSTED_ISSUERS):
+            score += 1
+
+    return {
+        "score": score,
+        "expired": expired,
+        "issuer": issuer,
+        "days_remaining": days_remaining,
+        "cert": cert,
+    }
+
+
 def scan(host: str = "example.com", port: int = 443) -> dict:
     category = "ssl_cert"
     details: dict[str, Any] = {"host": host}
 
     try:
-        expired = False
-        days_remaining: int | None = None
-        issuer = ""
-        cert_data: dict[str, Any] | None = None
-
         context = ssl.create_default_context()
         with socket.create_connection((host, port), timeout=2) as sock:
             with context.wrap_socket(sock, server_hostname=host) as ssock:
-                cert = ssock.getpeercert()
-                cert_data = cert
-                issuer = _extract_issuer(cert)
-                not_after = cert.get("notAfter") if cert else None
-                if isinstance(not_after, str):
-                    expiry = datetime.strptime(
-                        not_after, "%b %d %H:%M:%S %Y %Z"
-                    ).replace(tzinfo=timezone.utc)
-                    delta = expiry - datetime.now(timezone.utc)
-                    days_remaining = delta.days
-                    expired = days_remaining < 0
-
-        score = 0
-        if expired:
-            score = 5
-        else:
-            if days_remaining is not None and days_remaining < 30:
-                score += 2
-            if issuer and all(t not in issuer for t in TRUSTED_ISSUERS):
-                score += 1
-
-        details.update(
-            {
-                "expired": expired,
-                "issuer": issuer,
-                "days_remaining": days_remaining,
-                "cert": cert_data,
-            }
-        )
+                analysis = _analyse(ssock.getpeercert())
+
+        score = analysis.pop("score")
+        details.update(analysis)
         return {"category": category, "score": score, "details": details}
 
     except Exception as exc:
         details["error"] = str(exc)
         return {"category": category, "score": 0, "details": details}
+
+
+def _decode_der(der: bytes) -> dict[str, Any]:
+    """DER 証明書を ``getpeercert()`` と同じ形式の辞書に変換する。
+
+    検証に失敗した接続では ``getpeercert()`` が空になるため、DER から読む。
+    """
+
+    names = {
+        NameOID.COMMON_NAME: "commonName",
+        NameOID.ORGANIZATION_NAME: "organizationName",
+        NameOID.ORGANIZATIONAL_UNIT_NAME: "organizationalUnitName",
+        NameOID.COUNTRY_NAME: "countryName",
+    }
+
+    def rdns(name: Any) -> tuple:
+        return tuple(
+            ((names.get(attr.oid, attr.rfc4514_attribute_name), attr.value),)
+            for attr in name
+        )
+
+    cert = x509.load_der_x509_certificate(der)
+    fmt = "%b %d %H:%M:%S %Y GMT"
+    return {
+        "subject": rdns(cert.subject),
+        "issuer": rdns(cert.issuer),
+        "serialNumber": format(cert.serial_number, "X"),
+        "notBefore": cert.not_valid_before_utc.strftime(fmt),
+        "notAfter": cert.not_valid_after_utc.strftime(fmt),
+    }
+
+
+def _analyse_der(der: bytes, cert: dict[str, Any] | None) -> dict[str, Any]:
+    """証明書を評価する。DER の復号結果はフィンガープリント単位でキャッシュする。"""
+
+    fingerprint = hashlib.sha256(der).hexdigest()
+    if cert is None:
+        cert = _CERT_CACHE.get(fingerprint)
+        if cert is None:
+            cert = _decode_der(der)
+            _CERT_CACHE[fingerprint] = cert
+            while len(_CERT_CACHE) > CERT_CACHE_SIZE:
+                _CERT_CACHE.popitem(last=False)
+        else:
+            _CERT_CACHE.move_to_end(fingerprint)
+    analysis = _analyse(cert)
+    analysis["fingerprint"] = fingerprint
+    return analysis
+
+
+async def _rdp_negotiate(reader: asyncio.StreamReader, writer: Any) -> None:
+    writer.write(_RDP_NEG_REQ)
+    await writer.drain()
+    header = await reader.readexactly(4)
+    body = await reader.readexactly(int.from_bytes(header[2:4], "big") - 4)
+    # X.224 CC (7 bytes) の後ろに RDP_NEG_RSP(0x02) / RDP_NEG_FAILURE(0x03)
+    if len(body) < 8 or body[7] != 0x02:
+        raise ssl.SSLError("RDP server refused TLS security")
+
+
+async def _handshake(
+    host: str, port: int, context: ssl.SSLContext
+) -> tuple[bytes, dict[str, Any] | None]:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        if port in RDP_PORTS:
+            await _rdp_negotiate(reader, writer)
+        await writer.start_tls(context, server_hostname=host)
+        sslobj = writer.get_extra_info("ssl_object")
+        return sslobj.getpeercert(binary_form=True), sslobj.getpeercert() or None
+    finally:
+        writer.close()
+
+
+def _unverified_context() -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def _check_endpoint(
+    host: str, port: int, semaphore: asyncio.Semaphore, timeout: float
+) -> dict:
+    details: dict[str, Any] = {"host": host, "port": port}
+    async with semaphore:
+        try:
+            try:
+                der, cert = await asyncio.wait_for(
+                    _handshake(host, port, ssl.create_default_context()), timeout
+                )
+                details["verified"] = True
+            except ssl.SSLCertVerificationError as exc:
+                # 検証に失敗しても証明書そのものは読み取る
+                der, cert = await asyncio.wait_for(
+                    _handshake(host, port, _unverified_context()), timeout
+                )
+                details["verified"] = False
+                details["verify_error"] = exc.verify_message or str(exc)
+            analysis = _analyse_der(der, cert)
+        except Exception as exc:
+            details["error"] = str(exc) or type(exc).__name__
+            return {"category": "ssl_cert", "score": 0, "details": details}
+
+    score = analysis.pop("score")
+    details.update(analysis)
+    return {"category": "ssl_cert", "score": score, "details": details}
+
+
+def _parse_endpoint(endpoint: Any) -> tuple[str, int]:
+    """``(host, port)``、``"host:port"``、``"[v6]:port"`` または host のみを解釈する。"""
+
+    if isinstance(endpoint, (tuple, list)):
+        return str(endpoint[0]), int(endpoint[1])
+    text = str(endpoint)
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+        return host, int(port) if port.isdigit() else 443
+    # ":" が 2 つ以上あるのは括弧なしの IPv6 アドレス (ポート指定なし)
+    if text.count(":") > 1:
+        return text, 443
+    host, sep, port = text.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return text, 443
+
+
+async def sweep(
+    endpoints: Iterable[Any],
+    *,
+    concurrency: int = DEFAULT_SWEEP_CONCURRENCY,
+    timeout: float = 2.0,
+) -> list[dict]:
+    """Check many TLS endpoints concurrently.
+
+    ``endpoints`` may contain ``(host, port)`` pairs, ``"host:port"`` or
+    ``"[v6]:port"`` strings or bare hosts and IPv6 addresses (port 443).
+    At most ``concurrency`` handshakes run at once.  Certificates that fail
+    validation are still read and reported with ``verified: False``; each
+    distinct certificate (by SHA-256 fingerprint) is decoded only once,
+    while its expiry is evaluated on every call.  Results are returned in
+    input order.
+    """
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    targets = [_parse_endpoint(e) for e in endpoints]
+    return list(
+        await asyncio.gather(
+            *(_check_endpoint(h, p, semaphore, timeout) for h, p in targets)
+        )
+    )
+
+
+def scan_many(
+    endpoints: Iterable[Any],
+    *,
+    concurrency: int = DEFAULT_SWEEP_CONCURRENCY,
+    timeout: float = 2.0,
+) -> list[dict]:
+    """Synchronous wrapper around :func:`sweep` for non-async callers."""
+
+    return asyncio.run(sweep(endpoints, concurrency=concurrency, timeout=timeout))
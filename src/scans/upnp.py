@@ -1,11 +1,140 @@
-"""Static scan for UPnP/SSDP services using scapy."""
+"""Static scan for UPnP/SSDP services."""
 
 # UPnP/SSDP応答から不要なサービス公開を検知する
-from scapy.all import IP, UDP, Raw, sr1  # type: ignore
+from __future__ import annotations
+
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from ._collector import collect
 
 # SSDPのマルチキャストアドレスとポート
 SSDP_ADDR = "239.255.255.250"
 SSDP_PORT = 1900
+# M-SEARCH の MX。応答はこの秒数内にばらけて届くので静穏期間もこれに合わせる
+SSDP_MX = 1
+# 機器記述 XML の取得設定
+DESCRIPTION_TIMEOUT = 2.0
+DESCRIPTION_MAX_BYTES = 64 * 1024
+DESCRIPTION_WORKERS = 8
+# 機器記述を再取得するまでの秒数
+DESCRIPTION_TTL = 3600.0
+
+# USN の UUID -> (取得時刻, LOCATION, 機器記述)。取得に成功したものだけ保持する
+_DESCRIPTION_CACHE: Dict[str, Tuple[float, str, Dict[str, str]]] = {}
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Return the shared HTTP session so connections are pooled."""
+
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        return _session
+
+
+def _parse_headers(payload: bytes) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    for line in payload.decode("latin-1", "replace").split("\r\n")[1:]:
+        key, sep, value = line.partition(":")
+        if sep:
+            headers[key.strip().upper()] = value.strip()
+    return headers
+
+
+def _device_key(usn: str) -> str:
+    # "uuid:XXXX::urn:..." の UUID 部分で機器を識別する
+    return usn.split("::", 1)[0]
+
+
+def _fetch_description(location: str) -> Dict[str, str]:
+    """Download and summarise a device description XML."""
+
+    resp = _get_session().get(location, timeout=DESCRIPTION_TIMEOUT, stream=True)
+    try:
+        resp.raise_for_status()
+        body = resp.raw.read(DESCRIPTION_MAX_BYTES, decode_content=True)
+    finally:
+        resp.close()
+    root = ET.fromstring(body)
+    device = None
+    for elem in root.iter():
+        if elem.tag.rsplit("}", 1)[-1] == "device":
+            device = elem
+            break
+    info: Dict[str, str] = {}
+    if device is not None:
+        for child in device:
+            tag = child.tag.rsplit("}", 1)[-1]
+            if tag in {"deviceType", "friendlyName", "manufacturer", "modelName"}:
+                info[tag] = (child.text or "").strip()
+    return info
+
+
+def _cached_description(
+    key: str, location: str, now: float
+) -> Optional[Dict[str, str]]:
+    entry = _DESCRIPTION_CACHE.get(key)
+    if entry is None:
+        return None
+    fetched_at, cached_location, info = entry
+    # 期限切れや LOCATION の変化 (IP の付け替えなど) は取り直す
+    if now - fetched_at >= DESCRIPTION_TTL or cached_location != location:
+        del _DESCRIPTION_CACHE[key]
+        return None
+    return info
+
+
+def _describe(devices: List[Dict[str, str]]) -> None:
+    """Attach description XML data to *devices*, fetching concurrently.
+
+    Descriptions are cached per device for :data:`DESCRIPTION_TTL` seconds;
+    failed fetches are reported on the device but retried on the next scan.
+    """
+
+    now = time.monotonic()
+    results: Dict[str, Dict[str, str]] = {}
+    pending: Dict[str, str] = {}
+    for device in devices:
+        key = device["usn"]
+        location = device.get("location", "")
+        if key in results or key in pending:
+            continue
+        cached = _cached_description(key, location, now)
+        if cached is not None:
+            results[key] = cached
+            continue
+        # LOCATION が応答元以外を指す場合は取得しない
+        if not location or urlparse(location).hostname != device["ip"]:
+            continue
+        pending[key] = location
+
+    def fetch(item: tuple) -> None:
+        key, location = item
+        try:
+            info = _fetch_description(location)
+        except Exception as exc:  # noqa: BLE001 - 取得失敗は記録だけ
+            results[key] = {"error": str(exc)}
+            return
+        results[key] = info
+        _DESCRIPTION_CACHE[key] = (time.monotonic(), location, info)
+
+    if pending:
+        workers = min(DESCRIPTION_WORKERS, len(pending))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fetch, pending.items()))
+
+    for device in devices:
+        device.update(results.get(device["usn"], {}))
 
 
 def scan(target: str = SSDP_ADDR) -> dict:
@@ -19,19 +148,42 @@ def scan(target: str = SSDP_ADDR) -> dict:
             "M-SEARCH * HTTP/1.1\r\n"
             f"HOST: {SSDP_ADDR}:{SSDP_PORT}\r\n"
             'MAN: "ssdp:discover"\r\n'
-            "MX: 1\r\n"
+            f"MX: {SSDP_MX}\r\n"
             "ST: ssdp:all\r\n\r\n"
         )
-        pkt = IP(dst=target) / UDP(sport=SSDP_PORT, dport=SSDP_PORT) / Raw(load=query)
-        ans = sr1(pkt, timeout=1, verbose=False)
-        if ans:
-            src = getattr(ans, "src", "")
-            responders.append(src)
-            payload = bytes(getattr(ans, "load", b""))
-            if b"upnp" in payload.lower():
-                warnings.append(f"UPnP service responded from {src}")
-            else:
-                warnings.append(f"Misconfigured SSDP response from {src}")
+        replies = collect(
+            query.encode(),
+            (target, SSDP_PORT),
+            quiet=SSDP_MX + 0.5,
+            deadline=SSDP_MX + 2.0,
+        )
+
+        devices: Dict[str, Dict[str, str]] = {}
+        for payload, (src, _) in replies:
+            headers = _parse_headers(payload)
+            if src not in responders:
+                responders.append(src)
+                if b"upnp" in payload.lower():
+                    warnings.append(f"UPnP service responded from {src}")
+                else:
+                    warnings.append(f"Misconfigured SSDP response from {src}")
+            usn = headers.get("USN")
+            if usn:
+                key = _device_key(usn)
+                devices.setdefault(
+                    key,
+                    {
+                        "ip": src,
+                        "usn": key,
+                        "location": headers.get("LOCATION", ""),
+                        "server": headers.get("SERVER", ""),
+                    },
+                )
+
+        if devices:
+            device_list = list(devices.values())
+            _describe(device_list)
+            details["devices"] = device_list
 
         return {"category": category, "score": len(warnings), "details": details}
 
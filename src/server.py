@@ -1,45 +1,102 @@
 """HTTP server exposing the static scan API.
 
 The static scan can take time and perform blocking operations.  To keep the
-API responsive we execute the scan in a background thread and apply a timeout
-so hung scanners do not block the event loop.
+API responsive we execute the scan in a background thread; scanners run in
+child processes that are killed at the global deadline so hung scanners do
+not linger.  Results that are still fresh in the persistent scan cache are
+reused instead of re-running the scanner.  Partial results can also be
+streamed as NDJSON or over a WebSocket while the scan is still running.
+PDF reports are rendered by a worker pool and downloaded via ``/reports``.
 """
 
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
-from typing import Any
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
 from . import static_scan
-from .report.pdf import create_pdf
+from .report.store import ReportStore
+from .scan_cache import ScanResultCache
 
 STATIC_SCAN_TIMEOUT = 60  # seconds
-REPORT_PATH = "/tmp/static_scan_report.pdf"
+# deadline 後にスキャナ子プロセスを停止して結果をまとめるまでの猶予
+STATIC_SCAN_GRACE = 5  # seconds
+# ダウンロード要求が描画完了を待つ最大時間
+REPORT_WAIT_TIMEOUT = 30  # seconds
 
 app = FastAPI()
 logger = logging.getLogger(__name__)
 
+_report_store: Optional[ReportStore] = None
+_scan_cache: Optional[ScanResultCache] = None
+
+
+def get_report_store() -> ReportStore:
+    """Return the shared report store, creating it on first use."""
+    global _report_store
+    if _report_store is None:
+        _report_store = ReportStore()
+    return _report_store
+
+
+def get_scan_cache() -> ScanResultCache:
+    """Return the shared static scan result cache, creating it on first use."""
+    global _scan_cache
+    if _scan_cache is None:
+        _scan_cache = ScanResultCache()
+    return _scan_cache
+
+
+def _report_info(report_id: str, status: Optional[str]) -> Dict[str, Any]:
+    info: Dict[str, Any] = {
+        "report_id": report_id,
+        "report_status": status,
+        "report_url": f"/reports/{report_id}.pdf",
+    }
+    # ファイルができるまではパスを返さない（クライアントが直接開くため）
+    if status == "ready":
+        info["report_path"] = str(get_report_store().path(report_id))
+    return info
+
 
 @app.get("/static_scan")
-async def static_scan_endpoint(report: bool = False):
+async def static_scan_endpoint(report: bool = False, refresh: bool = False):
     """Run all static scan modules and return aggregated results.
 
+    Results still fresh in the scan cache are reused (marked ``"cached"``).
+
     Parameters
     ----------
     report: bool, optional
-        When ``True`` the server generates a PDF report and returns its path.
+        When ``True`` a PDF report is queued in the report worker pool and
+        ``report_id``, ``report_status`` and ``report_url`` are returned
+        without waiting for it.  ``report_path`` is added only once the PDF
+        exists; until then poll ``/reports/{report_id}``.  Identical results
+        reuse the same report.
+    refresh: bool, optional
+        When ``True`` every scanner runs again and the cache is refreshed.
     """
-    # Execute the scan in a worker thread and enforce a timeout so the
-    # server remains responsive even if individual scanners hang.
+    # Execute the scan in a worker thread.  The scan itself stops at
+    # ``STATIC_SCAN_TIMEOUT`` and kills scanner processes that are still
+    # running; the outer timeout is only a backstop.
     logger.info("Starting static scan")
+    cache = get_scan_cache()
+    if refresh:
+        cache.invalidate()
     try:
         result = await asyncio.wait_for(
-            asyncio.to_thread(static_scan.run_all),
-            timeout=STATIC_SCAN_TIMEOUT,
+            asyncio.to_thread(
+                static_scan.run_all,
+                deadline=STATIC_SCAN_TIMEOUT,
+                isolation="process",
+                cache=cache,
+            ),
+            timeout=STATIC_SCAN_TIMEOUT + STATIC_SCAN_GRACE,
         )
     except asyncio.TimeoutError:
         logger.warning("Static scan timed out")
@@ -60,6 +117,103 @@ async def static_scan_endpoint(report: bool = False):
 
     response = {"status": "ok", "findings": findings, "risk_score": risk_score}
     if report:
-        create_pdf(result, REPORT_PATH)
-        response["report_path"] = REPORT_PATH
+        store = get_report_store()
+        report_id, _ = store.submit(result if isinstance(result, dict) else {})
+        response.update(_report_info(report_id, store.status(report_id)))
     return response
+
+
+@app.get("/reports/{report_id}.pdf")
+async def download_report(report_id: str):
+    """Download a report, waiting briefly while it is still rendering."""
+    store = get_report_store()
+    try:
+        path = await store.wait(report_id, REPORT_WAIT_TIMEOUT)
+    except ValueError:
+        path = None
+    except asyncio.TimeoutError:
+        return JSONResponse(status_code=202, content=_report_info(report_id, "pending"))
+    if path is None:
+        return JSONResponse(status_code=404, content={"status": "not_found"})
+    return FileResponse(path, media_type="application/pdf", filename="report.pdf")
+
+
+@app.get("/reports/{report_id}")
+async def report_status(report_id: str):
+    """Return whether a report is ``pending``, ``ready`` or ``failed``.
+
+    Declared after the ``.pdf`` route so downloads are matched first.
+    """
+    store = get_report_store()
+    try:
+        status = store.status(report_id)
+    except ValueError:
+        status = None
+    if status is None:
+        return JSONResponse(status_code=404, content={"status": "not_found"})
+    info = _report_info(report_id, status)
+    if status == "failed":
+        info["message"] = store.error(report_id)
+    return info
+
+
+async def _scan_events(
+    targets: Optional[List[str]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Relay :func:`static_scan.iter_results` events from a worker thread.
+
+    The overall scan is bounded by ``STATIC_SCAN_TIMEOUT`` through the
+    scanner deadline, so a ``done`` event is always produced.  Failures are
+    reported as a final ``{"type": "error"}`` event.
+    """
+    kwargs: Dict[str, Any] = {
+        "deadline": STATIC_SCAN_TIMEOUT,
+        "isolation": "process",
+        "cache": get_scan_cache(),
+    }
+    if targets:
+        kwargs["targets"] = targets
+    events = static_scan.iter_results(**kwargs)
+    try:
+        while True:
+            event = await asyncio.to_thread(next, events, None)
+            if event is None:
+                break
+            yield event
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("Static scan stream failed")
+        yield {"type": "error", "message": f"Static scan failed: {exc}"}
+    finally:
+        try:
+            events.close()
+        except ValueError:
+            # ワーカースレッドで実行中。deadline で自然に終了する
+            pass
+
+
+@app.get("/static_scan/stream")
+async def static_scan_stream(targets: Optional[List[str]] = Query(None)):
+    """Stream each scanner's result as NDJSON the moment it completes.
+
+    Every line is one event from :func:`static_scan.iter_results` carrying
+    the running ``risk_score``; the last line has ``"type": "done"``.
+    """
+
+    async def body() -> AsyncIterator[str]:
+        async for event in _scan_events(targets):
+            yield json.dumps(event, default=str) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.websocket("/ws/static_scan")
+async def ws_static_scan(websocket: WebSocket):
+    """Send static scan events over a WebSocket, then close it."""
+    await websocket.accept()
+    targets = websocket.query_params.getlist("targets") or None
+    try:
+        async for event in _scan_events(targets):
+            await websocket.send_text(json.dumps(event, default=str))
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Static scan WebSocket disconnected")
@@ -0,0 +1,372 @@
+"""Minimal asynchronous SNMPv2c client with GETBULK walks.
+
+Only what neighbour discovery needs is implemented: BER encoding of SNMP
+messages, and walking a subtree with GETBULK over one shared UDP socket.
+Requests to many devices run concurrently and responses are matched by
+request id, so an agent answering from another of its addresses is still
+accepted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+import os
+import socket
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+SNMP_PORT = 161
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_RETRIES = 1
+DEFAULT_MAX_REPETITIONS = 25
+# 1 回の walk で取得する行数の上限 (応答が壊れている機器への保険)
+MAX_WALK_ROWS = 10000
+
+VERSION_2C = 1
+
+PDU_RESPONSE = 0xA2
+PDU_GET_BULK = 0xA5
+
+_INTEGER = 0x02
+_OCTET_STRING = 0x04
+_NULL = 0x05
+_OID = 0x06
+_SEQUENCE = 0x30
+_IP_ADDRESS = 0x40
+_UNSIGNED = (0x41, 0x42, 0x43, 0x46)  # Counter32, Gauge32, TimeTicks, Counter64
+_NO_SUCH_OBJECT = 0x80
+_NO_SUCH_INSTANCE = 0x81
+_END_OF_MIB_VIEW = 0x82
+
+
+class _Exception(NamedTuple):
+    """SNMPv2 varbind exception value such as ``endOfMibView``."""
+
+    name: str
+
+
+NO_SUCH_OBJECT = _Exception("noSuchObject")
+NO_SUCH_INSTANCE = _Exception("noSuchInstance")
+END_OF_MIB_VIEW = _Exception("endOfMibView")
+_EXCEPTION_TAGS = {
+    NO_SUCH_OBJECT: _NO_SUCH_OBJECT,
+    NO_SUCH_INSTANCE: _NO_SUCH_INSTANCE,
+    END_OF_MIB_VIEW: _END_OF_MIB_VIEW,
+}
+
+
+class Message(NamedTuple):
+    """Decoded SNMP message.
+
+    For GETBULK requests ``error_status`` and ``error_index`` carry
+    ``non-repeaters`` and ``max-repetitions``.
+    """
+
+    community: str
+    pdu_type: int
+    request_id: int
+    error_status: int
+    error_index: int
+    varbinds: List[Tuple[str, Any]]
+
+
+def _tlv(tag: int, payload: bytes) -> bytes:
+    length = len(payload)
+    if length < 0x80:
+        return bytes([tag, length]) + payload
+    raw = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([tag, 0x80 | len(raw)]) + raw + payload
+
+
+def _encode_int(value: int, tag: int = _INTEGER) -> bytes:
+    size = max(1, (value.bit_length() + 8) // 8)
+    return _tlv(tag, value.to_bytes(size, "big", signed=True))
+
+
+def _encode_oid(oid: str) -> bytes:
+    parts = [int(p) for p in oid.strip(".").split(".")]
+    if len(parts) < 2:
+        raise ValueError(f"invalid OID: {oid}")
+    body = bytearray([parts[0] * 40 + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return _tlv(_OID, bytes(body))
+
+
+def _encode_value(value: Any) -> bytes:
+    if value is None:
+        return _tlv(_NULL, b"")
+    if isinstance(value, _Exception):
+        return _tlv(_EXCEPTION_TAGS[value], b"")
+    if isinstance(value, bool):
+        raise TypeError("unsupported SNMP value: bool")
+    if isinstance(value, int):
+        return _encode_int(value)
+    if isinstance(value, str):
+        return _tlv(_OCTET_STRING, value.encode())
+    if isinstance(value, bytes):
+        return _tlv(_OCTET_STRING, value)
+    raise TypeError(f"unsupported SNMP value: {type(value).__name__}")
+
+
+def encode_message(
+    community: str,
+    pdu_type: int,
+    request_id: int,
+    varbinds: Sequence[Tuple[str, Any]],
+    error_status: int = 0,
+    error_index: int = 0,
+) -> bytes:
+    """Encode an SNMPv2c message with the given PDU."""
+
+    bindings = b"".join(
+        _tlv(_SEQUENCE, _encode_oid(oid) + _encode_value(value))
+        for oid, value in varbinds
+    )
+    pdu = _tlv(
+        pdu_type,
+        _encode_int(request_id)
+        + _encode_int(error_status)
+        + _encode_int(error_index)
+        + _tlv(_SEQUENCE, bindings),
+    )
+    return _tlv(
+        _SEQUENCE,
+        _encode_int(VERSION_2C) + _tlv(_OCTET_STRING, community.encode()) + pdu,
+    )
+
+
+def build_getbulk(
+    request_id: int,
+    community: str,
+    oid: str,
+    max_repetitions: int = DEFAULT_MAX_REPETITIONS,
+) -> bytes:
+    return encode_message(
+        community, PDU_GET_BULK, request_id, [(oid, None)], 0, max_repetitions
+    )
+
+
+def _read_tlv(data: bytes, offset: int) -> Tuple[int, bytes, int]:
+    if offset + 2 > len(data):
+        raise ValueError("truncated TLV")
+    tag, length = data[offset], data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if size == 0 or size > 4 or offset + size > len(data):
+            raise ValueError("bad length")
+        length = int.from_bytes(data[offset : offset + size], "big")
+        offset += size
+    end = offset + length
+    if end > len(data):
+        raise ValueError("truncated value")
+    return tag, data[offset:end], end
+
+
+def _decode_oid(raw: bytes) -> str:
+    if not raw:
+        raise ValueError("empty OID")
+    first = raw[0]
+    parts = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    value = 0
+    for byte in raw[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(str(p) for p in parts)
+
+
+def _decode_value(tag: int, raw: bytes) -> Any:
+    if tag == _INTEGER:
+        return int.from_bytes(raw, "big", signed=True)
+    if tag in _UNSIGNED:
+        return int.from_bytes(raw, "big")
+    if tag == _OCTET_STRING:
+        return raw.decode("utf-8", "replace")
+    if tag == _OID:
+        return _decode_oid(raw)
+    if tag == _IP_ADDRESS and len(raw) == 4:
+        return socket.inet_ntoa(raw)
+    if tag == _NO_SUCH_OBJECT:
+        return NO_SUCH_OBJECT
+    if tag == _NO_SUCH_INSTANCE:
+        return NO_SUCH_INSTANCE
+    if tag == _END_OF_MIB_VIEW:
+        return END_OF_MIB_VIEW
+    if tag == _NULL:
+        return None
+    return raw
+
+
+def decode_message(data: bytes) -> Message:
+    """Decode an SNMP message; raises :class:`ValueError` when malformed."""
+
+    tag, body, _ = _read_tlv(data, 0)
+    if tag != _SEQUENCE:
+        raise ValueError("not an SNMP message")
+    _, _version, offset = _read_tlv(body, 0)
+    _, community, offset = _read_tlv(body, offset)
+    pdu_type, pdu, _ = _read_tlv(body, offset)
+    fields = []
+    offset = 0
+    for _ in range(3):
+        _, raw, offset = _read_tlv(pdu, offset)
+        fields.append(int.from_bytes(raw, "big", signed=True))
+    _, bindings, _ = _read_tlv(pdu, offset)
+    varbinds: List[Tuple[str, Any]] = []
+    offset = 0
+    while offset < len(bindings):
+        _, pair, offset = _read_tlv(bindings, offset)
+        _, oid, inner = _read_tlv(pair, 0)
+        value_tag, value, _ = _read_tlv(pair, inner)
+        varbinds.append((_decode_oid(oid), _decode_value(value_tag, value)))
+    return Message(
+        community.decode("utf-8", "replace"),
+        pdu_type,
+        fields[0],
+        fields[1],
+        fields[2],
+        varbinds,
+    )
+
+
+def _in_subtree(oid: str, root: str) -> bool:
+    return oid.startswith(root + ".")
+
+
+def _oid_key(oid: str) -> Tuple[int, ...]:
+    return tuple(int(p) for p in oid.split("."))
+
+
+class _Dispatcher(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.waiters: Dict[int, asyncio.Future] = {}
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        try:
+            message = decode_message(data)
+        except ValueError:
+            return
+        waiter = self.waiters.get(message.request_id)
+        if (
+            waiter is not None
+            and not waiter.done()
+            and message.pdu_type == PDU_RESPONSE
+        ):
+            waiter.set_result(message)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP port unreachable は応答なしとして扱う
+        pass
+
+
+class SnmpClient:
+    """SNMPv2c client sharing one UDP socket between concurrent requests."""
+
+    def __init__(
+        self, transport: asyncio.DatagramTransport, dispatcher: _Dispatcher
+    ) -> None:
+        self._transport = transport
+        self._dispatcher = dispatcher
+        self._ids = itertools.count(int.from_bytes(os.urandom(2), "big") + 1)
+
+    @classmethod
+    async def open(cls) -> "SnmpClient":
+        loop = asyncio.get_running_loop()
+        transport, dispatcher = await loop.create_datagram_endpoint(
+            _Dispatcher, local_addr=("0.0.0.0", 0)
+        )
+        return cls(transport, dispatcher)
+
+    async def request(
+        self,
+        ip: str,
+        build: Callable[[int], bytes],
+        *,
+        port: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+    ) -> Optional[Message]:
+        """Send ``build(request_id)`` to *ip* and wait for the response."""
+
+        request_id = next(self._ids) & 0x7FFFFFFF
+        packet = build(request_id)
+        waiter = asyncio.get_running_loop().create_future()
+        self._dispatcher.waiters[request_id] = waiter
+        try:
+            for _ in range(max(0, retries) + 1):
+                self._transport.sendto(packet, (ip, port or SNMP_PORT))
+                try:
+                    return await asyncio.wait_for(asyncio.shield(waiter), timeout)
+                except asyncio.TimeoutError:
+                    continue
+            return None
+        finally:
+            self._dispatcher.waiters.pop(request_id, None)
+            waiter.cancel()
+
+    async def bulk_walk(
+        self,
+        ip: str,
+        community: str,
+        oid: str,
+        *,
+        port: Optional[int] = None,
+        max_repetitions: int = DEFAULT_MAX_REPETITIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+    ) -> List[Tuple[str, Any]]:
+        """Return every ``(oid, value)`` below *oid* using GETBULK requests.
+
+        Raises
+        ------
+        TimeoutError
+            When the agent does not answer the first request.
+        """
+
+        root = oid.strip(".")
+        rows: List[Tuple[str, Any]] = []
+        current = root
+        while len(rows) < MAX_WALK_ROWS:
+            response = await self.request(
+                ip,
+                functools.partial(
+                    build_getbulk,
+                    community=community,
+                    oid=current,
+                    max_repetitions=max_repetitions,
+                ),
+                port=port,
+                timeout=timeout,
+                retries=retries,
+            )
+            if response is None:
+                if not rows:
+                    raise TimeoutError(f"no SNMP response from {ip}")
+                break
+            if response.error_status:
+                break
+            progressed = False
+            for name, value in response.varbinds:
+                if isinstance(value, _Exception) or not _in_subtree(name, root):
+                    return rows
+                # OID が進まない応答はループを避けるため打ち切る
+                if _oid_key(name) <= _oid_key(current):
+                    return rows
+                rows.append((name, value))
+                current = name
+                progressed = True
+            if not progressed:
+                break
+        return rows
+
+    def close(self) -> None:
+        self._transport.close()
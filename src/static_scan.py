@@ -1,88 +1,676 @@
 """Run all static scan modules concurrently with fault tolerance."""
 
-from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
-from importlib import import_module
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from pkgutil import iter_modules
-from typing import Any, Callable, Dict, List, Tuple
+from types import ModuleType
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
 
 from . import scans
 
+if TYPE_CHECKING:
+    from .scan_cache import ScanResultCache
 
-def _load_scanners() -> List[Tuple[str, Callable[[], Dict[str, Any]]]]:
+logger = logging.getLogger(__name__)
+
+# 対象ホストを引数に取るスキャナ。それ以外はネットワーク全体を 1 回だけ調べる。
+HOST_SCANNERS = frozenset(
+    name for name, info in scans.SCANNERS.items() if info.scope == "host"
+)
+
+# スキャナ種別ごとの同時実行数の上限。nmap は重いので控えめにする。
+DEFAULT_CONCURRENCY: Dict[str, int] = {
+    "ports": 16,
+    "os_banner": 2,
+    "smb_netbios": 8,
+    "ssl_cert": 16,
+}
+DEFAULT_SCANNER_CONCURRENCY = 4
+
+# 実行中タスクの期限切れを確認する最大間隔（秒）
+_POLL_INTERVAL = 0.05
+
+# 複数スレッドから同時に fork すると子プロセス側でロックが固まるため直列化する
+_FORK_LOCK = threading.Lock()
+
+
+class _Discovery(NamedTuple):
+    modules: List[Tuple[str, ModuleType]]
+    skipped: Dict[str, str]
+
+
+# scans.__path__ ごとの探索結果。run_all のたびに iter_modules しないためのキャッシュ
+_DISCOVERY_CACHE: Dict[Tuple[str, ...], _Discovery] = {}
+_NO_DISCOVERY = _Discovery([], {})
+
+
+def _discover_modules() -> _Discovery:
+    """Import scanner modules once per ``scans.__path__`` and cache them.
+
+    Modules whose registered dependencies are missing are skipped before
+    import so their (often heavy) import cost is never paid.
+    """
+
+    key = tuple(scans.__path__)
+    cached = _DISCOVERY_CACHE.get(key)
+    if cached is None:
+        modules: List[Tuple[str, ModuleType]] = []
+        skipped: Dict[str, str] = {}
+        for mod_info in iter_modules(scans.__path__):
+            if mod_info.name.startswith("_"):
+                continue
+            missing = scans.scanner_info(mod_info.name).missing_requirements()
+            if missing:
+                skipped[mod_info.name] = "missing dependency: " + ", ".join(missing)
+                logger.info(
+                    "Skipping scanner %s (%s)", mod_info.name, skipped[mod_info.name]
+                )
+                continue
+            modules.append((mod_info.name, getattr(scans, mod_info.name)))
+        cached = _DISCOVERY_CACHE[key] = _Discovery(modules, skipped)
+    return cached
+
+
+def _load_scanners() -> List[Tuple[str, Callable[..., Dict[str, Any]]]]:
     """Discover scan functions under :mod:`src.scans`.
 
-    Returns a list of ``(module_name, scan_callable)`` tuples.
+    Returns a list of ``(module_name, scan_callable)`` tuples.  Module
+    discovery is cached; ``scan`` is looked up on every call so replacing it
+    at runtime (e.g. in tests) still takes effect.
     """
 
-    scanners: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
-    for mod_info in iter_modules(scans.__path__):
-        if mod_info.name.startswith("_"):
-            continue
-        module = import_module(f"{scans.__name__}.{mod_info.name}")
+    scanners: List[Tuple[str, Callable[..., Dict[str, Any]]]] = []
+    for name, module in _discover_modules().modules:
         scan_func = getattr(module, "scan", None)
         if callable(scan_func):
-            scanners.append((mod_info.name, scan_func))
+            scanners.append((name, scan_func))
     return scanners
 
 
-def run_all(timeout: float = 5.0) -> Dict[str, List[Dict[str, Any]]]:
-    """Execute all static scanners in parallel and aggregate their results.
+def _has_privileges() -> bool:
+    geteuid = getattr(os, "geteuid", None)
+    return geteuid is None or geteuid() == 0
 
-    Parameters
-    ----------
-    timeout:
-        Maximum time (in seconds) to wait for each individual scanner.
 
-    Returns
-    -------
-    dict
-        A mapping containing a ``findings`` list with each scanner's result and
-        the aggregated ``risk_score``.
+def _normalise_targets(targets: Iterable[Any]) -> Dict[str, Mapping[str, Any]]:
+    """Return unique host addresses from *targets* preserving order.
+
+    ``targets`` may contain plain IP strings or the host dictionaries returned
+    by :func:`discover_hosts.discover_hosts` (``{"ip": ...}``).  The mapping
+    values keep the original host dictionary (empty for plain strings) so
+    that metadata such as the MAC address can be used for change detection.
     """
 
+    hosts: Dict[str, Mapping[str, Any]] = {}
+    for target in targets:
+        ip = target.get("ip") if isinstance(target, Mapping) else target
+        if ip and str(ip) not in hosts:
+            hosts[str(ip)] = target if isinstance(target, Mapping) else {}
+    return hosts
+
+
+def _normalise_result(name: str, result: Any) -> Dict[str, Any]:
+    """Ensure mandatory fields exist even if the scanner omitted them."""
+
+    if not isinstance(result, dict):
+        result = {}
+    result.setdefault("category", name)
+    result.setdefault("score", 0)
+    result.setdefault("details", {})
+    return result
+
+
+def _error_result(name: str, message: str) -> Dict[str, Any]:
+    return {"category": name, "score": 0, "details": {"error": message}}
+
+
+class _Task(NamedTuple):
+    """One cell of the host × scanner matrix."""
+
+    name: str
+    host: Optional[str]
+    func: Callable[..., Any]
+    args: Tuple[Any, ...]
+    # 同じスキャナを同時に実行できる数。None は全体の上限だけに従う
+    limit: Optional[int]
+
+
+def _mp_context() -> Any:
+    """Prefer ``fork`` so closures and monkeypatched scanners work as-is."""
+
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("fork" if "fork" in methods else None)
+
+
+def _subprocess_entry(conn: Any, func: Callable[..., Any], args: Tuple) -> None:
+    try:
+        conn.send(("ok", func(*args)))
+    except BaseException as exc:  # noqa: BLE001 - 親プロセスへそのまま伝える
+        conn.send(("error", str(exc)))
+    finally:
+        conn.close()
+
+
+def _call_in_subprocess(
+    func: Callable[..., Any],
+    args: Tuple[Any, ...],
+    budget: float,
+    cancel: threading.Event,
+) -> Any:
+    """Run ``func(*args)`` in a child process that is killed on overrun.
+
+    A hung ``nmap`` or ``sr1`` call would otherwise pin a worker thread
+    forever; a process can be terminated once ``budget`` seconds elapse or
+    ``cancel`` is set by the global deadline.
+    """
+
+    ctx = _mp_context()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(
+        target=_subprocess_entry, args=(child_conn, func, args), daemon=True
+    )
+    with _FORK_LOCK:
+        proc.start()
+    child_conn.close()
+    expires = time.monotonic() + budget
+    try:
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0 or cancel.is_set():
+                raise TimeoutError("timeout")
+            if parent_conn.poll(min(remaining, _POLL_INTERVAL)):
+                try:
+                    status, payload = parent_conn.recv()
+                except EOFError:
+                    raise RuntimeError(
+                        f"scanner process exited with code {proc.exitcode}"
+                    ) from None
+                if status == "error":
+                    raise RuntimeError(payload)
+                return payload
+            if not proc.is_alive() and not parent_conn.poll():
+                raise RuntimeError(f"scanner process exited with code {proc.exitcode}")
+    finally:
+        if proc.is_alive():
+            proc.kill()
+        proc.join(timeout=1)
+        parent_conn.close()
+
+
+def _start(
+    task: _Task, budget: float, cancel: threading.Event, isolation: str
+) -> Tuple["Future[Any]", threading.Thread]:
+    """Run ``task`` on its own daemon thread and return its future.
+
+    A fresh thread per run means a thread-mode scanner abandoned after its
+    budget only leaks that thread; it does not keep a pool worker or a
+    concurrency slot away from the tasks still waiting.
+    """
+
+    future: "Future[Any]" = Future()
+    future.set_running_or_notify_cancel()
+
+    def target() -> None:
+        try:
+            if isolation == "process":
+                result = _call_in_subprocess(task.func, task.args, budget, cancel)
+            else:
+                result = task.func(*task.args)
+        except BaseException as exc:  # noqa: BLE001 - 呼び出し側へそのまま伝える
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    thread = threading.Thread(target=target, name=f"scan-{task.name}", daemon=True)
+    thread.start()
+    return future, thread
+
+
+def _run_tasks(
+    tasks: List[_Task],
+    workers: int,
+    budgets: Mapping[str, float],
+    default_budget: float,
+    deadline: Optional[float],
+    isolation: str,
+) -> Generator[Tuple[int, Dict[str, Any]], None, None]:
+    """Yield ``(task_index, result)`` pairs in completion order.
+
+    Tasks are started in plan order while fewer than ``workers`` run overall
+    and fewer than ``task.limit`` run for the same scanner.  Each task gets
+    its own budget counted from the moment it starts running and every task
+    is abandoned once the overall ``deadline`` passes.  An abandoned task
+    gives its slot back immediately, so a hung scanner cannot starve the
+    hosts queued behind it.  The generator never blocks on hung workers:
+    thread workers are left behind and process workers are killed.
+    """
+
+    if isolation not in {"thread", "process"}:
+        raise ValueError(f"unknown isolation mode: {isolation}")
+
+    cancel = threading.Event()
+    hard_stop = time.monotonic() + deadline if deadline is not None else None
+    capacity = max(1, workers)
+    limits = [budgets.get(task.name, default_budget) for task in tasks]
+    # スキャナ名ごとの待ち行列。先頭から順に空きスロットへ割り当てる
+    queues: Dict[str, Deque[int]] = {}
+    for index, task in enumerate(tasks):
+        queues.setdefault(task.name, deque()).append(index)
+    active: Dict[str, int] = {name: 0 for name in queues}
+    running: Dict["Future[Any]", Tuple[int, float]] = {}
+    threads: List[threading.Thread] = []
+
+    def admit() -> None:
+        for name, queue in queues.items():
+            while queue and len(running) < capacity:
+                limit = tasks[queue[0]].limit
+                if limit is not None and active[name] >= limit:
+                    break
+                index = queue.popleft()
+                future, thread = _start(tasks[index], limits[index], cancel, isolation)
+                running[future] = (index, time.monotonic())
+                active[name] += 1
+                threads.append(thread)
+
+    def finish(future: "Future[Any]") -> int:
+        index, _ = running.pop(future)
+        active[tasks[index].name] -= 1
+        return index
+
+    try:
+        admit()
+        while running:
+            now = time.monotonic()
+            if hard_stop is not None and now >= hard_stop:
+                # 期限切れ: 実行中も未開始もまとめてタイムアウトにする
+                waiting = [i for queue in queues.values() for i in queue]
+                for index in sorted([i for i, _ in running.values()] + waiting):
+                    yield index, _error_result(tasks[index].name, "timeout")
+                return
+            for future, (index, begun) in list(running.items()):
+                if now >= begun + limits[index] and not future.done():
+                    finish(future)
+                    yield index, _error_result(tasks[index].name, "timeout")
+            admit()
+            if not running:
+                break
+
+            wake = [begun + limits[index] for index, begun in running.values()]
+            if hard_stop is not None:
+                wake.append(hard_stop)
+            wait_for = min([_POLL_INTERVAL, *(w - now for w in wake)])
+            done, _ = wait(
+                list(running), timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                index = finish(future)
+                name = tasks[index].name
+                try:
+                    result = _normalise_result(name, future.result())
+                except TimeoutError:
+                    result = _error_result(name, "timeout")
+                except Exception as exc:  # noqa: BLE001 - surface scan errors
+                    result = _error_result(name, str(exc))
+                yield index, result
+            admit()
+    finally:
+        cancel.set()
+        if isolation == "process":
+            # 子プロセスを確実に止めてから戻る
+            for thread in threads:
+                thread.join()
+
+
+def _build_tasks(
+    scanners: List[Tuple[str, Callable[..., Any]]],
+    hosts: Optional[List[str]],
+    concurrency: Optional[Mapping[str, int]],
+) -> Tuple[List[_Task], int]:
+    """Build the host × scanner task matrix and the worker count it needs.
+
+    Without ``hosts`` every scanner runs once with its default target.
+    """
+
+    limits = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+    tasks: List[_Task] = []
+    workers = 0
+    for name, scan in scanners:
+        if hosts is not None and name in HOST_SCANNERS:
+            limit = max(1, limits.get(name, DEFAULT_SCANNER_CONCURRENCY))
+            tasks.extend(_Task(name, host, scan, (host,), limit) for host in hosts)
+            workers += min(limit, len(hosts))
+        else:
+            tasks.append(_Task(name, None, scan, (), None))
+            workers += 1
+    return tasks, workers
+
+
+class _Plan(NamedTuple):
+    tasks: List[_Task]
+    workers: int
+    hosts: Optional[List[str]]
+    metadata: Optional[Dict[str, Mapping[str, Any]]]
+    skipped: Dict[str, str]
+
+
+def _plan(
+    targets: Optional[Iterable[Any]],
+    concurrency: Optional[Mapping[str, int]],
+    skip_unprivileged: bool,
+) -> _Plan:
+    """Discover scanners and lay out the task matrix for one run."""
+
     # Discover available scanners then prioritise important ones.  The first
     # two results should always be ``ports`` followed by ``os_banner`` so the
     # API responses remain consistent.
     scanners = _load_scanners()
+    skipped = dict(_DISCOVERY_CACHE.get(tuple(scans.__path__), _NO_DISCOVERY).skipped)
+    if skip_unprivileged and not _has_privileges():
+        for name, _ in scanners:
+            if scans.scanner_info(name).privileged:
+                skipped[name] = "requires root privileges"
+        scanners = [item for item in scanners if item[0] not in skipped]
     priority = ["ports", "os_banner"]
     scanners.sort(
         key=lambda x: priority.index(x[0]) if x[0] in priority else len(priority)
     )
 
-    findings: List[Dict[str, Any]] = []
+    metadata = _normalise_targets(targets) if targets is not None else None
+    hosts = list(metadata) if metadata is not None else None
+    tasks, workers = _build_tasks(scanners, hosts, concurrency)
+    return _Plan(tasks, workers, hosts, metadata, skipped)
+
+
+def _execute(
+    plan: _Plan,
+    *,
+    timeout: float,
+    deadline: Optional[float],
+    budgets: Optional[Mapping[str, float]],
+    isolation: str,
+    cache: Optional["ScanResultCache"],
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield ``(task_index, result)`` for every task as soon as it is known.
+
+    Fresh cached results are yielded first, then live results in completion
+    order.  On timeout or failure an error entry with score 0 is yielded.
+    New results are written back to ``cache`` even if the caller stops early.
+
+    With a cache, host scanners of hosts whose ``ports`` result is being
+    re-scanned are looked up only after that scan finished, so their
+    fingerprint reflects the ports open now rather than in the previous run.
+    """
+
+    tasks, metadata = plan.tasks, plan.metadata
+    started = time.monotonic()
+    snapshot: Dict[Any, Any] = {}
+    fresh: List[Tuple[_Task, Dict[str, Any]]] = []
+
+    def fingerprint(task: _Task) -> str:
+        assert cache is not None
+        target = metadata.get(task.host) if metadata and task.host else None
+        return cache.fingerprint(task.name, task.host, target, snapshot)
+
+    def lookup(
+        indices: List[int],
+    ) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[int]]:
+        # キャッシュが有効で指紋も変わっていない結果は再スキャンしない
+        assert cache is not None
+        hits: List[Tuple[int, Dict[str, Any]]] = []
+        misses: List[int] = []
+        for index in indices:
+            task = tasks[index]
+            hit = cache.lookup(snapshot, task.host, task.name, fingerprint(task))
+            if hit is None:
+                misses.append(index)
+                continue
+            hit = {**hit, "cached": True}
+            if task.host is not None:
+                hit["target"] = task.host
+            hits.append((index, hit))
+        return hits, misses
+
+    def run(pending: List[int]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        remaining = None
+        if deadline is not None:
+            remaining = max(0.0, deadline - (time.monotonic() - started))
+        runner = _run_tasks(
+            [tasks[index] for index in pending],
+            plan.workers,
+            budgets or {},
+            timeout,
+            remaining,
+            isolation,
+        )
+        try:
+            for position, result in runner:
+                index = pending[position]
+                task = tasks[index]
+                if task.host is not None:
+                    result["target"] = task.host
+                    if task.name == "ports" and "error" not in result["details"]:
+                        # 今回の ports 結果を以降の指紋計算に使う
+                        snapshot[(task.host, "ports")] = ("", 0.0, result)
+                fresh.append((task, result))
+                yield index, result
+        finally:
+            runner.close()
 
-    # Run all scanners concurrently while preserving the deterministic order
-    # established above.  Each scanner is allowed ``timeout`` seconds to
-    # complete; on timeout or failure we record an error entry with score 0.
-    with ThreadPoolExecutor() as pool:
-        futures: List[Tuple[str, Future[Any]]] = [
-            (name, pool.submit(scan)) for name, scan in scanners
+    if cache is None:
+        yield from run(list(range(len(tasks))))
+        return
+
+    snapshot = cache.snapshot()
+    try:
+        hits, pending = lookup(
+            [i for i, task in enumerate(tasks) if task.name == "ports"]
+        )
+        rescanned = {tasks[index].host for index in pending}
+        # ポートを取り直すホストのスキャナは新しい開放ポートで判定する
+        deferred = [
+            i
+            for i, task in enumerate(tasks)
+            if task.name != "ports" and task.host is not None and task.host in rescanned
         ]
-        for name, future in futures:
-            try:
-                result = future.result(timeout=timeout)
-            except TimeoutError:
-                result = {
-                    "category": name,
-                    "score": 0,
-                    "details": {"error": "timeout"},
-                }
-            except Exception as exc:  # noqa: BLE001 - surface scan errors
-                result = {
-                    "category": name,
-                    "score": 0,
-                    "details": {"error": str(exc)},
-                }
-            else:
-                # Ensure mandatory fields exist even if the scanner omitted
-                # them.
-                result.setdefault("category", name)
-                result.setdefault("score", 0)
-                result.setdefault("details", {})
+        deferred_set = set(deferred)
+        other_hits, other_pending = lookup(
+            [
+                i
+                for i, task in enumerate(tasks)
+                if task.name != "ports" and i not in deferred_set
+            ]
+        )
+        yield from hits
+        yield from other_hits
+        yield from run(pending + other_pending)
+        if deferred:
+            hits, pending = lookup(deferred)
+            yield from hits
+            yield from run(pending)
+    finally:
+        cache.store_many(
+            (task.host, task.name, fingerprint(task), item) for task, item in fresh
+        )
+
+
+def run_all(
+    timeout: float = 5.0,
+    targets: Optional[Iterable[Any]] = None,
+    concurrency: Optional[Mapping[str, int]] = None,
+    *,
+    deadline: Optional[float] = None,
+    budgets: Optional[Mapping[str, float]] = None,
+    isolation: str = "thread",
+    skip_unprivileged: bool = False,
+    cache: Optional["ScanResultCache"] = None,
+) -> Dict[str, Any]:
+    """Execute all static scanners in parallel and aggregate their results.
+
+    Parameters
+    ----------
+    timeout:
+        Default time budget (in seconds) for each individual scanner run,
+        counted from when that run starts.
+    targets:
+        Optional hosts to assess, e.g. the output of
+        :func:`discover_hosts.discover_hosts`.  Host based scanners
+        (:data:`HOST_SCANNERS`) are scheduled once per host while network wide
+        scanners still run once.  When omitted each scanner runs with its own
+        default target.
+    concurrency:
+        Per-scanner overrides for :data:`DEFAULT_CONCURRENCY`.
+    deadline:
+        Overall time limit for the whole run.  Scanners still running (or not
+        yet started) when it passes are reported as timed out.
+    budgets:
+        Per-scanner overrides for ``timeout``, e.g. ``{"os_banner": 30}``.
+    isolation:
+        ``"thread"`` (default) runs scanners in worker threads; one that
+        overruns its budget is left behind and its slot goes to the next
+        queued task.  ``"process"``
+        runs each one in a child process that is killed when its budget or
+        the deadline expires, so hung scanners do not linger.
+    skip_unprivileged:
+        Skip scanners registered as ``privileged`` when not running as root
+        instead of letting them fail with permission errors.
+    cache:
+        Optional :class:`scan_cache.ScanResultCache`.  Cached results that are
+        still within their scanner's TTL and whose host fingerprint (MAC,
+        open ports) is unchanged are reused instead of re-scanning; reused
+        findings carry ``"cached": True``.  Fresh results are written back.
 
-            findings.append(result)
+    Returns
+    -------
+    dict
+        A mapping containing a ``findings`` list with each scanner's result and
+        the aggregated ``risk_score``.  With ``targets`` a ``hosts`` mapping of
+        ``ip -> {"findings", "risk_score"}`` is added as well.  Scanners that
+        were not run (missing dependency or privileges) are listed under
+        ``skipped`` as ``name -> reason``.
+    """
+
+    plan = _plan(targets, concurrency, skip_unprivileged)
+
+    # Results arrive in completion order and are slotted back into the
+    # deterministic order established by the plan.
+    ordered: List[Optional[Dict[str, Any]]] = [None] * len(plan.tasks)
+    for index, result in _execute(
+        plan,
+        timeout=timeout,
+        deadline=deadline,
+        budgets=budgets,
+        isolation=isolation,
+        cache=cache,
+    ):
+        ordered[index] = result
+
+    hosts, skipped = plan.hosts, plan.skipped
+    findings: List[Dict[str, Any]] = []
+    host_findings: Dict[str, List[Dict[str, Any]]] = {h: [] for h in hosts or []}
+    for task, item in zip(plan.tasks, ordered):
+        if item is None:
+            continue
+        findings.append(item)
+        if task.host is not None:
+            host_findings[task.host].append(item)
 
     # ``risk_score`` は各スキャンの ``score`` の合計値
     risk_score = sum(item.get("score", 0) for item in findings)
 
-    return {"findings": findings, "risk_score": risk_score}
+    report: Dict[str, Any] = {"findings": findings, "risk_score": risk_score}
+    if hosts is not None:
+        report["hosts"] = {
+            host: {
+                "findings": items,
+                "risk_score": sum(item.get("score", 0) for item in items),
+            }
+            for host, items in host_findings.items()
+        }
+    if skipped:
+        report["skipped"] = skipped
+    return report
+
+
+def iter_results(
+    timeout: float = 5.0,
+    targets: Optional[Iterable[Any]] = None,
+    concurrency: Optional[Mapping[str, int]] = None,
+    *,
+    deadline: Optional[float] = None,
+    budgets: Optional[Mapping[str, float]] = None,
+    isolation: str = "thread",
+    skip_unprivileged: bool = False,
+    cache: Optional["ScanResultCache"] = None,
+) -> Generator[Dict[str, Any], None, None]:
+    """Streaming variant of :func:`run_all`.
+
+    Takes the same arguments but yields an event as soon as each scanner (or
+    each host × scanner pair with ``targets``) completes::
+
+        {"type": "result", "finding": {...}, "risk_score": 7,
+         "completed": 3, "total": 12, "host": "10.0.0.5", "host_risk_score": 2}
+
+    ``risk_score`` is the running total; ``host``/``host_risk_score`` are only
+    present for host results.  A final ``{"type": "done", "risk_score",
+    "completed", "total"}`` event (plus ``skipped`` when non-empty) closes the
+    stream.  Closing the iterator early abandons the remaining scanners.
+    """
+
+    plan = _plan(targets, concurrency, skip_unprivileged)
+    total = len(plan.tasks)
+    risk_score = 0
+    host_scores: Dict[str, int] = {h: 0 for h in plan.hosts or []}
+    completed = 0
+    for index, result in _execute(
+        plan,
+        timeout=timeout,
+        deadline=deadline,
+        budgets=budgets,
+        isolation=isolation,
+        cache=cache,
+    ):
+        completed += 1
+        score = result.get("score", 0)
+        risk_score += score
+        event: Dict[str, Any] = {
+            "type": "result",
+            "finding": result,
+            "risk_score": risk_score,
+            "completed": completed,
+            "total": total,
+        }
+        host = plan.tasks[index].host
+        if host is not None:
+            host_scores[host] += score
+            event["host"] = host
+            event["host_risk_score"] = host_scores[host]
+        yield event
+
+    done: Dict[str, Any] = {
+        "type": "done",
+        "risk_score": risk_score,
+        "completed": completed,
+        "total": total,
+    }
+    if plan.skipped:
+        done["skipped"] = plan.skipped
+    yield done
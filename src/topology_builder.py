@@ -1,34 +1,33 @@
 """Network topology building utilities.
 
 This module constructs simple path representations between the local
-network and discovered hosts.  The implementation relies on the system's
-``traceroute`` command and optionally augments hop information using
-SNMP/LLDP queries via :mod:`pysnmp`.
+network and discovered hosts.  Routes are traced concurrently by
+:mod:`traceroute_engine`, falling back to the system's ``traceroute``
+command without raw socket privileges, and hop information is optionally
+augmented with LLDP neighbour names fetched over SNMP by
+:mod:`snmp_client`.  The walk uses SNMPv2c GETBULK, so devices that only
+speak SNMPv1 contribute no neighbour names.
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import subprocess
-from typing import Iterable, List
-
-try:
-    from pysnmp.hlapi import (
-        CommunityData,
-        ContextData,
-        ObjectIdentity,
-        ObjectType,
-        SnmpEngine,
-        UdpTransportTarget,
-        nextCmd,
-    )
-except Exception:  # pragma: no cover - pysnmp may be unavailable
-    CommunityData = ContextData = ObjectIdentity = ObjectType = SnmpEngine = (
-        UdpTransportTarget
-    ) = nextCmd = None
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
+from . import snmp_client, traceroute_engine
+from .dynamic_scan import neighbors as l2_neighbors
+from .topology_graph import Delta, TopologyGraph
 
 LLDP_REMOTE_SYS_NAME_OID = "1.0.8802.1.1.2.1.4.1.1.9"
+# traceroute コマンドへフォールバックする際の同時実行数
+TRACEROUTE_WORKERS = 16
+# LLDP 近隣情報のキャッシュ有効期間 (秒) と SNMP の同時問い合わせ数
+NEIGHBOR_CACHE_TTL = 300.0
+SNMP_CONCURRENCY = 32
 
 
 def traceroute(ip: str) -> List[str]:
@@ -45,64 +44,187 @@ def traceroute(ip: str) -> List[str]:
     return hops
 
 
-def _get_lldp_neighbors(ip: str, community: str = "public") -> List[str]:
-    """Retrieve LLDP neighbor names using SNMP."""
-    if nextCmd is None:  # pysnmp not available
-        return []
+def _trace_all(hosts: List[str]) -> Dict[str, List[str]]:
+    """Return hop addresses for every host, tracing them concurrently."""
+
+    traced = traceroute_engine.trace_many(hosts) if hosts else {}
+    if traced is None:
+        traced = {}
+    missing = [ip for ip in hosts if ip not in traced]
+    if missing:
+        # raw ソケットが使えない場合や IPv6 はコマンドを並列に実行する
+        with ThreadPoolExecutor(
+            max_workers=min(TRACEROUTE_WORKERS, len(missing))
+        ) as pool:
+            traced.update(zip(missing, pool.map(traceroute, missing)))
+    return traced
+
+
+class NeighborCache:
+    """LLDP neighbour names per ``(device, community)`` with a TTL.
+
+    Devices that did not answer are cached as well, so an unreachable
+    switch on many paths costs one timeout per TTL window.
+    """
+
+    def __init__(
+        self,
+        ttl: float = NEIGHBOR_CACHE_TTL,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[Tuple[str, str], Tuple[float, List[str]]] = {}
+
+    def get(self, ip: str, community: str) -> Optional[List[str]]:
+        entry = self._entries.get((ip, community))
+        if entry is None or self._clock() - entry[0] >= self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, ip: str, community: str, neighbors: List[str]) -> None:
+        self._entries[(ip, community)] = (self._clock(), neighbors)
+
+
+_neighbor_cache = NeighborCache()
+
+
+async def _fetch_lldp_neighbors(
+    ips: List[str], community: str, concurrency: int = SNMP_CONCURRENCY
+) -> Dict[str, List[str]]:
+    """Walk the LLDP remote system names of *ips* concurrently."""
+
+    client = await snmp_client.SnmpClient.open()
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def walk(ip: str) -> List[str]:
+        async with sem:
+            try:
+                rows = await client.bulk_walk(ip, community, LLDP_REMOTE_SYS_NAME_OID)
+            except (OSError, TimeoutError):
+                return []
+            return [str(value) for _, value in rows if value]
 
-    neighbors: List[str] = []
     try:
-        for error_indication, error_status, _error_index, var_binds in nextCmd(
-            SnmpEngine(),
-            CommunityData(community, mpModel=0),
-            UdpTransportTarget((ip, 161), timeout=1, retries=0),
-            ContextData(),
-            ObjectType(ObjectIdentity(LLDP_REMOTE_SYS_NAME_OID)),
-            lexicographicMode=False,
-        ):
-            if error_indication or error_status:
-                break
-            for var_bind in var_binds:
-                neighbors.append(str(var_bind[1]))
-    except Exception:
-        return []
-    return neighbors
+        results = await asyncio.gather(*(walk(ip) for ip in ips))
+    finally:
+        client.close()
+    return dict(zip(ips, results))
+
+
+def lookup_lldp_neighbors(
+    ips: Iterable[str], community: str = "public"
+) -> Dict[str, List[str]]:
+    """Return LLDP neighbour names for every device in *ips*.
+
+    Each distinct device is queried at most once per cache TTL; devices
+    missing from the cache are walked concurrently with GETBULK.
+    """
+
+    targets = list(dict.fromkeys(ips))
+    found: Dict[str, List[str]] = {}
+    missing: List[str] = []
+    for ip in targets:
+        cached = _neighbor_cache.get(ip, community)
+        if cached is None:
+            missing.append(ip)
+        else:
+            found[ip] = cached
+    if missing:
+        fetched = asyncio.run(_fetch_lldp_neighbors(missing, community))
+        for ip, neighbors in fetched.items():
+            _neighbor_cache.put(ip, community, neighbors)
+            found[ip] = neighbors
+    return found
+
+
+def _get_lldp_neighbors(ip: str, community: str = "public") -> List[str]:
+    """Retrieve LLDP neighbor names using SNMP."""
+    return lookup_lldp_neighbors([ip], community).get(ip, [])
 
 
 def _augment_with_snmp(
     hops: List[str], path: List[str], community: str = "public"
 ) -> None:
     """Replace hop labels with LLDP neighbor names when available."""
-    if nextCmd is None:
-        return
     for idx, hop in enumerate(hops[:-1]):  # 最終ホストは除外
+        if path[idx + 1] != "Router":  # 受動的に判明した名前を優先
+            continue
         neighbors = _get_lldp_neighbors(hop, community)
         if neighbors:
             path[idx + 1] = neighbors[0]
 
 
+def _augment_with_neighbors(hops: List[str], path: List[str]) -> None:
+    """Label hops with names learned passively from captured LLDP/CDP."""
+    for idx, hop in enumerate(hops[:-1]):
+        name = l2_neighbors.neighbor_table.name_for(hop)
+        if name:
+            path[idx + 1] = name
+
+
 def build_paths(
     hosts: Iterable[str], use_snmp: bool = False, community: str = "public"
 ) -> dict:
     """Construct labelled paths for ``hosts``.
 
     Each path starts with ``LAN`` and converts hop IPs to generic labels
-    such as ``Router`` and ``Host``. When ``use_snmp`` is true and
-    :mod:`pysnmp` is available, the path is augmented with LLDP neighbor
-    names via :func:`_augment_with_snmp`.
+    such as ``Router`` and ``Host``.  Hops whose management address was seen
+    in captured LLDP/CDP frames are labelled with the announced system name.
+    When ``use_snmp`` is true, the remaining intermediate hops of all paths
+    are queried once via :func:`lookup_lldp_neighbors` and the path is
+    augmented with LLDP neighbor names via :func:`_augment_with_snmp`.
     """
+    targets = list(hosts)
+    traced = _trace_all(list(dict.fromkeys(targets)))
+    table = l2_neighbors.neighbor_table
+    if use_snmp:
+        # 全経路の中継機器をまとめて問い合わせ、キャッシュを温めておく
+        lookup_lldp_neighbors(
+            (
+                hop
+                for ip in targets
+                for hop in traced[ip][:-1]
+                if table.name_for(hop) is None
+            ),
+            community,
+        )
     results = []
-    for ip in hosts:
-        hops = traceroute(ip)
+    for ip in targets:
+        hops = traced[ip]
         path: List[str] = ["LAN"]
         for hop in hops:
             path.append("Host" if hop == ip else "Router")
-        if use_snmp and nextCmd is not None:
+        _augment_with_neighbors(hops, path)
+        if use_snmp:
             _augment_with_snmp(hops, path, community)
         results.append({"ip": ip, "path": path})
     return {"paths": results}
 
 
+def update_topology_graph(
+    graph: TopologyGraph, hosts: Iterable[str], *, replace: bool = True
+) -> List[Delta]:
+    """Trace ``hosts`` and merge their paths into ``graph``.
+
+    Node ids are ``LAN`` followed by hop addresses, so hosts behind the same
+    routers share nodes and edges.  With ``replace`` hosts missing from
+    ``hosts`` are removed.  Only the changes are returned, as produced by
+    :meth:`TopologyGraph.update`.
+    """
+    targets = list(dict.fromkeys(hosts))
+    traced = _trace_all(targets)
+    paths: Dict[str, List[str]] = {}
+    for ip in targets:
+        path = ["LAN", *traced[ip]]
+        if path[-1] != ip:
+            # 宛先まで届かなかった経路も最後に応答したホップの先に置く
+            path.append(ip)
+        paths[ip] = path
+    return graph.update(paths, replace=replace)
+
+
 def build_topology(
     hosts: Iterable[str], use_snmp: bool = False, community: str = "public"
 ) -> str:
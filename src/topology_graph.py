@@ -0,0 +1,248 @@
+"""Incrementally maintained topology graph backed by a path trie.
+
+Every host contributes one path (a sequence of node ids from the local
+network to the host).  Paths are stored in a trie, so hosts behind the same
+gateway and core switches share their common prefix, and each trie node
+adds exactly one edge to the merged graph.  Inserting or removing a host
+therefore only touches the trie nodes of its own path, and the changes to
+the node and edge sets are returned as deltas the UI can apply directly.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+Edge = Tuple[str, str]
+Delta = Dict[str, Any]
+
+
+class _TrieNode:
+    __slots__ = ("node_id", "parent", "children", "count")
+
+    def __init__(self, node_id: str, parent: Optional["_TrieNode"]) -> None:
+        self.node_id = node_id
+        self.parent = parent
+        self.children: Dict[str, "_TrieNode"] = {}
+        # この trie ノードを通るホストの数
+        self.count = 0
+
+
+class TopologyGraph:
+    """Merged graph of host paths supporting incremental updates.
+
+    Mutating methods return the resulting deltas: ``add_node``,
+    ``add_edge``, ``remove_edge`` and ``remove_node`` changes, followed by
+    ``set_host`` / ``remove_host``.  Changes cancelling out within one call
+    (a host moving behind the same router) are not reported.
+    """
+
+    def __init__(self) -> None:
+        self._root = _TrieNode("", None)
+        self._hosts: Dict[str, _TrieNode] = {}
+        # trie ノード単位の参照数 (同じ機器が複数の経路位置に現れうる)
+        self._nodes: Dict[str, int] = {}
+        self._edges: Dict[Edge, int] = {}
+        self.version = 0
+
+    # -- 参照 -------------------------------------------------------------
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    @property
+    def edges(self) -> List[Edge]:
+        return list(self._edges)
+
+    @property
+    def hosts(self) -> List[str]:
+        return list(self._hosts)
+
+    def __contains__(self, host: object) -> bool:
+        return host in self._hosts
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def path(self, host: str) -> List[str]:
+        """Return the path of *host* (``KeyError`` if unknown)."""
+
+        node: Optional[_TrieNode] = self._hosts[host]
+        path: List[str] = []
+        while node is not None and node is not self._root:
+            path.append(node.node_id)
+            node = node.parent
+        path.reverse()
+        return path
+
+    def paths(self) -> Iterator[Tuple[str, List[str]]]:
+        for host in self._hosts:
+            yield host, self.path(host)
+
+    # -- 更新 -------------------------------------------------------------
+    def set_path(self, host: str, path: Sequence[str]) -> List[Delta]:
+        """Insert *host* with *path*, replacing its previous path."""
+
+        return self.update({host: path})
+
+    def remove(self, host: str) -> List[Delta]:
+        """Remove *host*; unknown hosts produce no deltas."""
+
+        return self.update({}, remove=[host])
+
+    def update(
+        self,
+        paths: Mapping[str, Sequence[str]],
+        *,
+        remove: Sequence[str] = (),
+        replace: bool = False,
+    ) -> List[Delta]:
+        """Apply several host changes at once.
+
+        Parameters
+        ----------
+        paths:
+            ``host -> path`` to insert or replace.  Unchanged paths cost one
+            comparison and produce no deltas.
+        remove:
+            Hosts to remove.
+        replace:
+            Also remove every known host missing from *paths*.
+        """
+
+        touched_nodes: Dict[str, bool] = {}
+        touched_edges: Dict[Edge, bool] = {}
+        host_changes: List[Delta] = []
+        gone = list(remove)
+        if replace:
+            gone.extend(h for h in self._hosts if h not in paths)
+        for host in gone:
+            leaf = self._hosts.pop(host, None)
+            if leaf is None:
+                continue
+            self._release(leaf, touched_nodes, touched_edges)
+            host_changes.append({"op": "remove_host", "host": host})
+        for host, path in paths.items():
+            new_path = list(path)
+            if not new_path:
+                raise ValueError(f"empty path for host {host!r}")
+            old = self._hosts.get(host)
+            if old is not None:
+                if self.path(host) == new_path:
+                    continue
+                self._release(old, touched_nodes, touched_edges)
+            self._hosts[host] = self._acquire(new_path, touched_nodes, touched_edges)
+            host_changes.append({"op": "set_host", "host": host, "path": new_path})
+
+        changes: List[Delta] = []
+        for node_id, existed in touched_nodes.items():
+            if not existed and node_id in self._nodes:
+                changes.append({"op": "add_node", "id": node_id})
+        for edge, existed in touched_edges.items():
+            if not existed and edge in self._edges:
+                changes.append({"op": "add_edge", "source": edge[0], "target": edge[1]})
+        for edge, existed in touched_edges.items():
+            if existed and edge not in self._edges:
+                changes.append(
+                    {"op": "remove_edge", "source": edge[0], "target": edge[1]}
+                )
+        for node_id, existed in touched_nodes.items():
+            if existed and node_id not in self._nodes:
+                changes.append({"op": "remove_node", "id": node_id})
+        changes.extend(host_changes)
+        if changes:
+            self.version += 1
+        return changes
+
+    def _acquire(
+        self,
+        path: List[str],
+        touched_nodes: Dict[str, bool],
+        touched_edges: Dict[Edge, bool],
+    ) -> _TrieNode:
+        node = self._root
+        for node_id in path:
+            child = node.children.get(node_id)
+            if child is None:
+                # 新しい trie ノードだけがノード・エッジの参照を増やす
+                child = node.children[node_id] = _TrieNode(node_id, node)
+                touched_nodes.setdefault(node_id, node_id in self._nodes)
+                self._nodes[node_id] = self._nodes.get(node_id, 0) + 1
+                if node is not self._root:
+                    edge = (node.node_id, node_id)
+                    touched_edges.setdefault(edge, edge in self._edges)
+                    self._edges[edge] = self._edges.get(edge, 0) + 1
+            child.count += 1
+            node = child
+        return node
+
+    def _release(
+        self,
+        leaf: _TrieNode,
+        touched_nodes: Dict[str, bool],
+        touched_edges: Dict[Edge, bool],
+    ) -> None:
+        node: Optional[_TrieNode] = leaf
+        while node is not None and node is not self._root:
+            parent = node.parent
+            node.count -= 1
+            if node.count == 0 and parent is not None:
+                del parent.children[node.node_id]
+                touched_nodes.setdefault(node.node_id, True)
+                self._decrement(self._nodes, node.node_id)
+                if parent is not self._root:
+                    edge = (parent.node_id, node.node_id)
+                    touched_edges.setdefault(edge, True)
+                    self._decrement(self._edges, edge)
+            node = parent
+
+    @staticmethod
+    def _decrement(counts: Dict[Any, int], key: Any) -> None:
+        if counts[key] <= 1:
+            del counts[key]
+        else:
+            counts[key] -= 1
+
+    # -- 直列化 -----------------------------------------------------------
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a compact JSON-serialisable snapshot.
+
+        Node ids are stored once in ``ids``; the trie is a flat
+        ``[parent, id_index, ...]`` list (parent ``-1`` for first hops) in
+        which parents precede children, and ``hosts`` maps each host to its
+        trie entry.
+        """
+
+        ids: Dict[str, int] = {}
+        trie: List[int] = []
+        index: Dict[int, int] = {}
+        stack = [(child, -1) for child in reversed(list(self._root.children.values()))]
+        while stack:
+            node, parent = stack.pop()
+            position = len(trie) // 2
+            index[id(node)] = position
+            trie.extend((parent, ids.setdefault(node.node_id, len(ids))))
+            stack.extend(
+                (child, position) for child in reversed(list(node.children.values()))
+            )
+        return {
+            "version": self.version,
+            "ids": list(ids),
+            "trie": trie,
+            "hosts": {host: index[id(leaf)] for host, leaf in self._hosts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "TopologyGraph":
+        """Rebuild a graph from :meth:`to_dict` output."""
+
+        ids: List[str] = list(data.get("ids", []))
+        trie: List[int] = list(data.get("trie", []))
+        paths: List[List[str]] = []
+        for pos in range(len(trie) // 2):
+            parent, id_index = trie[2 * pos], trie[2 * pos + 1]
+            prefix = paths[parent] if parent >= 0 else []
+            paths.append(prefix + [ids[id_index]])
+        graph = cls()
+        graph.update({host: paths[pos] for host, pos in data.get("hosts", {}).items()})
+        graph.version = int(data.get("version", 0))
+        return graph
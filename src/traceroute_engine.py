@@ -0,0 +1,287 @@
+"""Concurrent TTL-probing traceroute with a shared hop cache.
+
+Instead of running the system ``traceroute`` once per host, UDP probes with
+increasing TTL are sent for many destinations at the same time from one
+socket, and the ICMP time-exceeded / port-unreachable answers are read from
+one raw socket.  Probes are matched to answers through the UDP header quoted
+inside the ICMP message.
+
+Destinations in the same prefix (``/24`` by default) are routed the same
+way, so a router found at a given TTL for one of them is cached per
+``(TTL, prefix)`` and reused by the others: the gateway and core hops of a
+subnet are probed once, and every further host only probes its own hop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import ipaddress
+import socket
+import struct
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_HOPS = 30
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_ATTEMPTS = 2
+DEFAULT_CONCURRENCY = 64
+DEFAULT_PREFIX_LEN = 24
+# 無応答のホップがこれだけ続いたら打ち切る
+MAX_SILENT_HOPS = 5
+
+BASE_PORT = 33434
+_PORT_RANGE = 65000 - BASE_PORT
+
+_ICMP_DEST_UNREACHABLE = 3
+_ICMP_TIME_EXCEEDED = 11
+
+# (応答元アドレス, 宛先に到達したか)
+Answer = Tuple[str, bool]
+
+
+def parse_icmp_reply(packet: bytes) -> Optional[Tuple[str, int, str, int]]:
+    """Parse a raw IPv4 ICMP error quoting one of our UDP probes.
+
+    Returns
+    -------
+    tuple
+        ``(responder, icmp_type, probe_destination, probe_port)`` for
+        time-exceeded and destination-unreachable messages, else ``None``.
+    """
+
+    if len(packet) < 20:
+        return None
+    offset = (packet[0] & 0x0F) * 4
+    if len(packet) < offset + 8:
+        return None
+    icmp_type = packet[offset]
+    if icmp_type not in (_ICMP_TIME_EXCEEDED, _ICMP_DEST_UNREACHABLE):
+        return None
+    inner = offset + 8
+    if len(packet) < inner + 20:
+        return None
+    inner_len = (packet[inner] & 0x0F) * 4
+    if packet[inner + 9] != socket.IPPROTO_UDP or len(packet) < inner + inner_len + 4:
+        return None
+    responder = socket.inet_ntoa(packet[12:16])
+    destination = socket.inet_ntoa(packet[inner + 16 : inner + 20])
+    (port,) = struct.unpack("!H", packet[inner + inner_len + 2 : inner + inner_len + 4])
+    return responder, icmp_type, destination, port
+
+
+class RawProber:
+    """Send TTL-limited UDP probes and match the ICMP answers."""
+
+    def __init__(self, send_sock: socket.socket, recv_sock: socket.socket) -> None:
+        self._send = send_sock
+        self._recv = recv_sock
+        self._send.setblocking(False)
+        self._recv.setblocking(False)
+        self._seq = 0
+        self._waiters: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(recv_sock.fileno(), self._on_readable)
+
+    @classmethod
+    def open(cls) -> Optional["RawProber"]:
+        """Return a prober, or ``None`` without raw socket privileges."""
+
+        try:
+            recv_sock = socket.socket(
+                socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP
+            )
+        except OSError:
+            return None
+        send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        return cls(send_sock, recv_sock)
+
+    def _next_port(self) -> int:
+        self._seq = (self._seq + 1) % _PORT_RANGE
+        return BASE_PORT + self._seq
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                packet, _ = self._recv.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            parsed = parse_icmp_reply(packet)
+            if parsed is None:
+                continue
+            responder, icmp_type, destination, port = parsed
+            waiter = self._waiters.get((destination, port))
+            if waiter is not None and not waiter.done():
+                waiter.set_result((responder, icmp_type == _ICMP_DEST_UNREACHABLE))
+
+    async def probe(self, ip: str, ttl: int, timeout: float) -> Optional[Answer]:
+        """Send one probe to *ip* with *ttl* and wait for the ICMP answer."""
+
+        port = self._next_port()
+        waiter = self._loop.create_future()
+        self._waiters[(ip, port)] = waiter
+        try:
+            # 同じソケットを共有するので TTL の設定と送信は続けて行う
+            self._send.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+            self._send.sendto(b"nw-checker", (ip, port))
+            return await asyncio.wait_for(waiter, timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            self._waiters.pop((ip, port), None)
+
+    def close(self) -> None:
+        self._loop.remove_reader(self._recv.fileno())
+        self._recv.close()
+        self._send.close()
+
+
+class HopCache:
+    """Routers seen per ``(TTL, destination prefix)``, shared between traces.
+
+    The first trace reaching a ``(TTL, prefix)`` probes it; concurrent traces
+    of the same prefix wait for that probe instead of sending their own.
+    Only time-exceeded answers are shared: a destination's own reply or a
+    silent hop says nothing about the other hosts of the prefix.
+    """
+
+    def __init__(self, prefix_len: int = DEFAULT_PREFIX_LEN) -> None:
+        self.prefix_len = prefix_len
+        self.hits = 0
+        self._hops: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    def _key(self, ip: str, ttl: int) -> Tuple[int, str]:
+        network = ipaddress.ip_network(f"{ip}/{self.prefix_len}", strict=False)
+        return ttl, str(network)
+
+    async def hop(
+        self,
+        ip: str,
+        ttl: int,
+        probe: Callable[[], Awaitable[Optional[Answer]]],
+    ) -> Optional[Answer]:
+        key = self._key(ip, ttl)
+        shared = self._hops.get(key)
+        if shared is not None:
+            router = await asyncio.shield(shared)
+            if router is not None:
+                self.hits += 1
+                return router, False
+            return await probe()
+
+        future = asyncio.get_running_loop().create_future()
+        self._hops[key] = future
+        answer: Optional[Answer] = None
+        try:
+            answer = await probe()
+        finally:
+            future.set_result(answer[0] if answer and not answer[1] else None)
+        return answer
+
+
+async def _trace(
+    ip: str,
+    probe: Callable[[str, int, float], Awaitable[Optional[Answer]]],
+    cache: HopCache,
+    *,
+    max_hops: int,
+    timeout: float,
+    attempts: int,
+) -> List[str]:
+    async def probe_ttl(ttl: int) -> Optional[Answer]:
+        for _ in range(max(1, attempts)):
+            answer = await probe(ip, ttl, timeout)
+            if answer is not None:
+                return answer
+        return None
+
+    hops: List[str] = []
+    silent = 0
+    for ttl in range(1, max_hops + 1):
+        answer = await cache.hop(ip, ttl, functools.partial(probe_ttl, ttl))
+        if answer is None:
+            silent += 1
+            if silent >= MAX_SILENT_HOPS:
+                break
+            continue
+        silent = 0
+        hops.append(answer[0])
+        if answer[1]:  # 宛先 (または到達不能を返したルータ) で終了
+            break
+    return hops
+
+
+async def trace_many_async(
+    ips: Iterable[str],
+    *,
+    max_hops: int = DEFAULT_MAX_HOPS,
+    timeout: float = DEFAULT_TIMEOUT,
+    attempts: int = DEFAULT_ATTEMPTS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    prefix_len: int = DEFAULT_PREFIX_LEN,
+    prober: Optional[RawProber] = None,
+) -> Optional[Dict[str, List[str]]]:
+    """Trace the route to every IPv4 address in *ips* concurrently.
+
+    Parameters
+    ----------
+    max_hops:
+        Highest TTL probed.
+    timeout:
+        Time to wait for the answer to one probe.
+    attempts:
+        Probes sent per TTL before the hop is considered silent.
+    concurrency:
+        Maximum number of destinations traced at the same time.
+    prefix_len:
+        Destinations sharing this prefix share cached router hops.
+    prober:
+        Object with a ``probe(ip, ttl, timeout)`` coroutine; a
+        :class:`RawProber` is opened by default.
+
+    Returns
+    -------
+    dict or None
+        ``ip -> hop addresses`` like the output of ``traceroute -n`` without
+        silent hops.  Non-IPv4 addresses are left out.  ``None`` is returned
+        when no raw ICMP socket can be opened.
+    """
+
+    targets = []
+    for ip in dict.fromkeys(ips):
+        try:
+            if ipaddress.ip_address(ip).version == 4:
+                targets.append(ip)
+        except ValueError:
+            continue
+    own = prober is None
+    active = prober if prober is not None else RawProber.open()
+    if active is None:
+        return None
+    cache = HopCache(prefix_len)
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(ip: str) -> List[str]:
+        async with sem:
+            return await _trace(
+                ip,
+                active.probe,
+                cache,
+                max_hops=max_hops,
+                timeout=timeout,
+                attempts=attempts,
+            )
+
+    try:
+        paths = await asyncio.gather(*(run(ip) for ip in targets))
+    finally:
+        if own:
+            active.close()
+    return dict(zip(targets, paths))
+
+
+def trace_many(ips: Iterable[str], **kwargs) -> Optional[Dict[str, List[str]]]:
+    """Synchronous wrapper around :func:`trace_many_async`."""
+
+    return asyncio.run(trace_many_async(ips, **kwargs))
@@ -1,6 +1,10 @@
 """pytest 共通設定."""
 
 import importlib.util
+import socket
+import threading
+
+import pytest
 
 
 def _has(mod: str) -> bool:
@@ -10,3 +14,87 @@ def _has(mod: str) -> bool:
 
 # 他の依存 (impacket, nmap, pysnmp など) は
 # 各テストファイルで pytest.importorskip() する
+
+
+@pytest.fixture(autouse=True)
+def _isolated_oui_cache(tmp_path, monkeypatch):
+    """ベンダー API の永続キャッシュをテストごとに分離する"""
+    from src import discover_hosts, oui
+
+    monkeypatch.setattr(oui, "API_CACHE_PATH", tmp_path / "oui_api_cache.db")
+    monkeypatch.setattr(discover_hosts, "_api_cache", None)
+
+
+class _SnmpAgent:
+    """Tiny SNMPv2c agent answering GETBULK from a static MIB.
+
+    Messages are encoded with :mod:`snmp_client` itself; its wire format is
+    pinned independently by the golden-byte tests in ``test_snmp_client.py``.
+    """
+
+    def __init__(self, mib, community="public"):
+        from src import snmp_client
+
+        self._snmp = snmp_client
+        self.mib = sorted(mib.items(), key=lambda kv: snmp_client._oid_key(kv[0]))
+        self.community = community
+        self.requests = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("0.0.0.0", 0))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        snmp = self._snmp
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(65535)
+            except OSError:
+                continue
+            request = snmp.decode_message(data)
+            self.requests.append(request)
+            if request.community != self.community:
+                continue  # 実機同様コミュニティ不一致には応答しない
+            start = snmp._oid_key(request.varbinds[0][0])
+            rows = [kv for kv in self.mib if snmp._oid_key(kv[0]) > start]
+            varbinds = rows[: request.error_index]
+            if len(varbinds) < request.error_index:
+                varbinds.append((request.varbinds[0][0], snmp.END_OF_MIB_VIEW))
+            response = snmp.encode_message(
+                self.community, snmp.PDU_RESPONSE, request.request_id, varbinds
+            )
+            self.sock.sendto(response, addr)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def snmp_agent():
+    """Start local SNMP simulators: ``snmp_agent(mib, community="public")``."""
+
+    agents = []
+
+    def start(mib, community="public"):
+        agent = _SnmpAgent(mib, community)
+        agents.append(agent)
+        return agent
+
+    yield start
+    for agent in agents:
+        agent.close()
+
+
+@pytest.fixture(autouse=True)
+def _empty_neighbor_table():
+    """キャプチャ由来の LLDP/CDP 近隣テーブルをテスト間で共有しない"""
+    from src.dynamic_scan import neighbors
+
+    neighbors.neighbor_table.clear()
+    yield
+    neighbors.neighbor_table.clear()
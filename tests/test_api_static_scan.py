@@ -1,15 +1,27 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import pytest
 
 pytest.importorskip("fastapi")
 from fastapi.testclient import TestClient
 from src import server
+from src.report.store import ReportStore
+from src.scan_cache import ScanResultCache
 
 pytestmark = pytest.mark.fastapi
 
 
-def test_static_scan_success(monkeypatch):
-    def fake_run_all():
+@pytest.fixture(autouse=True)
+def _scan_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        server, "_scan_cache", ScanResultCache(tmp_path / "scan_cache.db")
+    )
+
+
+def test_static_scan_success(monkeypatch, tmp_path):
+    def fake_run_all(**kwargs):
         return {"findings": {"dummy": {"score": 1, "details": {}}}, "risk_score": 1}
 
     monkeypatch.setattr(server.static_scan, "run_all", fake_run_all)
@@ -18,23 +30,31 @@ def test_static_scan_success(monkeypatch):
 
     def fake_pdf(data, path):
         called["path"] = path
+        Path(path).write_bytes(b"%PDF-1.4")
 
-    monkeypatch.setattr(server, "create_pdf", fake_pdf)
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(
+        server, "_report_store", ReportStore(tmp_path, executor=pool, render=fake_pdf)
+    )
 
     client = TestClient(server.app)
     resp = client.get("/static_scan", params={"report": "true"})
+    pool.shutdown()
 
     assert resp.status_code == 200
     body = resp.json()
     assert body["status"] == "ok"
     assert body["findings"]["dummy"]["score"] == 1
     assert body["risk_score"] == 1
-    assert body["report_path"] == server.REPORT_PATH
-    assert called["path"] == server.REPORT_PATH
+    assert body["report_url"] == f"/reports/{body['report_id']}.pdf"
+    # 描画が終わった後は状態 API がファイルのパスを返す
+    status = client.get(f"/reports/{body['report_id']}").json()
+    assert status["report_status"] == "ready"
+    assert status["report_path"] == called["path"]
 
 
 def test_static_scan_error(monkeypatch):
-    def failing_run_all():
+    def failing_run_all(**kwargs):
         raise RuntimeError("boom")
 
     monkeypatch.setattr(server.static_scan, "run_all", failing_run_all)
@@ -49,11 +69,12 @@ def test_static_scan_error(monkeypatch):
 
 
 def test_static_scan_timeout(monkeypatch):
-    def slow_run_all():
+    def slow_run_all(**kwargs):
         time.sleep(1)
 
     monkeypatch.setattr(server.static_scan, "run_all", slow_run_all)
     monkeypatch.setattr(server, "STATIC_SCAN_TIMEOUT", 0.01)
+    monkeypatch.setattr(server, "STATIC_SCAN_GRACE", 0)
 
     client = TestClient(server.app)
     resp = client.get("/static_scan")
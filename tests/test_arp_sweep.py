@@ -0,0 +1,146 @@
+"""Tests for the native ARP sweep engine."""
+
+import asyncio
+import ipaddress
+import socket
+
+from src import arp_sweep, discovery_scheduler
+
+OUR_MAC = bytes.fromhex("020000000001")
+
+
+def _mac(ip: str) -> bytes:
+    return bytes.fromhex("0a0000") + socket.inet_aton(ip)[1:]
+
+
+def test_frames_round_trip():
+    request = arp_sweep.build_request(OUR_MAC, "10.0.0.1", "10.0.0.7")
+    assert request[:6] == b"\xff" * 6
+    assert arp_sweep.parse_reply(request) is None  # 要求は応答として扱わない
+
+    reply = arp_sweep.build_frame(2, _mac("10.0.0.7"), "10.0.0.7", OUR_MAC, "10.0.0.1")
+    assert arp_sweep.parse_reply(reply) == ("10.0.0.7", "0a:00:00:00:00:07")
+    assert arp_sweep.parse_reply(b"\x00" * 10) is None
+
+
+async def test_sweep_socket_collects_replies_while_sending():
+    ours, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    peer.setblocking(False)
+    alive = {"10.0.0.3", "10.0.0.9"}
+    probes = {
+        f"10.0.0.{i}": arp_sweep.build_request(OUR_MAC, "10.0.0.1", f"10.0.0.{i}")
+        for i in range(2, 12)
+    }
+    loop = asyncio.get_running_loop()
+    received = []
+
+    async def responder():
+        while True:
+            frame = await loop.sock_recv(peer, 2048)
+            target = socket.inet_ntoa(frame[38:42])
+            received.append(target)
+            # 無関係なホストからの応答は無視される
+            stray = arp_sweep.build_frame(
+                2, _mac("10.9.9.9"), "10.9.9.9", OUR_MAC, "10.0.0.1"
+            )
+            await loop.sock_sendall(peer, stray)
+            if target in alive:
+                reply = arp_sweep.build_frame(
+                    2, _mac(target), target, OUR_MAC, "10.0.0.1"
+                )
+                await loop.sock_sendall(peer, reply)
+
+    task = asyncio.create_task(responder())
+    start = loop.time()
+    with ours, peer:
+        found = await arp_sweep.sweep_socket(ours, probes, rate=500, timeout=0.3)
+    elapsed = loop.time() - start
+    task.cancel()
+
+    assert found == {"10.0.0.3": "0a:00:00:00:00:03", "10.0.0.9": "0a:00:00:00:00:09"}
+    assert received == list(probes)
+    # 10 件を 500/s で送ると約 20ms。送信完了後 timeout だけ待つ
+    assert 0.3 <= elapsed < 1.0
+
+
+async def test_sweep_socket_returns_early_when_all_hosts_answered():
+    ours, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    peer.setblocking(False)
+    loop = asyncio.get_running_loop()
+
+    async def responder():
+        frame = await loop.sock_recv(peer, 2048)
+        target = socket.inet_ntoa(frame[38:42])
+        reply = arp_sweep.build_frame(2, _mac(target), target, OUR_MAC, "10.0.0.1")
+        await loop.sock_sendall(peer, reply)
+
+    task = asyncio.create_task(responder())
+    probes = {"10.0.0.5": arp_sweep.build_request(OUR_MAC, "10.0.0.1", "10.0.0.5")}
+    start = loop.time()
+    with ours, peer:
+        found = await arp_sweep.sweep_socket(ours, probes, timeout=5)
+    await task
+    assert found == {"10.0.0.5": "0a:00:00:00:00:05"}
+    assert loop.time() - start < 1
+
+
+async def test_shared_limiter_does_not_stall_the_reply_reader():
+    """リミッタ待ちの間も応答の受信は止まらない"""
+
+    ours, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    peer.setblocking(False)
+    loop = asyncio.get_running_loop()
+
+    async def responder():
+        while True:
+            frame = await loop.sock_recv(peer, 2048)
+            target = socket.inet_ntoa(frame[38:42])
+            reply = arp_sweep.build_frame(2, _mac(target), target, OUR_MAC, "10.0.0.1")
+            await loop.sock_sendall(peer, reply)
+
+    limiter = discovery_scheduler.RateLimiter(10, burst=1)
+    probes = {
+        f"10.0.0.{i}": arp_sweep.build_request(OUR_MAC, "10.0.0.1", f"10.0.0.{i}")
+        for i in range(2, 5)
+    }
+    replied = {}
+    sent = {}
+    task = asyncio.create_task(responder())
+    with ours, peer:
+        found = await arp_sweep.sweep_socket(
+            ours,
+            probes,
+            timeout=0.2,
+            on_reply=lambda ip, mac: replied.setdefault(ip, loop.time()),
+            on_sent=lambda count: sent.setdefault(count, loop.time()),
+            pace=limiter.acquire_async,
+        )
+    task.cancel()
+
+    assert len(found) == 3
+    # 10/s なので 3 件目の送信は約 0.2 秒後。1 件目の応答はそれより前に届く
+    assert sent[3] - sent[1] >= 0.15
+    assert replied["10.0.0.2"] < sent[3]
+
+
+def test_on_link_interface_reads_directly_connected_routes(tmp_path, monkeypatch):
+    route = tmp_path / "route"
+    route.write_text(
+        "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT\n"
+        "eth0\t00000000\t0100A8C0\t0003\t0\t0\t0\t00000000\t0\t0\t0\n"
+        "eth0\t0000A8C0\t00000000\t0001\t0\t0\t0\t0000FFFF\t0\t0\t0\n"
+        "wlan0\t0000A8C0\t00000000\t0001\t0\t0\t0\t00FFFFFF\t0\t0\t0\n"
+    )
+    monkeypatch.setattr(arp_sweep, "PROC_ROUTE", str(route))
+    net = ipaddress.ip_network
+
+    assert arp_sweep._on_link_interface(net("192.168.0.0/24")) == "wlan0"
+    assert arp_sweep._on_link_interface(net("192.168.5.0/24")) == "eth0"
+    # デフォルトルート経由のサブネットは対象外
+    assert arp_sweep._on_link_interface(net("10.0.0.0/24")) is None
+
+
+def test_sweep_returns_none_for_routed_or_ipv6_subnets(monkeypatch):
+    monkeypatch.setattr(arp_sweep, "_on_link_interface", lambda network: None)
+    assert arp_sweep.sweep("10.0.0.0/24") is None
+    assert arp_sweep.sweep("fe80::/64") is None
@@ -2,6 +2,7 @@ import sys
 import subprocess
 import types
 
+from src.scans import arp_spoof
 from src.scans.arp_spoof import _get_arp_table
 
 scapy_all = types.SimpleNamespace(ARP=object, send=lambda *args, **kwargs: None)
@@ -10,7 +11,29 @@ sys.modules.setdefault("scapy", scapy)
 sys.modules.setdefault("scapy.all", scapy_all)
 
 
-def test_get_arp_table_parses_and_ignores_malformed(monkeypatch):
+def test_get_arp_table_reads_proc_net_arp(monkeypatch, tmp_path):
+    proc = tmp_path / "arp"
+    proc.write_text(
+        "IP address       HW type     Flags       HW address            Mask     Device\n"
+        "192.168.1.1      0x1         0x2         AA:BB:CC:DD:EE:01     *        eth0\n"
+        "192.168.1.2      0x1         0x0         00:00:00:00:00:00     *        eth0\n"
+        "192.168.1.3      0x1         0x6         11:22:33:44:55:66     *        eth0\n"
+    )
+    monkeypatch.setattr(arp_spoof, "PROC_ARP", str(proc))
+
+    def no_subprocess(*args, **kwargs):
+        raise AssertionError("arp -an should not run when /proc is readable")
+
+    monkeypatch.setattr(subprocess, "check_output", no_subprocess)
+    assert _get_arp_table() == {
+        "192.168.1.1": "aa:bb:cc:dd:ee:01",
+        "192.168.1.3": "11:22:33:44:55:66",
+    }
+
+
+def test_get_arp_table_parses_and_ignores_malformed(monkeypatch, tmp_path):
+    # /proc/net/arp が無い環境では arp -an にフォールバックする
+    monkeypatch.setattr(arp_spoof, "PROC_ARP", str(tmp_path / "missing"))
     output = """? (192.168.1.1) at aa:bb:cc:dd:ee:01 on en0 ifscope [ethernet]
 ? (10.0.0.1) at 11:22:33:44:55:66 on en0 ifscope [ethernet]
 ? (10.0.0.2) at (incomplete) on en0 ifscope [ethernet]
@@ -32,7 +55,9 @@ invalid line without expected format
     assert "10.0.0.3" not in table
 
 
-def test_get_arp_table_handles_subprocess_error(monkeypatch):
+def test_get_arp_table_handles_subprocess_error(monkeypatch, tmp_path):
+    monkeypatch.setattr(arp_spoof, "PROC_ARP", str(tmp_path / "missing"))
+
     def boom(*args, **kwargs):
         raise OSError("arp failed")
 
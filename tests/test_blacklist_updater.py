@@ -1,4 +1,92 @@
-from src.dynamic_scan import analyze, blacklist_updater
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.dynamic_scan import analyze, blacklist_index, blacklist_updater
+
+
+class _FeedServer:
+    """Local HTTP stand-in for blacklist feeds with ETag / 304 support."""
+
+    def __init__(self):
+        self.feeds = {}
+        self.requests = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append((self.path, dict(self.headers)))
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                try:
+                    self._respond()
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def _respond(self):
+                feed = server.feeds.get(self.path)
+                if feed is None:
+                    self.send_error(404)
+                    return
+                time.sleep(feed.get("delay", 0))
+                etag = feed.get("etag")
+                if etag and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                modified = feed.get("last_modified")
+                if modified and self.headers.get("If-Modified-Since") == modified:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = feed["body"]
+                self.send_response(200)
+                self.send_header("Content-Type", feed.get("type", "text/plain"))
+                if feed.get("encoding"):
+                    self.send_header("Content-Encoding", feed["encoding"])
+                if etag:
+                    self.send_header("ETag", etag)
+                if modified:
+                    self.send_header("Last-Modified", modified)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self.thread.start()
+
+    def add(self, path, body, **options):
+        if isinstance(body, str):
+            body = body.encode()
+        self.feeds[path] = {"body": body, **options}
+        return self.url + path
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def feed_server():
+    server = _FeedServer()
+    yield server
+    server.close()
 
 
 def test_load_blacklist_reads_domains(tmp_path):
@@ -16,47 +104,126 @@ def test_merge_blacklist_deduplicates(tmp_path):
     assert "new.com" in lines
 
 
-def test_fetch_feed_parses_json(monkeypatch):
-    class FakeResp:
-        status_code = 200
-        headers = {"Content-Type": "application/json"}
+def test_merge_blacklist_is_incremental(tmp_path):
+    path = tmp_path / "dns_blacklist.txt"
+    # 手編集された未整列のファイルは初回に並べ直す
+    path.write_text("# mine\nzeta.example\nalpha.example\n")
+    added = blacklist_updater.merge_blacklist({"Mid.example "}, path=str(path))
+    assert added == 1
+    assert path.read_text().splitlines()[1:] == [
+        "alpha.example",
+        "mid.example",
+        "zeta.example",
+    ]
+    index = blacklist_index.open_index(path)
+    assert index is not None and len(index) == 3
+    assert "mid.example" in index and "other.example" not in index
+    index.close()
+
+    # 既知のドメインだけなら本体も索引も書き換えない
+    stamp = path.stat().st_mtime_ns
+    assert blacklist_updater.merge_blacklist({"zeta.example"}, path=str(path)) == 0
+    assert path.stat().st_mtime_ns == stamp
+
+    assert blacklist_updater.merge_blacklist({"beta.example"}, path=str(path)) == 1
+    assert path.read_text().splitlines()[1:3] == ["alpha.example", "beta.example"]
+    index = blacklist_index.open_index(path)
+    assert len(index) == 4 and "beta.example" in index
+    index.close()
 
-        def raise_for_status(self):
-            pass
 
-        def json(self):
-            return {"domains": ["a.com", "b.com"]}
+def test_stale_index_is_ignored(tmp_path):
+    path = tmp_path / "dns_blacklist.txt"
+    blacklist_updater.merge_blacklist({"a.example"}, path=str(path))
+    # 索引の後にテキストを手で編集すると索引は使わない
+    path.write_text("# edited\nb.example\n")
+    assert blacklist_index.open_index(path) is None
+    assert blacklist_updater.merge_blacklist({"b.example"}, path=str(path)) == 0
+    index = blacklist_index.open_index(path)
+    assert "b.example" in index and "a.example" not in index
+    index.close()
+
 
-    monkeypatch.setattr(
-        blacklist_updater.requests, "get", lambda url, timeout=10: FakeResp()
+def test_fetch_feed_parses_json(feed_server):
+    url = feed_server.add(
+        "/feed.json",
+        json.dumps({"domains": ["a.com", "b.com"]}),
+        type="application/json",
     )
-    assert blacklist_updater.fetch_feed("http://example.com/feed.json") == {
-        "a.com",
-        "b.com",
-    }
+    assert blacklist_updater.fetch_feed(url) == {"a.com", "b.com"}
 
 
-def test_fetch_feed_parses_text(monkeypatch):
-    class FakeResp:
-        status_code = 200
-        headers = {"Content-Type": "text/plain"}
-        text = "#c\n d.com \n"
+def test_fetch_feed_parses_text(feed_server):
+    url = feed_server.add("/feed.txt", "#c\n d.com \r\ne.com")
+    assert blacklist_updater.fetch_feed(url) == {"d.com", "e.com"}
 
-        def raise_for_status(self):
-            pass
 
-    monkeypatch.setattr(
-        blacklist_updater.requests, "get", lambda url, timeout=10: FakeResp()
-    )
-    assert blacklist_updater.fetch_feed("http://example.com/feed.txt") == {"d.com"}
+def test_fetch_feed_handles_gzip(feed_server):
+    body = gzip.compress(b"gz.example\n# c\nfile.example\n")
+    encoded = feed_server.add("/encoded", body, encoding="gzip")
+    archive = feed_server.add("/feed.txt.gz", body, type="application/gzip")
+    assert blacklist_updater.fetch_feed(encoded) == {"gz.example", "file.example"}
+    assert blacklist_updater.fetch_feed(archive) == {"gz.example", "file.example"}
 
 
-def test_update_fetches_and_writes(monkeypatch, tmp_path):
+def test_update_uses_conditional_requests(feed_server, tmp_path):
     blk = tmp_path / "dns_blacklist.txt"
-    monkeypatch.setattr(
-        blacklist_updater,
-        "fetch_feed",
-        lambda url: {"foo.example"},
+    tagged = feed_server.add("/a.txt", "foo.example\n", etag='"v1"')
+    dated = feed_server.add(
+        "/b.txt", "bar.example\n", last_modified="Mon, 19 Oct 2026 00:00:00 GMT"
     )
-    blacklist_updater.update("http://feed", path=str(blk))
-    assert "foo.example" in blk.read_text()
+    missing = feed_server.url + "/gone.txt"
+
+    blacklist_updater.update(f"{tagged},{dated} {missing}", path=str(blk))
+    assert blk.read_text().splitlines()[1:] == ["bar.example", "foo.example"]
+    state = json.loads((tmp_path / "dns_blacklist.feeds.json").read_text())
+    assert state == {
+        tagged: {"etag": '"v1"'},
+        dated: {"last_modified": "Mon, 19 Oct 2026 00:00:00 GMT"},
+    }
+
+    feed_server.requests.clear()
+    stamp = blk.stat().st_mtime_ns
+    blacklist_updater.update([tagged, dated], path=str(blk))
+    headers = dict(feed_server.requests)
+    assert headers["/a.txt"]["If-None-Match"] == '"v1"'
+    assert headers["/b.txt"]["If-Modified-Since"] == "Mon, 19 Oct 2026 00:00:00 GMT"
+    assert blk.stat().st_mtime_ns == stamp
+
+    # フィードが更新されれば新しい ETag で取り込む
+    feed_server.add("/a.txt", "foo.example\nnew.example\n", etag='"v2"')
+    blacklist_updater.update([tagged, dated], path=str(blk))
+    assert "new.example" in blk.read_text().splitlines()
+    state = json.loads((tmp_path / "dns_blacklist.feeds.json").read_text())
+    assert state[tagged] == {"etag": '"v2"'}
+
+
+def test_update_fetches_feeds_concurrently(feed_server, tmp_path):
+    urls = [
+        feed_server.add(f"/{i}.txt", f"host{i}.example\n", delay=0.2) for i in range(4)
+    ]
+    blk = tmp_path / "dns_blacklist.txt"
+    blacklist_updater.update(urls, path=str(blk))
+    assert feed_server.peak == 4
+    assert len(blk.read_text().splitlines()) == 5
+
+
+@pytest.mark.slow
+def test_update_multi_million_line_feeds(feed_server, tmp_path):
+    lines = 1_500_000
+    for name in ("a", "b"):
+        body = "".join(f"{name}{i}.example\n" for i in range(lines)).encode()
+        feed_server.add(f"/{name}.txt.gz", gzip.compress(body, compresslevel=1))
+    urls = [feed_server.url + "/a.txt.gz", feed_server.url + "/b.txt.gz"]
+    blk = tmp_path / "dns_blacklist.txt"
+
+    blacklist_updater.update(urls, path=str(blk))
+
+    index = blacklist_index.open_index(blk)
+    assert len(index) == 2 * lines
+    assert "a0.example" in index and f"b{lines - 1}.example" in index
+    index.close()
+    # 追加分だけを索引経由でマージする
+    assert blacklist_updater.merge_blacklist({"a0.example", "c.example"}, str(blk)) == 1
+    with open(blk) as f:
+        assert sum(1 for _ in f) == 2 * lines + 2
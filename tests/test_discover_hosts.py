@@ -1,35 +1,96 @@
 """Tests for :func:`discover_hosts`."""
 
-import socket
 import subprocess
+import threading
+import time
 
+import pytest
 import requests
 
+from src import arp_sweep, discovery_scheduler, host_verify, hostnames
+from src import discover_hosts as discover_hosts_module
 from src.discover_hosts import discover_hosts
 
 
-def test_discover_hosts_resolves_hostname_and_vendor(monkeypatch):
-    """Ensure host discovery returns hostnames and vendors."""
+@pytest.fixture(autouse=True)
+def _routed_subnet(monkeypatch):
+    """既定では ARP スイープ不可 (ルーティング先) として nmap 経路を使う"""
+    monkeypatch.setattr(arp_sweep, "sweep", lambda subnet, **kw: None)
 
-    def fake_check_output(cmd, text=True):
-        if cmd[:2] == ["nmap", "-sn"]:
-            assert cmd == ["nmap", "-sn", "-oG", "-", "-R", "192.168.0.0/24"]
-            return (
-                "Host: 192.168.0.10 (printer) Status: Up\n"
-                "Host: 192.168.0.10 () MAC Address: 00:11:22:33:44:55\n"
-                "Host: 192.168.0.20 Status: Up\n"
-                "Host: 192.168.0.20 () MAC Address: 66:77:88:99:AA:BB\n"
-            )
-        if cmd[0] == "nbtscan":
-            assert cmd == ["nbtscan", "-q", "192.168.0.20"]
-            return "192.168.0.20 host20\n"
-        if cmd[0] == "avahi-resolve":
-            raise AssertionError(
-                "avahi-resolve should not be called when nbtscan succeeds"
-            )
-        raise AssertionError(f"Unexpected command: {cmd}")
 
-    monkeypatch.setattr(subprocess, "check_output", fake_check_output)
+class FakeNmap:
+    """Stand-in for ``subprocess.Popen`` streaming canned greppable output."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.cmds = []
+        self.terminated = False
+
+    def __call__(self, cmd, **kwargs):
+        self.cmds.append(cmd)
+        self.stdout = iter(self.lines)
+        return self
+
+    def poll(self):
+        return 0 if self.terminated else None
+
+    def terminate(self):
+        self.terminated = True
+
+    def wait(self, timeout=None):
+        return 0
+
+
+def _use_nmap(monkeypatch, lines):
+    fake = FakeNmap(lines)
+    monkeypatch.setattr(subprocess, "Popen", fake)
+    return fake
+
+
+@pytest.fixture
+def name_sources(monkeypatch):
+    """Replace every hostname source with canned answers."""
+
+    answers = {"dns": {}, "netbios": {}, "mdns": {}, "llmnr": {}}
+    queried = {}
+
+    def fake_run(cmd, input, **kwargs):
+        assert cmd == ["nbtscan", "-q", "-f", "-"]
+        queried["netbios"] = input.split()
+        out = "".join(f"{ip} {name}\n" for ip, name in answers["netbios"].items())
+        return subprocess.CompletedProcess(cmd, 0, stdout=out, stderr="")
+
+    def fake_source(name):
+        async def source(ips, timeout=1.0):
+            queried[name] = list(ips)
+            return answers[name]
+
+        return source
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    for name in ("dns", "mdns", "llmnr"):
+        monkeypatch.setattr(hostnames, f"{name}_names", fake_source(name))
+    return answers, queried
+
+
+def test_discover_hosts_resolves_hostname_and_vendor(monkeypatch, name_sources):
+    """Ensure host discovery returns hostnames and vendors."""
+
+    answers, queried = name_sources
+    answers["netbios"] = {"192.168.0.20": "host20"}
+    answers["mdns"] = {"192.168.0.20": "host20.local"}
+
+    nmap = _use_nmap(
+        monkeypatch,
+        [
+            "# Nmap 7.94 scan initiated as: nmap -sn -v -oG - -R 192.168.0.0/24\n",
+            "Host: 192.168.0.1 ()\tStatus: Down\n",
+            "Host: 192.168.0.10 (printer) Status: Up\n",
+            "Host: 192.168.0.10 () MAC Address: 00:11:22:33:44:55\n",
+            "Host: 192.168.0.20 Status: Up\n",
+            "Host: 192.168.0.20 () MAC Address: 66:77:88:99:AA:BB\n",
+        ],
+    )
 
     api_calls = []
 
@@ -49,54 +110,59 @@ def test_discover_hosts_resolves_hostname_and_vendor(monkeypatch):
 
     monkeypatch.setattr(requests, "get", fake_get)
 
-    class DummySocket:
-        def __init__(self, *args, **kwargs):
-            pass
-
-        def settimeout(self, timeout):
-            pass
-
-        def connect(self, addr):
-            pass
+    verified = []
 
-        def close(self):
-            pass
+    def fake_verify(ips, **kwargs):
+        ips = list(ips)
+        verified.append(ips)
+        return set(ips)
 
-    monkeypatch.setattr(socket, "socket", lambda *a, **kw: DummySocket())
+    monkeypatch.setattr(host_verify, "verify_hosts", fake_verify)
 
     result = discover_hosts("192.168.0.0/24")
     assert result == [
-        {"ip": "192.168.0.10", "hostname": "printer", "vendor": "VendorA"},
-        {"ip": "192.168.0.20", "hostname": "host20", "vendor": "VendorB"},
+        {
+            "ip": "192.168.0.10",
+            "hostname": "printer",
+            "mac": "00:11:22:33:44:55",
+            "vendor": "VendorA",
+        },
+        {
+            "ip": "192.168.0.20",
+            "hostname": "host20",
+            "mac": "66:77:88:99:AA:BB",
+            "vendor": "VendorB",
+        },
     ]
     assert set(api_calls) == {
         "https://api.macvendors.com/00:11:22:33:44:55",
         "https://api.macvendors.com/66:77:88:99:AA:BB",
     }
+    assert nmap.cmds == [["nmap", "-sn", "-v", "-oG", "-", "-R", "192.168.0.0/24"]]
+    # 全候補をまとめて 1 回で確認する (Down のホストは除く)
+    assert verified == [["192.168.0.10", "192.168.0.20"]]
+    # 名前の無いホストだけを 1 回の nbtscan で問い合わせ、DNS は nmap に任せる
+    assert queried == {
+        "netbios": ["192.168.0.20"],
+        "mdns": ["192.168.0.20"],
+        "llmnr": ["192.168.0.20"],
+    }
 
 
-def test_discover_hosts_avahi_fallback(monkeypatch):
-    """Fallback to ``avahi-resolve`` when ``nbtscan`` fails."""
-
-    calls = []
+def test_discover_hosts_mdns_fallback(monkeypatch, name_sources):
+    """Fall back to mDNS names when NetBIOS does not know the host."""
 
-    def fake_check_output(cmd, text=True):
-        calls.append(cmd)
-        if cmd[:2] == ["nmap", "-sn"]:
-            assert cmd == ["nmap", "-sn", "-oG", "-", "-R", "192.168.0.0/24"]
-            return (
-                "Host: 192.168.0.30 Status: Up\n"
-                "Host: 192.168.0.30 () MAC Address: AA:BB:CC:DD:EE:FF\n"
-            )
-        if cmd[0] == "nbtscan":
-            assert cmd == ["nbtscan", "-q", "192.168.0.30"]
-            raise subprocess.CalledProcessError(1, cmd)
-        if cmd[0] == "avahi-resolve":
-            assert cmd == ["avahi-resolve", "-a", "192.168.0.30"]
-            return "192.168.0.30 host30\n"
-        raise AssertionError(f"Unexpected command: {cmd}")
+    answers, _ = name_sources
+    answers["mdns"] = {"192.168.0.30": "host30.local"}
+    answers["llmnr"] = {"192.168.0.30": "HOST30"}
 
-    monkeypatch.setattr(subprocess, "check_output", fake_check_output)
+    _use_nmap(
+        monkeypatch,
+        [
+            "Host: 192.168.0.30 Status: Up\n",
+            "Host: 192.168.0.30 () MAC Address: AA:BB:CC:DD:EE:FF\n",
+        ],
+    )
 
     def fake_get(url, timeout=5):
         assert url == "https://api.macvendors.com/AA:BB:CC:DD:EE:FF"
@@ -109,23 +175,215 @@ def test_discover_hosts_avahi_fallback(monkeypatch):
 
     monkeypatch.setattr(requests, "get", fake_get)
 
-    class DummySocket:
-        def __init__(self, *args, **kwargs):
-            pass
+    verified = []
 
-        def settimeout(self, timeout):
-            pass
+    def fake_verify(ips, **kwargs):
+        ips = list(ips)
+        verified.append(ips)
+        return set(ips)
 
-        def connect(self, addr):
-            pass
+    monkeypatch.setattr(host_verify, "verify_hosts", fake_verify)
 
-        def close(self):
-            pass
+    result = discover_hosts("192.168.0.0/24")
+    assert result == [
+        {
+            "ip": "192.168.0.30",
+            "hostname": "host30.local",
+            "mac": "AA:BB:CC:DD:EE:FF",
+            "vendor": "VendorC",
+        }
+    ]
 
-    monkeypatch.setattr(socket, "socket", lambda *a, **kw: DummySocket())
 
-    result = discover_hosts("192.168.0.0/24")
-    assert result == [{"ip": "192.168.0.30", "hostname": "host30", "vendor": "VendorC"}]
-    # ensure nbtscan was tried before avahi-resolve
-    assert calls[1][0] == "nbtscan"
-    assert calls[2][0] == "avahi-resolve"
+def test_discover_hosts_prefers_arp_sweep_on_local_subnet(monkeypatch, name_sources):
+    """On-link subnets are swept natively without spawning nmap."""
+
+    answers, queried = name_sources
+    answers["dns"] = {"192.168.0.10": "printer.lan"}
+    answers["netbios"] = {"192.168.0.10": "PRINTER", "192.168.0.20": "nb-20"}
+
+    def fake_sweep(subnet, on_reply, on_sent, **kw):
+        pairs = [
+            ("192.168.0.10", "00:11:22:33:44:55"),
+            ("192.168.0.20", "00:11:22:aa:bb:cc"),
+        ]
+        for count, (ip, mac) in enumerate(pairs, 1):
+            on_sent(count)
+            on_reply(ip, mac)
+        return [{"ip": ip, "mac": mac} for ip, mac in pairs]
+
+    def no_nmap(cmd, **kwargs):
+        raise AssertionError(f"Unexpected command: {cmd}")
+
+    monkeypatch.setattr(arp_sweep, "sweep", fake_sweep)
+    monkeypatch.setattr(subprocess, "Popen", no_nmap)
+
+    api_calls = []
+
+    def fake_get(url, timeout=5):
+        api_calls.append(url)
+
+        class Resp:
+            status_code = 200
+            text = "VendorA"
+
+        return Resp()
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    monkeypatch.setattr(
+        host_verify,
+        "verify_hosts",
+        lambda ips, **kw: pytest.fail("ARP replies need no verification"),
+    )
+
+    assert discover_hosts("192.168.0.0/24") == [
+        {
+            "ip": "192.168.0.10",
+            "hostname": "printer.lan",
+            "mac": "00:11:22:33:44:55",
+            "vendor": "VendorA",
+        },
+        {
+            "ip": "192.168.0.20",
+            "hostname": "nb-20",
+            "mac": "00:11:22:aa:bb:cc",
+            "vendor": "VendorA",
+        },
+    ]
+    # 登録簿に無い OUI はブロック長が分からないため MAC ごとに問い合わせる
+    assert len(api_calls) == 2
+    assert queried["dns"] == ["192.168.0.10", "192.168.0.20"]
+
+
+def test_iter_discovery_streams_hosts_before_the_scan_finishes(
+    monkeypatch, name_sources
+):
+    """Hosts are yielded while nmap is still running, with progress."""
+
+    release = threading.Event()
+
+    def lines():
+        yield "Host: 10.0.0.1 (gw) Status: Up\n"
+        yield "Host: 10.0.0.2 ()\tStatus: Down\n"
+        # 最初のホストが届くまで nmap の残りを出さない
+        assert release.wait(5)
+        yield "Host: 10.0.0.3 (nas) Status: Up\n"
+
+    nmap = _use_nmap(monkeypatch, lines())
+    monkeypatch.setattr(discover_hosts_module, "STREAM_FLUSH_INTERVAL", 0.05)
+    monkeypatch.setattr(host_verify, "verify_hosts", lambda ips, **kw: set(ips))
+
+    events = discover_hosts_module.iter_discovery("10.0.0.0/30")
+    first = next(events)
+    assert first == {
+        "type": "host",
+        "host": {"ip": "10.0.0.1", "hostname": "gw", "mac": None, "vendor": None},
+        "probed": 2,
+        "total": 4,
+    }
+    release.set()
+    rest = list(events)
+    assert [e["host"]["ip"] for e in rest if e["type"] == "host"] == ["10.0.0.3"]
+    assert rest[-1] == {"type": "done", "hosts": 2, "probed": 3, "total": 4}
+    assert not nmap.terminated
+
+
+def test_iter_discovery_reports_progress_and_stops_nmap_on_close(monkeypatch):
+    gate = threading.Event()
+
+    def lines():
+        for i in range(1, 4):
+            yield f"Host: 10.0.0.{i} ()\tStatus: Down\n"
+        gate.wait(5)
+        yield "Host: 10.0.0.9 (late) Status: Up\n"
+
+    nmap = _use_nmap(monkeypatch, lines())
+    monkeypatch.setattr(discover_hosts_module, "STREAM_FLUSH_INTERVAL", 0.05)
+
+    events = discover_hosts_module.iter_discovery("10.0.0.0/28")
+    assert next(events) == {"type": "progress", "probed": 3, "total": 16}
+    events.close()
+    gate.set()
+    for _ in range(100):
+        if nmap.terminated:
+            break
+        time.sleep(0.01)
+    assert nmap.terminated
+
+
+async def test_aiter_discovery_yields_events(monkeypatch):
+    _use_nmap(monkeypatch, ["Host: 10.0.0.1 (gw) Status: Up\n"])
+    monkeypatch.setattr(host_verify, "verify_hosts", lambda ips, **kw: set(ips))
+    events = [e async for e in discover_hosts_module.aiter_discovery("10.0.0.1/32")]
+    assert [e["type"] for e in events] == ["host", "done"]
+
+
+def test_iter_discovery_uses_neighbour_discovery_for_ipv6(monkeypatch, name_sources):
+    answers, queried = name_sources
+    answers["dns"] = {"2001:db8::10": "nas.example"}
+    sent = []
+
+    def fake_discover(subnet, on_sent):
+        on_sent(1)
+        sent.append(subnet)
+        return [
+            {"ip": "2001:db8::10", "mac": "00:11:22:33:44:55"},
+            {"ip": "fe80::1%eth0", "mac": ""},
+        ]
+
+    monkeypatch.setattr(discover_hosts_module.ndp_discovery, "discover", fake_discover)
+    monkeypatch.setattr(
+        host_verify,
+        "verify_hosts",
+        lambda ips, **kw: pytest.fail("neighbour advertisements need no verification"),
+    )
+    monkeypatch.setattr(discover_hosts_module, "lookup_vendors", lambda macs: {})
+
+    events = list(discover_hosts_module.iter_discovery("2001:db8::/64"))
+    hosts = [e["host"] for e in events if e["type"] == "host"]
+    assert hosts == [
+        {
+            "ip": "2001:db8::10",
+            "hostname": "nas.example",
+            "mac": "00:11:22:33:44:55",
+            "vendor": None,
+        },
+        {"ip": "fe80::1%eth0", "hostname": None, "mac": None, "vendor": None},
+    ]
+    assert events[-1] == {"type": "done", "hosts": 2, "probed": 1, "total": None}
+    # IPv6 では IPv4 専用の名前解決は使わない
+    assert set(queried) == {"dns"}
+
+
+def test_nmap_fallback_honours_rate_and_ipv6(monkeypatch):
+    nmap = _use_nmap(monkeypatch, [])
+    monkeypatch.setattr(
+        discover_hosts_module.ndp_discovery, "discover", lambda subnet, on_sent: None
+    )
+    list(discover_hosts_module.iter_discovery("10.0.0.0/24", max_rate=250.5))
+    list(discover_hosts_module.iter_discovery("2001:db8::/120"))
+    # 列挙できない IPv6 範囲は nmap にも渡さない
+    list(discover_hosts_module.iter_discovery("2001:db8::/64"))
+    assert nmap.cmds == [
+        ["nmap", "-sn", "-v", "-oG", "-", "-R", "--max-rate", "250", "10.0.0.0/24"],
+        ["nmap", "-sn", "-v", "-oG", "-", "-R", "-6", "2001:db8::/120"],
+    ]
+
+
+def test_native_sweep_uses_worker_rate_and_async_limiter(monkeypatch):
+    """ARP スイープは担当分のレートで送り、共有リミッタは非同期で待つ"""
+
+    calls = []
+
+    def fake_sweep(subnet, on_reply, on_sent, **kwargs):
+        calls.append(kwargs)
+        return []
+
+    monkeypatch.setattr(arp_sweep, "sweep", fake_sweep)
+    limiter = discovery_scheduler.RateLimiter(2000)
+    list(
+        discover_hosts_module.iter_discovery(
+            "10.0.0.0/30", limiter=limiter, max_rate=500
+        )
+    )
+    assert calls == [{"rate": 500, "pace": limiter.acquire_async}]
@@ -0,0 +1,189 @@
+"""Tests for chunked, rate-limited and resumable discovery."""
+
+import json
+import threading
+
+import pytest
+
+from src import discover_hosts, discovery_scheduler
+
+
+def test_split_ranges():
+    chunks = discovery_scheduler.split_ranges("10.1.0.0/16")
+    assert len(chunks) == 256
+    assert chunks[0] == "10.1.0.0/24" and chunks[-1] == "10.1.255.0/24"
+    assert discovery_scheduler.split_ranges("10.1.2.128/25") == ["10.1.2.128/25"]
+    assert discovery_scheduler.split_ranges("10.1.2.3/22", 23) == [
+        "10.1.0.0/23",
+        "10.1.2.0/23",
+    ]
+    # IPv6 はアドレスを列挙しないので分割しない
+    assert discovery_scheduler.split_ranges("2001:db8::/48") == ["2001:db8::/48"]
+
+
+def test_rate_limiter_paces_to_the_configured_rate():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    limiter = discovery_scheduler.RateLimiter(
+        100, burst=10, clock=lambda: now[0], sleep=sleep
+    )
+    for _ in range(110):
+        limiter.acquire()
+    # 最初の 10 個はバースト、残り 100 個で 1 秒
+    assert now[0] == pytest.approx(1.0)
+
+    with pytest.raises(ValueError):
+        discovery_scheduler.RateLimiter(0)
+
+
+async def test_rate_limiter_waits_without_blocking_the_event_loop():
+    now = [0.0]
+    limiter = discovery_scheduler.RateLimiter(
+        100,
+        burst=1,
+        clock=lambda: now[0],
+        sleep=lambda s: pytest.fail("blocking sleep in event loop"),
+    )
+    assert limiter.try_acquire() == 0.0
+    assert limiter.try_acquire() == pytest.approx(0.01)
+
+    waited = []
+
+    async def fake_sleep(seconds):
+        waited.append(seconds)
+        now[0] += seconds
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(discovery_scheduler.asyncio, "sleep", fake_sleep)
+        await limiter.acquire_async()
+    assert waited == [pytest.approx(0.01)]
+
+
+def _fake_discovery(monkeypatch, hosts_per_chunk=1, gate=None):
+    """Replace iter_discovery with a fake yielding one host per chunk."""
+
+    calls = []
+    active = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    def fake_iter(chunk, *, limiter=None, max_rate=None):
+        calls.append((chunk, limiter, max_rate))
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            if gate is not None:
+                gate.wait(5)
+            limiter.acquire()
+            base = chunk.split("/")[0].rsplit(".", 1)[0]
+            for i in range(1, hosts_per_chunk + 1):
+                yield {
+                    "type": "host",
+                    "host": {"ip": f"{base}.{i}", "hostname": None, "vendor": None},
+                    "probed": i,
+                    "total": 256,
+                }
+            yield {"type": "progress", "probed": 200, "total": 256}
+            yield {
+                "type": "done",
+                "hosts": hosts_per_chunk,
+                "probed": 256,
+                "total": 256,
+            }
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(discover_hosts, "iter_discovery", fake_iter)
+    return calls, peak
+
+
+def test_chunks_run_in_parallel_with_a_shared_limiter(monkeypatch):
+    gate = threading.Event()
+    calls, peak = _fake_discovery(monkeypatch, gate=gate)
+    threading.Timer(0.1, gate.set).start()
+
+    events = list(
+        discovery_scheduler.iter_scheduled("10.0.0.0/22", workers=4, rate=400)
+    )
+
+    assert peak[0] == 4
+    assert sorted(c for c, _, _ in calls) == [
+        "10.0.0.0/24",
+        "10.0.1.0/24",
+        "10.0.2.0/24",
+        "10.0.3.0/24",
+    ]
+    limiters = {id(limiter) for _, limiter, _ in calls}
+    assert len(limiters) == 1
+    # nmap にはレートを均等に割り当てる
+    assert {rate for _, _, rate in calls} == {100}
+    hosts = [e for e in events if e["type"] == "host"]
+    assert len(hosts) == 4
+    assert sum(e["type"] == "chunk" for e in events) == 4
+    assert events[-1] == {
+        "type": "done",
+        "hosts": 4,
+        "probed": 1024,
+        "total": 1024,
+        "chunks_done": 4,
+        "chunks_total": 4,
+    }
+
+
+def test_interrupted_scan_resumes_from_checkpoint(monkeypatch, tmp_path):
+    path = tmp_path / "scan.json"
+    calls, _ = _fake_discovery(monkeypatch, hosts_per_chunk=2)
+
+    events = discovery_scheduler.iter_scheduled(
+        "10.0.0.0/22", workers=1, checkpoint=path
+    )
+    for event in events:
+        if event["type"] == "chunk":
+            break
+    events.close()  # 1 チャンク終えたところで中断
+
+    saved = json.loads(path.read_text())
+    assert saved["subnet"] == "10.0.0.0/22"
+    assert list(saved["chunks"]) == ["10.0.0.0/24"]
+
+    calls.clear()
+    events = list(
+        discovery_scheduler.iter_scheduled("10.0.0.0/22", workers=1, checkpoint=path)
+    )
+    # 完了済みのチャンクは再スキャンしない
+    assert "10.0.0.0/24" not in [c for c, _, _ in calls]
+    resumed = [e for e in events if e.get("resumed")]
+    assert [e["host"]["ip"] for e in resumed] == ["10.0.0.1", "10.0.0.2"]
+    assert events[-1]["hosts"] == 8
+    assert events[-1]["probed"] == 1024
+    assert not path.exists()
+
+
+def test_checkpoint_for_another_scan_is_ignored(tmp_path):
+    store = discovery_scheduler.Checkpoint(tmp_path / "scan.json")
+    store.save("10.0.0.0/16", 24, {"10.0.0.0/24": []})
+    assert store.load("10.0.0.0/16", 24) == {"10.0.0.0/24": []}
+    assert store.load("10.1.0.0/16", 24) == {}
+    assert store.load("10.0.0.0/16", 25) == {}
+    (tmp_path / "scan.json").write_text("not json")
+    assert store.load("10.0.0.0/16", 24) == {}
+
+
+def test_failed_chunk_is_reported_and_kept_for_resume(monkeypatch, tmp_path):
+    def fake_iter(chunk, **kwargs):
+        if chunk == "10.0.1.0/24":
+            raise RuntimeError("nmap crashed")
+        yield {"type": "done", "hosts": 0, "probed": 256, "total": 256}
+
+    monkeypatch.setattr(discover_hosts, "iter_discovery", fake_iter)
+    path = tmp_path / "scan.json"
+    events = list(
+        discovery_scheduler.iter_scheduled("10.0.0.0/23", workers=2, checkpoint=path)
+    )
+    assert {"type": "error", "chunk": "10.0.1.0/24", "error": "nmap crashed"} in events
+    assert list(json.loads(path.read_text())["chunks"]) == ["10.0.0.0/24"]
@@ -0,0 +1,117 @@
+import asyncio
+import struct
+import time
+
+from src.scans import dns
+
+
+class FakeResolver(asyncio.DatagramProtocol):
+    """AD フラグ付きで即答する UDP DNS サーバ"""
+
+    def __init__(self, ad=True):
+        self.ad = ad
+        self.queries = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queries.append(data)
+        flags = 0x8180 | (0x0020 if self.ad else 0)
+        self.transport.sendto(data[:2] + struct.pack("!H", flags) + data[4:], addr)
+
+
+async def test_probe_resolver_records_ad_and_latency():
+    loop = asyncio.get_running_loop()
+    resolver = FakeResolver(ad=True)
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: resolver, local_addr=("127.0.0.1", 0)
+    )
+    port = transport.get_extra_info("sockname")[1]
+    try:
+        stats = await dns.probe_resolver("127.0.0.1", queries=4, port=port)
+    finally:
+        transport.close()
+
+    assert stats["answered"] == 4
+    assert stats["timeout_rate"] == 0
+    assert stats["ad"] is True
+    assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["p90"] < 1000
+    # クエリは AD と EDNS0 DO ビットを要求する
+    query = resolver.queries[0]
+    assert struct.unpack("!H", query[2:4])[0] & 0x0020
+    assert struct.unpack("!H", query[10:12])[0] == 1
+
+
+async def test_probe_resolvers_run_concurrently_and_count_timeouts(monkeypatch):
+    """無応答サーバーがあっても全体の所要時間は 1 回分の timeout で収まる"""
+
+    loop = asyncio.get_running_loop()
+    silent = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol, local_addr=("127.0.0.2", 0)
+    )
+    port = silent[0].get_extra_info("sockname")[1]
+    answering = await loop.create_datagram_endpoint(
+        lambda: FakeResolver(ad=False), local_addr=("127.0.0.1", port)
+    )
+    real_probe = dns.probe_resolver
+
+    async def probe(server, **kwargs):
+        return await real_probe(server, port=port, **kwargs)
+
+    monkeypatch.setattr(dns, "probe_resolver", probe)
+    start = time.monotonic()
+    try:
+        stats = await dns.probe_resolvers(
+            ["127.0.0.1", "127.0.0.2", "127.0.0.3"], queries=3, timeout=0.5
+        )
+    finally:
+        silent[0].close()
+        answering[0].close()
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 1.0
+    assert stats["127.0.0.1"]["answered"] == 3
+    assert stats["127.0.0.1"]["ad"] is False
+    assert stats["127.0.0.2"]["timeout_rate"] == 1.0
+    assert stats["127.0.0.2"]["latency_ms"]["p50"] is None
+    # ポートが閉じているサーバーは ICMP エラーとして数える
+    assert stats["127.0.0.3"]["answered"] == 0
+
+
+def test_dns_scan_records_silent_resolvers_without_scoring(monkeypatch):
+    async def fake(servers, **kwargs):
+        return {
+            "192.168.1.1": {"queries": 5, "answered": 5, "ad": True},
+            "192.168.1.2": {"queries": 5, "answered": 0, "ad": False},
+        }
+
+    monkeypatch.setattr(
+        dns, "_get_nameservers", lambda path=None: ["192.168.1.1", "192.168.1.2"]
+    )
+    monkeypatch.setattr(dns, "probe_resolvers", fake)
+    result = dns.scan()
+    assert result["details"]["dnssec_enabled"] is True
+    assert result["details"]["unresponsive_servers"] == ["192.168.1.2"]
+    # 応答しないサーバーは score に加えない
+    assert result["details"]["warnings"] == []
+    assert result["score"] == 0
+    assert result["details"]["resolvers"]["192.168.1.1"]["answered"] == 5
+
+
+def test_dns_scan_requires_every_resolver_to_validate(monkeypatch):
+    async def fake(servers, **kwargs):
+        return {
+            "192.168.1.1": {"queries": 5, "answered": 5, "ad": True},
+            "192.168.1.2": {"queries": 5, "answered": 4, "ad": False},
+        }
+
+    monkeypatch.setattr(
+        dns, "_get_nameservers", lambda path=None: ["192.168.1.1", "192.168.1.2"]
+    )
+    monkeypatch.setattr(dns, "probe_resolvers", fake)
+    result = dns.scan()
+    assert result["details"]["dnssec_enabled"] is False
+    assert result["details"]["dnssec_disabled_servers"] == ["192.168.1.2"]
+    assert result["details"]["warnings"] == ["DNSSEC is disabled"]
+    assert result["score"] == 1
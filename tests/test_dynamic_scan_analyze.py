@@ -12,6 +12,7 @@ import pytest
 
 from src.dynamic_scan import (
     analyze,
+    blacklist_index,
     dns_analyzer,
     protocol_detector,
     device_tracker,
@@ -20,16 +21,13 @@ from src.dynamic_scan import (
 
 
 @pytest.fixture
-def sample_blacklist(monkeypatch):
-    """load_blacklist をモックして既知のドメイン集合を返す"""
+def sample_blacklist(monkeypatch, tmp_path):
+    """既知のドメインだけを含むブラックリスト索引に差し替える"""
+    blk = tmp_path / "dns_blacklist.txt"
+    blk.write_text("# test\nmalicious.example\n")
     monkeypatch.setattr(
-        dns_analyzer,
-        "load_blacklist",
-        lambda path="data/dns_blacklist.txt": {"malicious.example"},
+        dns_analyzer, "DOMAIN_BLACKLIST", blacklist_index.SharedIndex(blk)
     )
-    dns_analyzer.DOMAIN_BLACKLIST = dns_analyzer.load_blacklist()
-    yield
-    dns_analyzer.DOMAIN_BLACKLIST.clear()
 
 
 def test_geoip_lookup(monkeypatch):
@@ -403,7 +401,7 @@ def test_assign_geoip_info_ip_src(monkeypatch):
 
 def test_record_dns_history(monkeypatch):
     analyze._dns_history.clear()
-    dns_analyzer.DOMAIN_BLACKLIST.clear()
+    monkeypatch.setattr(dns_analyzer, "DOMAIN_BLACKLIST", set())
     monkeypatch.setattr(
         analyze.socket, "gethostbyaddr", lambda ip: ("host.example", [], [])
     )
@@ -462,8 +460,7 @@ def test_record_dns_history_uses_loaded_blacklist(monkeypatch, sample_blacklist)
 
 def test_record_dns_history_blacklisted(monkeypatch):
     analyze._dns_history.clear()
-    dns_analyzer.DOMAIN_BLACKLIST.clear()
-    dns_analyzer.DOMAIN_BLACKLIST.add("bad.example")
+    monkeypatch.setattr(dns_analyzer, "DOMAIN_BLACKLIST", {"bad.example"})
     monkeypatch.setattr(
         analyze.socket, "gethostbyaddr", lambda ip: ("bad.example", [], [])
     )
@@ -475,8 +472,7 @@ def test_record_dns_history_blacklisted(monkeypatch):
 
 def test_record_dns_history_blacklisted_cached(monkeypatch):
     analyze._dns_history.clear()
-    dns_analyzer.DOMAIN_BLACKLIST.clear()
-    dns_analyzer.DOMAIN_BLACKLIST.add("bad.example")
+    monkeypatch.setattr(dns_analyzer, "DOMAIN_BLACKLIST", {"bad.example"})
 
     # 1回目の呼び出しで DNS を解決して履歴に保存
     monkeypatch.setattr(
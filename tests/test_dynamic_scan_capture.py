@@ -157,3 +157,33 @@ def test_capture_packets_stops_when_cancelled(monkeypatch):
     asyncio.run(run_and_cancel())
 
     assert FakeSniffer.instance.stopped is True
+
+
+def test_capture_packets_updates_neighbor_table(monkeypatch):
+    from types import SimpleNamespace
+
+    from src.dynamic_scan import neighbors
+
+    neighbor = {"chassis_id": "sw", "port_id": "1", "ttl": 120, "system_name": "sw"}
+    monkeypatch.setattr(
+        capture.parser, "parse_packet", lambda pkt: SimpleNamespace(neighbor=neighbor)
+    )
+
+    class FakeSniffer:
+        def __init__(self, iface=None, prn=None):
+            self.prn = prn
+
+        def start(self):
+            self.prn("lldp")
+
+        def stop(self):  # pragma: no cover - 本テストでは処理なし
+            pass
+
+    monkeypatch.setattr(capture, "AsyncSniffer", FakeSniffer)
+
+    async def runner():
+        _, task = capture.capture_packets(duration=0)
+        await task
+
+    asyncio.run(runner())
+    assert [e["system_name"] for e in neighbors.neighbor_table.entries()] == ["sw"]
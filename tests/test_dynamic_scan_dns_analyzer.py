@@ -1,4 +1,4 @@
-from src.dynamic_scan import dns_analyzer
+from src.dynamic_scan import blacklist_index, blacklist_updater, dns_analyzer
 
 
 def test_load_blacklist_ignores_comments_and_blank_lines(tmp_path):
@@ -68,3 +68,60 @@ def test_is_blacklisted(monkeypatch, tmp_path):
 
 def test_load_blacklist_missing_file(tmp_path):
     assert dns_analyzer.load_blacklist(str(tmp_path / "none.txt")) == set()
+
+
+def test_blacklist_is_not_read_at_import():
+    # 索引は最初の照会まで開かない
+    assert isinstance(dns_analyzer.DOMAIN_BLACKLIST, blacklist_index.SharedIndex)
+    assert dns_analyzer.DOMAIN_BLACKLIST.text_path == blacklist_index.BLACKLIST_PATH
+    assert blacklist_updater.DEFAULT_PATH == str(blacklist_index.BLACKLIST_PATH)
+
+
+def test_shared_index_compiles_and_remaps(tmp_path):
+    text = tmp_path / "dns_blacklist.txt"
+    text.write_text("# seed\nBad.example\n")
+    shared = blacklist_index.SharedIndex(text, check_interval=0)
+
+    assert "bad.example" in shared
+    assert len(shared) == 1
+    # 索引が無ければ一度だけ作成する
+    assert blacklist_index.index_path(text).exists()
+
+    # 更新ツールが差し替えた索引を次の照会で開き直す
+    blacklist_updater.merge_blacklist({"new.example"}, path=str(text))
+    assert "new.example" in shared and "bad.example" in shared
+
+    # テキストを手で編集した場合は索引を作り直す
+    text.write_text("edited.example\n")
+    assert "edited.example" in shared
+    assert "new.example" not in shared
+
+
+def test_shared_index_checks_for_changes_periodically(tmp_path):
+    text = tmp_path / "dns_blacklist.txt"
+    text.write_text("a.example\n")
+    now = [0.0]
+    shared = blacklist_index.SharedIndex(text, check_interval=5, clock=lambda: now[0])
+    assert "a.example" in shared
+
+    blacklist_updater.merge_blacklist({"b.example"}, path=str(text))
+    now[0] = 4.0
+    assert "b.example" not in shared
+    now[0] = 5.0
+    assert "b.example" in shared
+
+
+def test_shared_index_falls_back_to_memory(tmp_path, monkeypatch):
+    text = tmp_path / "dns_blacklist.txt"
+    text.write_text("ro.example\n")
+
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only file system")
+
+    monkeypatch.setattr(blacklist_index, "write_index", read_only)
+    shared = blacklist_index.SharedIndex(text, check_interval=0)
+    assert "ro.example" in shared
+    assert not blacklist_index.index_path(text).exists()
+
+    missing = blacklist_index.SharedIndex(tmp_path / "none.txt")
+    assert "ro.example" not in missing and len(missing) == 0
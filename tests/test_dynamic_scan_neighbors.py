@@ -0,0 +1,125 @@
+"""Tests for passive LLDP / CDP decoding and the neighbour table."""
+
+import socket
+import struct
+
+from src.dynamic_scan import neighbors
+
+SWITCH_MAC = bytes.fromhex("001122334455")
+
+
+def _lldp_tlv(tlv_type, value):
+    return struct.pack("!H", (tlv_type << 9) | len(value)) + value
+
+
+def lldpdu(name="core-sw", port="Gi1/0/24", mgmt="192.168.0.2", ttl=120):
+    return b"".join(
+        [
+            _lldp_tlv(1, b"\x04" + SWITCH_MAC),
+            _lldp_tlv(2, b"\x05" + port.encode()),
+            _lldp_tlv(3, struct.pack("!H", ttl)),
+            _lldp_tlv(4, b"uplink to office"),
+            _lldp_tlv(5, name.encode()),
+            _lldp_tlv(
+                8,
+                b"\x05\x01" + socket.inet_aton(mgmt) + b"\x02\x00\x00\x00\x01\x00",
+            ),
+            _lldp_tlv(0, b""),
+        ]
+    )
+
+
+def lldp_frame(**kwargs):
+    return (
+        bytes.fromhex("0180c200000e")
+        + SWITCH_MAC
+        + struct.pack("!H", neighbors.LLDP_ETHERTYPE)
+        + lldpdu(**kwargs)
+    )
+
+
+def _cdp_tlv(tlv_type, value):
+    return struct.pack("!HH", tlv_type, len(value) + 4) + value
+
+
+def cdp_payload(device="edge-sw.example", port="FastEthernet0/1", addr="10.0.0.3"):
+    address = (
+        struct.pack("!I", 1)
+        + b"\x01\x01\xcc"
+        + struct.pack("!H", 4)
+        + socket.inet_aton(addr)
+    )
+    return b"\x02\xb4\x00\x00" + b"".join(
+        [
+            _cdp_tlv(0x0001, device.encode()),
+            _cdp_tlv(0x0002, address),
+            _cdp_tlv(0x0003, port.encode()),
+            _cdp_tlv(0x0006, b"cisco WS-C2960"),
+        ]
+    )
+
+
+def cdp_frame(**kwargs):
+    llc = b"\xaa\xaa\x03\x00\x00\x0c\x20\x00" + cdp_payload(**kwargs)
+    return (
+        bytes.fromhex("01000ccccccc") + SWITCH_MAC + struct.pack("!H", len(llc)) + llc
+    )
+
+
+def test_decode_lldp_frame():
+    neighbor = neighbors.decode_frame(lldp_frame())
+    assert neighbor == {
+        "protocol": "lldp",
+        "chassis_id": "00:11:22:33:44:55",
+        "port_id": "Gi1/0/24",
+        "ttl": 120,
+        "port_description": "uplink to office",
+        "system_name": "core-sw",
+        "management_addresses": ["192.168.0.2"],
+        "src_mac": "00:11:22:33:44:55",
+    }
+
+
+def test_decode_vlan_tagged_lldp_frame():
+    frame = lldp_frame()
+    tagged = frame[:12] + b"\x81\x00\x00\x0a" + frame[12:]
+    assert neighbors.decode_frame(tagged)["system_name"] == "core-sw"
+
+
+def test_decode_cdp_frame():
+    neighbor = neighbors.decode_frame(cdp_frame())
+    assert neighbor["protocol"] == "cdp"
+    assert neighbor["system_name"] == "edge-sw.example"
+    assert neighbor["port_id"] == "FastEthernet0/1"
+    assert neighbor["platform"] == "cisco WS-C2960"
+    assert neighbor["management_addresses"] == ["10.0.0.3"]
+    assert neighbor["ttl"] == 180
+
+
+def test_decode_rejects_other_and_truncated_frames():
+    assert neighbors.decode_frame(b"\x00" * 10) is None
+    ipv4 = bytes(12) + b"\x08\x00" + bytes(20)
+    assert neighbors.decode_frame(ipv4) is None
+    # 必須 TLV (Port ID) が欠けた LLDPDU
+    frame = lldp_frame()
+    assert neighbors.decode_lldp(frame[14:23]) is None
+
+
+def test_neighbor_table_expires_and_withdraws():
+    now = [1000.0]
+    table = neighbors.NeighborTable(clock=lambda: now[0])
+    table.update(neighbors.decode_frame(lldp_frame(ttl=30)))
+    table.update(neighbors.decode_frame(cdp_frame()))
+
+    assert table.name_for("192.168.0.2") == "core-sw"
+    assert table.find("10.0.0.3")["port_id"] == "FastEthernet0/1"
+    assert table.name_for("10.9.9.9") is None
+
+    now[0] = 1030.0
+    assert [e["protocol"] for e in table.entries()] == ["cdp"]
+
+    # TTL 0 の CDP/LLDP は近隣の削除
+    withdraw = neighbors.decode_frame(cdp_frame())
+    withdraw["ttl"] = 0
+    table.update(withdraw)
+    assert table.entries() == []
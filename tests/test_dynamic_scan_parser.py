@@ -1,9 +1,25 @@
-from scapy.layers.l2 import Ether
+import struct
+
 from scapy.layers.inet import IP, TCP
+from scapy.layers.l2 import Ether
+from scapy.packet import Raw
 
 from src.dynamic_scan import parser
 
 
+def _lldpdu():
+    tlvs = [(1, b"\x07sw"), (2, b"\x05Gi1/0/24"), (3, b"\x00\x78"), (5, b"core-sw")]
+    body = b"".join(struct.pack("!H", (t << 9) | len(v)) + v for t, v in tlvs)
+    return body + b"\x00\x00"
+
+
+def _cdp_frame():
+    tlv = b"edge-sw.example"
+    cdp = b"\x02\xb4\x00\x00" + struct.pack("!HH", 1, len(tlv) + 4) + tlv
+    llc = b"\xaa\xaa\x03\x00\x00\x0c\x20\x00" + cdp
+    return bytes.fromhex("01000ccccccc001122334455") + struct.pack("!H", len(llc)) + llc
+
+
 def test_parse_packet_tcp_fields():
     pkt = (
         Ether(src="aa:aa:aa:aa:aa:aa", dst="bb:bb:bb:bb:bb:bb")
@@ -34,3 +50,23 @@ def test_parse_packet_unknown_protocol():
 def test_parse_packet_none_returns_empty():
     parsed = parser.parse_packet(None)
     assert vars(parsed) == {}
+
+
+def test_parse_packet_decodes_lldp():
+    pkt = Ether(src="00:11:22:33:44:55", dst="01:80:c2:00:00:0e", type=0x88CC) / Raw(
+        _lldpdu()
+    )
+    parsed = parser.parse_packet(pkt)
+    assert parsed.neighbor["system_name"] == "core-sw"
+    assert parsed.neighbor["port_id"] == "Gi1/0/24"
+
+
+def test_parse_packet_decodes_cdp_dot3_frame():
+    pkt = Ether(_cdp_frame())
+    parsed = parser.parse_packet(pkt)
+    assert parsed.neighbor["system_name"] == "edge-sw.example"
+
+
+def test_parse_packet_without_discovery_frame_has_no_neighbor():
+    pkt = Ether() / IP(src="1.1.1.1", dst="2.2.2.2") / TCP()
+    assert parser.parse_packet(pkt).neighbor is None
@@ -0,0 +1,100 @@
+"""Tests for the concurrent host verifier."""
+
+import asyncio
+import socket
+
+import pytest
+
+from src import host_verify
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def test_open_or_refused_ports_count_as_alive():
+    server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        alive = await host_verify.verify_hosts_async(
+            ["127.0.0.1", "127.0.0.2"], ports=[port], icmp=False
+        )
+    # 127.0.0.2 は RST を返すので生存とみなす
+    assert alive == {"127.0.0.1", "127.0.0.2"}
+
+
+async def test_first_positive_probe_wins_and_cancels_the_rest(monkeypatch):
+    cancelled = []
+
+    async def fake_probe(ip, port, timeout):
+        if ip == "10.0.0.1" and port == 22:
+            return 0.01
+        try:
+            await asyncio.sleep(timeout)
+        except asyncio.CancelledError:
+            cancelled.append((ip, port))
+            raise
+        return None
+
+    monkeypatch.setattr(host_verify, "_tcp_probe", fake_probe)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    alive = await host_verify.verify_hosts_async(
+        ["10.0.0.1"], ports=[80, 22, 443], icmp=False
+    )
+    assert alive == {"10.0.0.1"}
+    assert loop.time() - start < 0.2
+    assert sorted(cancelled) == [("10.0.0.1", 80), ("10.0.0.1", 443)]
+
+
+async def test_parallelism_is_bounded(monkeypatch):
+    active = [0]
+    peak = [0]
+
+    async def fake_probe(ip, port, timeout):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return None
+
+    monkeypatch.setattr(host_verify, "_tcp_probe", fake_probe)
+    ips = [f"10.0.0.{i}" for i in range(1, 41)]
+    alive = await host_verify.verify_hosts_async(
+        ips, ports=[80], icmp=False, concurrency=5
+    )
+    assert alive == set()
+    assert peak[0] == 5
+
+
+def test_estimator_adapts_timeout_to_observed_rtt():
+    est = host_verify.RttEstimator(initial=0.25, minimum=0.05, maximum=1.0)
+    assert est.timeout() == 0.25
+    for _ in range(20):
+        est.update(0.002)
+    assert est.timeout() == 0.05  # 速い LAN では下限まで縮む
+    for _ in range(20):
+        est.update(0.4)
+    assert 0.4 <= est.timeout() <= 1.0
+    est.update(30.0)
+    assert est.timeout() == 1.0
+
+
+def test_echo_request_and_reply_parsing():
+    request = host_verify.build_echo_request(0x1234, 7)
+    assert host_verify._checksum(request) == 0
+    # 20 バイトの IPv4 ヘッダ + echo reply
+    reply = b"\x45" + b"\x00" * 19 + b"\x00\x00\x00\x00\x12\x34\x00\x07"
+    assert host_verify.parse_echo_reply(reply) == (0x1234, 7)
+    assert host_verify.parse_echo_reply(b"\x45" + b"\x00" * 19 + request) is None
+
+
+async def test_icmp_probe_on_loopback():
+    pinger = host_verify.IcmpPinger.open()
+    if pinger is None:
+        pytest.skip("raw ICMP socket requires privileges")
+    pinger.close()
+    alive = await host_verify.verify_hosts_async(["127.0.0.1"], ports=[], icmp=True)
+    assert alive == {"127.0.0.1"}
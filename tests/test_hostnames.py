@@ -0,0 +1,155 @@
+"""Tests for batched hostname resolution."""
+
+import asyncio
+import struct
+import subprocess
+
+from src import hostnames
+
+
+def _respond(query: bytes, known: dict) -> bytes:
+    """Answer the PTR questions in *query* that appear in *known*."""
+
+    txid, _, qdcount = struct.unpack("!HHH", query[:6])
+    offset = 12
+    answers = b""
+    count = 0
+    for _ in range(qdcount):
+        start = offset
+        name, offset = hostnames._read_name(query, offset)
+        offset += 4
+        if name in known:
+            target = hostnames._encode_name(known[name])
+            # 所有者名は質問への圧縮ポインタで表す
+            answers += struct.pack("!HHHIH", 0xC000 | start, 12, 1, 120, len(target))
+            answers += target
+            count += 1
+    header = struct.pack("!HHHHHH", txid, 0x8400, qdcount, count, 0, 0)
+    return header + query[12:offset] + answers
+
+
+class _Responder(asyncio.DatagramProtocol):
+    def __init__(self, known):
+        self.known = known
+        self.queries = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queries.append(data)
+        self.transport.sendto(_respond(data, self.known), addr)
+
+
+async def _responder(known):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _Responder(known), local_addr=("127.0.0.1", 0)
+    )
+    return transport, protocol, transport.get_extra_info("sockname")[1]
+
+
+def test_ptr_query_round_trip():
+    query = hostnames.build_ptr_query(
+        7, ["4.3.2.1.in-addr.arpa", "5.3.2.1.in-addr.arpa"]
+    )
+    reply = _respond(query, {"5.3.2.1.in-addr.arpa": "printer.local."})
+    assert hostnames.parse_ptr_answers(reply) == {
+        "5.3.2.1.in-addr.arpa": "printer.local"
+    }
+    # 質問 (応答フラグ無し) や壊れたデータは無視する
+    assert hostnames.parse_ptr_answers(query) == {}
+    assert hostnames.parse_ptr_answers(reply[:-3]) == {}
+
+
+async def test_mdns_sends_one_round_of_multi_question_queries(monkeypatch):
+    ips = [f"10.0.0.{i}" for i in range(1, 41)]
+    transport, protocol, port = await _responder(
+        {hostnames.reverse_name("10.0.0.7"): "cam.local"}
+    )
+    monkeypatch.setattr(hostnames, "MDNS_ADDR", ("127.0.0.1", port))
+    monkeypatch.setattr(hostnames, "MDNS_QUESTIONS_PER_PACKET", 16)
+    try:
+        names = await hostnames.mdns_names(ips, timeout=0.3)
+    finally:
+        transport.close()
+    assert names == {"10.0.0.7": "cam.local"}
+    assert len(protocol.queries) == 3  # 40 件を 16 件ずつ
+
+
+async def test_llmnr_queries_each_host_and_returns_when_all_answered(monkeypatch):
+    transport, protocol, port = await _responder(
+        {hostnames.reverse_name("127.0.0.1"): "DESKTOP-1"}
+    )
+    monkeypatch.setattr(hostnames, "LLMNR_PORT", port)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        names = await hostnames.llmnr_names(["127.0.0.1"], timeout=5)
+    finally:
+        transport.close()
+    assert names == {"127.0.0.1": "DESKTOP-1"}
+    assert loop.time() - start < 1
+
+
+def test_nbtscan_runs_once_for_all_hosts(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, input, **kwargs):
+        calls.append((cmd, input))
+        return subprocess.CompletedProcess(
+            cmd,
+            0,
+            stdout="10.0.0.1 HOST1 <server> 00:11:22:33:44:55\n10.9.9.9 OTHER\n",
+            stderr="",
+        )
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    assert hostnames.nbtscan_names(["10.0.0.1", "10.0.0.2"]) == {"10.0.0.1": "HOST1"}
+    assert calls == [(["nbtscan", "-q", "-f", "-"], "10.0.0.1\n10.0.0.2\n")]
+
+    def missing(cmd, **kwargs):
+        raise FileNotFoundError(cmd[0])
+
+    monkeypatch.setattr(subprocess, "run", missing)
+    assert hostnames.nbtscan_names(["10.0.0.1"]) == {}
+
+
+async def test_sources_run_concurrently_and_merge_by_priority(monkeypatch):
+    answers = {
+        "dns": {"10.0.0.1": "one.example"},
+        "netbios": {"10.0.0.1": "ONE", "10.0.0.2": "TWO"},
+        "mdns": {"10.0.0.2": "two.local", "10.0.0.3": "three.local"},
+        "llmnr": {"10.0.0.4": "FOUR"},
+    }
+
+    def fake(name):
+        async def source(ips, timeout=1.0):
+            await asyncio.sleep(0.1)
+            return {ip: n for ip, n in answers[name].items() if ip in ips}
+
+        return source
+
+    monkeypatch.setattr(hostnames, "dns_names", fake("dns"))
+    monkeypatch.setattr(hostnames, "mdns_names", fake("mdns"))
+    monkeypatch.setattr(hostnames, "llmnr_names", fake("llmnr"))
+    monkeypatch.setattr(
+        hostnames, "nbtscan_names", lambda ips, timeout: answers["netbios"]
+    )
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    names = await hostnames.resolve_hostnames_async(
+        [f"10.0.0.{i}" for i in range(1, 6)],
+        sources=("llmnr", "mdns", "netbios", "dns"),
+    )
+    assert loop.time() - start < 0.3
+    assert names == {
+        "10.0.0.1": "one.example",
+        "10.0.0.2": "TWO",
+        "10.0.0.3": "three.local",
+        "10.0.0.4": "FOUR",
+    }
+
+    names = await hostnames.resolve_hostnames_async(["10.0.0.1"], sources=("mdns",))
+    assert names == {}
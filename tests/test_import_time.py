@@ -0,0 +1,52 @@
+"""API/CLI 起動時の import コストを計測するベンチマーク"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# API 起動時に読み込まれてはならない重い依存
+HEAVY_MODULES = (
+    "scapy",
+    "nmap",
+    "impacket",
+    "reportlab",
+    "httpx",
+    "requests",
+    "apscheduler",
+)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def _import_in_fresh_interpreter(module: str) -> dict:
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT, text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "module", ["src.api", "src.server", "src.static_scan", "src.scans"]
+)
+def test_entry_points_do_not_import_heavy_dependencies(module):
+    result = _import_in_fresh_interpreter(module)
+    assert result["heavy"] == []
+
+
+@pytest.mark.benchmark
+def test_api_import_time(benchmark):
+    result = benchmark.pedantic(
+        _import_in_fresh_interpreter, args=("src.api",), rounds=3, iterations=1
+    )
+    assert result["heavy"] == []
@@ -0,0 +1,53 @@
+"""Tests for IPv6 neighbour discovery helpers."""
+
+import ipaddress
+import struct
+
+from src import ndp_discovery
+
+
+def test_solicited_node_group():
+    addr = ipaddress.IPv6Address("2001:db8::211:22ff:fe33:4455")
+    assert ndp_discovery.solicited_node(addr) == "ff02::1:ff33:4455"
+
+
+def test_neighbor_solicit_layout():
+    target = ipaddress.IPv6Address("2001:db8::1")
+    packet = ndp_discovery.build_neighbor_solicit(target, bytes.fromhex("020000000001"))
+    assert packet[0] == 135
+    assert packet[8:24] == target.packed
+    # 送信元リンク層アドレスオプション (8 バイト単位の長さ 1)
+    assert packet[24:] == b"\x01\x01" + bytes.fromhex("020000000001")
+
+
+def test_parse_advert_and_echo_reply():
+    target = ipaddress.IPv6Address("2001:db8::1")
+    advert = (
+        struct.pack("!BBHI", 136, 0, 0, 0x60000000)
+        + target.packed
+        + b"\x02\x01"
+        + bytes.fromhex("0a0000000001")
+    )
+    assert ndp_discovery.parse_message(advert) == (
+        136,
+        {"target": target, "mac": "0a:00:00:00:00:01"},
+    )
+    reply = struct.pack("!BBHHH", 129, 0, 0, 0x1234, 1)
+    assert ndp_discovery.parse_message(reply) == (129, {"ident": 0x1234, "seq": 1})
+    assert ndp_discovery.parse_message(ndp_discovery.build_echo_request(1, 1)) is None
+
+
+def test_interface_lookup_reads_proc(tmp_path, monkeypatch):
+    proc = tmp_path / "if_inet6"
+    proc.write_text(
+        "fe8000000000000000fc00fffe000001 04 40 20 80     eth0\n"
+        "00000000000000000000000000000001 01 80 10 80       lo\n"
+        "20010db8000000000000000000000002 05 40 00 80     eth1\n"
+    )
+    monkeypatch.setattr(ndp_discovery, "PROC_IF_INET6", str(proc))
+    net = ipaddress.ip_network
+    assert ndp_discovery._interface_for(net("2001:db8::/64")) == ("eth1", 5)
+    assert ndp_discovery._interface_for(net("fe80::/64")) == ("eth0", 4)
+    assert ndp_discovery._interface_for(net("2001:db9::/64")) is None
+    assert ndp_discovery.discover("2001:db9::/64") is None
+    assert ndp_discovery.discover("10.0.0.0/24") is None
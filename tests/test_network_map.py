@@ -60,3 +60,28 @@ def test_main_requires_subnet_arg(capsys):
     assert exc.value.code == 2
     assert captured.out == ""
     assert "usage" in captured.err.lower()
+
+
+def test_main_jsonl_streams_events(monkeypatch, capsys):
+    """--jsonl writes one JSON document per discovery event."""
+
+    printed = []
+
+    def fake_iter(subnet):
+        yield {"type": "host", "host": {"ip": "10.0.0.1"}, "probed": 1, "total": 4}
+        # 次のイベントより前に前の行が出力済みであること
+        printed.append(capsys.readouterr().out)
+        yield {"type": "done", "hosts": 1, "probed": 4, "total": 4}
+
+    monkeypatch.setattr(network_map, "iter_discovery", fake_iter)
+    exit_code = network_map.main(["10.0.0.0/30", "--jsonl"])
+    captured = capsys.readouterr()
+    assert exit_code == 0
+    assert json.loads(printed[0])["host"] == {"ip": "10.0.0.1"}
+    assert json.loads(captured.out) == {
+        "type": "done",
+        "hosts": 1,
+        "probed": 4,
+        "total": 4,
+    }
+    assert "succeeded" in captured.err
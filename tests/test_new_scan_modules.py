@@ -1,4 +1,3 @@
-import types
 from datetime import datetime, timedelta, timezone
 
 import pytest
@@ -6,22 +5,22 @@ import pytest
 from src.scans import dns, dhcp, ssl_cert, arp_spoof
 
 
-def test_dns_scan_success(monkeypatch):
-    class FakeResp:
-        ancount = 1
-        arcount = 0
-        ad = 1
+def _fake_resolvers(ad=True, answered=5):
+    """probe_resolvers の代替。全サーバーが同じ統計を返す"""
+
+    async def fake(servers, **kwargs):
+        return {
+            server: {"queries": 5, "answered": answered, "ad": ad} for server in servers
+        }
 
-        def __getitem__(self, item):
-            return self
+    return fake
 
-        def haslayer(self, layer):  # noqa: D401
-            return True
 
+def test_dns_scan_success(monkeypatch):
     monkeypatch.setattr(
         dns, "_get_nameservers", lambda path="/etc/resolv.conf": ["8.8.8.8"]
     )
-    monkeypatch.setattr(dns, "sr1", lambda *_, **__: FakeResp())
+    monkeypatch.setattr(dns, "probe_resolvers", _fake_resolvers(ad=True))
     result = dns.scan()
     assert result["score"] == 1
     assert result["details"]["servers"] == ["8.8.8.8"]
@@ -30,7 +29,9 @@ def test_dns_scan_success(monkeypatch):
 
 def test_dns_scan_error(monkeypatch):
     monkeypatch.setattr(
-        dns, "sr1", lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom"))
+        dns,
+        "probe_resolvers",
+        lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom")),
     )
     result = dns.scan()
     assert result["score"] == 0
@@ -38,44 +39,61 @@ def test_dns_scan_error(monkeypatch):
 
 
 def test_dns_scan_dnssec_disabled(monkeypatch):
-    class FakeResp:
-        ancount = 1
-        arcount = 0
-        ad = 0
-
-        def __getitem__(self, item):
-            return self
-
-        def haslayer(self, layer):  # noqa: D401
-            return True
-
     monkeypatch.setattr(
         dns, "_get_nameservers", lambda path="/etc/resolv.conf": ["192.168.1.1"]
     )
-    monkeypatch.setattr(dns, "sr1", lambda *_, **__: FakeResp())
+    monkeypatch.setattr(dns, "probe_resolvers", _fake_resolvers(ad=False))
     result = dns.scan()
     assert result["score"] == 1
     assert result["details"]["dnssec_enabled"] is False
     assert any("DNSSEC is disabled" in w for w in result["details"]["warnings"])
 
 
-def test_dhcp_scan_success(monkeypatch):
-    class FakePkt:
-        def __contains__(self, layer):  # noqa: D401
-            return True
+def _dhcp_offer(probe, server):
+    """DISCOVER を元に、同じ xid の DHCPOFFER を組み立てる"""
+    return (
+        bytes([2])
+        + probe[1:240]
+        + bytes([53, 1, 2, 54, 4, *map(int, server.split(".")), 255])
+    )
+
 
-        def __getitem__(self, layer):  # noqa: D401
-            return types.SimpleNamespace(src="1.2.3.4")
+def test_dhcp_scan_success(monkeypatch):
+    def fake_collect(probe, address, **kwargs):
+        assert address == ("255.255.255.255", 67)
+        assert kwargs["bind"] == ("", 68)
+        return [(_dhcp_offer(probe, "1.2.3.4"), ("1.2.3.4", 67))]
 
-    monkeypatch.setattr(dhcp, "srp", lambda *_, **__: ([(None, FakePkt())], None))
+    monkeypatch.setattr(dhcp, "collect", fake_collect)
     result = dhcp.scan()
     assert result["score"] == 1
     assert result["details"]["servers"] == ["1.2.3.4"]
 
 
+def test_dhcp_scan_collects_every_offer_and_ignores_other_xids(monkeypatch):
+    def fake_collect(probe, address, **kwargs):
+        other = bytearray(_dhcp_offer(probe, "9.9.9.9"))
+        other[4:8] = b"\xff\xff\xff\xff"
+        replies = [
+            (_dhcp_offer(probe, "10.0.0.1"), ("10.0.0.1", 67)),
+            (_dhcp_offer(probe, "10.0.0.1"), ("10.0.0.1", 67)),
+            (_dhcp_offer(probe, "10.0.0.254"), ("10.0.0.254", 67)),
+            (bytes(other), ("9.9.9.9", 67)),
+        ]
+        return [r for r in replies if kwargs["accept"](*r)]
+
+    monkeypatch.setattr(dhcp, "collect", fake_collect)
+    result = dhcp.scan()
+    assert result["details"]["servers"] == ["10.0.0.1", "10.0.0.254"]
+    assert result["score"] == 2
+    assert "Multiple DHCP servers" in result["details"]["warnings"][0]
+
+
 def test_dhcp_scan_error(monkeypatch):
     monkeypatch.setattr(
-        dhcp, "srp", lambda *_, **__: (_ for _ in ()).throw(RuntimeError("dhcp fail"))
+        dhcp,
+        "collect",
+        lambda *_, **__: (_ for _ in ()).throw(RuntimeError("dhcp fail")),
     )
     result = dhcp.scan()
     assert result["score"] == 0
@@ -83,7 +101,7 @@ def test_dhcp_scan_error(monkeypatch):
 
 
 def test_dhcp_scan_no_servers(monkeypatch):
-    monkeypatch.setattr(dhcp, "srp", lambda *_, **__: ([], None))
+    monkeypatch.setattr(dhcp, "collect", lambda *_, **__: [])
     result = dhcp.scan()
     assert result["score"] == 0
     assert result["details"]["servers"] == []
@@ -0,0 +1,170 @@
+"""Tests for the compiled OUI index and the vendor API cache."""
+
+import os
+import random
+
+import pytest
+import requests
+
+from src import discover_hosts, oui
+
+REGISTRY = """\
+# comment lines are ignored
+001122 VendorA
+00-55-DA   (hex)\t\tBigVendor
+00:55:DA:A0:00:00/28\tShort\tMediumVendor
+70B3D5   (base 16)\t\tIEEE Registration Authority
+70:B3:D5:F2:F0:00/36\tTinyVendor
+MA-S,70B3D5123,"CsvVendor","Somewhere"
+"""
+
+
+def test_index_uses_longest_matching_prefix():
+    index = oui.OuiIndex.from_lines(REGISTRY.splitlines())
+
+    assert len(index) == 6
+    assert index.lookup("00:11:22:33:44:55") == "VendorA"
+    assert index.lookup("00-55-da-12-34-56") == "BigVendor"
+    assert index.lookup("00:55:DA:A1:23:45") == "MediumVendor"
+    assert index.lookup("70:B3:D5:F2:F1:23") == "TinyVendor"
+    assert index.lookup("70:B3:D5:12:3F:FF") == "CsvVendor"
+    assert index.lookup("70:B3:D5:00:00:01") == "IEEE Registration Authority"
+    assert index.lookup("AA:BB:CC:DD:EE:FF") is None
+    assert index.lookup("not-a-mac") is None
+
+
+def test_block_bits_reports_the_registry_block():
+    index = oui.OuiIndex.from_lines(REGISTRY.splitlines())
+
+    assert index.block_bits("00:11:22:33:44:55") == 24
+    assert index.block_bits("00:55:DA:A1:23:45") == 28
+    # 一覧に無いブロックでも OUI が分割されていればその長さで区切る
+    assert index.block_bits("00:55:DA:10:00:00") == 28
+    assert index.block_bits("70:B3:D5:00:00:01") == 36
+    assert index.block_bits("AA:BB:CC:DD:EE:FF") == 48
+    assert index.block_bits("not-a-mac") == 48
+
+
+def test_load_index_compiles_once_and_reloads_on_change(tmp_path, monkeypatch):
+    path = tmp_path / "oui.txt"
+    path.write_text("001122 VendorA\n")
+    built = []
+    real_from_file = oui.OuiIndex.from_file.__func__
+    monkeypatch.setattr(
+        oui.OuiIndex,
+        "from_file",
+        classmethod(lambda cls, p: built.append(p) or real_from_file(cls, p)),
+    )
+    monkeypatch.setattr(oui, "_INDEX_CACHE", {})
+
+    assert oui.load_index(path).lookup("00:11:22:00:00:00") == "VendorA"
+    assert oui.load_index(path) is oui.load_index(path)
+    assert len(built) == 1
+
+    path.write_text("001122 VendorB\n")
+    os.utime(path, (1, 1))
+    assert oui.load_index(path).lookup("00:11:22:00:00:00") == "VendorB"
+    assert len(built) == 2
+    assert len(oui.load_index(tmp_path / "missing.txt")) == 0
+
+
+def test_lookup_vendors_queries_api_once_per_block_and_persists(tmp_path, monkeypatch):
+    path = tmp_path / "oui.txt"
+    path.write_text("001122 LocalVendor\n66:77:88:F0:00:00/28\tListedBlock\n")
+    monkeypatch.setattr(oui, "OUI_PATH", path)
+    monkeypatch.setattr(oui, "_INDEX_CACHE", {})
+
+    calls = []
+
+    def fake_get(url, timeout=5):
+        calls.append(url)
+
+        class Resp:
+            status_code = 404 if "DE:AD" in url else 200
+            text = "Vendor" + url[-8:-6]
+
+        return Resp()
+
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    macs = [
+        "00:11:22:33:44:55",
+        "66:77:88:00:00:01",
+        "66:77:88:00:00:02",
+        "66:77:88:10:00:01",
+        "DE:AD:BE:00:00:01",
+        "DE:AD:BE:00:00:02",
+    ]
+    # 66:77:88 は /28 に分割されているため、同じ /28 の MAC だけが答えを共有する
+    assert discover_hosts.lookup_vendors(macs) == {
+        "00:11:22:33:44:55": "LocalVendor",
+        "66:77:88:00:00:01": "Vendor00",
+        "66:77:88:00:00:02": "Vendor00",
+        "66:77:88:10:00:01": "Vendor10",
+        "DE:AD:BE:00:00:01": None,
+        "DE:AD:BE:00:00:02": None,
+    }
+    # 登録簿に無い OUI はブロック長が分からないので MAC ごとに問い合わせる
+    assert calls == [
+        "https://api.macvendors.com/66:77:88:00:00:01",
+        "https://api.macvendors.com/66:77:88:10:00:01",
+        "https://api.macvendors.com/DE:AD:BE:00:00:01",
+        "https://api.macvendors.com/DE:AD:BE:00:00:02",
+    ]
+
+    # 新しいプロセス相当: キャッシュを開き直しても API は呼ばれない
+    monkeypatch.setattr(discover_hosts, "_api_cache", None)
+    assert discover_hosts._lookup_vendor("66:77:88:0A:BB:CC") == "Vendor00"
+    assert discover_hosts._lookup_vendor("DE:AD:BE:00:00:01") is None
+    assert len(calls) == 4
+
+
+def test_api_cache_expires_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    cache = oui.ApiCache(tmp_path / "cache.db", clock=lambda: now[0])
+    cache.put("66:77:88:00:00:01", "RemoteVendor", 24)
+    cache.put("DE:AD:BE:00:00:01", None)
+
+    assert cache.get("66-77-88-FF-FF-FF", 24) == (True, "RemoteVendor")
+    assert cache.get("66:77:88:00:00:01", 28) == (False, None)
+    assert cache.get("DE:AD:BE:00:00:01") == (True, None)
+    assert cache.get("DE:AD:BE:00:00:02") == (False, None)
+
+    now[0] += oui.API_NEGATIVE_TTL
+    assert cache.get("DE:AD:BE:00:00:01") == (False, None)
+    assert cache.get("66:77:88:00:00:01", 24) == (True, "RemoteVendor")
+
+    now[0] += oui.API_TTL
+    assert cache.get("66:77:88:00:00:01", 24) == (False, None)
+
+
+def test_api_errors_are_not_cached(monkeypatch):
+    status = [429]
+
+    def fake_get(url, timeout=5):
+        class Resp:
+            status_code = status[0]
+            text = "VendorX"
+
+        return Resp()
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    assert discover_hosts._lookup_vendor("12:34:56:00:00:01") is None
+    status[0] = 200
+    assert discover_hosts._lookup_vendor("12:34:56:00:00:01") == "VendorX"
+
+
+@pytest.mark.benchmark
+def test_bulk_lookup_benchmark(benchmark):
+    rng = random.Random(0)
+    lines = [f"{rng.getrandbits(24):06X} Vendor{i % 500}" for i in range(30000)]
+    lines += [f"{rng.getrandbits(28):07X}00000/28 Medium{i}" for i in range(4000)]
+    lines += [f"{rng.getrandbits(36):09X}000/36 Small{i}" for i in range(4000)]
+    index = oui.OuiIndex.from_lines(lines)
+    macs = [
+        ":".join(f"{b:02X}" for b in rng.getrandbits(48).to_bytes(6, "big"))
+        for _ in range(100_000)
+    ]
+
+    result = benchmark.pedantic(index.lookup_many, args=(macs,), rounds=3)
+    assert len(result) == 100_000
@@ -23,3 +23,69 @@ def test_create_pdf(tmp_path):
     assert "note: ok" in text
     assert "vulns: 90 HIGH RISK" in text
     assert "issue: CVE-1234" in text
+
+
+def test_create_pdf_list_findings_and_hosts(tmp_path):
+    """``static_scan.run_all`` の list 形式と hosts 節を描画できる"""
+    report_data = {
+        "findings": [
+            {"category": "ports", "score": 80, "details": {"open": "22,80"}},
+            {"category": "smb", "target": "10.0.0.5", "score": 10, "details": {}},
+        ],
+        "risk_score": 80,
+        "hosts": {
+            f"10.0.0.{i}": {
+                "risk_score": i,
+                "findings": [{"category": "ports", "score": i, "details": {"n": i}}],
+            }
+            for i in range(1, 40)
+        },
+    }
+    output = tmp_path / "report.pdf"
+    create_pdf(report_data, str(output))
+
+    reader = PdfReader(str(output))
+    assert len(reader.pages) > 1
+    text = "".join(page.extract_text() for page in reader.pages)
+    assert "ports: 80 HIGH RISK" in text
+    assert "open: 22,80" in text
+    assert "smb (10.0.0.5): 10" in text
+    assert "Host 10.0.0.39: 39" in text
+
+
+def test_create_pdf_renders_large_reports_in_parts(tmp_path, monkeypatch):
+    """ホストの多いレポートは部分 PDF ごとに保存してから連結する"""
+    from src.report import pdf
+
+    monkeypatch.setattr(pdf, "HOSTS_PER_PART", 5)
+    saved = []
+    real_save = pdf._Writer.save
+
+    def save(self):
+        saved.append(self.canvas.getPageNumber())
+        real_save(self)
+
+    monkeypatch.setattr(pdf._Writer, "save", save)
+    report_data = {
+        "findings": [{"category": "ports", "score": 1, "details": {}}],
+        "risk_score": 12,
+        "hosts": {
+            f"10.0.0.{i}": {
+                "risk_score": i,
+                "findings": [{"category": "ports", "score": i, "details": {"n": i}}],
+            }
+            for i in range(1, 13)
+        },
+    }
+    output = tmp_path / "report.pdf"
+    create_pdf(report_data, str(output))
+
+    reader = PdfReader(str(output))
+    assert len(saved) == 3
+    assert len(reader.pages) == sum(saved)
+    text = "".join(page.extract_text() for page in reader.pages)
+    assert text.count("Static Scan Report") == 1
+    positions = [text.index(f"Host 10.0.0.{i}: {i}") for i in range(1, 13)]
+    assert positions == sorted(positions)
+    # 部分 PDF の一時ディレクトリは残らない
+    assert [p.name for p in tmp_path.iterdir()] == ["report.pdf"]
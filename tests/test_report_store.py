@@ -0,0 +1,108 @@
+"""Tests for the content-addressed report store."""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.report import store as report_store
+
+PAYLOAD = {"findings": [{"category": "ports", "score": 5}], "risk_score": 5}
+
+
+def test_report_id_is_order_independent():
+    a = report_store.report_id({"risk_score": 1, "findings": []})
+    b = report_store.report_id({"findings": [], "risk_score": 1})
+    assert a == b and len(a) == 64
+    assert report_store.report_id({"findings": [], "risk_score": 2}) != a
+
+
+def test_identical_payloads_share_one_render(tmp_path):
+    gate = threading.Event()
+    calls = []
+
+    def slow_render(payload, path):
+        calls.append(path)
+        gate.wait(5)
+        with open(path, "wb") as fh:
+            fh.write(b"%PDF")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        store = report_store.ReportStore(tmp_path, executor=pool, render=slow_render)
+        rid, first = store.submit(PAYLOAD)
+        rid2, second = store.submit(dict(PAYLOAD))
+        assert rid == rid2 and first is second
+        assert store.status(rid) == "pending"
+        gate.set()
+        assert first.result(5) == tmp_path / f"{rid}.pdf"
+    assert store.status(rid) == "ready"
+
+    _, cached = store.submit(PAYLOAD)
+    assert cached.done() and len(calls) == 1
+
+
+def test_invalid_ids_are_rejected(tmp_path):
+    store = report_store.ReportStore(tmp_path)
+    with pytest.raises(ValueError):
+        store.path("../secret")
+
+
+def test_render_pdf_in_process_pool(tmp_path):
+    pytest.importorskip("reportlab")
+    store = report_store.ReportStore(tmp_path)
+    try:
+        rid, future = store.submit(PAYLOAD)
+        path = future.result(60)
+    finally:
+        store.close()
+    assert path.read_bytes().startswith(b"%PDF")
+    # 一時ファイルは残らない
+    assert [p.name for p in tmp_path.iterdir()] == [f"{rid}.pdf"]
+
+
+def _write_pdf(payload, path):
+    with open(path, "wb") as fh:
+        fh.write(b"%PDF")
+
+
+def test_least_recently_used_reports_are_pruned(tmp_path):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        store = report_store.ReportStore(
+            tmp_path, executor=pool, render=_write_pdf, max_reports=2
+        )
+        old, _ = store.submit({"n": 1})
+        pool.submit(lambda: None).result(5)
+        used, _ = store.submit({"n": 2})
+        pool.submit(lambda: None).result(5)
+        os.utime(store.path(old), (1000, 1000))
+        os.utime(store.path(used), (2000, 2000))
+
+        # キャッシュから返したレポートは最近使ったものになる
+        _, cached = store.submit({"n": 2})
+        assert cached.done()
+        new, future = store.submit({"n": 3})
+        future.result(5)
+
+    assert store.status(old) is None
+    assert store.status(used) == "ready"
+    assert store.status(new) == "ready"
+
+
+def test_failed_reports_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_store, "MAX_FAILED", 2)
+
+    def broken(payload, path):
+        raise RuntimeError("render failed")
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        store = report_store.ReportStore(tmp_path, executor=pool, render=broken)
+        rids = []
+        for n in range(3):
+            rid, future = store.submit({"n": n})
+            with pytest.raises(RuntimeError):
+                future.result(5)
+            rids.append(rid)
+
+    assert store.status(rids[0]) is None
+    assert [store.status(rid) for rid in rids[1:]] == ["failed", "failed"]
@@ -0,0 +1,168 @@
+from src import arp_sweep, hostnames, static_scan
+from src import discover_hosts as discover_hosts_module
+from src.scan_cache import ScanResultCache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _scanners(calls, open_ports):
+    def ports(host):
+        calls.append(("ports", host))
+        return {
+            "category": "ports",
+            "score": len(open_ports[host]),
+            "details": {"open_ports": open_ports[host]},
+        }
+
+    def ssl_cert(host):
+        calls.append(("ssl_cert", host))
+        return {"category": "ssl_cert", "score": 0, "details": {}}
+
+    def dhcp():
+        calls.append(("dhcp", None))
+        return {"category": "dhcp", "score": 1, "details": {}}
+
+    return [("ports", ports), ("ssl_cert", ssl_cert), ("dhcp", dhcp)]
+
+
+def _setup(monkeypatch, tmp_path, open_ports, **kwargs):
+    calls = []
+    monkeypatch.setattr(
+        static_scan, "_load_scanners", lambda: _scanners(calls, open_ports)
+    )
+    clock = FakeClock()
+    cache = ScanResultCache(tmp_path / "cache.db", clock=clock, **kwargs)
+    return calls, clock, cache
+
+
+def test_run_all_reuses_fresh_cached_results(monkeypatch, tmp_path):
+    """2 回目の実行ではキャッシュ済みの結果を再利用する"""
+
+    open_ports = {"10.0.0.1": [22], "10.0.0.2": [80]}
+    calls, _, cache = _setup(monkeypatch, tmp_path, open_ports)
+    targets = [{"ip": "10.0.0.1", "mac": "aa"}, {"ip": "10.0.0.2", "mac": "bb"}]
+
+    first = static_scan.run_all(targets=targets, cache=cache)
+    assert len(calls) == 5
+    calls.clear()
+
+    second = static_scan.run_all(targets=targets, cache=cache)
+    assert calls == []
+    assert second["risk_score"] == first["risk_score"]
+    assert all(item["cached"] for item in second["findings"])
+    assert second["hosts"]["10.0.0.2"]["findings"][0]["target"] == "10.0.0.2"
+
+
+def test_run_all_rescans_expired_entries_only(monkeypatch, tmp_path):
+    """TTL を過ぎたスキャナだけを再実行する"""
+
+    open_ports = {"10.0.0.1": [22]}
+    calls, clock, cache = _setup(
+        monkeypatch, tmp_path, open_ports, ttls={"dhcp": 60, "ports": 600}
+    )
+
+    static_scan.run_all(targets=["10.0.0.1"], cache=cache)
+    calls.clear()
+    clock.now += 120
+
+    static_scan.run_all(targets=["10.0.0.1"], cache=cache)
+    assert calls == [("dhcp", None)]
+
+
+def test_run_all_rescans_hosts_whose_fingerprint_changed(monkeypatch, tmp_path):
+    """MAC や開放ポートが変わったホストだけ再スキャンする"""
+
+    open_ports = {"10.0.0.1": [22], "10.0.0.2": [80]}
+    calls, _, cache = _setup(monkeypatch, tmp_path, open_ports)
+    targets = [{"ip": "10.0.0.1", "mac": "aa"}, {"ip": "10.0.0.2", "mac": "bb"}]
+    static_scan.run_all(targets=targets, cache=cache)
+
+    # MAC 変更 → そのホストのスキャナをすべて再実行
+    calls.clear()
+    targets[0] = {"ip": "10.0.0.1", "mac": "cc"}
+    static_scan.run_all(targets=targets, cache=cache)
+    assert sorted(calls) == [("ports", "10.0.0.1"), ("ssl_cert", "10.0.0.1")]
+
+    # 開放ポート変更 → ports 以外のホストスキャナを再実行
+    calls.clear()
+    targets[1] = {"ip": "10.0.0.2", "mac": "bb", "open_ports": [80, 443]}
+    static_scan.run_all(targets=targets, cache=cache)
+    assert calls == [("ssl_cert", "10.0.0.2")]
+
+
+def test_run_all_uses_this_runs_open_ports(monkeypatch, tmp_path):
+    """ports を取り直した回のうちに、開放ポートの変化で再スキャンする"""
+
+    open_ports = {"10.0.0.1": [22]}
+    calls, clock, cache = _setup(monkeypatch, tmp_path, open_ports, ttls={"ports": 60})
+    static_scan.run_all(targets=["10.0.0.1"], cache=cache)
+
+    calls.clear()
+    clock.now += 120
+    open_ports["10.0.0.1"] = [22, 443]
+    static_scan.run_all(targets=["10.0.0.1"], cache=cache)
+    assert calls == [("ports", "10.0.0.1"), ("ssl_cert", "10.0.0.1")]
+
+    # 次の回は変化が無いので再スキャンしない
+    calls.clear()
+    static_scan.run_all(targets=["10.0.0.1"], cache=cache)
+    assert calls == []
+
+
+def _discover(monkeypatch, replies):
+    """Run the real :func:`discover_hosts` over canned ARP replies."""
+
+    def fake_sweep(subnet, on_reply, on_sent, **kw):
+        for count, (ip, mac) in enumerate(replies, 1):
+            on_sent(count)
+            on_reply(ip, mac)
+        return [{"ip": ip, "mac": mac} for ip, mac in replies]
+
+    monkeypatch.setattr(arp_sweep, "sweep", fake_sweep)
+    monkeypatch.setattr(hostnames, "resolve_hostnames", lambda ips, **kw: {})
+    monkeypatch.setattr(discover_hosts_module, "lookup_vendors", lambda macs: {})
+    return discover_hosts_module.discover_hosts("10.0.0.0/30")
+
+
+def test_run_all_detects_replaced_device_from_discovery(monkeypatch, tmp_path):
+    """discover_hosts の MAC で機器の入れ替わりを検出する"""
+
+    open_ports = {"10.0.0.1": [22], "10.0.0.2": [80]}
+    calls, _, cache = _setup(monkeypatch, tmp_path, open_ports)
+    replies = [("10.0.0.1", "00:11:22:33:44:55"), ("10.0.0.2", "66:77:88:99:aa:bb")]
+    static_scan.run_all(targets=_discover(monkeypatch, replies), cache=cache)
+
+    calls.clear()
+    static_scan.run_all(targets=_discover(monkeypatch, replies), cache=cache)
+    assert calls == []
+
+    # 同じ IP に別の機器が付いた
+    replies[1] = ("10.0.0.2", "de:ad:be:ef:00:01")
+    static_scan.run_all(targets=_discover(monkeypatch, replies), cache=cache)
+    assert sorted(calls) == [("ports", "10.0.0.2"), ("ssl_cert", "10.0.0.2")]
+
+
+def test_cache_skips_error_results(tmp_path):
+    cache = ScanResultCache(tmp_path / "cache.db")
+    fp = cache.fingerprint("dns", None)
+    cache.store_many(
+        [
+            (None, "dns", fp, {"category": "dns", "details": {"error": "timeout"}}),
+            (None, "dhcp", fp, {"category": "dhcp", "details": {}}),
+        ]
+    )
+    snapshot = cache.snapshot()
+    assert cache.lookup(snapshot, None, "dns", fp) is None
+    assert cache.lookup(snapshot, None, "dhcp", fp) == {
+        "category": "dhcp",
+        "details": {},
+    }
+
+    cache.invalidate(scanner="dhcp")
+    assert cache.snapshot() == {}
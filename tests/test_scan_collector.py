@@ -0,0 +1,53 @@
+import socket
+import threading
+import time
+
+from src.scans._collector import collect
+
+
+def _responder(count, delay):
+    """プローブを受けると count 個の応答を delay 秒間隔で返す UDP サーバ"""
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+
+    def run():
+        data, addr = server.recvfrom(1024)
+        for i in range(count):
+            time.sleep(delay)
+            server.sendto(b"reply-%d" % i, addr)
+        server.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return server.getsockname()
+
+
+def test_collect_gathers_all_replies_and_exits_after_quiet_period():
+    address = _responder(3, 0.05)
+    start = time.monotonic()
+    replies = collect(b"probe", address, bind=("127.0.0.1", 0), quiet=0.3, deadline=5)
+    elapsed = time.monotonic() - start
+
+    assert [data for data, _ in replies] == [b"reply-0", b"reply-1", b"reply-2"]
+    assert all(addr == address for _, addr in replies)
+    # 最終応答から静穏期間で抜け、deadline までは待たない
+    assert elapsed < 1.5
+
+
+def test_collect_stops_at_deadline_and_applies_filter():
+    address = _responder(20, 0.05)
+    start = time.monotonic()
+    replies = collect(
+        b"probe",
+        address,
+        bind=("127.0.0.1", 0),
+        quiet=0.5,
+        deadline=0.4,
+        accept=lambda data, addr: data != b"reply-0",
+    )
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 1.0
+    assert replies
+    assert b"reply-0" not in [data for data, _ in replies]
+    assert len(replies) < 20
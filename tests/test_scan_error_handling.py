@@ -44,7 +44,7 @@ def patch_smb_netbios(mp):
 
 def patch_upnp(mp):
     mp.setattr(
-        upnp, "sr1", lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom"))
+        upnp, "collect", lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom"))
     )
 
 
@@ -58,12 +58,16 @@ def patch_arp_spoof(mp):
 
 def patch_dhcp(mp):
     mp.setattr(
-        dhcp, "srp", lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom"))
+        dhcp, "collect", lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom"))
     )
 
 
 def patch_dns(mp):
-    mp.setattr(dns, "sr1", lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom")))
+    mp.setattr(
+        dns,
+        "probe_resolvers",
+        lambda *_, **__: (_ for _ in ()).throw(RuntimeError("boom")),
+    )
 
 
 def patch_ssl_cert(mp):
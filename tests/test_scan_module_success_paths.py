@@ -1,4 +1,3 @@
-import types
 from datetime import datetime, timedelta, timezone
 
 import pytest
@@ -69,10 +68,8 @@ def ok_smb_netbios(mp):
 
 
 def ok_upnp(mp):
-    response = types.SimpleNamespace(
-        src="1.2.3.4", load=b"HTTP/1.1 200 OK\r\nSERVER: upnp\r\n\r\n"
-    )
-    mp.setattr(upnp, "sr1", lambda *_, **__: response)
+    response = b"HTTP/1.1 200 OK\r\nSERVER: upnp\r\n\r\n"
+    mp.setattr(upnp, "collect", lambda *_, **__: [(response, ("1.2.3.4", 1900))])
 
 
 def ok_arp_spoof(mp):
@@ -83,30 +80,19 @@ def ok_arp_spoof(mp):
 
 
 def ok_dhcp(mp):
-    class FakePkt:
-        def __contains__(self, layer):  # noqa: D401
-            return True
+    def fake_collect(probe, address, **kwargs):
+        offer = bytes([2]) + probe[1:240] + bytes([53, 1, 2, 54, 4, 1, 2, 3, 4, 255])
+        return [(offer, ("1.2.3.4", 67))]
 
-        def __getitem__(self, layer):  # noqa: D401
-            return types.SimpleNamespace(src="1.2.3.4")
-
-    mp.setattr(dhcp, "srp", lambda *_, **__: ([(None, FakePkt())], None))
+    mp.setattr(dhcp, "collect", fake_collect)
 
 
 def ok_dns(mp):
-    class FakeResp:
-        ancount = 1
-        arcount = 0
-        ad = 1
-
-        def __getitem__(self, item):  # noqa: D401
-            return self
-
-        def haslayer(self, layer):  # noqa: D401
-            return True
+    async def fake_probe(servers, **kwargs):
+        return {server: {"queries": 5, "answered": 5, "ad": True} for server in servers}
 
     mp.setattr(dns, "_get_nameservers", lambda path="/etc/resolv.conf": ["8.8.8.8"])
-    mp.setattr(dns, "sr1", lambda *_, **__: FakeResp())
+    mp.setattr(dns, "probe_resolvers", fake_probe)
 
 
 def ok_ssl_cert(mp):
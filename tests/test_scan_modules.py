@@ -1,3 +1,5 @@
+import os
+import subprocess
 from types import SimpleNamespace
 from datetime import datetime, timedelta, timezone
 
@@ -122,6 +124,149 @@ def test_os_banner_scan_handles_exception(monkeypatch):
     assert "nmap error" in result["details"]["error"]
 
 
+NMAP_XML_HOSTS = [
+    """<host><status state="up"/>
+<address addr="10.0.0.1" addrtype="ipv4"/>
+<address addr="AA:BB:CC:DD:EE:FF" addrtype="mac"/>
+<ports><port protocol="tcp" portid="22"><state state="open"/>
+<service name="ssh" product="OpenSSH" version="8.9"/></port></ports>
+<os><osmatch name="Linux 5.X" accuracy="98"/></os></host>
+""",
+    """<host><status state="up"/>
+<address addr="10.0.0.2" addrtype="ipv4"/>
+<ports><port protocol="tcp" portid="80"><state state="open"/>
+<service name="http"/></port></ports></host>
+""",
+]
+
+
+class FakeNmapProcess:
+    """Popen stand-in that streams nmap XML one chunk at a time."""
+
+    def __init__(self, chunks, returncode=0, stderr=""):
+        self.chunks = chunks
+        self.fed = 0
+        self.returncode = returncode
+        self.stderr_text = stderr
+        self.commands = []
+        self.killed = False
+
+    def popen(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        # stderr はパイプではなくファイルで受け取る
+        assert kwargs["stderr"] is not subprocess.PIPE
+        kwargs["stderr"].write(self.stderr_text)
+        kwargs["stderr"].flush()
+        return self
+
+    @property
+    def stdout(self):
+        for chunk in self.chunks:
+            self.fed += 1
+            yield chunk
+
+    def wait(self):
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+
+
+def test_os_banner_scan_many_streams_hosts_from_one_nmap_run(monkeypatch):
+    chunks = ['<?xml version="1.0"?>\n<nmaprun>\n', *NMAP_XML_HOSTS, "</nmaprun>\n"]
+    proc = FakeNmapProcess(chunks)
+    monkeypatch.setattr(os_banner.subprocess, "Popen", proc.popen)
+    stream = os_banner.scan_many(["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+
+    first = next(stream)
+    # 1 台目は 2 台目の XML を読む前に届く
+    assert proc.fed == 2
+    assert first == {
+        "category": "os_banner",
+        "score": 2,
+        "details": {
+            "target": "10.0.0.1",
+            "os": "Linux 5.X",
+            "banners": {22: "ssh 8.9"},
+        },
+    }
+    rest = list(stream)
+    assert [r["details"]["target"] for r in rest] == ["10.0.0.2", "10.0.0.3"]
+    assert rest[0]["details"]["banners"] == {80: "http"}
+    # 応答のないホストは空の結果になる
+    assert rest[1]["score"] == 0
+    assert "error" not in rest[1]["details"]
+
+    assert len(proc.commands) == 1
+    cmd = proc.commands[0]
+    assert cmd[0] == "nmap"
+    assert cmd[-3:] == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    assert ["-oX", "-"] == cmd[cmd.index("-oX") : cmd.index("-oX") + 2]
+
+
+def test_os_banner_scan_many_reports_nmap_failure(monkeypatch):
+    proc = FakeNmapProcess([], returncode=1, stderr="requires root privileges")
+    monkeypatch.setattr(os_banner.subprocess, "Popen", proc.popen)
+
+    results = list(os_banner.scan_many(["10.0.0.1", "10.0.0.2"]))
+    assert [r["details"]["error"] for r in results] == [
+        "requires root privileges",
+        "requires root privileges",
+    ]
+
+
+def test_os_banner_scan_many_matches_host_name_targets(monkeypatch):
+    """ホスト名の対象は nmap が返す名前で元の指定に戻す"""
+
+    host = """<host><status state="up"/>
+<address addr="10.0.0.5" addrtype="ipv4"/>
+<hostnames><hostname name="nas.lan" type="PTR"/>
+<hostname name="NAS.example" type="user"/></hostnames>
+<ports><port protocol="tcp" portid="445"><state state="open"/>
+<service name="microsoft-ds"/></port></ports></host>
+"""
+    chunks = ["<nmaprun>\n", host, NMAP_XML_HOSTS[0], "</nmaprun>\n"]
+    proc = FakeNmapProcess(chunks)
+    monkeypatch.setattr(os_banner.subprocess, "Popen", proc.popen)
+
+    results = list(os_banner.scan_many(["NAS.example", "10.0.0.1"]))
+    assert [r["details"]["target"] for r in results] == ["NAS.example", "10.0.0.1"]
+    assert results[0]["details"]["banners"] == {445: "microsoft-ds"}
+
+
+def test_os_banner_scan_many_does_not_block_on_stderr(monkeypatch, tmp_path):
+    """大量の stderr 出力があっても stdout の読み取りが止まらない"""
+
+    script = tmp_path / "nmap"
+    script.write_text(
+        "#!/bin/sh\n"
+        "head -c 1000000 /dev/zero | tr '\\0' w >&2\n"
+        'echo \'<nmaprun><host><address addr="10.0.0.1" addrtype="ipv4"/>'
+        "</host></nmaprun>'\n"
+        "exit 1\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{os.environ['PATH']}")
+
+    results = list(os_banner.scan_many(["10.0.0.1", "10.0.0.2"]))
+    assert results[0]["details"]["target"] == "10.0.0.1"
+    assert "error" not in results[0]["details"]
+    assert results[1]["details"]["error"].startswith("wwww")
+
+
+def test_os_banner_scan_many_handles_missing_nmap(monkeypatch):
+    def missing(cmd, **kwargs):
+        raise FileNotFoundError("nmap not found")
+
+    monkeypatch.setattr(os_banner.subprocess, "Popen", missing)
+    results = list(os_banner.scan_many(["10.0.0.1"]))
+    assert results[0]["score"] == 0
+    assert "nmap not found" in results[0]["details"]["error"]
+
+
 def test_smb_netbios_scan_detects_smb1(monkeypatch):
     class DummyNB:
         def queryIPForName(self, target, timeout=2):  # noqa: D401, ARG002
@@ -243,11 +388,12 @@ def test_nmblookup_names_handles_failure(monkeypatch):
 # --- scapy based scans ---------------------------------------------------
 
 
+def _ssdp_reply(src, body=b"HTTP/1.1 200 OK\r\nSERVER: upnp\r\n\r\n"):
+    return lambda *_, **__: [(body, (src, 1900))]
+
+
 def test_upnp_scan_flags_open_service(monkeypatch):
-    response = SimpleNamespace(
-        src="1.2.3.4", load=b"HTTP/1.1 200 OK\r\nSERVER: upnp\r\n\r\n"
-    )
-    monkeypatch.setattr(upnp, "sr1", lambda *_, **__: response)
+    monkeypatch.setattr(upnp, "collect", _ssdp_reply("1.2.3.4"))
     result = upnp.scan()
     assert result["score"] == 1
     assert result["details"]["responders"] == ["1.2.3.4"]
@@ -255,8 +401,7 @@ def test_upnp_scan_flags_open_service(monkeypatch):
 
 
 def test_upnp_scan_flags_misconfigured(monkeypatch):
-    response = SimpleNamespace(src="5.6.7.8", load=b"BAD RESPONSE")
-    monkeypatch.setattr(upnp, "sr1", lambda *_, **__: response)
+    monkeypatch.setattr(upnp, "collect", _ssdp_reply("5.6.7.8", b"BAD RESPONSE"))
     result = upnp.scan()
     assert result["score"] == 1
     assert result["details"]["responders"] == ["5.6.7.8"]
@@ -265,7 +410,7 @@ def test_upnp_scan_flags_misconfigured(monkeypatch):
 
 def test_upnp_scan_handles_no_response(monkeypatch):
     """No responder should yield empty findings."""
-    monkeypatch.setattr(upnp, "sr1", lambda *_, **__: None)
+    monkeypatch.setattr(upnp, "collect", lambda *_, **__: [])
     result = upnp.scan()
     assert result["score"] == 0
     assert result["details"]["responders"] == []
@@ -273,12 +418,12 @@ def test_upnp_scan_handles_no_response(monkeypatch):
 
 
 def test_upnp_scan_handles_errors(monkeypatch):
-    """Exceptions from scapy should not crash the scan."""
+    """Exceptions from the collector should not crash the scan."""
 
     def boom(*_, **__):  # noqa: D401, ARG002
         raise RuntimeError("boom")
 
-    monkeypatch.setattr(upnp, "sr1", boom)
+    monkeypatch.setattr(upnp, "collect", boom)
     result = upnp.scan()
     assert result["score"] == 0
     assert result["details"]["responders"] == []
@@ -286,53 +431,151 @@ def test_upnp_scan_handles_errors(monkeypatch):
     assert "boom" in result["details"]["error"]
 
 
-def test_dns_scan_flags_external_dns(monkeypatch):
+def test_upnp_scan_records_every_responder_and_fetches_descriptions_once(
+    monkeypatch,
+):
+    def ssdp(src, usn):
+        return (
+            (
+                "HTTP/1.1 200 OK\r\nSERVER: Linux UPnP/1.0\r\n"
+                f"LOCATION: http://{src}:49152/desc.xml\r\nUSN: {usn}\r\n\r\n"
+            ).encode(),
+            (src, 1900),
+        )
+
+    replies = [
+        ssdp("10.0.0.1", "uuid:router::upnp:rootdevice"),
+        ssdp("10.0.0.1", "uuid:router::urn:schemas-upnp-org:service:WANIPConnection:1"),
+        ssdp("10.0.0.2", "uuid:tv::upnp:rootdevice"),
+    ]
+    monkeypatch.setattr(upnp, "collect", lambda *_, **__: replies)
+    monkeypatch.setattr(upnp, "_DESCRIPTION_CACHE", {})
+    fetched = []
+
+    def fake_fetch(location):
+        fetched.append(location)
+        return {"friendlyName": location.split("//")[1].split(":")[0]}
+
+    monkeypatch.setattr(upnp, "_fetch_description", fake_fetch)
+
+    result = upnp.scan()
+    assert result["details"]["responders"] == ["10.0.0.1", "10.0.0.2"]
+    assert result["score"] == 2
+    devices = {d["usn"]: d for d in result["details"]["devices"]}
+    assert devices["uuid:router"]["friendlyName"] == "10.0.0.1"
+    assert devices["uuid:tv"]["server"] == "Linux UPnP/1.0"
+    assert sorted(fetched) == [
+        "http://10.0.0.1:49152/desc.xml",
+        "http://10.0.0.2:49152/desc.xml",
+    ]
+
+    # 2 回目は USN キャッシュから返す
+    upnp.scan()
+    assert len(fetched) == 2
+
+
+def test_upnp_description_cache_expires_and_skips_failures(monkeypatch):
+    replies = [
+        (
+            b"HTTP/1.1 200 OK\r\nLOCATION: http://10.0.0.1/d.xml\r\n"
+            b"USN: uuid:router::upnp:rootdevice\r\n\r\n",
+            ("10.0.0.1", 1900),
+        )
+    ]
+    monkeypatch.setattr(upnp, "collect", lambda *_, **__: replies)
+    monkeypatch.setattr(upnp, "_DESCRIPTION_CACHE", {})
+    now = [1000.0]
+    monkeypatch.setattr(upnp.time, "monotonic", lambda: now[0])
+    fetched = []
+
+    def flaky_fetch(location):
+        fetched.append(location)
+        if len(fetched) == 1:
+            raise OSError("connection reset")
+        return {"friendlyName": "Router"}
+
+    monkeypatch.setattr(upnp, "_fetch_description", flaky_fetch)
+
+    # 失敗はその回の結果にだけ載り、次回は取り直す
+    first = upnp.scan()["details"]["devices"][0]
+    assert first["error"] == "connection reset"
+    second = upnp.scan()["details"]["devices"][0]
+    assert second["friendlyName"] == "Router" and "error" not in second
+    assert len(fetched) == 2
+
+    upnp.scan()
+    assert len(fetched) == 2
+    now[0] += upnp.DESCRIPTION_TTL
+    upnp.scan()
+    assert len(fetched) == 3
+
+
+def test_upnp_fetch_description_parses_device_xml(monkeypatch):
+    xml = (
+        b'<?xml version="1.0"?><root xmlns="urn:schemas-upnp-org:device-1-0">'
+        b"<device><deviceType>urn:schemas-upnp-org:device:InternetGatewayDevice:1"
+        b"</deviceType><friendlyName>Router</friendlyName>"
+        b"<manufacturer>ACME</manufacturer><modelName>R1</modelName></device></root>"
+    )
+
     class FakeResp:
-        def haslayer(self, layer):
-            return True
+        raw = SimpleNamespace(read=lambda n, decode_content=True: xml[:n])
+
+        def raise_for_status(self):
+            pass
+
+        def close(self):
+            pass
+
+    session = SimpleNamespace(get=lambda url, timeout, stream: FakeResp())
+    monkeypatch.setattr(upnp, "_get_session", lambda: session)
+    info = upnp._fetch_description("http://10.0.0.1/desc.xml")
+    assert info == {
+        "deviceType": "urn:schemas-upnp-org:device:InternetGatewayDevice:1",
+        "friendlyName": "Router",
+        "manufacturer": "ACME",
+        "modelName": "R1",
+    }
+
 
-        def __getitem__(self, layer):  # noqa: D401, ARG002
-            class FakeDNS:
-                ad = 1
+def _fake_resolvers(ad=True, answered=5):
+    """probe_resolvers の代替。全サーバーが同じ統計を返す"""
 
-            return FakeDNS()
+    async def fake(servers, **kwargs):
+        return {
+            server: {"queries": 5, "answered": answered, "ad": ad} for server in servers
+        }
 
+    return fake
+
+
+def test_dns_scan_flags_external_dns(monkeypatch):
     monkeypatch.setattr(
         dns, "_get_nameservers", lambda path="/etc/resolv.conf": ["8.8.8.8"]
     )
-    monkeypatch.setattr(dns, "sr1", lambda *_, **__: FakeResp())
+    monkeypatch.setattr(dns, "probe_resolvers", _fake_resolvers(ad=True))
     result = dns.scan()
     warnings = result["details"]["warnings"]
     assert any("External DNS detected" in w for w in warnings)
 
 
 def test_dns_scan_flags_dnssec_disabled(monkeypatch):
-    class FakeResp:
-        def haslayer(self, layer):
-            return True
-
-        def __getitem__(self, layer):  # noqa: D401, ARG002
-            class FakeDNS:
-                ad = 0
-
-            return FakeDNS()
-
     monkeypatch.setattr(
         dns, "_get_nameservers", lambda path="/etc/resolv.conf": ["1.1.1.1"]
     )
-    monkeypatch.setattr(dns, "sr1", lambda *_, **__: FakeResp())
+    monkeypatch.setattr(dns, "probe_resolvers", _fake_resolvers(ad=False))
     result = dns.scan()
     warnings = result["details"]["warnings"]
     assert "DNSSEC is disabled" in warnings
 
 
 def test_dns_scan_handles_error(monkeypatch):
-    """Errors from sr1 should be surfaced."""
+    """Errors from the resolver probe should be surfaced."""
 
     def boom(*args, **kwargs):  # noqa: D401, ARG001, ARG002
         raise RuntimeError("dns fail")
 
-    monkeypatch.setattr(dns, "sr1", boom)
+    monkeypatch.setattr(dns, "probe_resolvers", boom)
     result = dns.scan()
     assert result["score"] == 0
     assert "dns fail" in result["details"]["error"]
@@ -349,15 +592,21 @@ def test_dns_scan_flags_invalid_server(monkeypatch):
     assert any("Invalid DNS server IP" in w for w in warnings)
 
 
-def test_dhcp_scan_detects_servers(monkeypatch):
-    class FakePkt:
-        def __contains__(self, item):
-            return True
+def _dhcp_offers(*servers):
+    """DISCOVER と同じ xid の DHCPOFFER を servers の順に返す collect の代替"""
+
+    def fake_collect(probe, address, **kwargs):
+        replies = []
+        for server in servers:
+            options = bytes([53, 1, 2, 54, 4, *map(int, server.split(".")), 255])
+            replies.append((bytes([2]) + probe[1:240] + options, (server, 67)))
+        return replies
 
-        def __getitem__(self, layer):
-            return SimpleNamespace(src="10.0.0.1")
+    return fake_collect
 
-    monkeypatch.setattr(dhcp, "srp", lambda *_, **__: ([(None, FakePkt())], None))
+
+def test_dhcp_scan_detects_servers(monkeypatch):
+    monkeypatch.setattr(dhcp, "collect", _dhcp_offers("10.0.0.1"))
     result = dhcp.scan()
     assert result["score"] == 1
     assert result["details"]["servers"] == ["10.0.0.1"]
@@ -365,18 +614,7 @@ def test_dhcp_scan_detects_servers(monkeypatch):
 
 
 def test_dhcp_scan_warns_on_conflict(monkeypatch):
-    class FakePkt:
-        def __init__(self, src):
-            self.src = src
-
-        def __contains__(self, item):
-            return True
-
-        def __getitem__(self, layer):
-            return SimpleNamespace(src=self.src)
-
-    pkts = [(None, FakePkt("10.0.0.1")), (None, FakePkt("10.0.0.2"))]
-    monkeypatch.setattr(dhcp, "srp", lambda *_, **__: (pkts, None))
+    monkeypatch.setattr(dhcp, "collect", _dhcp_offers("10.0.0.1", "10.0.0.2"))
     result = dhcp.scan()
     assert result["score"] == 2
     assert sorted(result["details"]["servers"]) == ["10.0.0.1", "10.0.0.2"]
@@ -384,18 +622,7 @@ def test_dhcp_scan_warns_on_conflict(monkeypatch):
 
 
 def test_dhcp_scan_deduplicates_servers(monkeypatch):
-    class FakePkt:
-        def __init__(self, src):
-            self.src = src
-
-        def __contains__(self, item):
-            return True
-
-        def __getitem__(self, layer):
-            return SimpleNamespace(src=self.src)
-
-    pkts = [(None, FakePkt("10.0.0.1")), (None, FakePkt("10.0.0.1"))]
-    monkeypatch.setattr(dhcp, "srp", lambda *_, **__: (pkts, None))
+    monkeypatch.setattr(dhcp, "collect", _dhcp_offers("10.0.0.1", "10.0.0.1"))
     result = dhcp.scan()
     assert result["score"] == 1
     assert result["details"]["servers"] == ["10.0.0.1"]
@@ -404,7 +631,7 @@ def test_dhcp_scan_deduplicates_servers(monkeypatch):
 def test_dhcp_scan_no_servers(monkeypatch):
     """No responses should yield empty server list and no warnings."""
 
-    monkeypatch.setattr(dhcp, "srp", lambda *_, **__: ([], None))
+    monkeypatch.setattr(dhcp, "collect", lambda *_, **__: [])
     result = dhcp.scan()
     assert result["score"] == 0
     assert result["details"]["servers"] == []
@@ -413,12 +640,12 @@ def test_dhcp_scan_no_servers(monkeypatch):
 
 
 def test_dhcp_scan_handles_errors(monkeypatch):
-    """srp raising should surface an error and score 0."""
+    """collect raising should surface an error and score 0."""
 
     def boom(*args, **kwargs):  # noqa: D401, ARG001, ARG002
         raise RuntimeError("dhcp fail")
 
-    monkeypatch.setattr(dhcp, "srp", boom)
+    monkeypatch.setattr(dhcp, "collect", boom)
     result = dhcp.scan()
     assert result["score"] == 0
     assert "dhcp fail" in result["details"]["error"]
@@ -518,7 +745,7 @@ def test_arp_spoof_scan_waits(monkeypatch):
         nonlocal current
         current += seconds
 
-    monkeypatch.setattr(arp_spoof.time, "time", fake_time)
+    monkeypatch.setattr(arp_spoof.time, "monotonic", fake_time)
     monkeypatch.setattr(arp_spoof.time, "sleep", fake_sleep)
     monkeypatch.setattr(arp_spoof, "_get_arp_table", lambda: {})
     monkeypatch.setattr(arp_spoof, "send", lambda *_, **__: None)
@@ -529,6 +756,88 @@ def test_arp_spoof_scan_waits(monkeypatch):
     assert elapsed == pytest.approx(1.5, abs=0.2)
 
 
+def test_arp_spoof_scan_returns_once_entry_appears(monkeypatch):
+    """偽エントリが現れた時点で待機を打ち切る"""
+
+    current = 0.0
+    tables = [{}, {}, {}, {arp_spoof.FAKE_IP: arp_spoof.FAKE_MAC}]
+
+    def fake_sleep(seconds: float) -> None:
+        nonlocal current
+        current += seconds
+
+    monkeypatch.setattr(arp_spoof.time, "monotonic", lambda: current)
+    monkeypatch.setattr(arp_spoof.time, "sleep", fake_sleep)
+    monkeypatch.setattr(arp_spoof, "_get_arp_table", lambda: tables.pop(0))
+    monkeypatch.setattr(arp_spoof, "send", lambda *_, **__: None)
+
+    result = arp_spoof.scan(wait=5)
+    assert result["score"] == 5
+    assert current == pytest.approx(2 * arp_spoof.POLL_INTERVAL)
+
+
+def test_arp_spoof_scan_tests_multiple_pairs(monkeypatch):
+    pairs = [("10.9.9.1", "de:ad:be:ef:00:01"), ("10.9.9.2", "de:ad:be:ef:00:02")]
+    tables = [{}, {"10.9.9.2": "DE:AD:BE:EF:00:02"}]
+    sent = []
+    monkeypatch.setattr(arp_spoof, "_get_arp_table", lambda: tables.pop(0))
+    monkeypatch.setattr(arp_spoof, "send", lambda pkts, **__: sent.append(pkts))
+
+    result = arp_spoof.scan(wait=0, pairs=pairs)
+    assert len(sent) == 1 and len(sent[0]) == 2
+    assert result["score"] == 5
+    assert result["details"]["vulnerable"] is True
+    assert result["details"]["pairs"] == [
+        {"ip": "10.9.9.1", "mac": "de:ad:be:ef:00:01", "poisoned": False},
+        {"ip": "10.9.9.2", "mac": "de:ad:be:ef:00:02", "poisoned": True},
+    ]
+
+
+def test_arp_spoof_scan_keeps_polling_until_every_pair_is_seen(monkeypatch):
+    """1 組目が汚染されても残りのペアの確認を続ける"""
+
+    pairs = [("10.9.9.1", "de:ad:be:ef:00:01"), ("10.9.9.2", "de:ad:be:ef:00:02")]
+    tables = [
+        {},
+        {"10.9.9.1": "de:ad:be:ef:00:01"},
+        {},
+        {"10.9.9.2": "de:ad:be:ef:00:02"},
+    ]
+    current = 0.0
+
+    def fake_sleep(seconds: float) -> None:
+        nonlocal current
+        current += seconds
+
+    monkeypatch.setattr(arp_spoof.time, "monotonic", lambda: current)
+    monkeypatch.setattr(arp_spoof.time, "sleep", fake_sleep)
+    monkeypatch.setattr(arp_spoof, "_get_arp_table", lambda: tables.pop(0))
+    monkeypatch.setattr(arp_spoof, "send", lambda *_, **__: None)
+
+    result = arp_spoof.scan(wait=5, pairs=pairs)
+    assert [p["poisoned"] for p in result["details"]["pairs"]] == [True, True]
+    # 全ペアが揃った時点で打ち切る
+    assert tables == []
+    assert current == pytest.approx(2 * arp_spoof.POLL_INTERVAL)
+
+
+def test_arp_spoof_scan_accepts_empty_pairs(monkeypatch):
+    sent = []
+    monkeypatch.setattr(arp_spoof, "send", lambda pkts, **__: sent.append(pkts))
+    monkeypatch.setattr(
+        arp_spoof, "_get_arp_table", lambda: pytest.fail("nothing to check")
+    )
+
+    result = arp_spoof.scan(wait=0, pairs=[])
+    assert sent == []
+    assert result["score"] == 0
+    assert result["details"] == {
+        "vulnerable": False,
+        "explanation": "No ARP poisoning detected",
+        "pairs": [],
+    }
+
+
 def test_arp_spoof_scan_handles_send_error(monkeypatch):
     """send() が例外を投げてもエラーとして扱われること。"""
     monkeypatch.setattr(arp_spoof, "_get_arp_table", lambda: {})
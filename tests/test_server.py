@@ -1,6 +1,11 @@
 import asyncio
+import json
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import pytest
 
 import httpx
@@ -8,12 +13,22 @@ import httpx
 pytest.importorskip("fastapi")
 from fastapi.testclient import TestClient
 from src import server
+from src.report.store import ReportStore
+from src.scan_cache import ScanResultCache
 
 pytestmark = pytest.mark.fastapi
 
 
+@pytest.fixture(autouse=True)
+def scan_cache(monkeypatch, tmp_path):
+    """テストごとに空のスキャンキャッシュを使う"""
+    cache = ScanResultCache(tmp_path / "scan_cache.db")
+    monkeypatch.setattr(server, "_scan_cache", cache)
+    return cache
+
+
 def test_static_scan_success(monkeypatch):
-    def fake_run_all():
+    def fake_run_all(**kwargs):
         return {"findings": {"ports": ["22"]}, "risk_score": 5}
 
     monkeypatch.setattr(server.static_scan, "run_all", fake_run_all)
@@ -28,11 +43,12 @@ def test_static_scan_success(monkeypatch):
 
 
 def test_static_scan_timeout(monkeypatch):
-    def slow_run_all():
+    def slow_run_all(**kwargs):
         time.sleep(0.2)
 
     monkeypatch.setattr(server.static_scan, "run_all", slow_run_all)
     monkeypatch.setattr(server, "STATIC_SCAN_TIMEOUT", 0.05)
+    monkeypatch.setattr(server, "STATIC_SCAN_GRACE", 0)
     client = TestClient(server.app)
 
     resp = client.get("/static_scan")
@@ -40,8 +56,75 @@ def test_static_scan_timeout(monkeypatch):
     assert resp.json()["status"] == "timeout"
 
 
+def test_static_scan_uses_deadline_and_process_isolation(monkeypatch, scan_cache):
+    calls = []
+
+    def fake_run_all(**kwargs):
+        calls.append(kwargs)
+        return {"findings": [], "risk_score": 0}
+
+    monkeypatch.setattr(server.static_scan, "run_all", fake_run_all)
+    client = TestClient(server.app)
+
+    assert client.get("/static_scan").status_code == 200
+    assert calls == [
+        {
+            "deadline": server.STATIC_SCAN_TIMEOUT,
+            "isolation": "process",
+            "cache": scan_cache,
+        }
+    ]
+
+
+def test_static_scan_reuses_cached_results(monkeypatch):
+    """2 回目の要求はキャッシュ済みの結果を返し、refresh で取り直す"""
+
+    calls = []
+
+    def dhcp():
+        calls.append("dhcp")
+        return {"category": "dhcp", "score": 1, "details": {}}
+
+    monkeypatch.setattr(server.static_scan, "_load_scanners", lambda: [("dhcp", dhcp)])
+    monkeypatch.setattr(server.static_scan, "_call_in_subprocess", lambda f, a, *_: f())
+    client = TestClient(server.app)
+
+    first = client.get("/static_scan").json()
+    second = client.get("/static_scan").json()
+    assert calls == ["dhcp"]
+    assert "cached" not in first["findings"][0]
+    assert second["findings"][0]["cached"] is True
+    assert second["risk_score"] == 1
+
+    client.get("/static_scan", params={"refresh": True})
+    assert calls == ["dhcp", "dhcp"]
+
+
+def test_static_scan_kills_hung_scanner_at_deadline(monkeypatch):
+    """期限を過ぎたスキャナは子プロセスごと停止し、部分結果を返す"""
+
+    def hung():
+        time.sleep(30)
+
+    monkeypatch.setattr(
+        server.static_scan,
+        "_load_scanners",
+        lambda: [("ports", lambda: {"score": 1}), ("hung", hung)],
+    )
+    monkeypatch.setattr(server, "STATIC_SCAN_TIMEOUT", 0.5)
+    client = TestClient(server.app)
+
+    start = time.monotonic()
+    resp = client.get("/static_scan")
+    assert time.monotonic() - start < 3
+    assert resp.status_code == 200
+    findings = {f["category"]: f for f in resp.json()["findings"]}
+    assert findings["ports"]["score"] == 1
+    assert findings["hung"]["details"] == {"error": "timeout"}
+
+
 def test_static_scan_error(monkeypatch):
-    def bad_run_all():
+    def bad_run_all(**kwargs):
         raise RuntimeError("boom")
 
     monkeypatch.setattr(server.static_scan, "run_all", bad_run_all)
@@ -57,7 +140,7 @@ def test_static_scan_error(monkeypatch):
 def test_static_scan_non_dict(monkeypatch):
     """run_allが辞書以外を返した場合のハンドリングを確認"""
 
-    def weird_run_all():
+    def weird_run_all(**kwargs):
         return ["80/tcp open http"]
 
     monkeypatch.setattr(server.static_scan, "run_all", weird_run_all)
@@ -74,7 +157,7 @@ def test_static_scan_non_dict(monkeypatch):
 def test_static_scan_none(monkeypatch):
     """run_allがNoneを返した場合のハンドリングを確認"""
 
-    def none_run_all():
+    def none_run_all(**kwargs):
         return None
 
     monkeypatch.setattr(server.static_scan, "run_all", none_run_all)
@@ -88,34 +171,99 @@ def test_static_scan_none(monkeypatch):
     assert data["risk_score"] is None
 
 
-def test_static_scan_pdf_report(monkeypatch):
-    """PDFレポート生成の呼び出しを確認"""
+def test_static_scan_pdf_report(monkeypatch, tmp_path):
+    """PDF レポートはワーカーで描画され、ID と URL で取得できる"""
 
-    def fake_run_all():
+    def fake_run_all(**kwargs):
         return {"findings": {"ports": {"score": 5}}, "risk_score": 5}
 
     monkeypatch.setattr(server.static_scan, "run_all", fake_run_all)
 
-    called: dict = {}
+    rendered: list = []
 
-    def fake_create_pdf(data, path):
-        called["data"] = data
-        called["path"] = path
+    def fake_render(data, path):
+        rendered.append(data)
+        Path(path).write_bytes(b"%PDF-1.4 fake")
 
-    monkeypatch.setattr(server, "create_pdf", fake_create_pdf)
+    pool = ThreadPoolExecutor(max_workers=1)
+    store = ReportStore(tmp_path, executor=pool, render=fake_render)
+    monkeypatch.setattr(server, "_report_store", store)
     client = TestClient(server.app)
 
     resp = client.get("/static_scan", params={"report": "true"})
     assert resp.status_code == 200
-    assert called["data"]["findings"]["ports"]["score"] == 5
-    assert called["path"] == "/tmp/static_scan_report.pdf"
-    assert resp.json()["report_path"] == "/tmp/static_scan_report.pdf"
+    body = resp.json()
+    report_id = body["report_id"]
+    assert body["report_url"] == f"/reports/{report_id}.pdf"
+
+    pdf = client.get(body["report_url"])
+    assert pdf.status_code == 200
+    assert pdf.headers["content-type"] == "application/pdf"
+    assert pdf.content == b"%PDF-1.4 fake"
+    assert client.get(f"/reports/{report_id}").json()["report_status"] == "ready"
+
+    # 同じ結果なら描画済みの PDF を再利用する
+    again = client.get("/static_scan", params={"report": "true"}).json()
+    assert again["report_id"] == report_id
+    assert again["status"] == "ok"
+    assert len(rendered) == 1
+    assert rendered[0]["findings"]["ports"]["score"] == 5
+    pool.shutdown()
+
+
+def test_pending_report_has_no_path(monkeypatch, tmp_path):
+    """描画中のレポートはまだ存在しないファイルのパスを返さない"""
+
+    monkeypatch.setattr(server.static_scan, "run_all", lambda **kw: {"findings": []})
+    gate = threading.Event()
+
+    def slow_render(data, path):
+        gate.wait(5)
+        Path(path).write_bytes(b"%PDF-1.4 fake")
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    store = ReportStore(tmp_path, executor=pool, render=slow_render)
+    monkeypatch.setattr(server, "_report_store", store)
+    client = TestClient(server.app)
+
+    body = client.get("/static_scan", params={"report": "true"}).json()
+    assert body["report_status"] == "pending"
+    assert "report_path" not in body
+    assert "report_path" not in client.get(f"/reports/{body['report_id']}").json()
+
+    gate.set()
+    pool.shutdown()
+    status = client.get(f"/reports/{body['report_id']}").json()
+    assert status["report_status"] == "ready"
+    assert status["report_path"] == str(store.path(body["report_id"]))
+
+
+def test_report_endpoints_unknown_and_failed(monkeypatch, tmp_path):
+    def broken(data, path):
+        raise RuntimeError("render failed")
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    store = ReportStore(tmp_path, executor=pool, render=broken)
+    monkeypatch.setattr(server, "_report_store", store)
+    client = TestClient(server.app)
+
+    assert client.get("/reports/../../etc/passwd.pdf").status_code == 404
+    assert client.get("/reports/" + "0" * 64).status_code == 404
+
+    report_id, future = store.submit({"findings": []})
+    with pytest.raises(RuntimeError):
+        future.result(5)
+    assert client.get(f"/reports/{report_id}.pdf").status_code == 404
+    status = client.get(f"/reports/{report_id}").json()
+    assert status["report_status"] == "failed"
+    assert status["message"] == "render failed"
+    pool.shutdown()
 
 
 def test_static_scan_does_not_block_other_requests(monkeypatch):
     """Static scan runs in background thread so other requests respond."""
 
-    def slow_run_all():
+    def slow_run_all(**kwargs):
         time.sleep(0.2)
         return {}
 
@@ -142,7 +290,7 @@ def test_static_scan_does_not_block_other_requests(monkeypatch):
 def test_static_scan_logs_success(monkeypatch, caplog):
     """ログ出力（成功時）を確認"""
 
-    def fake_run_all():
+    def fake_run_all(**kwargs):
         return {}
 
     monkeypatch.setattr(server.static_scan, "run_all", fake_run_all)
@@ -158,11 +306,12 @@ def test_static_scan_logs_success(monkeypatch, caplog):
 def test_static_scan_logs_timeout(monkeypatch, caplog):
     """ログ出力（タイムアウト時）を確認"""
 
-    def slow_run_all():
+    def slow_run_all(**kwargs):
         time.sleep(0.2)
 
     monkeypatch.setattr(server.static_scan, "run_all", slow_run_all)
     monkeypatch.setattr(server, "STATIC_SCAN_TIMEOUT", 0.05)
+    monkeypatch.setattr(server, "STATIC_SCAN_GRACE", 0)
     client = TestClient(server.app)
 
     with caplog.at_level(logging.INFO):
@@ -175,7 +324,7 @@ def test_static_scan_logs_timeout(monkeypatch, caplog):
 def test_static_scan_logs_error(monkeypatch, caplog):
     """ログ出力（エラー時）を確認"""
 
-    def bad_run_all():
+    def bad_run_all(**kwargs):
         raise RuntimeError("boom")
 
     monkeypatch.setattr(server.static_scan, "run_all", bad_run_all)
@@ -186,3 +335,56 @@ def test_static_scan_logs_error(monkeypatch, caplog):
 
     assert "Starting static scan" in caplog.text
     assert "Static scan failed" in caplog.text
+
+
+def _fake_iter_results(calls):
+    def fake(**kwargs):
+        calls.append(kwargs)
+        yield {"type": "result", "finding": {"category": "ports"}, "risk_score": 2}
+        yield {"type": "result", "finding": {"category": "dns"}, "risk_score": 3}
+        yield {"type": "done", "risk_score": 3, "completed": 2, "total": 2}
+
+    return fake
+
+
+def test_static_scan_stream_emits_ndjson(monkeypatch):
+    calls: list = []
+    monkeypatch.setattr(server.static_scan, "iter_results", _fake_iter_results(calls))
+    client = TestClient(server.app)
+
+    resp = client.get(
+        "/static_scan/stream", params={"targets": ["10.0.0.1", "10.0.0.2"]}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert [e["risk_score"] for e in events] == [2, 3, 3]
+    assert events[-1]["type"] == "done"
+    assert calls[0]["targets"] == ["10.0.0.1", "10.0.0.2"]
+    assert calls[0]["deadline"] == server.STATIC_SCAN_TIMEOUT
+    assert calls[0]["cache"] is server.get_scan_cache()
+
+
+def test_static_scan_stream_reports_errors(monkeypatch):
+    def broken(**kwargs):
+        yield {"type": "result", "finding": {"category": "ports"}, "risk_score": 1}
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server.static_scan, "iter_results", broken)
+    client = TestClient(server.app)
+
+    events = [
+        json.loads(line) for line in client.get("/static_scan/stream").text.splitlines()
+    ]
+    assert events[-1] == {"type": "error", "message": "Static scan failed: boom"}
+
+
+def test_static_scan_websocket_streams_events(monkeypatch):
+    calls: list = []
+    monkeypatch.setattr(server.static_scan, "iter_results", _fake_iter_results(calls))
+    client = TestClient(server.app)
+
+    with client.websocket_connect("/ws/static_scan?targets=10.0.0.1") as ws:
+        events = [ws.receive_json() for _ in range(3)]
+    assert [e["type"] for e in events] == ["result", "result", "done"]
+    assert calls[0]["targets"] == ["10.0.0.1"]
@@ -0,0 +1,110 @@
+import asyncio
+import socket
+import struct
+
+from src.scans import smb_netbios
+
+
+def _nbstat_reply(query, names, mac=b"\x00\x11\x22\x33\x44\x55"):
+    """NBSTAT 要求に対する応答 (名前は圧縮ポインタで返す) を組み立てる"""
+
+    header = query[:2] + struct.pack("!HHHHH", 0x8400, 0, 1, 0, 0)
+    entries = b"".join(
+        name.ljust(15).encode() + bytes([suffix]) + b"\x04\x00"
+        for name, suffix in names
+    )
+    rdata = bytes([len(names)]) + entries + mac + b"\x00" * 40
+    return header + b"\xc0\x0c" + struct.pack("!HHIH", 0x21, 1, 0, len(rdata)) + rdata
+
+
+class NbstatResponder(asyncio.DatagramProtocol):
+    def __init__(self, names):
+        self.names = names
+        self.queries = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queries += 1
+        self.transport.sendto(_nbstat_reply(data, self.names), addr)
+
+
+def _free_port():
+    with socket.socket() as tcp, socket.socket(type=socket.SOCK_DGRAM) as udp:
+        tcp.bind(("127.0.0.1", 0))
+        port = tcp.getsockname()[1]
+        udp.bind(("127.0.0.1", port))
+        return port
+
+
+async def _smb_server(host, port, accept_smb1):
+    async def handle(reader, writer):
+        header = await reader.readexactly(4)
+        request = await reader.readexactly(int.from_bytes(header[1:4], "big"))
+        assert request[:5] == b"\xffSMB\x72"
+        if accept_smb1:
+            body = request[:32] + b"\x11" + struct.pack("<H", 0) + b"\x00" * 40
+            writer.write(b"\x00" + len(body).to_bytes(3, "big") + body)
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def test_sweep_batches_nbstat_and_smb_probes(monkeypatch):
+    port = _free_port()
+    monkeypatch.setattr(smb_netbios, "NBSTAT_PORT", port)
+    monkeypatch.setattr(smb_netbios, "SMB_PORT", port)
+
+    loop = asyncio.get_running_loop()
+    responder = NbstatResponder([("fileserver", 0x00), ("WORKGROUP", 0x00)])
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: responder, local_addr=("127.0.0.1", port)
+    )
+    legacy = await _smb_server("127.0.0.1", port, accept_smb1=True)
+    modern = await _smb_server("127.0.0.2", port, accept_smb1=False)
+    try:
+        async with legacy, modern:
+            results = await smb_netbios.sweep(
+                ["127.0.0.1", "127.0.0.2", "127.0.0.3"], timeout=1.0
+            )
+    finally:
+        transport.close()
+
+    by_host = {r["details"]["target"]: r for r in results}
+    assert list(by_host) == ["127.0.0.1", "127.0.0.2", "127.0.0.3"]
+
+    first = by_host["127.0.0.1"]
+    assert first["score"] == 5
+    assert first["details"]["smb1_enabled"] is True
+    assert first["details"]["netbios_names"] == ["FILESERVER", "WORKGROUP"]
+    assert first["details"]["mac"] == "00:11:22:33:44:55"
+
+    second = by_host["127.0.0.2"]
+    assert second["score"] == 0
+    assert second["details"]["smb1_enabled"] is False
+    assert "error" not in second["details"]
+
+    # 応答の無いホストは接続エラーのみ記録
+    third = by_host["127.0.0.3"]
+    assert third["details"]["netbios_names"] == []
+    assert third["details"]["error"]
+    # 1 つの UDP ソケットから全ホストへ送っている
+    assert responder.queries == 1
+
+
+def test_expand_targets_accepts_cidr():
+    assert smb_netbios._expand_targets("10.0.0.0/30") == ["10.0.0.1", "10.0.0.2"]
+    assert smb_netbios._expand_targets(["10.0.0.5", "10.0.0.4/31", "10.0.0.5"]) == [
+        "10.0.0.5",
+        "10.0.0.4",
+    ]
+
+
+def test_parse_nbstat_rejects_other_record_types():
+    query = smb_netbios.build_nbstat_query(7)
+    reply = bytearray(_nbstat_reply(query, [("HOST", 0)]))
+    assert smb_netbios.parse_nbstat_response(bytes(reply))[:2] == (7, ["HOST"])
+    reply[15] = 0x20  # NB レコード
+    assert smb_netbios.parse_nbstat_response(bytes(reply)) is None
@@ -0,0 +1,160 @@
+"""Tests for the asynchronous SNMP client."""
+
+import asyncio
+
+import pytest
+
+from src import snmp_client
+
+ROOT = "1.0.8802.1.1.2.1.4.1.1.9"
+
+
+def test_message_round_trip():
+    packet = snmp_client.build_getbulk(1234, "public", ROOT, max_repetitions=10)
+    message = snmp_client.decode_message(packet)
+    assert message.community == "public"
+    assert message.pdu_type == snmp_client.PDU_GET_BULK
+    assert message.request_id == 1234
+    assert (message.error_status, message.error_index) == (0, 10)
+    assert message.varbinds == [(ROOT, None)]
+
+    varbinds = [
+        (f"{ROOT}.0.1.300", "x" * 200),
+        ("1.3.6.1.2.1.1.3.0", -5),
+        ("1.3.6.1.2.1.1.4.0", snmp_client.END_OF_MIB_VIEW),
+    ]
+    response = snmp_client.encode_message(
+        "public", snmp_client.PDU_RESPONSE, 7, varbinds
+    )
+    assert snmp_client.decode_message(response).varbinds == varbinds
+
+
+# 手で検証した BER。シミュレータも snmp_client で符号化するため、
+# 送受信の両方が同じ誤りを持っても気付けるようにバイト列で固定する
+GOLDEN_GETBULK = bytes.fromhex(
+    "3025"  # SEQUENCE
+    "020101"  # version: 1 (SNMPv2c)
+    "04067075626c6963"  # community: "public"
+    "a518"  # GetBulkRequest-PDU
+    "020204d2"  # request-id: 1234
+    "020100"  # non-repeaters: 0
+    "02010a"  # max-repetitions: 10
+    "300c"  # varbind list
+    "300a06062b0601020101"  # 1.3.6.1.2.1.1
+    "0500"  # NULL
+)
+
+GOLDEN_RESPONSE = bytes.fromhex(
+    "304e"
+    "020101"
+    "04067075626c6963"
+    "a241"  # Response-PDU
+    "020204d2"
+    "020100"
+    "020100"
+    "3035"
+    "300e06082b06010201010300"  # 1.3.6.1.2.1.1.3.0
+    "43023039"  # TimeTicks 12345
+    "3015060d2b06010201041401010a000001"  # 1.3.6.1.2.1.4.20.1.1.10.0.0.1
+    "40040a000001"  # IpAddress 10.0.0.1
+    "300c06082b06010201010500"  # 1.3.6.1.2.1.1.5.0
+    "8200"  # endOfMibView
+)
+
+
+def test_getbulk_matches_golden_bytes():
+    packet = snmp_client.build_getbulk(
+        1234, "public", "1.3.6.1.2.1.1", max_repetitions=10
+    )
+    assert packet == GOLDEN_GETBULK
+
+
+def test_decode_matches_golden_response():
+    message = snmp_client.decode_message(GOLDEN_RESPONSE)
+    assert message.community == "public"
+    assert message.pdu_type == snmp_client.PDU_RESPONSE
+    assert message.request_id == 1234
+    assert message.varbinds == [
+        ("1.3.6.1.2.1.1.3.0", 12345),
+        ("1.3.6.1.2.1.4.20.1.1.10.0.0.1", "10.0.0.1"),
+        ("1.3.6.1.2.1.1.5.0", snmp_client.END_OF_MIB_VIEW),
+    ]
+
+
+@pytest.mark.parametrize(
+    "encoded, expected",
+    [
+        # LLDP-MIB: 8802 は 2 バイトの基数 128 表現 (c4 62)
+        (snmp_client._encode_oid("1.0.8802.1.1.2"), "0606" "28c462010102"),
+        # 0x80 以上の正の整数は符号ビットを避けて 00 を前置する
+        (snmp_client._encode_int(200), "020200c8"),
+        (snmp_client._encode_int(-5), "0201fb"),
+        # 長さ 128 以上は長形式
+        (snmp_client._tlv(0x04, b"x" * 200)[:3], "0481c8"),
+    ],
+)
+def test_ber_primitives_match_golden_bytes(encoded, expected):
+    assert encoded.hex() == expected
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(ValueError):
+        snmp_client.decode_message(b"\x30\x05\x02")
+
+
+async def _walk(port, ip="127.0.0.1", **kwargs):
+    client = await snmp_client.SnmpClient.open()
+    try:
+        return await client.bulk_walk(ip, "public", ROOT, port=port, **kwargs)
+    finally:
+        client.close()
+
+
+def test_bulk_walk_pages_through_subtree(snmp_agent):
+    mib = {f"{ROOT}.0.{i}.1": f"sw{i}" for i in range(1, 6)}
+    mib["1.0.8802.1.1.2.1.4.1.1.10.0.1.1"] = "outside"
+    agent = snmp_agent(mib)
+
+    rows = asyncio.run(_walk(agent.port, max_repetitions=2))
+
+    assert [value for _, value in rows] == [f"sw{i}" for i in range(1, 6)]
+    # 2 件ずつ 3 回で部分木の外に出る
+    assert len(agent.requests) == 3
+    assert all(r.pdu_type == snmp_client.PDU_GET_BULK for r in agent.requests)
+
+
+def test_bulk_walk_stops_at_end_of_mib(snmp_agent):
+    agent = snmp_agent({f"{ROOT}.0.1.1": "only"})
+
+    rows = asyncio.run(_walk(agent.port))
+
+    assert rows == [(f"{ROOT}.0.1.1", "only")]
+    assert len(agent.requests) == 1
+
+
+def test_bulk_walk_times_out_without_agent(snmp_agent):
+    agent = snmp_agent({f"{ROOT}.0.1.1": "x"}, community="secret")
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(_walk(agent.port, timeout=0.1, retries=1))
+    assert len(agent.requests) == 2
+
+
+def test_concurrent_walks_share_one_socket(snmp_agent):
+    agent = snmp_agent({f"{ROOT}.0.{i}.1": f"sw{i}" for i in range(1, 4)})
+
+    async def run():
+        client = await snmp_client.SnmpClient.open()
+        try:
+            return await asyncio.gather(
+                *(
+                    client.bulk_walk(ip, "public", ROOT, port=agent.port)
+                    for ip in ("127.0.0.1", "127.0.0.2", "127.0.0.3")
+                )
+            )
+        finally:
+            client.close()
+
+    results = asyncio.run(run())
+    assert [len(rows) for rows in results] == [3, 3, 3]
+    assert len({r.request_id for r in agent.requests}) == 3
@@ -0,0 +1,173 @@
+import asyncio
+import datetime as dt
+import ssl
+from collections import OrderedDict
+
+import pytest
+
+from src.scans import ssl_cert
+
+x509 = pytest.importorskip("cryptography.x509")
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def server_context(tmp_path_factory):
+    """127.0.0.1 向けの自己署名証明書を持つサーバ用コンテキスト"""
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name(
+        [
+            x509.NameAttribute(NameOID.COMMON_NAME, "test.local"),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, "SelfSigned Inc"),
+        ]
+    )
+    now = dt.datetime.now(dt.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - dt.timedelta(days=1))
+        .not_valid_after(now + dt.timedelta(days=10))
+        .sign(key, hashes.SHA256())
+    )
+    path = tmp_path_factory.mktemp("tls")
+    (path / "cert.pem").write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    (path / "key.pem").write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(path / "cert.pem", path / "key.pem")
+    return context
+
+
+async def _tls_server(context):
+    async def handle(reader, writer):
+        try:
+            await reader.read()
+        except (ConnectionError, ssl.SSLError):
+            pass
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=context)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def test_sweep_reads_unverified_certs_and_caches_by_fingerprint(
+    server_context, monkeypatch
+):
+    monkeypatch.setattr(ssl_cert, "_CERT_CACHE", OrderedDict())
+    decoded = []
+    real_decode = ssl_cert._decode_der
+    monkeypatch.setattr(
+        ssl_cert, "_decode_der", lambda der: decoded.append(der) or real_decode(der)
+    )
+    first, port1 = await _tls_server(server_context)
+    second, port2 = await _tls_server(server_context)
+    async with first, second:
+        results = await ssl_cert.sweep(
+            [("127.0.0.1", port1), f"127.0.0.1:{port2}"], concurrency=2
+        )
+
+    assert [r["details"]["port"] for r in results] == [port1, port2]
+    for result in results:
+        details = result["details"]
+        assert details["verified"] is False
+        assert "self" in details["verify_error"]
+        assert details["issuer"] == "test.local, SelfSigned Inc"
+        assert 8 <= details["days_remaining"] <= 10
+        # 期限間近 (+2) と信頼されていない発行者 (+1)
+        assert result["score"] == 3
+    assert results[0]["details"]["fingerprint"] == results[1]["details"]["fingerprint"]
+    # 同じ証明書の解析は 1 回だけ
+    assert len(decoded) == 1
+
+
+def test_cached_certs_recompute_expiry_and_stay_bounded(monkeypatch):
+    """キャッシュは復号結果だけを持ち、残り日数は毎回計算する"""
+
+    monkeypatch.setattr(ssl_cert, "_CERT_CACHE", OrderedDict())
+    monkeypatch.setattr(ssl_cert, "CERT_CACHE_SIZE", 2)
+    expiry = {"when": "Jan 10 00:00:00 2030 GMT"}
+    monkeypatch.setattr(
+        ssl_cert, "_decode_der", lambda der: {"notAfter": expiry["when"]}
+    )
+
+    first = ssl_cert._analyse_der(b"a", None)
+    assert first["expired"] is False
+
+    class Later(dt.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return dt.datetime(2030, 2, 1, tzinfo=tz)
+
+    monkeypatch.setattr(ssl_cert, "datetime", Later)
+    again = ssl_cert._analyse_der(b"a", None)
+    assert again["expired"] is True and again["score"] == 5
+
+    ssl_cert._analyse_der(b"b", None)
+    ssl_cert._analyse_der(b"c", None)
+    assert len(ssl_cert._CERT_CACHE) == 2
+
+
+@pytest.mark.parametrize(
+    "endpoint, expected",
+    [
+        ("example.com", ("example.com", 443)),
+        ("example.com:8443", ("example.com", 8443)),
+        ("10.0.0.1:993", ("10.0.0.1", 993)),
+        ("fe80::1", ("fe80::1", 443)),
+        ("2001:db8::1:8443", ("2001:db8::1:8443", 443)),
+        ("[2001:db8::1]:8443", ("2001:db8::1", 8443)),
+        ("[fe80::1]", ("fe80::1", 443)),
+        (("::1", "636"), ("::1", 636)),
+    ],
+)
+def test_parse_endpoint_handles_ipv6(endpoint, expected):
+    assert ssl_cert._parse_endpoint(endpoint) == expected
+
+
+async def test_sweep_negotiates_tls_for_rdp(server_context, monkeypatch):
+    """RDP は X.224 で TLS を要求してからハンドシェイクする"""
+
+    async def handle(reader, writer):
+        request = await reader.readexactly(19)
+        assert request == ssl_cert._RDP_NEG_REQ
+        # TPKT + X.224 CC + RDP_NEG_RSP (PROTOCOL_SSL)
+        writer.write(bytes.fromhex("030000130ed000001234000200080001000000"))
+        await writer.drain()
+        await writer.start_tls(server_context)
+        try:
+            await reader.read()
+        except (ConnectionError, ssl.SSLError):
+            pass
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(ssl_cert, "RDP_PORTS", frozenset({port}))
+    async with server:
+        (result,) = await ssl_cert.sweep([("127.0.0.1", port)])
+
+    assert "error" not in result["details"]
+    assert result["details"]["issuer"] == "test.local, SelfSigned Inc"
+
+
+def test_scan_many_reports_unreachable_endpoints():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    (result,) = ssl_cert.scan_many([f"127.0.0.1:{port}"], timeout=1)
+    assert result["score"] == 0
+    assert result["details"]["port"] == port
+    assert result["details"]["error"]
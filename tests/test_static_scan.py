@@ -146,3 +146,240 @@ def test_run_all_prioritizes_ports_and_os_banner(monkeypatch):
 
     # run_all should reorder to prioritise ports then os_banner
     assert categories == ["ports", "os_banner", "smb_netbios"]
+
+
+def _host_scanners(calls):
+    def make(name):
+        def scan(host):
+            calls.append((name, host))
+            return {"category": name, "score": 1, "details": {"target": host}}
+
+        return scan
+
+    return [
+        ("ports", make("ports")),
+        ("os_banner", make("os_banner")),
+        ("dhcp", lambda: {"category": "dhcp", "score": 2, "details": {}}),
+    ]
+
+
+def test_run_all_schedules_host_scanner_matrix(monkeypatch):
+    """ホスト指定時はホスト × スキャナの行列で実行し、ホスト別に集計する"""
+
+    calls = []
+    monkeypatch.setattr(static_scan, "_load_scanners", lambda: _host_scanners(calls))
+
+    results = static_scan.run_all(
+        targets=[{"ip": "10.0.0.1"}, "10.0.0.2", {"ip": "10.0.0.1"}]
+    )
+
+    assert sorted(calls) == [
+        ("os_banner", "10.0.0.1"),
+        ("os_banner", "10.0.0.2"),
+        ("ports", "10.0.0.1"),
+        ("ports", "10.0.0.2"),
+    ]
+    # ネットワーク全体のスキャナは 1 回だけ
+    assert [f["category"] for f in results["findings"]].count("dhcp") == 1
+    assert results["risk_score"] == 6
+    assert set(results["hosts"]) == {"10.0.0.1", "10.0.0.2"}
+    host = results["hosts"]["10.0.0.2"]
+    assert [f["category"] for f in host["findings"]] == ["ports", "os_banner"]
+    assert all(f["target"] == "10.0.0.2" for f in host["findings"])
+    assert host["risk_score"] == 2
+    json.dumps(results)
+
+
+def test_run_all_bounds_per_scanner_concurrency(monkeypatch):
+    """同一スキャナの同時実行数が concurrency で制限される"""
+
+    import threading
+
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def scan(host):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return {"category": "ports", "score": 0, "details": {}}
+
+    monkeypatch.setattr(static_scan, "_load_scanners", lambda: [("ports", scan)])
+
+    hosts = [f"10.0.0.{i}" for i in range(6)]
+    results = static_scan.run_all(targets=hosts, concurrency={"ports": 2})
+
+    assert state["peak"] == 2
+    assert len(results["hosts"]) == 6
+
+
+def test_run_all_hung_host_scanner_frees_its_slot(monkeypatch):
+    """ハングしたホストスキャナを見捨てたら待機中のホストが走り出す"""
+
+    import threading
+
+    release = threading.Event()
+    started = []
+
+    def hung(host):
+        started.append(host)
+        release.wait(30)
+
+    def ports(host):
+        return {"category": "ports", "score": 1, "details": {}}
+
+    monkeypatch.setattr(
+        static_scan, "_load_scanners", lambda: [("ports", ports), ("os_banner", hung)]
+    )
+    hosts = [f"10.0.0.{i}" for i in range(5)]
+
+    start = time.perf_counter()
+    try:
+        results = static_scan.run_all(timeout=0.5, targets=hosts)
+    finally:
+        release.set()
+    elapsed = time.perf_counter() - start
+
+    # 同時実行 2 なので 0.5 秒ずつ 3 巡で終わる
+    assert elapsed < 3
+    assert sorted(started) == hosts
+    for host in hosts:
+        by_cat = {f["category"]: f for f in results["hosts"][host]["findings"]}
+        assert by_cat["ports"]["score"] == 1
+        assert by_cat["os_banner"]["details"]["error"] == "timeout"
+
+
+def test_run_all_matrix_records_host_errors(monkeypatch):
+    def scan(host):
+        if host == "10.0.0.2":
+            raise RuntimeError("unreachable")
+        return {"category": "ports", "score": 1, "details": {}}
+
+    monkeypatch.setattr(static_scan, "_load_scanners", lambda: [("ports", scan)])
+
+    results = static_scan.run_all(targets=["10.0.0.1", "10.0.0.2"])
+    bad = results["hosts"]["10.0.0.2"]["findings"][0]
+    assert bad["details"]["error"] == "unreachable"
+    assert bad["score"] == 0
+    assert results["risk_score"] == 1
+
+
+def test_run_all_enforces_single_deadline(monkeypatch):
+    """逐次の per-future 待ちではなく全体で 1 つの期限に収まる"""
+
+    def hung():
+        time.sleep(1.5)
+
+    scanners = [(f"hung{i}", hung) for i in range(4)]
+    monkeypatch.setattr(static_scan, "_load_scanners", lambda: scanners)
+
+    start = time.perf_counter()
+    results = static_scan.run_all(timeout=5, deadline=0.3)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.0
+    assert all(f["details"]["error"] == "timeout" for f in results["findings"])
+    assert [f["category"] for f in results["findings"]] == [n for n, _ in scanners]
+
+
+def test_run_all_applies_per_scanner_budgets(monkeypatch):
+    def make_slow(name):
+        def slow():
+            time.sleep(0.4)
+            return {"category": name, "score": 1, "details": {}}
+
+        return slow
+
+    scanners = [("slow", make_slow("slow")), ("slow_ok", make_slow("slow_ok"))]
+    monkeypatch.setattr(static_scan, "_load_scanners", lambda: scanners)
+
+    results = static_scan.run_all(timeout=2, budgets={"slow": 0.1})
+    by_cat = _findings_by_category(results)
+    assert by_cat["slow"]["details"]["error"] == "timeout"
+    assert by_cat["slow"]["score"] == 0
+    # 予算内のスキャナは結果が残る
+    assert by_cat["slow_ok"]["score"] == 1
+
+
+def test_run_all_process_isolation_kills_hung_scanner(monkeypatch, tmp_path):
+    """process モードでは期限切れのワーカーが強制終了される"""
+
+    marker = tmp_path / "finished"
+
+    def hung():
+        time.sleep(2)
+        marker.write_text("done")
+
+    def ok():
+        return {"category": "ok", "score": 3, "details": {"pid": 1}}
+
+    def boom():
+        raise RuntimeError("child boom")
+
+    monkeypatch.setattr(
+        static_scan,
+        "_load_scanners",
+        lambda: [("hung", hung), ("ok", ok), ("boom", boom)],
+    )
+
+    start = time.perf_counter()
+    results = static_scan.run_all(timeout=0.5, isolation="process")
+    elapsed = time.perf_counter() - start
+
+    by_cat = _findings_by_category(results)
+    assert by_cat["hung"]["details"]["error"] == "timeout"
+    assert by_cat["ok"]["score"] == 3
+    assert by_cat["boom"]["details"]["error"] == "child boom"
+    assert elapsed < 1.8
+    time.sleep(2)
+    assert not marker.exists()
+
+
+def test_run_all_rejects_unknown_isolation():
+    with pytest.raises(ValueError):
+        static_scan.run_all(isolation="green-threads")
+
+
+def test_iter_results_streams_results_as_they_complete(monkeypatch):
+    """遅いスキャナを待たずに完了したものから順に届く"""
+
+    def slow():
+        time.sleep(1)
+        return {"category": "os_banner", "score": 3, "details": {}}
+
+    monkeypatch.setattr(
+        static_scan,
+        "_load_scanners",
+        lambda: [("ports", STUB_SCANS["ports"]), ("os_banner", slow)],
+    )
+
+    start = time.monotonic()
+    events = static_scan.iter_results()
+    first = next(events)
+    assert time.monotonic() - start < 0.5
+    assert first["type"] == "result"
+    assert first["finding"]["category"] == "ports"
+    assert first["risk_score"] == 1
+    assert (first["completed"], first["total"]) == (1, 2)
+
+    rest = list(events)
+    assert [e["type"] for e in rest] == ["result", "done"]
+    assert rest[0]["risk_score"] == 4
+    assert rest[-1]["risk_score"] == 4
+
+
+def test_iter_results_tracks_per_host_scores(monkeypatch):
+    calls = []
+    monkeypatch.setattr(static_scan, "_load_scanners", lambda: _host_scanners(calls))
+
+    events = list(static_scan.iter_results(targets=["10.0.0.1", "10.0.0.2"]))
+    host_events = [e for e in events if "host" in e]
+    assert len(host_events) == 4
+    assert {e["host"] for e in host_events} == {"10.0.0.1", "10.0.0.2"}
+    last = {e["host"]: e["host_risk_score"] for e in host_events}
+    assert last == {"10.0.0.1": 2, "10.0.0.2": 2}
+    assert events[-1] == {"type": "done", "risk_score": 6, "completed": 5, "total": 5}
+    json.dumps(events)
@@ -90,3 +90,74 @@ def test_load_scanners_skips_private_and_non_scan_modules(tmp_path, monkeypatch)
     result = static_scan.run_all()
     assert result["findings"] == [{"category": "good", "score": 1, "details": {}}]
     assert result["risk_score"] == 1
+
+
+def test_load_scanners_caches_module_discovery(monkeypatch):
+    """2 回目以降の _load_scanners は iter_modules を再実行しない"""
+
+    static_scan._load_scanners()
+    calls = []
+
+    def fake_iter_modules(path):
+        calls.append(path)
+        return []
+
+    monkeypatch.setattr(static_scan, "iter_modules", fake_iter_modules)
+    names = {name for name, _ in static_scan._load_scanners()}
+    assert calls == []
+    assert {"ports", "os_banner"}.issubset(names)
+
+
+def test_load_scanners_skips_missing_dependencies(tmp_path, monkeypatch):
+    """依存ライブラリが無いスキャナは import せずにスキップする"""
+
+    (tmp_path / "needs_dep.py").write_text("raise ImportError('must not import')\n")
+    (tmp_path / "good.py").write_text(
+        "def scan():\n    return {'category': 'good', 'score': 1, 'details': {}}\n"
+    )
+    monkeypatch.setattr(static_scan.scans, "__path__", [str(tmp_path)])
+    monkeypatch.setitem(
+        static_scan.scans.SCANNERS,
+        "needs_dep",
+        static_scan.scans.ScannerInfo("needs_dep", requires=("no_such_module_x",)),
+    )
+
+    assert [name for name, _ in static_scan._load_scanners()] == ["good"]
+    result = static_scan.run_all()
+    assert result["skipped"] == {"needs_dep": "missing dependency: no_such_module_x"}
+
+
+def test_run_all_skips_privileged_scanners_without_root(monkeypatch):
+    ran = []
+
+    def make(name):
+        def scan():
+            ran.append(name)
+            return {"category": name, "score": 0, "details": {}}
+
+        return scan
+
+    monkeypatch.setattr(
+        static_scan,
+        "_load_scanners",
+        lambda: [("ports", make("ports")), ("dhcp", make("dhcp"))],
+    )
+    monkeypatch.setattr(static_scan, "_has_privileges", lambda: False)
+
+    result = static_scan.run_all(skip_unprivileged=True)
+    assert ran == ["ports"]
+    assert result["skipped"] == {"dhcp": "requires root privileges"}
+
+
+def test_scanner_registry_metadata():
+    info = static_scan.scans.scanner_info("os_banner")
+    assert info.scope == "host"
+    assert "nmap" in info.requires
+    assert "cryptography" in static_scan.scans.scanner_info("ssl_cert").requires
+    assert static_scan.scans.scanner_info("unknown_mod").scope == "network"
+    assert static_scan.HOST_SCANNERS == {
+        "ports",
+        "os_banner",
+        "smb_netbios",
+        "ssl_cert",
+    }
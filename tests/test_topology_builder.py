@@ -2,6 +2,9 @@
 
 import json
 
+import pytest
+
+from src import snmp_client, topology_builder, traceroute_engine
 from src.topology_builder import (
     build_paths,
     build_topology,
@@ -11,6 +14,22 @@ from src.topology_builder import (
 )
 
 
+@pytest.fixture(autouse=True)
+def _no_raw_socket(monkeypatch):
+    """Use the ``traceroute`` fallback unless a test opts into the engine."""
+
+    monkeypatch.setattr(
+        traceroute_engine.RawProber, "open", classmethod(lambda cls: None)
+    )
+
+
+@pytest.fixture(autouse=True)
+def _fresh_neighbor_cache(monkeypatch):
+    monkeypatch.setattr(
+        topology_builder, "_neighbor_cache", topology_builder.NeighborCache()
+    )
+
+
 def test_traceroute_parses_hops(monkeypatch):
     """Raw traceroute output is parsed into hop IP addresses."""
 
@@ -60,7 +79,9 @@ def test_build_paths_with_snmp(monkeypatch):
 
     monkeypatch.setattr("src.topology_builder.traceroute", fake_traceroute)
     monkeypatch.setattr("src.topology_builder._augment_with_snmp", fake_augment)
-    monkeypatch.setattr("src.topology_builder.nextCmd", object())
+    monkeypatch.setattr(
+        "src.topology_builder.lookup_lldp_neighbors", lambda ips, community: {}
+    )
 
     result = build_paths(["192.168.0.20"], use_snmp=True)
     assert result == {
@@ -68,26 +89,25 @@ def test_build_paths_with_snmp(monkeypatch):
     }
 
 
-def test_build_paths_snmp_unavailable(monkeypatch):
-    """When pysnmp is missing, SNMP augmentation is skipped."""
-
-    def fake_traceroute(ip):  # pragma: no cover - simple stub
-        return ["192.168.0.1", ip]
+def test_build_paths_snmp_queries_each_hop_once(monkeypatch):
+    """Intermediate hops of all paths are looked up in one batch."""
 
-    called = {"flag": False}
+    monkeypatch.setattr(
+        "src.topology_builder.traceroute", lambda ip: ["192.168.0.1", "10.0.0.1", ip]
+    )
+    batches = []
 
-    def fake_augment(hops, path, community="public"):
-        called["flag"] = True
+    async def fake_fetch(ips, community):
+        batches.append(list(ips))
+        return {ip: ["Core"] if ip == "10.0.0.1" else [] for ip in ips}
 
-    monkeypatch.setattr("src.topology_builder.traceroute", fake_traceroute)
-    monkeypatch.setattr("src.topology_builder._augment_with_snmp", fake_augment)
-    monkeypatch.setattr("src.topology_builder.nextCmd", None)
+    monkeypatch.setattr(topology_builder, "_fetch_lldp_neighbors", fake_fetch)
 
-    result = build_paths(["192.168.0.30"], use_snmp=True)
-    assert result == {
-        "paths": [{"ip": "192.168.0.30", "path": ["LAN", "Router", "Host"]}]
-    }
-    assert not called["flag"]
+    result = build_paths(["10.0.5.1", "10.0.5.2", "10.0.5.3"], use_snmp=True)
+    assert batches == [["192.168.0.1", "10.0.0.1"]]
+    assert [entry["path"] for entry in result["paths"]] == [
+        ["LAN", "Router", "Core", "Host"]
+    ] * 3
 
 
 def test_augment_with_snmp_replaces_labels(monkeypatch):
@@ -102,32 +122,61 @@ def test_augment_with_snmp_replaces_labels(monkeypatch):
     monkeypatch.setattr(
         "src.topology_builder._get_lldp_neighbors", fake_get_lldp_neighbors
     )
-    monkeypatch.setattr("src.topology_builder.nextCmd", object())
 
     _augment_with_snmp(hops, path)
     assert path == ["LAN", "SwitchX", "Host"]
 
 
-def test_augment_with_snmp_skipped_without_pysnmp(monkeypatch):
-    """No augmentation occurs when pysnmp is unavailable."""
-
-    hops = ["10.0.0.1", "10.0.0.2"]
-    path = ["LAN", "Router", "Host"]
-
-    called = {"flag": False}
-
-    def fake_get_lldp_neighbors(ip, community="public"):
-        called["flag"] = True
-        return ["SwitchX"]
+def test_neighbor_cache_expires(monkeypatch):
+    """Cached neighbours (including empty answers) are reused until the TTL."""
 
+    now = [0.0]
     monkeypatch.setattr(
-        "src.topology_builder._get_lldp_neighbors", fake_get_lldp_neighbors
+        topology_builder,
+        "_neighbor_cache",
+        topology_builder.NeighborCache(60, clock=lambda: now[0]),
     )
-    monkeypatch.setattr("src.topology_builder.nextCmd", None)
+    calls = []
+
+    async def fake_fetch(ips, community):
+        calls.append((list(ips), community))
+        return {ip: [] for ip in ips}
+
+    monkeypatch.setattr(topology_builder, "_fetch_lldp_neighbors", fake_fetch)
+
+    assert topology_builder.lookup_lldp_neighbors(["10.0.0.1"]) == {"10.0.0.1": []}
+    now[0] = 59
+    topology_builder.lookup_lldp_neighbors(["10.0.0.1", "10.0.0.1"])
+    topology_builder.lookup_lldp_neighbors(["10.0.0.1"], community="private")
+    now[0] = 60
+    topology_builder.lookup_lldp_neighbors(["10.0.0.1"])
+    assert calls == [
+        (["10.0.0.1"], "public"),
+        (["10.0.0.1"], "private"),
+        (["10.0.0.1"], "public"),
+    ]
+
+
+def test_lldp_neighbors_from_snmp_simulator(monkeypatch, snmp_agent):
+    """Neighbour names are walked from a local SNMP agent and cached."""
+
+    agent = snmp_agent(
+        {
+            f"{topology_builder.LLDP_REMOTE_SYS_NAME_OID}.0.1.1": "core-sw",
+            f"{topology_builder.LLDP_REMOTE_SYS_NAME_OID}.0.2.1": "edge-sw",
+            "1.0.8802.1.1.2.1.4.1.1.10.0.1.1": "not a name",
+        }
+    )
+    monkeypatch.setattr(snmp_client, "SNMP_PORT", agent.port)
 
-    _augment_with_snmp(hops, path)
-    assert path == ["LAN", "Router", "Host"]
-    assert not called["flag"]
+    names = topology_builder.lookup_lldp_neighbors(["127.0.0.1", "127.0.0.2"])
+    assert names == {
+        "127.0.0.1": ["core-sw", "edge-sw"],
+        "127.0.0.2": ["core-sw", "edge-sw"],
+    }
+    requests = len(agent.requests)
+    assert topology_builder._get_lldp_neighbors("127.0.0.1") == ["core-sw", "edge-sw"]
+    assert len(agent.requests) == requests
 
 
 def test_build_topology_wrapper(monkeypatch):
@@ -176,3 +225,95 @@ def test_build_topology_for_subnet(monkeypatch):
         "use_snmp": True,
         "community": "private",
     }
+
+
+def test_build_paths_uses_engine(monkeypatch):
+    """Engine results are used and only untraced hosts fall back to traceroute."""
+
+    def fake_trace_many(ips):
+        assert ips == ["192.168.0.10", "fe80::1"]
+        return {"192.168.0.10": ["192.168.0.1", "192.168.0.10"]}
+
+    fallback = []
+
+    def fake_traceroute(ip):
+        fallback.append(ip)
+        return [ip]
+
+    monkeypatch.setattr(traceroute_engine, "trace_many", fake_trace_many)
+    monkeypatch.setattr("src.topology_builder.traceroute", fake_traceroute)
+
+    result = build_paths(["192.168.0.10", "fe80::1"])
+    assert result == {
+        "paths": [
+            {"ip": "192.168.0.10", "path": ["LAN", "Router", "Host"]},
+            {"ip": "fe80::1", "path": ["LAN", "Host"]},
+        ]
+    }
+    assert fallback == ["fe80::1"]
+
+
+def test_build_paths_falls_back_without_raw_socket(monkeypatch):
+    """Without raw sockets every host is traced with the system command."""
+
+    monkeypatch.setattr(
+        "src.topology_builder.traceroute", lambda ip: ["192.168.0.1", ip]
+    )
+
+    result = build_paths(["192.168.0.11", "192.168.0.12"])
+    assert [entry["path"] for entry in result["paths"]] == [
+        ["LAN", "Router", "Host"],
+        ["LAN", "Router", "Host"],
+    ]
+
+
+def test_update_topology_graph_applies_deltas(monkeypatch):
+    """Traced hosts are merged into a graph and only changes are returned."""
+
+    monkeypatch.setattr(
+        "src.topology_builder.traceroute",
+        lambda ip: ["192.168.0.1", ip] if ip != "10.0.0.9" else ["192.168.0.1"],
+    )
+    graph = topology_builder.TopologyGraph()
+
+    first = topology_builder.update_topology_graph(graph, ["10.0.0.1", "10.0.0.9"])
+    assert graph.path("10.0.0.9") == ["LAN", "192.168.0.1", "10.0.0.9"]
+    assert {c["op"] for c in first} == {"add_node", "add_edge", "set_host"}
+
+    second = topology_builder.update_topology_graph(graph, ["10.0.0.1"])
+    assert [c["op"] for c in second] == ["remove_edge", "remove_node", "remove_host"]
+
+
+def test_build_paths_uses_passive_neighbors(monkeypatch):
+    """Hops announced via captured LLDP/CDP are labelled without SNMP."""
+
+    from src.dynamic_scan import neighbors
+
+    neighbors.neighbor_table.update(
+        {
+            "chassis_id": "00:11:22:33:44:55",
+            "port_id": "Gi1/0/24",
+            "ttl": 120,
+            "system_name": "core-sw",
+            "management_addresses": ["10.0.0.1"],
+        }
+    )
+    monkeypatch.setattr(
+        "src.topology_builder.traceroute", lambda ip: ["192.168.0.1", "10.0.0.1", ip]
+    )
+    batches = []
+
+    async def fake_fetch(ips, community):
+        batches.append(list(ips))
+        return {ip: [] for ip in ips}
+
+    monkeypatch.setattr(topology_builder, "_fetch_lldp_neighbors", fake_fetch)
+
+    assert build_paths(["10.0.5.1"])["paths"][0]["path"] == [
+        "LAN",
+        "Router",
+        "core-sw",
+        "Host",
+    ]
+    build_paths(["10.0.5.1"], use_snmp=True)
+    assert batches == [["192.168.0.1"]]
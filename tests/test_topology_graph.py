@@ -0,0 +1,165 @@
+"""Tests for the incremental topology graph."""
+
+import json
+
+import pytest
+
+from src.topology_graph import TopologyGraph
+
+
+def _ops(changes):
+    return [
+        (c["op"], c.get("id") or c.get("host") or (c["source"], c["target"]))
+        for c in changes
+    ]
+
+
+def test_shared_prefix_is_merged():
+    graph = TopologyGraph()
+    changes = graph.update(
+        {
+            "h1": ["LAN", "gw", "core", "h1"],
+            "h2": ["LAN", "gw", "core", "h2"],
+        }
+    )
+
+    assert graph.nodes == ["LAN", "gw", "core", "h1", "h2"]
+    assert graph.edges == [
+        ("LAN", "gw"),
+        ("gw", "core"),
+        ("core", "h1"),
+        ("core", "h2"),
+    ]
+    assert _ops(changes) == [
+        ("add_node", "LAN"),
+        ("add_node", "gw"),
+        ("add_node", "core"),
+        ("add_node", "h1"),
+        ("add_node", "h2"),
+        ("add_edge", ("LAN", "gw")),
+        ("add_edge", ("gw", "core")),
+        ("add_edge", ("core", "h1")),
+        ("add_edge", ("core", "h2")),
+        ("set_host", "h1"),
+        ("set_host", "h2"),
+    ]
+    assert graph.version == 1
+
+
+def test_incremental_insert_and_remove_emit_only_changes():
+    graph = TopologyGraph()
+    graph.update({"h1": ["LAN", "gw", "h1"], "h2": ["LAN", "gw", "h2"]})
+
+    assert _ops(graph.set_path("h3", ["LAN", "gw", "h3"])) == [
+        ("add_node", "h3"),
+        ("add_edge", ("gw", "h3")),
+        ("set_host", "h3"),
+    ]
+    assert _ops(graph.remove("h1")) == [
+        ("remove_edge", ("gw", "h1")),
+        ("remove_node", "h1"),
+        ("remove_host", "h1"),
+    ]
+    assert graph.remove("unknown") == []
+    assert graph.set_path("h2", ["LAN", "gw", "h2"]) == []
+    assert graph.version == 3
+
+    graph.remove("h2")
+    graph.remove("h3")
+    assert graph.nodes == [] and graph.edges == [] and len(graph) == 0
+
+
+def test_moving_host_reports_net_changes():
+    graph = TopologyGraph()
+    graph.update({"h1": ["LAN", "gw1", "h1"], "h2": ["LAN", "gw1", "h2"]})
+
+    changes = graph.set_path("h1", ["LAN", "gw2", "h1"])
+
+    # h1 ノード自体は残るのでエッジの付け替えだけが通知される
+    assert _ops(changes) == [
+        ("add_node", "gw2"),
+        ("add_edge", ("LAN", "gw2")),
+        ("add_edge", ("gw2", "h1")),
+        ("remove_edge", ("gw1", "h1")),
+        ("set_host", "h1"),
+    ]
+    assert graph.path("h1") == ["LAN", "gw2", "h1"]
+
+
+def test_replace_removes_missing_hosts():
+    graph = TopologyGraph()
+    graph.update({"h1": ["LAN", "h1"], "h2": ["LAN", "h2"]})
+
+    changes = graph.update({"h2": ["LAN", "h2"]}, replace=True)
+
+    assert _ops(changes) == [
+        ("remove_edge", ("LAN", "h1")),
+        ("remove_node", "h1"),
+        ("remove_host", "h1"),
+    ]
+    assert graph.hosts == ["h2"]
+
+
+def test_node_on_several_branches_is_kept_until_last_reference():
+    graph = TopologyGraph()
+    graph.update({"a": ["LAN", "r1", "sw"], "b": ["LAN", "r2", "sw"]})
+
+    assert _ops(graph.remove("a")) == [
+        ("remove_edge", ("r1", "sw")),
+        ("remove_edge", ("LAN", "r1")),
+        ("remove_node", "r1"),
+        ("remove_host", "a"),
+    ]
+    assert "sw" in graph.nodes
+
+
+def test_serialisation_round_trip():
+    graph = TopologyGraph()
+    graph.update(
+        {f"10.0.0.{i}": ["LAN", "gw", "core", f"10.0.0.{i}"] for i in range(1, 4)}
+    )
+    graph.update({"10.0.1.1": ["LAN", "gw", "10.0.1.1"]})
+
+    data = json.loads(json.dumps(graph.to_dict()))
+    # 共有プレフィックスは 1 回だけ記録される
+    assert data["ids"].count("gw") == 1
+    assert len(data["trie"]) == 2 * 7
+
+    restored = TopologyGraph.from_dict(data)
+    assert dict(restored.paths()) == dict(graph.paths())
+    assert restored.edges == graph.edges
+    assert restored.version == graph.version
+
+
+def test_empty_path_is_rejected():
+    with pytest.raises(ValueError):
+        TopologyGraph().set_path("h", [])
+
+
+@pytest.mark.benchmark
+def test_incremental_updates_scale(benchmark):
+    graph = TopologyGraph()
+    graph.update(
+        {
+            f"10.{a}.{b}.{c}": [
+                "LAN",
+                "gw",
+                f"core{a}",
+                f"10.{a}.{b}.1",
+                f"10.{a}.{b}.{c}",
+            ]
+            for a in range(4)
+            for b in range(10)
+            for c in range(2, 102)
+        }
+    )
+    assert len(graph) == 4000
+
+    def churn():
+        graph.remove("10.0.0.2")
+        return graph.set_path(
+            "10.0.0.2", ["LAN", "gw", "core0", "10.0.0.1", "10.0.0.2"]
+        )
+
+    changes = benchmark(churn)
+    assert len(changes) == 3
@@ -0,0 +1,143 @@
+"""Tests for cached topology rendering."""
+
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("graphviz")
+from src.NWCD import topology_render
+from src.topology_graph import TopologyGraph
+
+
+def fake_layout(source):
+    """Stand-in for Graphviz returning the DOT source wrapped as SVG."""
+
+    return f"<svg>{source}</svg>"
+
+
+def _graph(hosts=3):
+    graph = TopologyGraph()
+    graph.update({f"h{i}": ["LAN", "gw", f"h{i}"] for i in range(hosts)})
+    return graph
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    pool = ThreadPoolExecutor(max_workers=2)
+    calls = []
+
+    def layout(source):
+        calls.append(source)
+        return fake_layout(source)
+
+    r = topology_render.TopologyRenderer(tmp_path, executor=pool, layout=layout)
+    r.calls = calls
+    yield r
+    pool.shutdown()
+
+
+def test_render_caches_by_content(renderer, tmp_path):
+    nodes = {"gw": {"hostname": "router"}}
+
+    svg = renderer.render(_graph(), nodes)
+
+    assert svg.startswith("<svg>") and "router" in svg
+    key = topology_render.graph_key(_graph(), nodes)
+    assert (tmp_path / f"{key}.svg").read_text() == svg
+    # 挿入順が違っても同じグラフなら再描画しない
+    reordered = TopologyGraph()
+    reordered.update({f"h{i}": ["LAN", "gw", f"h{i}"] for i in (2, 0, 1)})
+    assert renderer.render(reordered, nodes) == svg
+    assert len(renderer.calls) == 1
+    # ラベルが変われば別のキー
+    renderer.render(_graph(), {"gw": {"hostname": "core"}})
+    assert len(renderer.calls) == 2
+
+
+def test_concurrent_requests_share_one_layout(tmp_path):
+    gate = threading.Event()
+    calls = []
+
+    def slow_layout(source):
+        calls.append(source)
+        gate.wait(5)
+        return fake_layout(source)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        renderer = topology_render.TopologyRenderer(
+            tmp_path, executor=pool, layout=slow_layout
+        )
+        first = renderer.submit(_graph(), {})
+        second = renderer.submit(_graph(), {})
+        assert first is second
+        # 描画中は前回の画像 (まだ無い) を返して待たない
+        assert renderer.current(_graph(), {}) is None
+        gate.set()
+        svg = first.result(5)
+    assert len(calls) == 1
+    assert renderer.current(_graph(), {}) == svg
+    assert renderer.latest == svg
+
+
+def test_render_async(renderer):
+    svg = asyncio.run(renderer.render_async(_graph(), {}))
+    assert renderer.cached(_graph(), {}) == svg
+
+
+def test_layout_errors_propagate_and_are_not_cached(tmp_path):
+    def broken(source):
+        raise RuntimeError("dot failed")
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        renderer = topology_render.TopologyRenderer(
+            tmp_path, executor=pool, layout=broken
+        )
+        with pytest.raises(RuntimeError):
+            renderer.render(_graph(), {})
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_large_graph_is_collapsed_per_router(renderer):
+    graph = TopologyGraph()
+    graph.update(
+        {
+            f"10.0.{r}.{h}": ["LAN", f"r{r}", f"10.0.{r}.{h}"]
+            for r in range(3)
+            for h in range(1, 11)
+        }
+    )
+    renderer.max_detailed_nodes = 10
+
+    svg = renderer.render(graph, {})
+
+    assert '"r0/hosts" [label="10 hosts"]' in svg
+    assert "10.0.0.1" not in svg
+    assert len(renderer.calls) == 1
+
+
+def test_collapse_keeps_shared_and_transit_nodes():
+    graph = TopologyGraph()
+    graph.update(
+        {
+            "a": ["LAN", "r1", "sw", "a"],
+            "b": ["LAN", "r1", "sw", "b"],
+            "c": ["LAN", "r1", "c"],
+        }
+    )
+
+    collapsed, info = topology_render.collapse(graph, {"sw": {"hostname": "switch"}})
+
+    assert set(collapsed.nodes) == {"LAN", "r1", "sw", "sw/hosts", "r1/hosts"}
+    assert info["sw/hosts"] == {"hostname": "2 hosts"}
+    assert info["sw"] == {"hostname": "switch"}
+
+
+def test_layout_runs_in_process_pool(tmp_path):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        renderer = topology_render.TopologyRenderer(
+            tmp_path, executor=pool, layout=fake_layout
+        )
+        svg = renderer.render(_graph(), {})
+    assert svg.startswith("<svg>digraph")
@@ -0,0 +1,160 @@
+"""Tests for the concurrent traceroute engine."""
+
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from src import traceroute_engine
+
+
+def _icmp_error(icmp_type, responder, destination, port):
+    ip = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0,
+        56,
+        0,
+        0,
+        64,
+        1,
+        0,
+        socket.inet_aton(responder),
+        socket.inet_aton("192.0.2.1"),
+    )
+    icmp = struct.pack("!BBHI", icmp_type, 3 if icmp_type == 3 else 0, 0, 0)
+    inner = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0,
+        38,
+        0,
+        0,
+        1,
+        17,
+        0,
+        socket.inet_aton("192.0.2.1"),
+        socket.inet_aton(destination),
+    )
+    udp = struct.pack("!HHHH", 40000, port, 18, 0)
+    return ip + icmp + inner + udp
+
+
+def test_parse_icmp_reply():
+    packet = _icmp_error(11, "10.0.0.1", "10.0.5.7", 33440)
+    assert traceroute_engine.parse_icmp_reply(packet) == (
+        "10.0.0.1",
+        11,
+        "10.0.5.7",
+        33440,
+    )
+    unreachable = _icmp_error(3, "10.0.5.7", "10.0.5.7", 33441)
+    assert traceroute_engine.parse_icmp_reply(unreachable)[1] == 3
+    echo_reply = unreachable[:20] + b"\x00" + unreachable[21:]
+    assert traceroute_engine.parse_icmp_reply(echo_reply) is None
+    assert traceroute_engine.parse_icmp_reply(packet[:30]) is None
+
+
+class FakeProber:
+    """Answer probes from a static routing table and count them."""
+
+    def __init__(self, routes, silent=()):
+        self.routes = routes
+        self.silent = set(silent)
+        self.sent = []
+
+    async def probe(self, ip, ttl, timeout):
+        self.sent.append((ip, ttl))
+        await asyncio.sleep(0)
+        path = self.routes[ip]
+        if ttl > len(path) or path[ttl - 1] in self.silent:
+            return None
+        return path[ttl - 1], ttl == len(path)
+
+
+def test_shared_prefix_hops_are_probed_once():
+    hosts = [f"10.0.5.{i}" for i in range(1, 11)]
+    routes = {ip: ["192.168.0.1", "10.0.0.1", ip] for ip in hosts}
+    prober = FakeProber(routes)
+
+    paths = traceroute_engine.trace_many(hosts, prober=prober)
+
+    assert paths == {ip: ["192.168.0.1", "10.0.0.1", ip] for ip in hosts}
+    # ゲートウェイとコアは 1 回ずつ、各ホストは自分のホップだけ
+    assert len(prober.sent) == 2 + len(hosts)
+
+
+def test_other_prefixes_and_direct_hosts_probe_themselves():
+    routes = {
+        "192.168.0.20": ["192.168.0.20"],
+        "192.168.0.21": ["192.168.0.21"],
+        "10.0.6.1": ["192.168.0.1", "10.0.6.1"],
+    }
+    prober = FakeProber(routes)
+
+    paths = traceroute_engine.trace_many(list(routes), prober=prober)
+
+    assert paths == routes
+    assert sorted(prober.sent) == [
+        ("10.0.6.1", 1),
+        ("10.0.6.1", 2),
+        ("192.168.0.20", 1),
+        ("192.168.0.21", 1),
+    ]
+
+
+def test_silent_hops_are_skipped_and_not_shared():
+    hosts = ["10.0.7.1", "10.0.7.2"]
+    routes = {ip: ["192.168.0.1", "*", ip] for ip in hosts}
+    prober = FakeProber(routes, silent={"*"})
+
+    paths = traceroute_engine.trace_many(hosts, prober=prober, attempts=2)
+
+    assert paths == {ip: ["192.168.0.1", ip] for ip in hosts}
+    assert prober.sent.count(("10.0.7.1", 2)) == 2
+    assert prober.sent.count(("10.0.7.2", 2)) == 2
+    assert ("10.0.7.2", 1) not in prober.sent
+
+
+def test_trace_stops_after_silent_hops():
+    route = ["192.168.0.1"] + ["*"] * 10 + ["10.0.8.1"]
+    prober = FakeProber({"10.0.8.1": route}, silent={"*"})
+
+    paths = traceroute_engine.trace_many(["10.0.8.1"], prober=prober, attempts=1)
+
+    assert paths == {"10.0.8.1": ["192.168.0.1"]}
+    assert len(prober.sent) == 1 + traceroute_engine.MAX_SILENT_HOPS
+
+
+def test_non_ipv4_targets_are_left_out():
+    prober = FakeProber({"10.0.9.1": ["10.0.9.1"]})
+
+    paths = traceroute_engine.trace_many(["10.0.9.1", "fe80::1", "x"], prober=prober)
+
+    assert paths == {"10.0.9.1": ["10.0.9.1"]}
+
+
+def test_returns_none_without_raw_socket(monkeypatch):
+    monkeypatch.setattr(
+        traceroute_engine.RawProber, "open", classmethod(lambda cls: None)
+    )
+    assert traceroute_engine.trace_many(["10.0.9.1"]) is None
+
+
+def test_raw_prober_traces_loopback():
+    async def probe():
+        prober = traceroute_engine.RawProber.open()
+        if prober is None:
+            return None
+        try:
+            return await traceroute_engine.trace_many_async(
+                ["127.0.0.1"], prober=prober, timeout=0.5
+            )
+        finally:
+            prober.close()
+
+    paths = asyncio.run(probe())
+    if paths is None:
+        pytest.skip("raw ICMP socket unavailable")
+    assert paths == {"127.0.0.1": ["127.0.0.1"]}